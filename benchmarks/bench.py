@@ -0,0 +1,322 @@
+"""
+Benchmarks of complete deployer runs against fake container tools
+
+Each scenario runs the deployer as a separate process with fake
+docker, singularity, wget and gunzip programs at the front of PATH
+(see shims/fake.py) and a local HTTP server answering the readiness
+probes, so a deploy exercises every step without containers.
+
+Usage:
+
+    python -m benchmarks.bench [-n 3] [-s docker-cold ...]
+                               [--save baseline.json]
+                               [--baseline baseline.json] [--threshold 0.25]
+
+Per scenario the runner reports the median wall time, the number
+of fake programs spawned, the time spent rendering configuration
+(the *.config spans of the --profile trace, or the plan.restore
+span of a reused plan) and the peak RSS of
+the deployer process. A run compared against a baseline fails when
+the wall time or peak RSS grow beyond the threshold, or when more
+programs are spawned.
+"""
+
+import argparse
+import gzip
+import http.server
+import json
+import os
+import shutil
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# the root of the repository holding the deployer package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the fake programs put on PATH
+SHIM = os.path.join(ROOT, "benchmarks", "shims", "fake.py")
+PROGRAMS = ("docker", "singularity", "wget", "gunzip")
+
+# the latencies of the fake programs in seconds
+DEFAULT_LATENCIES = {"docker pull": 0.5,
+                     "docker build": 0.5,
+                     "singularity pull": 0.5,
+                     "default": 0.01}
+
+# scenario name -> (deployer arguments, warm)
+SCENARIOS = {"docker-cold": ([], False),
+             "docker-warm": ([], True),
+             "docker-funnel-cold": (["--funnel"], False),
+             "docker-funnel-warm": (["--funnel"], True),
+             "singularity-cold": (["--singularity"], False),
+             "singularity-warm": (["--singularity"], True)}
+
+
+class readyHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers every readiness probe with 200
+    """
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+class readyServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    The server standing in for keycloak, ga4gh and funnel
+    """
+    daemon_threads = True
+
+
+class sandbox:
+    """
+    A private copy of the package with its own PATH, cache, data
+    directory and fake state
+    """
+
+    def __init__(self, latencies):
+        self.root = tempfile.mkdtemp(prefix="candigBench")
+        self.sourceDir = os.path.join(self.root, "src")
+        self.binDir = os.path.join(self.root, "bin")
+        self.cacheDir = os.path.join(self.root, "cache")
+        self.dataDir = os.path.join(self.root, "data")
+        self.stateDir = os.path.join(self.root, "state")
+        self.userStateDir = os.path.join(self.root, "userstate")
+        for directory in (self.binDir, self.cacheDir, self.dataDir, self.stateDir,
+                          self.userStateDir):
+            os.makedirs(directory)
+
+        shutil.copytree(os.path.join(ROOT, "deployer"), os.path.join(self.sourceDir, "deployer"),
+                        ignore=shutil.ignore_patterns("__pycache__", "ga4gh-server"))
+        for program in PROGRAMS:
+            os.symlink(SHIM, os.path.join(self.binDir, program))
+
+        self.latencyFile = os.path.join(self.root, "latencies.json")
+        with open(self.latencyFile, "w") as latencyHandle:
+            json.dump(latencies, latencyHandle)
+
+        # a gzipped stand-in for the keycloak singularity release
+        self.imageFile = os.path.join(self.root, "key.img.gz")
+        with gzip.open(self.imageFile, "wb") as imageHandle:
+            imageHandle.write(b"fake keycloak image\n" * 4096)
+
+    def environment(self):
+        env = dict(os.environ)
+        env.update({"PATH": self.binDir + os.pathsep + env.get("PATH", ""),
+                    "PYTHONPATH": self.sourceDir,
+                    "XDG_CACHE_HOME": self.cacheDir,
+                    "XDG_DATA_HOME": self.dataDir,
+                    "XDG_STATE_HOME": self.userStateDir,
+                    "FAKE_STATE": self.stateDir,
+                    "FAKE_LATENCIES": self.latencyFile})
+        return env
+
+    def calls(self):
+        """
+        Returns and clears the calls logged by the fake programs
+        """
+        logFile = os.path.join(self.stateDir, "calls.jsonl")
+        if not os.path.exists(logFile):
+            return []
+        with open(logFile) as logHandle:
+            calls = [json.loads(line) for line in logHandle]
+        os.remove(logFile)
+        return calls
+
+    def remove(self):
+        shutil.rmtree(self.root)
+
+
+def deploy(box, arguments, ports):
+    """
+    Runs one deployment inside a sandbox
+
+    Parameters:
+
+    sandbox box - The sandbox to run in
+    list arguments - The scenario arguments of the deployer
+    dict ports - The ports of keycloak, ga4gh and funnel
+
+    Returns:
+
+    dict measurement - wallTime, subprocesses, calls, configTime and peakRss (KB)
+    """
+    traceFile = os.path.join(box.root, "trace.json")
+    command = [sys.executable, "-m", "deployer.deployer", "--docker-cli",
+               "--keycloak-port", str(ports["keycloak"]),
+               "--ga4gh-port", str(ports["ga4gh"]),
+               "--funnel-port", str(ports["funnel"]),
+               "--keycloak-image-url", "file://" + box.imageFile,
+               "--ready-timeout", "60",
+               "--profile", traceFile] + arguments
+
+    start = time.perf_counter()
+    with open(os.path.join(box.root, "deploy.log"), "w") as logHandle:
+        process = subprocess.Popen(command, env=box.environment(), cwd=box.root,
+                                   stdout=logHandle, stderr=subprocess.STDOUT)
+        # wait4 reports the peak RSS of this deployer alone
+        pid, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    wallTime = time.perf_counter() - start
+
+    if process.returncode != 0:
+        with open(os.path.join(box.root, "deploy.log")) as logHandle:
+            raise RuntimeError("Deployment failed:\n" + logHandle.read())
+
+    with open(traceFile) as traceHandle:
+        events = json.load(traceHandle)["traceEvents"]
+    configTime = sum(event["dur"] for event in events
+                     if (event["cat"] == "step" and event["name"].endswith(".config")) or
+                     event["name"] == "plan.restore") / 1e6
+
+    calls = box.calls()
+    return {"wallTime": wallTime,
+            "subprocesses": len(calls),
+            "calls": [" ".join(call["argv"][:2]) for call in calls],
+            "configTime": configTime,
+            "peakRss": usage.ru_maxrss}
+
+
+def runScenario(name, repetitions, latencies=None):
+    """
+    Runs a scenario a number of times
+
+    Cold repetitions each start from an empty cache and image store;
+    warm repetitions follow an unmeasured deploy in the same sandbox
+
+    Parameters:
+
+    str name - The name of the scenario in SCENARIOS
+    int repetitions - The number of measured deploys
+    dict latencies - The latencies of the fake programs
+
+    Returns:
+
+    dict result - The median wall time, subprocesses and config time
+                  and the maximum peak RSS of the repetitions
+    """
+    arguments, warm = SCENARIOS[name]
+    server = readyServer(("127.0.0.1", 0), readyHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    # every service answers on the same stand-in server
+    port = server.server_address[1]
+    ports = {"keycloak": port, "ga4gh": port, "funnel": port}
+
+    measurements = []
+    box = None
+    try:
+        for repetition in range(repetitions):
+            if box is None or not warm:
+                if box is not None:
+                    box.remove()
+                box = sandbox(latencies or DEFAULT_LATENCIES)
+                if warm:
+                    deploy(box, arguments, ports)
+            measurements.append(deploy(box, arguments, ports))
+    finally:
+        server.shutdown()
+        server.server_close()
+        if box is not None:
+            box.remove()
+
+    return {"wallTime": statistics.median(m["wallTime"] for m in measurements),
+            "subprocesses": statistics.median(m["subprocesses"] for m in measurements),
+            "configTime": statistics.median(m["configTime"] for m in measurements),
+            "peakRss": max(m["peakRss"] for m in measurements),
+            "calls": measurements[-1]["calls"]}
+
+
+def compare(results, baseline, threshold):
+    """
+    Lists the regressions of results against a baseline
+
+    Parameters:
+
+    dict results - Maps scenario names to their results
+    dict baseline - The results of a previous run
+    float threshold - The allowed relative growth of time and memory
+
+    Returns:
+
+    list regressions - Descriptions of the regressions
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        for metric in ("wallTime", "peakRss"):
+            if result[metric] > base[metric] * (1 + threshold):
+                regressions.append("{0}: {1} {2:.3f} > {3:.3f} (+{4:.0%})".format(
+                    name, metric, result[metric], base[metric], 
+                    result[metric] / base[metric] - 1))
+        if result["subprocesses"] > base["subprocesses"]:
+            regressions.append("{0}: subprocesses {1} > {2}".format(
+                name, result["subprocesses"], base["subprocesses"]))
+    return regressions
+
+
+def report(results):
+    """
+    Returns a table of the results
+    """
+    lines = ["{0:<22} {1:>9} {2:>13} {3:>10} {4:>12}".format(
+        "SCENARIO", "WALL (s)", "SUBPROCESSES", "CONFIG (s)", "PEAK RSS (KB)")]
+    for name, result in sorted(results.items()):
+        lines.append("{0:<22} {1:>9.3f} {2:>13} {3:>10.4f} {4:>12}".format(
+            name, result["wallTime"], result["subprocesses"],
+            result["configTime"], result["peakRss"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the deployer against fake container tools")
+    parser.add_argument("-n", "--repetitions", type=int, default=3,
+                        help="Number of measured deploys per scenario")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (default: all)")
+    parser.add_argument("--latencies", help="JSON file of the latencies of the fake programs")
+    parser.add_argument("--save", help="Write the results as a baseline JSON file")
+    parser.add_argument("--baseline", help="Fail on regressions against a baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed relative growth of wall time and peak RSS")
+    args = parser.parse_args(argv)
+
+    latencies = None
+    if args.latencies:
+        with open(args.latencies) as latencyHandle:
+            latencies = json.load(latencyHandle)
+
+    results = {}
+    for name in args.scenario or sorted(SCENARIOS):
+        results[name] = runScenario(name, args.repetitions, latencies)
+    print(report(results))
+
+    if args.save:
+        with open(args.save, "w") as saveHandle:
+            json.dump(results, saveHandle, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baselineHandle:
+            regressions = compare(results, json.load(baselineHandle), args.threshold)
+        if regressions:
+            print("\nRegressions:\n" + "\n".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
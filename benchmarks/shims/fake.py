@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Fake docker, singularity, wget and gunzip programs for the benchmarks
+
+The benchmark runner links this script into a directory at the front
+of PATH under each program name. Every call sleeps for the latency
+configured for it, appends its argv and duration to calls.jsonl and
+keeps the images and containers it creates in a JSON state file, so
+later calls (and later deploys) see them.
+
+Environment:
+
+FAKE_STATE - The directory holding calls.jsonl and docker.json
+FAKE_LATENCIES - A JSON file mapping "program subcommand" (e.g.
+                 "docker pull") or "program" to seconds, with a
+                 "default" entry for everything else
+FAKE_STATS_INTERVAL - The seconds between the samples of docker stats
+                      (default 0.05)
+"""
+
+import fcntl
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+
+
+def latency(program, command):
+    """
+    Returns the seconds a call must take
+    """
+    try:
+        with open(os.environ["FAKE_LATENCIES"]) as latencyHandle:
+            latencies = json.load(latencyHandle)
+    except (KeyError, IOError, ValueError):
+        return 0.0
+    subcommand = command[0] if command else ""
+    for key in (program + " " + subcommand, program):
+        if key in latencies:
+            return latencies[key]
+    return latencies.get("default", 0.0)
+
+
+def record(program, command, start, status, bytesIn):
+    """
+    Appends a call to the call log
+    """
+    entry = {"argv": [program] + command, "start": start,
+             "seconds": time.time() - start, "status": status, "bytesIn": bytesIn}
+    with open(os.path.join(os.environ["FAKE_STATE"], "calls.jsonl"), "a") as logHandle:
+        logHandle.write(json.dumps(entry) + "\n")
+
+
+def digest(text):
+    """
+    Returns a stable fake sha256 digest
+    """
+    return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def repository(reference):
+    """
+    Strips the digest or tag from an image reference
+    """
+    reference = reference.split("@")[0]
+    repo, separator, tag = reference.rpartition(":")
+    if separator and "/" not in tag:
+        return repo
+    return reference
+
+
+def labels(arguments):
+    """
+    Collects the --label options of a command
+    """
+    found = {}
+    for index, argument in enumerate(arguments):
+        if argument == "--label":
+            label, value = arguments[index + 1].split("=", 1)
+            found[label] = value
+    return found
+
+
+def volumeFile(container, volumes, path):
+    """
+    Finds the named volume a container mounts at a path
+
+    Returns:
+
+    tuple location - (the files of the volume, the path inside it),
+                     or (None, None) if no named volume holds the path
+    """
+    for bind in container["HostConfig"]["Binds"]:
+        source, mount = bind.split(":")[:2]
+        if source in volumes and path.startswith(mount + "/"):
+            return volumes[source].setdefault("Files", {}), path[len(mount) + 1:]
+    return None, None
+
+
+def docker(command, state, stdin=b""):
+    """
+    Applies a docker command to the fake state
+
+    The files copied into the named volumes of a container are kept,
+    so they can be read back by later containers mounting the volume
+
+    Returns:
+
+    int status - The exit status of the command
+    """
+    images = state.setdefault("images", {})
+    containers = state.setdefault("containers", {})
+
+    volumes = state.setdefault("volumes", {})
+
+    # docker container kill/stop/rm, docker image/container/volume inspect, 
+    # docker image rm and docker volume ls/rm
+    kind = None
+    if command[0] in ("container", "image", "volume"):
+        kind = command[0]
+        command = command[1:]
+    subcommand, arguments = command[0], command[1:]
+
+    if subcommand == "version":
+        print("fake")
+    elif subcommand == "info":
+        print(json.dumps({"NCPU": 4, "MemTotal": 8 << 30}))
+    elif subcommand == "pull":
+        reference = arguments[-1]
+        repo = repository(reference)
+        repoDigest = reference.split("@")[1] if "@" in reference else digest(repo + "@registry")
+        inspection = {"Id": digest(repo), "RepoDigests": [repo + "@" + repoDigest]}
+        images[repo] = inspection
+        images[repo + "@" + repoDigest] = inspection
+    elif subcommand == "build":
+        tag = arguments[arguments.index("-t") + 1]
+        images[tag] = {"Id": digest(tag + str(time.time())), "RepoDigests": [],
+                       "Config": {"Labels": labels(arguments)}}
+        for step, instruction in enumerate(("FROM debian", "RUN apt-get -y update")):
+            print("Step {0}/2 : {1}".format(step + 1, instruction))
+    elif subcommand == "inspect":
+        store = {"image": images, "volume": volumes}.get(kind, containers)
+        name = arguments[-1]
+        if name not in store:
+            sys.stderr.write("Error: No such object: " + name + "\n")
+            return 1
+        print(json.dumps([store[name]]))
+    elif subcommand == "create" and kind == "volume":
+        volumes.setdefault(arguments[-1], {"Name": arguments[-1], "Labels": labels(arguments)})
+        print(arguments[-1])
+    elif subcommand == "create":
+        name = arguments[arguments.index("--name") + 1]
+        if name in containers:
+            sys.stderr.write("Error: Conflict. The container name is already in use\n")
+            return 1
+        bindings = {}
+        binds = []
+        index = 0
+        # every option takes a value, the image and its command follow them
+        while arguments[index].startswith("-"):
+            if arguments[index] == "-p":
+                hostPort, port = arguments[index + 1].split(":")
+                bindings[port + "/tcp"] = [{"HostPort": hostPort}]
+            elif arguments[index] == "-v":
+                binds.append(arguments[index + 1])
+                # docker creates the missing named volumes
+                source = arguments[index + 1].split(":")[0]
+                if "/" not in source:
+                    volumes.setdefault(source, {"Name": source, "Labels": {}})
+            index += 2
+        containers[name] = {"Id": digest(name), "Image": arguments[index],
+                            "Config": {"Labels": labels(arguments[:index]), 
+                                       "Cmd": arguments[index + 1:] or None},
+                            "HostConfig": {"PortBindings": bindings, "Binds": binds},
+                            "State": {"Running": False}}
+        print(containers[name]["Id"][7:])
+    elif subcommand == "ps":
+        wanted = [argument[6:] for argument in arguments if argument.startswith("label=")]
+        for name, container in sorted(containers.items()):
+            containerLabels = container["Config"]["Labels"]
+            if all(label in ["=".join(item) for item in containerLabels.items()] for label in wanted):
+                print(name)
+    elif subcommand == "start":
+        if arguments[-1] not in containers:
+            return 1
+        containers[arguments[-1]]["State"]["Running"] = True
+        containers[arguments[-1]]["State"]["StartedAt"] = time.time()
+    elif subcommand in ("kill", "stop"):
+        if arguments[-1] not in containers:
+            return 1
+        containers[arguments[-1]]["State"]["Running"] = False
+    elif subcommand == "rm":
+        store = {"image": images, "volume": volumes}.get(kind, containers)
+        if store.pop(arguments[-1], None) is None:
+            return 1
+    elif subcommand == "ls" and kind == "volume":
+        for name in sorted(volumes):
+            print(name)
+    elif subcommand == "cp" and arguments[0] == "-":
+        name, directory = arguments[-1].split(":", 1)
+        if name not in containers:
+            return 1
+        with tarfile.open(fileobj=io.BytesIO(stdin)) as tarHandle:
+            for info in tarHandle:
+                files, path = volumeFile(containers[name], volumes, 
+                                         directory.rstrip("/") + "/" + info.name)
+                if files is not None:
+                    files[path] = tarHandle.extractfile(info).read().decode("utf-8")
+    elif subcommand == "cp":
+        name, path = arguments[0].split(":", 1)
+        files, path = volumeFile(containers.get(name, {"HostConfig": {"Binds": []}}), 
+                                 volumes, path)
+        if not files or path not in files:
+            sys.stderr.write("Error: Could not find the file " + arguments[0] + "\n")
+            return 1
+        content = files[path].encode("utf-8")
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tarHandle:
+            info = tarfile.TarInfo(os.path.basename(path))
+            info.size = len(content)
+            tarHandle.addfile(info, io.BytesIO(content))
+        sys.stdout.buffer.write(buffer.getvalue())
+    return 0
+
+
+def stats(arguments):
+    """
+    Streams fake samples of docker stats --format "{{json .}}" until
+    killed, or prints one with --no-stream
+
+    Returns:
+
+    int status - The exit status of the command
+    """
+    try:
+        with open(os.path.join(os.environ["FAKE_STATE"], "docker.json")) as stateHandle:
+            containers = json.load(stateHandle).get("containers", {})
+    except (IOError, ValueError):
+        containers = {}
+    names = [argument for argument in arguments if not argument.startswith("-") and 
+             argument != "{{json .}}"]
+    for name in names:
+        if name not in containers:
+            sys.stderr.write("Error: No such container: " + name + "\n")
+            return 1
+
+    interval = float(os.environ.get("FAKE_STATS_INTERVAL", "0.05"))
+    iteration = 0
+    while True:
+        # docker stats redraws the screen before every sample
+        for name in names:
+            sys.stdout.write("\x1b[2J\x1b[H" + json.dumps({
+                "Name": name, "CPUPerc": "{0:.2f}%".format(iteration % 10 * 1.5),
+                "MemUsage": "{0}MiB / 1.944GiB".format(100 + iteration % 5),
+                "NetIO": "{0}kB / 2kB".format(iteration + 1), "BlockIO": "4MB / 0B",
+                "PIDs": "4"}) + "\n")
+        sys.stdout.flush()
+        if "--no-stream" in arguments:
+            return 0
+        iteration += 1
+        time.sleep(interval)
+
+
+# the lines logged by a fake container of each service, the last
+# one being the line the service logs once it is ready
+LOG_LINES = {"keycloak": ["WFLYSRV0025: Keycloak 3.4.0.Final (WildFly Core 3.0.8.Final) started in 9ms"],
+             "ga4gh": ["AH00489: Apache/2.4.29 (Ubuntu) configured -- resuming normal operations"],
+             "funnel": ["Server listening"]}
+
+
+def logs(arguments):
+    """
+    Prints the fake log lines of a started container with their 
+    timestamps, the second one on the standard error, and waits 
+    until killed with --follow
+
+    Returns:
+
+    int status - The exit status of the command
+    """
+    try:
+        with open(os.path.join(os.environ["FAKE_STATE"], "docker.json")) as stateHandle:
+            containers = json.load(stateHandle).get("containers", {})
+    except (IOError, ValueError):
+        containers = {}
+    name = arguments[-1]
+    if name not in containers:
+        sys.stderr.write("Error: No such container: " + name + "\n")
+        return 1
+
+    state = containers[name]["State"]
+    lines = []
+    if "StartedAt" in state:
+        service = containers[name]["Config"]["Labels"].get("candig.service", "")
+        texts = ["starting " + name, "warning: fake configuration"] + LOG_LINES.get(service, [])
+        lines = [(state["StartedAt"] + index * 0.01, text) for index, text in enumerate(texts)]
+    if "--since" in arguments:
+        since = float(arguments[arguments.index("--since") + 1])
+        lines = [(seconds, text) for seconds, text in lines if seconds >= since]
+    if "--tail" in arguments and arguments[arguments.index("--tail") + 1] != "all":
+        lines = lines[len(lines) - int(arguments[arguments.index("--tail") + 1]):]
+    for index, (seconds, text) in enumerate(lines):
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+        output = sys.stderr if text.startswith("warning") else sys.stdout
+        output.write("{0}.{1:09d}Z {2}\n".format(stamp, int(seconds % 1 * 1e9), text))
+        output.flush()
+
+    while "--follow" in arguments and state["Running"]:
+        time.sleep(1)
+    return 0
+
+
+def main():
+    program = os.path.basename(sys.argv[0])
+    command = sys.argv[1:]
+    start = time.time()
+    time.sleep(latency(program, command))
+
+    # read whatever is piped in, such as the archive of docker cp -
+    stdin = b""
+    if program == "docker" and command[:2] == ["cp", "-"]:
+        stdin = sys.stdin.buffer.read()
+    bytesIn = len(stdin)
+
+    status = 0
+    if program == "docker" and command[:1] in (["stats"], ["logs"]):
+        # a stream runs until it is killed, so the call is logged first
+        record(program, command, start, status, bytesIn)
+        sys.exit(stats(command[1:]) if command[0] == "stats" else logs(command[1:]))
+    elif program == "docker":
+        stateFile = os.path.join(os.environ["FAKE_STATE"], "docker.json")
+        with open(stateFile + ".lock", "w") as lockHandle:
+            fcntl.flock(lockHandle, fcntl.LOCK_EX)
+            try:
+                with open(stateFile) as stateHandle:
+                    state = json.load(stateHandle)
+            except (IOError, ValueError):
+                state = {}
+            status = docker(command, state, stdin)
+            with open(stateFile, "w") as stateHandle:
+                json.dump(state, stateHandle)
+    elif program == "singularity" and command[:1] == ["pull"]:
+        # write a small image where --name points to
+        with open(command[command.index("--name") + 1], "wb") as imageHandle:
+            imageHandle.write(b"fake singularity image\n" * 1024)
+    elif program == "wget" and "-O" in command:
+        with open(command[command.index("-O") + 1], "wb") as downloadHandle:
+            downloadHandle.write(b"fake download\n")
+
+    record(program, command, start, status, bytesIn)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
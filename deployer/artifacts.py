@@ -0,0 +1,386 @@
+"""
+Persistent cache of the Singularity images used by the deployer
+
+Images are stored once per content checksum outside the package
+directory, so a deploy only downloads an image the first time
+"""
+
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.request
+
+from . import paths
+from . import trace
+
+# the version of the index layout
+INDEX_VERSION = 1
+
+# the size of the chunks streamed from downloads and files
+CHUNK_SIZE = 1 << 20
+
+# the ioctl cloning a file on copy-on-write filesystems
+FICLONE = 0x40049409
+
+
+def sourceKey(name, url, checksum=None):
+    """
+    Returns the cache key of an artifact downloaded from a URL
+
+    The key changes with the URL and the expected checksum, so a
+    different image URL never reuses the artifact of another one
+
+    Parameters:
+
+    str name - The name of the artifact, e.g. keycloak
+    str url - The URL the artifact is downloaded from
+    str checksum - The expected sha256 of the artifact
+
+    Returns:
+
+    str key - The versioned key, e.g. keycloak/3f2a...
+    """
+    source = hashlib.sha256((url + "\n" + (checksum or "")).encode("utf-8"))
+    return name + "/" + source.hexdigest()[:16]
+
+
+class artifactError(Exception):
+    """
+    Raised when an artifact cannot be fetched or fails verification
+    """
+
+
+class artifacts:
+    """
+    Versioned, content-addressed artifact cache with LRU eviction
+
+    The cache directory holds the pristine artifacts under
+    blobs/<sha256> and an index mapping versioned keys (such as
+    ga4gh/latest) to their checksum, size and last use:
+
+    artifacts/
+        index.json
+        blobs/<sha256>
+        runs/<name>
+
+    Downloads are decompressed and hashed while they stream into
+    the cache, so each artifact is written in a single pass. Runs
+    that need to write to an image receive a copy-on-write clone
+    (or a plain copy where cloning is unsupported) under runs/.
+
+    Once the cache exceeds its size cap the least recently used
+    artifacts are evicted.
+    """
+
+    def __init__(self, cacheDir=None, maxBytes=4 << 30):
+        """
+        Constructor for the artifact cache
+
+        Parameters:
+
+        str cacheDir - The directory of the cache
+                       (default: artifacts in the cache directory)
+        int maxBytes - The total size of the pristine artifacts to keep
+
+        Returns: artifacts
+        """
+        if cacheDir is None:
+            cacheDir = paths.cacheDir("artifacts")
+        self.cacheDir = cacheDir
+        self.blobDir = os.path.join(cacheDir, "blobs")
+        self.runDir = os.path.join(cacheDir, "runs")
+        self.indexFile = os.path.join(cacheDir, "index.json")
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        for directory in (self.blobDir, self.runDir):
+            os.makedirs(directory, exist_ok=True)
+
+    def loadIndex(self):
+        """
+        Reads the index, discarding indexes of another layout version
+
+        Returns:
+
+        dict entries - Maps artifact keys to their index entries
+        """
+        try:
+            with open(self.indexFile) as indexHandle:
+                index = json.load(indexHandle)
+        except (IOError, ValueError):
+            return {}
+        if index.get("version") != INDEX_VERSION:
+            return {}
+        return index.get("entries", {})
+
+    def saveIndex(self, entries):
+        """
+        Writes the index atomically
+
+        Parameters:
+
+        dict entries - Maps artifact keys to their index entries
+
+        Returns: None
+        """
+        tempFile = self.indexFile + ".tmp"
+        with open(tempFile, "w") as indexHandle:
+            json.dump({"version": INDEX_VERSION, "entries": entries},
+                      indexHandle, indent=1, sort_keys=True)
+        os.rename(tempFile, self.indexFile)
+
+    def locked(self):
+        """
+        Returns a file lock guarding the index across processes
+
+        Returns:
+
+        file lockHandle - An open lock file to use in a with statement
+        """
+        lockHandle = open(os.path.join(self.cacheDir, "index.lock"), "w")
+        fcntl.flock(lockHandle, fcntl.LOCK_EX)
+        return lockHandle
+
+    def blobPath(self, checksum):
+        """
+        Returns the path of the pristine artifact with a checksum
+        """
+        return os.path.join(self.blobDir, checksum)
+
+    def lookup(self, key, checksum=None):
+        """
+        Returns the path of a cached artifact and marks it as used
+
+        An artifact whose file is missing or whose size differs
+        from the index is treated as absent, as is one whose 
+        checksum differs from the expected one. Only an artifact
+        that is returned counts as a hit
+
+        Parameters:
+
+        str key - The versioned key of the artifact
+        str checksum - The expected sha256 of the artifact
+
+        Returns:
+
+        str path - The pristine artifact, or None if it is not cached
+        """
+        with self.lock, self.locked():
+            entries = self.loadIndex()
+            entry = entries.get(key)
+            if entry is None or (checksum is not None and entry["sha256"] != checksum):
+                return None
+            path = self.blobPath(entry["sha256"])
+            if not os.path.exists(path) or os.path.getsize(path) != entry["size"]:
+                del entries[key]
+                self.saveIndex(entries)
+                return None
+            entry["used"] = time.time()
+            self.saveIndex(entries)
+            self.hits += 1
+            return path
+
+    def fetch(self, key, url, checksum=None, compressed=True):
+        """
+        Returns a cached artifact, downloading it on a cache miss
+
+        The download is decompressed (if gzipped) and hashed while
+        it streams into the cache
+
+        Parameters:
+
+        str key - The versioned key of the artifact
+        str url - The URL to download the artifact from
+        str checksum - The expected sha256 of the (decompressed) artifact
+        bool compressed - True if the download is gzipped
+
+        Returns:
+
+        str path - The pristine artifact in the cache
+
+        Raises:
+
+        artifactError - If the download does not match the checksum
+        """
+        path = self.lookup(key, checksum)
+        if path is not None:
+            return path
+
+        with trace.span("download " + key, "download", url=url) as phase:
+            response = urllib.request.urlopen(url)
+            try:
+                stream = gzip.GzipFile(fileobj=response) if compressed else response
+                path = self.store(key, stream, checksum, url)
+            finally:
+                response.close()
+            phase.set(bytesReceived=os.path.getsize(path))
+        return path
+
+    def insert(self, key, filename, checksum=None):
+        """
+        Moves a file produced outside the cache into the cache
+
+        Parameters:
+
+        str key - The versioned key of the artifact
+        str filename - The file to move into the cache
+        str checksum - The expected sha256 of the file
+
+        Returns:
+
+        str path - The pristine artifact in the cache
+        """
+        with open(filename, "rb") as stream:
+            path = self.store(key, stream, checksum, filename)
+        os.remove(filename)
+        return path
+
+    def store(self, key, stream, checksum, source):
+        """
+        Writes a stream into the cache under its sha256 checksum
+
+        Parameters:
+
+        str key - The versioned key of the artifact
+        file stream - The readable stream of the artifact
+        str checksum - The expected sha256 of the stream
+        str source - The URL or file the stream came from
+
+        Returns:
+
+        str path - The pristine artifact in the cache
+        """
+        digest = hashlib.sha256()
+        size = 0
+        tempHandle, tempName = tempfile.mkstemp(dir=self.blobDir, suffix=".part")
+        try:
+            with os.fdopen(tempHandle, "wb") as blobHandle:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    blobHandle.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            if checksum is not None and checksum != sha256:
+                raise artifactError("Checksum mismatch for {0}: expected {1}, got {2}".format(
+                    source, checksum, sha256))
+
+            # pristine artifacts are never written to
+            os.chmod(tempName, 0o444)
+            os.rename(tempName, self.blobPath(sha256))
+        except BaseException:
+            if os.path.exists(tempName):
+                os.remove(tempName)
+            raise
+
+        with self.lock, self.locked():
+            entries = self.loadIndex()
+            entries[key] = {"sha256": sha256, "size": size,
+                            "source": source, "used": time.time()}
+            self.misses += 1
+            self.evict(entries, keep=key)
+            self.saveIndex(entries)
+        return self.blobPath(sha256)
+
+    def evict(self, entries, keep=None):
+        """
+        Removes the least recently used artifacts above the size cap
+
+        Parameters:
+
+        dict entries - The index entries, updated in place
+        str keep - A key that must not be evicted
+
+        Returns:
+
+        list evicted - The keys of the evicted artifacts
+        """
+        evicted = []
+        total = sum(entry["size"] for entry in entries.values())
+        for key in sorted(entries, key=lambda name: entries[name]["used"]):
+            if total <= self.maxBytes:
+                break
+            if key == keep:
+                continue
+            entry = entries.pop(key)
+            total -= entry["size"]
+            evicted.append(key)
+            # other keys may share the same content
+            if not any(e["sha256"] == entry["sha256"] for e in entries.values()):
+                blob = self.blobPath(entry["sha256"])
+                if os.path.exists(blob):
+                    os.remove(blob)
+        return evicted
+
+    def invalidate(self, key):
+        """
+        Forgets an artifact so the next fetch downloads it again
+
+        Parameters:
+
+        str key - The versioned key of the artifact
+
+        Returns: None
+        """
+        with self.lock, self.locked():
+            entries = self.loadIndex()
+            if entries.pop(key, None) is not None:
+                self.saveIndex(entries)
+
+    def verify(self, key):
+        """
+        Re-hashes a cached artifact against its recorded checksum
+
+        Parameters:
+
+        str key - The versioned key of the artifact
+
+        Returns:
+
+        bool valid - True if the artifact matches its checksum
+        """
+        entry = self.loadIndex().get(key)
+        if entry is None:
+            return False
+        digest = hashlib.sha256()
+        with open(self.blobPath(entry["sha256"]), "rb") as blobHandle:
+            for chunk in iter(lambda: blobHandle.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest() == entry["sha256"]
+
+    def workingCopy(self, path, name):
+        """
+        Creates a writable per-run copy of a pristine artifact
+
+        The copy is a copy-on-write clone where the filesystem
+        supports it and a regular copy otherwise
+
+        Parameters:
+
+        str path - The pristine artifact
+        str name - The file name of the copy under runs/
+
+        Returns:
+
+        str copyPath - The writable copy
+        """
+        copyPath = os.path.join(self.runDir, name)
+        if os.path.exists(copyPath):
+            os.remove(copyPath)
+        with open(path, "rb") as source, open(copyPath, "wb") as destination:
+            try:
+                fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+            except (IOError, OSError):
+                shutil.copyfileobj(source, destination, CHUNK_SIZE)
+        os.chmod(copyPath, 0o644)
+        return copyPath
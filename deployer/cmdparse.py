@@ -1,4 +1,6 @@
 import argparse
+import os
+import re
 
 class cmdparse:
     """
@@ -16,8 +18,14 @@ class cmdparse:
 
     def __init__(self):
         # initialize the client secrets amongst the application servers
-        self.ga4ghSecret = "250e42b8-3f41-4d0f-9b6b-e32e09fccaf7"
-        self.funnelSecret = "07998d29-17aa-4821-9b9e-9f5c398146c6"
+        # the secrets and passwords may also be set in the environment,
+        # which keeps them out of the command line and of deployment plans
+        self.ga4ghSecret = os.environ.get("CANDIG_GA4GH_SECRET", 
+                                          "250e42b8-3f41-4d0f-9b6b-e32e09fccaf7")
+        self.funnelSecret = os.environ.get("CANDIG_FUNNEL_SECRET", 
+                                           "07998d29-17aa-4821-9b9e-9f5c398146c6")
+        self.userPassword = os.environ.get("CANDIG_USER_PASSWORD", "user")
+        self.adminPassword = os.environ.get("CANDIG_ADMIN_PASSWORD", "admin")
 
     def commandParser(self, commandArgs):
         """
@@ -46,6 +54,7 @@ class cmdparse:
         keycloakName = "keycloak_candig"
         ga4ghName =  "ga4gh_candig"
         funnelName = "funnel_candig"
+        keycloakImageUrl = "https://github.com/DaleDupont/singularity-keycloak/releases/download/0.0.1/key.img.gz"
 
         # commandList containing all the command-line
         # options to register
@@ -105,7 +114,7 @@ class cmdparse:
               "store",            "Set the user account username"),
             ("-gs",             "--ga4gh-secret",            
               self.ga4ghSecret,   "ga4ghSecret",           
-              "store",            "Client secret for the ga4gh server"),
+              "store",            "Client secret for the ga4gh server (default: $CANDIG_GA4GH_SECRET)"),
             ("-fin",            "--funnel-image-name",       
               funnelName,         "funnelImageName",       
               "store",            "Set the funnel image tag"),
@@ -123,24 +132,144 @@ class cmdparse:
               "store",            "Set the funnel client id"),
             ("-fs",             "--funnel-secret",           
               self.funnelSecret,  "funnelSecret",          
-              "store",            "Set the funnel client secret"),
+              "store",            "Set the funnel client secret (default: $CANDIG_FUNNEL_SECRET)"),
             ("-f",              "--funnel",                  
               False,              "funnel",                
               "store_true",       "Deploy the funnel server"),
+            ("-svc",            "--services",
+              None,               "services",
+              "store",            "Also deploy these installed services (candigDeploy.services entry points), separated by commas"),
             ("-t",              "--token-tracer",            
               False,              "tokenTracer",          
               "store_true",       "Deploy and run the token tracer program"),
             ("-upwd",           "--user-password",          
-              "user",             "userPassword",         
-              "store",            "Set the user account password"),
+              self.userPassword,  "userPassword",         
+              "store",            "Set the user account password (default: $CANDIG_USER_PASSWORD or user)"),
             ("-apwd",           "--admin-password",         
-              "admin",            "adminPassword",        
-              "store",            "Set the administrator password")]
+              self.adminPassword, "adminPassword",        
+              "store",            "Set the administrator password (default: $CANDIG_ADMIN_PASSWORD or admin)"),
+            ("-w",              "--workers",
+              "4",                "workers",
+              "store",            "Set the number of deployment steps to run at once"),
+            ("-rt",             "--ready-timeout",
+              "300",              "readyTimeout",
+              "store",            "Set the seconds to wait for each server to become ready"),
+            ("-kdg",            "--keycloak-digest",
+              None,               "keycloakDigest",
+              "store",            "Pin the keycloak image to a digest (sha256:...)"),
+            ("-gdg",            "--ga4gh-digest",
+              None,               "ga4ghDigest",
+              "store",            "Pin the ga4gh image to a digest (sha256:...)"),
+            ("-off",            "--offline",
+              False,              "offline",
+              "store_true",       "Never pull images from the registry"),
+            ("-sic",            "--show-image-cache",
+              False,              "showImageCache",
+              "store_true",       "Print the cached image digests and exit"),
+            ("-cic",            "--clear-image-cache",
+              False,              "clearImageCache",
+              "store_true",       "Forget the cached image digests before deploying"),
+            ("-ksum",           "--keycloak-checksum",
+              None,               "keycloakChecksum",
+              "store",            "Verify the keycloak singularity image against a sha256"),
+            ("-kurl",           "--keycloak-image-url",
+              keycloakImageUrl,   "keycloakImageUrl",
+              "store",            "Download the keycloak singularity image from a mirror"),
+            ("-acs",            "--artifact-cache-size",
+              "8192",             "artifactCacheSize",
+              "store",            "Set the size cap of the singularity image cache in MB"),
+            ("-rc",             "--reconcile",
+              False,              "reconcile",
+              "store_true",       "Only recreate the containers whose specification changed"),
+            ("-dcli",           "--docker-cli",
+              False,              "dockerCli",
+              "store_true",       "Run the docker program instead of calling the daemon socket"),
+            ("-prof",           "--profile",
+              None,               "profile",
+              "store",            "Write a Chrome trace of the deployment phases to a file and print a summary"),
+            ("-gr",             "--ga4gh-replicas",
+              "1",                "ga4ghReplicas",
+              "store",            "Run a number of ga4gh server containers on automatically allocated ports"),
+            ("-gdat",           "--ga4gh-data",
+              None,               "ga4ghData",
+              "store",            "Mount a data directory or docker volume holding a registry.db read-only into the ga4gh servers"),
+            ("-gprof",          "--ga4gh-profile",
+              "dev",              "ga4ghProfile",
+              "store",            "Tune the ga4gh servers for dev, small or large hosts, or derive the values from the host (auto)"),
+            ("-kvol",           "--keycloak-volume",
+              None,               "keycloakVolume",
+              "store",            "Keep the keycloak database in a docker volume (default: the container name followed by _data)"),
+            ("-kheap",          "--keycloak-heap",
+              None,               "keycloakHeap",
+              "store",            "Set the JVM heap of the keycloak server, e.g. 1g"),
+            ("-kgc",            "--keycloak-gc",
+              None,               "keycloakGc",
+              "store",            "Set the JVM garbage collector of the keycloak server (G1, Parallel, Serial or ConcMarkSweep)"),
+            ("-kmut",           "--keycloak-mutations",
+              None,               "keycloakMutations",
+              "store",            "Apply the users and clients of a JSON file through the keycloak admin API once it is ready"),
+            ("-inv",            "--inventory",
+              None,               "inventory",
+              "store",            "Deploy to every Docker host listed in an inventory file"),
+            ("-ipar",           "--inventory-parallel",
+              "4",                "inventoryParallel",
+              "store",            "Set the number of inventory hosts deployed at once"),
+            ("-hto",            "--host-timeout",
+              "1800",             "hostTimeout",
+              "store",            "Set the seconds each inventory host may take to deploy"),
+            ("-sto",            "--stop-timeout",
+              "10",               "stopTimeout",
+              "store",            "Set the seconds a container has to stop before it is killed by down"),
+            ("-rmi",            "--remove-images",
+              False,              "removeImages",
+              "store_true",       "Remove the images of the containers removed by down"),
+            ("-rmv",            "--remove-volumes",
+              False,              "removeVolumes",
+              "store_true",       "Remove the volumes of the containers removed by down"),
+            ("-dry",            "--dry-run",
+              False,              "dryRun",
+              "store_true",       "Print the deployment plan without deploying"),
+            ("-spl",            "--save-plan",
+              None,               "savePlan",
+              "store",            "Write the deployment plan to a JSON file for apply"),
+            ("-sint",           "--stats-interval",
+              "2",                "statsInterval",
+              "store",            "Set the seconds between the refreshes of stats"),
+            ("-scnt",           "--stats-count",
+              "0",                "statsCount",
+              "store",            "Stop stats after a number of refreshes (0 runs until interrupted)"),
+            ("-sfmt",           "--stats-format",
+              "table",            "statsFormat",
+              "store",            "Print stats as a refreshing table or as JSON lines (table or json)"),
+            ("-flog",           "--follow-logs",
+              False,              "followLogs",
+              "store_true",       "Follow the logs of the containers while deploying"),
+            ("-lsvc",           "--logs-service",
+              None,               "logsService",
+              "store",            "Only show the logs of these services, separated by commas"),
+            ("-lgrep",          "--logs-grep",
+              None,               "logsGrep",
+              "store",            "Only show the log lines matching a regular expression"),
+            ("-ltail",          "--logs-tail",
+              "100",              "logsTail",
+              "store",            "Set the number of earlier log lines shown per container (or all)"),
+            ("-lnf",            "--logs-no-follow",
+              False,              "logsNoFollow",
+              "store_true",       "Print the logs of the containers and exit instead of following them")]
 
         # register the arguments in command-list
         for subList in commandList:
             parser.add_argument(subList[0], subList[1], default=subList[2], dest=subList[3], action=subList[4], help=subList[5])
 
+        # the lifecycle command, deploying by default
+        parser.add_argument("command", nargs="?", default="up", choices=("up", "down", "restart", "apply", "status", "stats", "logs"), 
+                            help="Deploy the servers (up), stop and remove every managed container (down), "
+                                 "both (restart), deploy a saved plan (apply), report the recorded "
+                                 "deployments (status), stream the resource usage of the "
+                                 "containers (stats), or follow their merged logs (logs)")
+        parser.add_argument("planFile", nargs="?", default=None, 
+                            help="The plan file deployed by apply")
+
         # add mutually-exclusive arguments
         # no-config may be deprecated
         # override may be added to command-list
@@ -156,5 +285,72 @@ class cmdparse:
         if args.ip:
             args.keycloakIP = args.ga4ghIP = args.funnelIP = args.ip
 
+        # the numeric options, so a typo is a usage error rather than a traceback
+        for option, dest, convert in (("--workers", "workers", int),
+                                      ("--ready-timeout", "readyTimeout", float),
+                                      ("--artifact-cache-size", "artifactCacheSize", int),
+                                      ("--ga4gh-replicas", "ga4ghReplicas", int),
+                                      ("--inventory-parallel", "inventoryParallel", int),
+                                      ("--host-timeout", "hostTimeout", float),
+                                      ("--stop-timeout", "stopTimeout", int),
+                                      ("--stats-interval", "statsInterval", float),
+                                      ("--stats-count", "statsCount", int)):
+            try:
+                convert(getattr(args, dest))
+            except ValueError:
+                parser.error(option + (" must be an integer" if convert is int else " must be a number"))
+        if args.logsTail != "all":
+            try:
+                int(args.logsTail)
+            except ValueError:
+                parser.error("--logs-tail must be an integer or all")
+
+        # the ports of the ga4gh replicas, allocated at deployment 
+        # beyond the first one
+        if int(args.ga4ghReplicas) < 1:
+            parser.error("--ga4gh-replicas must be at least 1")
+        if args.singularity and int(args.ga4ghReplicas) > 1:
+            parser.error("--ga4gh-replicas requires docker containers")
+        args.ga4ghPorts = [args.ga4ghPort]
+
+        # the values of the ga4gh performance profile, chosen at deployment
+        if args.ga4ghProfile not in ("dev", "small", "large", "auto"):
+            parser.error("--ga4gh-profile must be dev, small, large or auto")
+        args.ga4ghTuning = None
+
+        # a data directory is made absolute, anything else names a docker volume
+        if args.ga4ghData and (os.sep in args.ga4ghData or args.ga4ghData.startswith(".") or 
+                               os.path.isdir(args.ga4ghData)):
+            args.ga4ghData = os.path.abspath(args.ga4ghData)
+        elif args.ga4ghData and args.singularity:
+            parser.error("--ga4gh-data needs a data directory with --singularity")
+
+        # the keycloak database volume and the options of its JVM
+        if args.keycloakVolume is None:
+            args.keycloakVolume = args.keycloakContainerName + "_data"
+        if args.keycloakHeap is not None and not re.match(r"^[0-9]+[kKmMgG]?$", args.keycloakHeap):
+            parser.error("--keycloak-heap must be a JVM memory size such as 512m or 2g")
+        if args.keycloakGc not in (None, "G1", "Parallel", "Serial", "ConcMarkSweep"):
+            parser.error("--keycloak-gc must be G1, Parallel, Serial or ConcMarkSweep")
+
+        # the changes applied through the keycloak admin API
+        if args.keycloakMutations is not None:
+            args.keycloakMutations = os.path.abspath(args.keycloakMutations)
+
+        # only apply reads a plan file, and down has no plan
+        if (args.command == "apply") != (args.planFile is not None):
+            parser.error("apply takes the plan file to deploy, written by --save-plan")
+        if args.command in ("down", "status", "stats", "logs") and (args.dryRun or args.savePlan):
+            parser.error(args.command + " has no deployment plan")
+        if args.followLogs and args.command not in ("up", "restart", "apply"):
+            parser.error("--follow-logs follows the logs while deploying")
+        if args.statsFormat not in ("table", "json"):
+            parser.error("--stats-format must be table or json")
+        if args.logsGrep is not None:
+            try:
+                re.compile(args.logsGrep)
+            except re.error as error:
+                parser.error("--logs-grep is not a regular expression: " + str(error))
+
         # return the resulting arguments and their values
         return args
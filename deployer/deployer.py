@@ -2,16 +2,17 @@
 This program deploys the keycloak and ga4gh server in docker containers
 
 The deployment procedure can be configured using command line arguments
+
+Only the argument parser and the tracer are imported up front. The
+deployment machinery and the subdeployers are imported once the
+arguments are parsed, so that --help stays fast (see tests/test_startup.py)
 """
 
-import subprocess
 import sys
-import pkg_resources
+import time
 
-import cmdparse as cmdparse
-import funnel.funnel as funnel
-import keycloak.keycloak as keycloak
-import ga4gh.ga4gh as ga4gh
+from . import cmdparse
+from . import trace
 
 class deployer:
     """
@@ -22,10 +23,11 @@ class deployer:
     The deployer first fetches command-line arguments
     from the cmdparse singleton (1).
 
-    Then, the deployer sequentially launches
-    each of the subdeployers. Each subdeployer
-    manages the deployment of a single application
-    server and its different deployment schemes (2).
+    Then, the deployer collects the deployment steps
+    of each of the subdeployers into a single dependency
+    graph and runs them concurrently through the scheduler.
+    Each subdeployer manages the deployment of a single 
+    application server and its different deployment schemes (2).
     The command-line arguments are passed to these
     subdeployers.
 
@@ -52,7 +54,11 @@ class deployer:
      |
      |               +----------+ -> docker
      +-> deploys --> |funnel    |
-                     +----------+
+     |               +----------+
+     |
+     |  steps        +-----------+
+     +-------------> | scheduler | -> worker pool
+                     +-----------+
     """
 
     def __init__(self):
@@ -69,86 +75,552 @@ class deployer:
 
         Returns: deployer
         """
-        # initialize the objects composed with the deployer:
-        # - keycloak 
-        # - ga4gh
-        # - cmdparse
-        # - funnel 
-        self.keycloak = keycloak.keycloak()
-        self.ga4gh = ga4gh.ga4gh()
-        self.cmdparse = cmdparse.cmdparse()
-        self.funnel = funnel.funnel()
-
         # get the command line arguments
+        self.cmdparse = cmdparse.cmdparse()
         args = self.cmdparse.commandParser(sys.argv[1:])
 
-        # initiate the deployment procedure 
-        self.routeDeploy(args)
+        # roll out to the hosts of an inventory instead of the local daemon
+        if args.inventory:
+            exit(self.routeInventory(args))
+
+        # record the deployment phases if a profile was requested
+        if args.profile:
+            trace.active.enable()
+
+        # import the deployment machinery now that the arguments are parsed
+        from . import artifacts
+        from . import engine
+        from . import images
+        from . import readiness
+        from . import registry
+        from . import render
+        from . import scheduler
+        from . import state
+
+        # initialize the objects composed with the deployer:
+        # - the docker client, readiness, images, artifacts and 
+        #   the configuration renderer (shared by the subdeployers)
+        # - the registry creating the subdeployers on first use:
+        #   keycloak, ga4gh, funnel and installed services
+        # - the store recording the deployments in the state directory
+        self.docker = engine.connect(forceCli=args.dockerCli)
+        self.readiness = readiness.readiness()
+        self.images = images.images(offline=args.offline, dockerClient=self.docker)
+        self.artifacts = artifacts.artifacts(maxBytes=int(args.artifactCacheSize) << 20)
+        self.render = render.renderer()
+        self.services = registry.registry({"readinessEngine": self.readiness, 
+                                           "imageCache": self.images, 
+                                           "artifactCache": self.artifacts, 
+                                           "dockerClient": self.docker, 
+                                           "configRenderer": self.render})
+        self.state = state.store()
+
+        # report the recorded deployments or the resource usage
+        if args.command == "status":
+            self.routeStatus(args)
+            exit()
+        if args.command == "stats":
+            self.routeStats(args)
+            exit()
+        if args.command == "logs":
+            self.routeLogs(args)
+            exit()
+
+        # inspect or invalidate the image digest cache
+        if args.showImageCache:
+            self.printImageCache()
+            exit()
+        if args.clearImageCache:
+            self.images.invalidate()
+
+        # compile the deployment plan, reuse the cached one or read
+        # the one to apply, printing it without deploying on --dry-run
+        try:
+            if args.command != "down":
+                steps = self.routePlan(args)
+
+            # stop and remove the managed containers
+            if args.command in ("down", "restart"):
+                self.routeDown(args)
+                if args.command == "down":
+                    self.printProfile(args)
+                    exit()
+
+            # initiate the deployment procedure 
+            self.routeDeploy(args, steps)
+        except scheduler.scheduleError as error:
+            print("\nDeployment Failed.\n")
+            for name in sorted(error.failures):
+                print(name + ": " + str(error.failures[name]))
+            for name in error.cancelled:
+                print(name + ": cancelled")
+            self.printProfile(args)
+            exit(1)
 
         # print deployment information
         self.printDeploy(args)
+        self.printProfile(args)
         exit()
 
 
-    def routeDeploy(self, args):
+    def routePlan(self, args):
+        """
+        Compiles the deployment plan of the arguments
+
+        Compiling the plan renders the configuration files (the 
+        *.config steps of the subdeployers) and allocates the ports
+        of the ga4gh replicas. The plan is cached by a key over the
+        inputs and the templates, so a deploy with the same inputs
+        reuses the previous plan and renders nothing. apply reads 
+        the plan from a file instead, replacing the arguments with
+        its inputs
+
+        With --save-plan the plan is written to a file, and with
+        --dry-run it is printed and the deployer exits
+
+        Parameters:
+
+        argparse.Namespace args - Object containing command-line
+                                  arguments as attributes
+
+        Returns:
+
+        list steps - The (name, function, dependencies) steps left to run
+        """
+        import os
+        from . import plan
+        try:
+            if args.command == "apply":
+                self.plan = plan.load(args.planFile)
+                plan.arguments(self.plan, args)
+                steps = plan.restore(self.plan, args, self.selected(args))
+                self.planSource = "applied from " + args.planFile
+            else:
+                services = self.selected(args)
+                planKey = plan.key(args, services)
+                cacheFile = plan.cacheFile(planKey)
+                steps = None
+
+                # reuse the plan of an earlier deploy with the same inputs
+                # unless its rendered files were removed or changed
+                if os.path.exists(cacheFile):
+                    try:
+                        self.plan = plan.load(cacheFile)
+                        steps = plan.restore(self.plan, args, services)
+                        self.planSource = "reused"
+                    except plan.planError:
+                        steps = None
+                if steps is None:
+                    self.plan, steps = plan.compilePlan(args, services, planKey)
+                    plan.save(self.plan, cacheFile)
+                    self.planSource = "compiled"
+        except plan.planError as error:
+            print("\nInvalid plan: " + str(error))
+            exit(1)
+
+        if args.savePlan:
+            plan.save(self.plan, args.savePlan)
+            print("Plan written to " + args.savePlan)
+        if args.dryRun:
+            print(plan.describe(self.plan))
+            print("\nNothing was deployed (--dry-run).")
+            exit()
+        return steps
+
+    def routeDeploy(self, args, steps):
         """
         Allocates deployment to each of the subdeployers
-        Passes command-line arguments of each of the subdeployers:
+        selected in the registry
+        Runs the steps the plan lists for each of the subdeployers:
         1. keycloak
         2. ga4gh
-        3. funnel
+        3. funnel (with --funnel)
+        4. services installed as candigDeploy.services entry points
 
         The subdeployers choose between their own deployment
-        schemes based on the command-line arguments
+        schemes based on the command-line arguments and list
+        the resulting steps. The steps of all subdeployers form
+        one dependency graph so that independent steps, such as
+        the image pulls and the funnel build, run concurrently
 
         Manages cleanup prior to deployment
         Existing containers with duplicate names and ports
         from previous deployments will otherwise conflict 
         with the current deployment
 
+        With --reconcile, containers whose specification is
+        unchanged are kept running instead
+
+        The deployment, its finished steps and its containers are
+        recorded in the state store. A deployment of the same plan
+        that failed or was interrupted is resumed: its containers 
+        are reconciled rather than removed, so the servers it 
+        already started are kept
+
         Parameters:
 
         argparse.Namespace args - Object containing command-line
                                   arguments as attributes
+        list steps - The steps of the plan (see routePlan)
         """
+        # resume a failed or interrupted deployment of the same plan:
+        # its containers are kept and reconciled instead of removed
+        from . import engine
+        name = engine.deploymentName(args.keycloakContainerName)
+        resumed = self.state.interrupted(name, self.plan["key"])
+        if resumed is not None:
+            from . import plan
+            print("Resuming deployment #{0} ({1} of {2} steps completed)".format(
+                resumed["id"], len(resumed["done"]), len(steps)))
+            args.reconcile = True
+
+            # skip the steps the interrupted deployment completed
+            steps = plan.unfinished(steps, resumed["done"])
+        deploymentId = self.state.begin(name, args.command, self.plan)
+
         # remove duplicate containers
-        self.containerTeardown(args.keycloakContainerName, args.ga4ghContainerName, args.funnelContainerName)
+        # when reconciling, each subdeployer only removes 
+        # its container if the specification changed
+        if self.plan["teardown"] and resumed is None:
+            start = time.perf_counter()
+            with trace.span("teardown"):
+                self.containerTeardown(args)
+            self.state.step(deploymentId, "teardown", "done", time.perf_counter() - start)
+
+        # Deploy keycloak, ga4gh, funnel and any installed service
+        # concurrently based on the command-line arguments,
+        # recording each finished step in the state store
+        from . import scheduler
+        def record(step, status, seconds):
+            self.state.step(deploymentId, step, status, seconds)
+        deployScheduler = scheduler.scheduler(args.workers, record)
+        deployScheduler.addSteps(steps)
+
+        # print the logs of the containers as they start
+        if args.followLogs:
+            logFollower, printer = self.followLogs(args)
+        try:
+            with trace.span("deploy", workers=args.workers):
+                deployScheduler.run()
+        except scheduler.scheduleError:
+            self.state.finish(deploymentId, "failed", self.deployed(args))
+            raise
+        finally:
+            if args.followLogs:
+                logFollower.finish()
+                printer.join()
+        self.state.finish(deploymentId, "complete", self.deployed(args))
+
+
+    def deployed(self, args):
+        """
+        Collects the containers and processes of the subdeployers
+
+        Parameters:
+
+        argparse.Namespace args - Object containing command-line
+                                  arguments as attributes
+
+        Returns:
+
+        list records - The records of the state store (see state.RECORD_FIELDS)
+        """
+        records = []
+        for name, subdeployer in self.selected(args):
+            if hasattr(subdeployer, "deployed"):
+                records += subdeployer.deployed(args)
+        return records
+
+    def routeStatus(self, args):
+        """
+        Reports the latest deployment of each name made to the
+        selected docker daemon from the state store
+
+        The recorded containers are inspected by name, so only the 
+        deployed containers are looked up rather than listing every 
+        container of the daemon
+
+        Parameters:
+
+        argparse.Namespace args - Object containing command-line
+                                  arguments as attributes
+
+        Returns: None
+        """
+        from . import engine
+        from . import state
+        deployments = [deployment for deployment in self.state.latest()
+                       if engine.onEndpoint(deployment["name"])]
+        if not deployments:
+            print("No deployments recorded in " + self.state.fileName)
+            return
+        for deployment in deployments:
+            records = state.status(self.docker, self.state.records(deployment["id"]))
+            print(state.report(deployment, records, self.state.steps(deployment["id"])) + "\n")
+
+    def selected(self, args):
+        """
+        Returns the subdeployers deployed with the arguments
+
+        Parameters:
+
+        argparse.Namespace args - Object containing command-line
+                                  arguments as attributes
+
+        Returns:
+
+        list services - (name, subdeployer) tuples in deployment order
+        """
+        from . import registry
+        try:
+            names = self.services.names(args)
+        except registry.registryError as error:
+            print("\n" + str(error))
+            exit(1)
+        return [(name, self.services.get(name)) for name in names]
+
+    def routeStats(self, args):
+        """
+        Streams the resource usage of every managed container
+
+        One stats feed per container is read concurrently, and every 
+        --stats-interval seconds the current CPU %, memory, network and 
+        block I/O of each container are printed with the rolling p50 
+        and p95 of the CPU and memory, as a table refreshed in place or
+        as JSON lines (--stats-format json), until interrupted or 
+        --stats-count refreshes were printed
+
+        Parameters:
+
+        argparse.Namespace args - Object containing command-line
+                                  arguments as attributes
+
+        Returns: None
+        """
+        from . import engine
+        from . import stats
+        from . import teardown
+        try:
+            containerNames = teardown.managed(self.docker)
+        except (OSError, engine.engineError) as error:
+            print("Cannot list the containers: " + str(error))
+            exit(1)
+        if not containerNames:
+            print("No containers are managed by the deployer")
+            return
+
+        resourceMonitor = stats.monitor(self.docker, containerNames)
+        resourceMonitor.start()
+        refreshes = 0
+        try:
+            while not int(args.statsCount) or refreshes < int(args.statsCount):
+                time.sleep(float(args.statsInterval))
+                rows = resourceMonitor.rows()
+                if args.statsFormat == "json":
+                    if rows:
+                        print(stats.jsonLines(rows), flush=True)
+                else:
+                    # redraw the table in place on a terminal
+                    if sys.stdout.isatty():
+                        sys.stdout.write("\x1b[2J\x1b[H")
+                    print(stats.table(rows) + "\n", flush=True)
+                refreshes += 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            resourceMonitor.stop()
+
+        for name, error in sorted(resourceMonitor.errors().items()):
+            print(name + ": " + str(error))
+
+    def routeLogs(self, args):
+        """
+        Follows the logs of every managed container
+
+        The log streams of the containers are read concurrently and
+        merged into one stream ordered by timestamp, each line prefixed
+        with its container. --logs-service and --logs-grep filter the
+        containers and the lines, and a marker is printed as soon as
+        a service logs that it is ready
+
+        Parameters:
+
+        argparse.Namespace args - Object containing command-line
+                                  arguments as attributes
+
+        Returns: None
+        """
+        from . import engine
+        from . import logs
+        services = args.logsService.split(",") if args.logsService else None
+        try:
+            containerList = logs.containers(self.docker, services)
+        except (OSError, engine.engineError) as error:
+            print("Cannot list the containers: " + str(error))
+            exit(1)
+        if not containerList:
+            print("No containers are managed by the deployer")
+            return
+
+        logFollower = logs.follower(self.docker, containerList, args.logsGrep, 
+                                    follow=not args.logsNoFollow, tail=args.logsTail)
+        logFollower.start()
+        try:
+            self.printLogs(logFollower)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            logFollower.stop()
+
+        for name, error in sorted(logFollower.errors().items()):
+            print(name + ": " + str(error))
+
+    def followLogs(self, args):
+        """
+        Follows the logs of the containers of a deployment while it runs
+
+        The streams of containers that do not run yet are reopened 
+        until they start, and only the lines logged after the start 
+        of the deployment are printed
+
+        Parameters:
+
+        argparse.Namespace args - Object containing command-line
+                                  arguments as attributes
+
+        Returns:
+
+        tuple following - The started logs.follower and the thread printing it
+        """
+        import threading
+        from . import logs
+        services = args.logsService.split(",") if args.logsService else None
+        containerList = [(record["service"], record["name"]) for record in self.deployed(args)
+                         if record["kind"] == "container" and 
+                         (not services or record["service"] in services)]
+        logFollower = logs.follower(self.docker, containerList, args.logsGrep, 
+                                    since=time.time(), wait=True)
+        logFollower.start()
+        printer = threading.Thread(target=self.printLogs, args=(logFollower,), name="logs")
+        printer.daemon = True
+        printer.start()
+        return logFollower, printer
+
+    def printLogs(self, logFollower):
+        """
+        Prints the merged lines of a log follower until its streams end
+
+        Parameters:
+
+        logs.follower logFollower - The started follower
+
+        Returns: None
+        """
+        from . import logs
+        width = max([len(logStream.name) for logStream in logFollower.streams] + [0])
+        for entry in logFollower.entries():
+            print(logs.formatEntry(entry, width), flush=True)
+
+    def routeInventory(self, args):
+        """
+        Deploys to every host of an inventory file
+
+        Each host is deployed by a deployer process of its own with 
+        the command-line arguments and the overrides of the host.
+        At most --inventory-parallel hosts are deployed at once and 
+        a host is stopped after --host-timeout seconds
+
+        Parameters:
+
+        argparse.Namespace args - Object containing command-line
+                                  arguments as attributes
 
-        # Deploy keycloak, ga4gh, and funnel 
-        # sequentially based on the command-line arguments
-        self.keycloak.route(args) # deploy keycloak
-        self.ga4gh.route(args) # deploy ga4gh
-        self.funnel.route(args) # deploy funnel
+        Returns:
 
+        int status - 0 if every host was deployed, 1 otherwise
+        """
+        from . import inventory
+        try:
+            hosts = inventory.load(args.inventory)
+        except (IOError, inventory.inventoryError) as error:
+            print("\nInvalid inventory: " + str(error))
+            return 1
+
+        print("Deploying to {0} hosts, {1} at a time".format(len(hosts), args.inventoryParallel))
+        results = inventory.rollout(hosts, inventory.sharedArguments(sys.argv[1:]), 
+                                    int(args.inventoryParallel), float(args.hostTimeout))
+        print("\n" + inventory.report(results) + "\n")
+        if all(result["status"] == "ok" for result in results):
+            return 0
+        return 1
+
+    def routeDown(self, args):
+        """
+        Stops and removes every container managed by the deployer
+
+        The containers are found by their candig.managed label and
+        torn down concurrently. Each container has --stop-timeout 
+        seconds to exit before it is killed. With --remove-images and
+        --remove-volumes, their images and volumes are removed as well
+
+        Parameters:
 
-    def containerTeardown(self, keycloakContainerName, ga4ghContainerName, funnelContainerName):
+        argparse.Namespace args - Object containing command-line
+                                  arguments as attributes
+
+        Returns: None
+        """
+        from . import engine
+        from . import teardown
+        try:
+            result = teardown.down(self.docker, int(args.stopTimeout), 
+                                   args.removeImages, args.removeVolumes)
+        except (OSError, engine.engineError) as error:
+            print("\nTeardown Failed.\n")
+            print(str(error))
+            exit(1)
+
+        # the deployments no longer have containers
+        for deployment in self.state.latest():
+            if deployment["status"] != "removed" and engine.onEndpoint(deployment["name"]):
+                self.state.removed(deployment["name"])
+
+        print("\nTeardown Complete.\n")
+        print(teardown.report(result) + "\n")
+
+    def containerTeardown(self, args):
         """
         Remove up any duplicate containers currently running or stopped that may conflict with deployment
 
-        Removes:
+        Removes, concurrently:
         1. Docker containers running Keycloak
-        2. Docker containers running GA4GH 
+        2. Docker containers running GA4GH, including every replica 
+           labelled with the ga4gh container name by earlier deployments
+        3. Docker containers running Funnel
 
         Parameters:
 
-        string keycloakContainerName - The name of the Docker container which holds the Keycloak server
-        string ga4ghContainerName - The name of the Docker container which holds the GA4GH server
-        string funnelContainerName - The name of the Docker container which holds the Funnel server
+        argparse.Namespace args - Object containing command-line
+                                  arguments as attributes
 
         Returns: None
         """
+        from . import engine
+        from . import reconcile
+        from . import teardown
+        containerNames = ([args.keycloakContainerName] + 
+                          self.services.get("ga4gh").replicaNames(args) + 
+                          [args.funnelContainerName])
         try:
-            # kill running containers:
-            subprocess.call(["docker", "container", "kill", 
-                             keycloakContainerName, 
-                             ga4ghContainerName, 
-                             funnelContainerName])
-            # remove stopped containers:
-            subprocess.call(["docker", "container", "rm", 
-                             keycloakContainerName, 
-                             ga4ghContainerName, 
-                             funnelContainerName])
-        except OSError:
+            # replicas left over by a deployment with more of them
+            group = {reconcile.GROUP_LABEL: args.ga4ghContainerName}
+            for containerName in self.docker.listContainers(group):
+                if containerName not in containerNames:
+                    containerNames.append(containerName)
+
+            # kill and remove the containers
+            teardown.removeContainers(self.docker, containerNames, 0)
+        except (OSError, engine.engineError):
             return # abort the function if Docker not installed
         
 
@@ -163,27 +635,77 @@ class deployer:
 
         Returns: None
         """
+        keycloak = self.services.get("keycloak")
+        ga4gh = self.services.get("ga4gh")
+
         print("\nDeployment Complete.\n")
         print("Keycloak is accessible at:")
 
         # print out Docker container information for keycloak
         if not args.singularity:
             print("CONTAINER: " + args.keycloakContainerName)
+            self.printAction(keycloak.action)
 
         print("IP:PORT:   " + args.keycloakIP + ":" + args.keycloakPort)
-        print("\nGA4GH Server is accessible at:")
 
-        # print out Docker container information for ga4gh
-        if not args.singularity:
-            print("CONTAINER: " + args.ga4ghContainerName)
+        # report whether the start imported the realm or found it in the database
+        if keycloak.realmAction == "unchanged":
+            print("REALM:     unchanged, import skipped")
+        elif keycloak.realmAction is not None:
+            print("REALM:     " + keycloak.realmAction)
+
+        # report the changes applied through the admin API
+        if keycloak.admin is not None:
+            print("ADMIN:     {0} changes ({1} requests, {2} logins)".format(
+                keycloak.adminChanges, keycloak.admin.requests, keycloak.admin.logins))
+        self.printReady("keycloak")
+        print("\nGA4GH Server is accessible at:")
 
-        print("IP:PORT:   " + args.ga4ghIP + ":" + args.ga4ghPort)
+        # print out Docker container information for every ga4gh replica
+        if args.singularity:
+            print("IP:PORT:   " + args.ga4ghIP + ":" + args.ga4ghPort)
+            self.printReady("ga4gh")
+        else:
+            for index, (containerName, port) in enumerate(ga4gh.replicas(args)):
+                if index:
+                    print("")
+                print("CONTAINER: " + containerName)
+                self.printAction(ga4gh.actions.get(containerName))
+                print("IP:PORT:   " + args.ga4ghIP + ":" + port)
+                self.printReady(self.services.module("ga4gh").probeName(index))
+
+        # report the values of the ga4gh performance profile
+        tuning = self.services.module("ga4gh").tuning
+        print("\nGA4GH profile " + tuning.describe(args.ga4ghTuning))
 
         # print out Docker container information for funnel
         if args.funnel:
             print("\nFunnel is accessible at:")
             print("CONTAINER: " + args.funnelContainerName)
+            funnel = self.services.get("funnel")
+            self.printAction(funnel.action)
+            if funnel.build is not None:
+                print("IMAGE:     " + funnel.build)
             print("IP:PORT:   " + args.funnelIP + ":" + args.funnelPort)     
+            self.printReady("funnel")
+
+        # report how many image pulls and downloads were skipped
+        if args.singularity:
+            print("\nArtifact cache: {0} hits, {1} misses".format(self.artifacts.hits, 
+                                                                self.artifacts.misses))
+        else:
+            print("\nImage cache: {0} hits, {1} misses".format(self.images.hits, 
+                                                             self.images.misses))
+            print("Docker daemon: {0} round-trips ({1})".format(self.docker.roundTrips, 
+                                                                self.docker.describe()))
+
+        # report whether the plan was compiled or reused
+        print("Plan: {0} ({1})".format(self.plan["key"][:12], self.planSource))
+
+        # report where the rendered configuration lives
+        if self.render.written or self.render.unchanged:
+            print("Configuration: {0} ({1} written, {2} unchanged)".format(
+                self.render.directory(args), self.render.written, self.render.unchanged))
 
         # provide login usernames and passwords
         print("\nUser Account:")
@@ -193,6 +715,60 @@ class deployer:
         print("USERNAME:  " + args.adminUsername)
         print("PASSWORD:  " + args.adminPassword + "\n")
 
+    def printProfile(self, args):
+        """
+        Writes the Chrome trace of the deployment and prints its summary
+
+        Parameters:
+
+        argparse.Namespace args - Object containing command-line arguments 
+                                  as attributes
+
+        Returns: None
+        """
+        if not args.profile:
+            return
+        trace.active.chromeTrace(args.profile)
+        print("\nProfile (Chrome trace written to " + args.profile + "):\n")
+        print(trace.active.summary() + "\n")
+
+    def printImageCache(self):
+        """
+        Prints the image digests recorded by previous deployments
+
+        Returns: None
+        """
+        print("Image cache: " + self.images.cacheFile)
+        for repo, entry in self.images.entries():
+            print(repo + "@" + entry["digest"])
+
+    def printAction(self, action):
+        """
+        Prints whether a container was kept, recreated or created
+
+        Parameters:
+
+        str action - What was done with the container, or None
+
+        Returns: None
+        """
+        if action is not None:
+            print("ACTION:    " + action)
+
+    def printReady(self, name):
+        """
+        Prints the time a server took to become ready after its start
+
+        Parameters:
+
+        str name - The name of the service polled by the readiness engine
+
+        Returns: None
+        """
+        seconds = self.readiness.results.get(name)
+        if seconds is not None:
+            print("READY IN:  {0:.1f} seconds".format(seconds))
+
 
 def main():
     """
@@ -0,0 +1,1286 @@
+"""
+Clients for the Docker daemon
+
+The engine client speaks HTTP to the Docker Engine API over the
+daemon's unix socket and keeps its connections alive between
+requests. The cli client runs the docker command-line program
+and is used when the socket cannot be reached.
+"""
+
+import http.client
+import io
+import json
+import os
+import queue
+import select
+import socket
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+import urllib.parse
+
+from . import trace
+
+# the oldest and newest Engine API versions the client speaks, the
+# newest one the daemon also supports is negotiated on connecting
+MIN_API_VERSION = "1.24"
+MAX_API_VERSION = "1.45"
+
+# the methods resent on a fresh connection when a reused one was closed
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+# the default location of the daemon socket
+DEFAULT_SOCKET = "/var/run/docker.sock"
+
+
+class engineError(Exception):
+    """
+    Raised when the Docker daemon rejects a request
+
+    Attributes:
+
+    int status - The HTTP status code (or exit status of the docker program)
+    """
+
+    def __init__(self, status, message):
+        self.status = status
+        Exception.__init__(self, "Docker daemon error {0}: {1}".format(status, message))
+
+
+class unixConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a unix domain socket
+    """
+
+    def __init__(self, socketPath, timeout=None):
+        http.client.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.socketPath = socketPath
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.socketPath)
+        self.sock = sock
+
+
+def versionTuple(version):
+    """
+    Returns an API version such as 1.24 as a tuple of integers
+    """
+    return tuple(int(part) for part in version.split("."))
+
+
+def archive(files):
+    """
+    Builds an uncompressed tar archive in memory
+
+    Parameters:
+
+    list files - (path inside the archive, bytes, mode) tuples
+
+    Returns:
+
+    bytes data - The tar archive
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tarHandle:
+        for name, data, mode in files:
+            info = tarfile.TarInfo(name.lstrip("/"))
+            info.size = len(data)
+            info.mode = mode
+            info.mtime = int(time.time())
+            tarHandle.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def fileArchive(files):
+    """
+    Builds one archive holding files destined for a container
+
+    The files are stored relative to their deepest common
+    directory, which is where the archive must be extracted
+
+    Parameters:
+
+    list files - (absolute path inside the container, bytes) tuples,
+                 or (path, bytes, mode) tuples for other modes than 0644
+
+    Returns:
+
+    tuple upload - (directory to extract into, tar archive bytes)
+    """
+    directory = os.path.commonpath([os.path.dirname(entry[0]) for entry in files])
+    data = archive([(os.path.relpath(entry[0], directory), entry[1], 
+                     entry[2] if len(entry) > 2 else 0o644) for entry in files])
+    return directory, data
+
+
+def extractFile(data):
+    """
+    Returns the content of the file in a tar archive of a single file
+
+    Parameters:
+
+    bytes data - The tar archive
+
+    Returns:
+
+    bytes content - The content of its first regular file, or None
+    """
+    with tarfile.open(fileobj=io.BytesIO(data)) as tarHandle:
+        for info in tarHandle:
+            if info.isfile():
+                return tarHandle.extractfile(info).read()
+    return None
+
+
+def contextArchive(contextDir):
+    """
+    Builds a tar archive of a docker build context directory
+
+    Parameters:
+
+    str contextDir - The directory holding the Dockerfile
+
+    Returns:
+
+    bytes data - The tar archive
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tarHandle:
+        tarHandle.add(contextDir, arcname=".",
+                      filter=lambda info: None if "__pycache__" in info.name else info)
+    return buffer.getvalue()
+
+
+class engine:
+    """
+    Docker Engine API client with a pool of keep-alive connections
+
+    Each request borrows an idle connection from the pool (or opens
+    a new one) and returns it afterwards, so the concurrent steps of
+    the scheduler reuse a handful of connections instead of starting
+    a docker process per operation. Every HTTP request is counted
+    as a daemon round-trip.
+
+    Requests are sent without a version prefix until negotiate has
+    chosen the API version, which the daemon then answers in.
+    """
+
+    def __init__(self, socketPath=DEFAULT_SOCKET, host=None, port=None, poolSize=4, timeout=None):
+        """
+        Constructor for the Engine API client
+
+        Parameters:
+
+        str socketPath - The unix socket of the daemon
+        str host - The TCP host of the daemon (instead of the socket)
+        int port - The TCP port of the daemon
+        int poolSize - The number of idle connections to keep open
+        float timeout - The socket timeout of the connections
+
+        Returns: engine
+        """
+        self.socketPath = socketPath
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool = queue.LifoQueue(poolSize)
+        self.apiVersion = None
+        self.roundTrips = 0
+        self.lock = threading.Lock()
+
+    def describe(self):
+        """
+        Returns a description of the daemon endpoint
+        """
+        version = " v" + self.apiVersion if self.apiVersion else ""
+        if self.host is not None:
+            return "engine API{0} at tcp://{1}:{2}".format(version, self.host, self.port)
+        return "engine API{0} at unix://{1}".format(version, self.socketPath)
+
+    def connection(self):
+        """
+        Opens a new connection to the daemon
+        """
+        if self.host is not None:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return unixConnection(self.socketPath, self.timeout)
+
+    def acquire(self):
+        """
+        Borrows an idle connection from the pool or opens a new one
+
+        Idle connections the daemon has closed in the meantime 
+        are discarded
+
+        Returns:
+
+        tuple borrowed - (connection, True if the connection was reused)
+        """
+        while True:
+            try:
+                conn = self.pool.get_nowait()
+            except queue.Empty:
+                return self.connection(), False
+            # an idle connection is only readable once the daemon closed it
+            if conn.sock is not None and not select.select([conn.sock], [], [], 0)[0]:
+                return conn, True
+            conn.close()
+
+    def release(self, conn):
+        """
+        Returns a connection to the pool, closing it if the pool is full
+        """
+        try:
+            self.pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """
+        Closes every idle connection of the pool
+        """
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def request(self, method, path, query=None, body=None, headers=None, stream=False):
+        """
+        Sends a request to the daemon
+
+        A reused connection that the daemon has closed in the meantime
+        is replaced by a fresh one and the request is sent again, 
+        unless it may already have reached the daemon: only the 
+        idempotent methods are resent once the request was written
+
+        Parameters:
+
+        str method - The HTTP method
+        str path - The API path without the version prefix
+        dict query - The query string parameters
+        bytes body - The request body
+        dict headers - Additional request headers
+        bool stream - Return the open response instead of its body
+
+        Returns:
+
+        tuple result - (status, body bytes) or (status, response) when streaming
+        """
+        url = "/v" + self.apiVersion + path if self.apiVersion else path
+        if query:
+            url += "?" + urllib.parse.urlencode(query)
+        headers = dict(headers or {})
+        if body is not None and "Content-Type" not in headers:
+            headers["Content-Type"] = "application/json"
+
+        with trace.span(method + " " + path, "docker", 
+                        bytesSent=len(body) if body else 0) as phase:
+            while True:
+                conn, reused = self.acquire()
+                sent = False
+                try:
+                    conn.request(method, url, body, headers)
+                    sent = True
+                    response = conn.getresponse()
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    conn.close()
+                    if reused and (not sent or method in IDEMPOTENT_METHODS):
+                        continue
+                    raise
+                except Exception:
+                    conn.close()
+                    raise
+                break
+
+            with self.lock:
+                self.roundTrips += 1
+            phase.set(status=response.status)
+
+            # streamed bodies are counted by their reader
+            if stream:
+                return response.status, streamedResponse(self, conn, response)
+
+            data = response.read()
+            phase.set(bytesReceived=len(data))
+        if response.will_close:
+            conn.close()
+        else:
+            self.release(conn)
+        return response.status, data
+
+    def call(self, method, path, query=None, body=None, headers=None, ignore=()):
+        """
+        Sends a request and decodes its JSON answer
+
+        Parameters:
+
+        str method - The HTTP method
+        str path - The API path without the version prefix
+        dict query - The query string parameters
+        bytes body - The request body
+        dict headers - Additional request headers
+        tuple ignore - Error status codes to treat as success
+
+        Returns:
+
+        object result - The decoded JSON body, or None if it is empty
+
+        Raises:
+
+        engineError - If the daemon answers with an error status
+        """
+        status, data = self.request(method, path, query, body, headers)
+        if status >= 400 and status not in ignore:
+            raise engineError(status, errorMessage(data))
+        if status >= 400 or not data:
+            return None
+        try:
+            return json.loads(data.decode("utf-8"))
+        except ValueError:
+            return None
+
+    def progress(self, method, path, query=None, body=None, headers=None, callback=None):
+        """
+        Sends a request answered by a stream of JSON progress messages
+
+        Parameters:
+
+        str method - The HTTP method
+        str path - The API path without the version prefix
+        dict query - The query string parameters
+        bytes body - The request body
+        dict headers - Additional request headers
+        callable callback - Called with each decoded message
+
+        Returns: None
+
+        Raises:
+
+        engineError - If the daemon reports an error in the stream
+        """
+        status, response = self.request(method, path, query, body, headers, stream=True)
+        with response, trace.span(method + " " + path + " (stream)", "docker") as phase:
+            if status >= 400:
+                raise engineError(status, errorMessage(response.read()))
+            received = 0
+            for line in response:
+                received += len(line)
+                phase.set(bytesReceived=received)
+                line = line.strip()
+                if not line:
+                    continue
+                message = json.loads(line.decode("utf-8"))
+                if "error" in message:
+                    raise engineError(500, message["error"])
+                if callback is not None:
+                    callback(message)
+
+    def ping(self):
+        """
+        Determines whether the daemon answers on the endpoint
+
+        Returns:
+
+        bool reachable - True if the daemon answered
+        """
+        try:
+            status, data = self.request("GET", "/_ping")
+        except (OSError, http.client.HTTPException):
+            return False
+        return status == 200
+
+    def negotiate(self):
+        """
+        Chooses the newest API version both the daemon and the client support
+
+        Returns:
+
+        str version - The API version of later requests, e.g. 1.45
+
+        Raises:
+
+        engineError - If the daemon supports none of the client versions
+        """
+        self.apiVersion = None
+        version = self.call("GET", "/version") or {}
+        daemonVersion = version.get("ApiVersion", MIN_API_VERSION)
+        daemonMinimum = version.get("MinAPIVersion", daemonVersion)
+
+        chosen = min(daemonVersion, MAX_API_VERSION, key=versionTuple)
+        if versionTuple(chosen) < versionTuple(max(daemonMinimum, MIN_API_VERSION, 
+                                                   key=versionTuple)):
+            raise engineError(400, "The daemon supports API versions {0} to {1}, "
+                              "the client {2} to {3}".format(daemonMinimum, daemonVersion, 
+                                                             MIN_API_VERSION, MAX_API_VERSION))
+        self.apiVersion = chosen
+        return chosen
+
+    def createContainer(self, name, image, ports=None, env=None, labels=None, binds=None,
+                        command=None):
+        """
+        Creates a container without starting it
+
+        Parameters:
+
+        str name - The name of the container
+        str image - The image reference
+        dict ports - Maps container ports to host ports
+        list env - (name, value) tuples
+        dict labels - The labels of the container
+        list binds - host:container volume bindings
+        list command - Replaces the command of the image
+
+        Returns:
+
+        str containerId - The ID of the new container
+        """
+        ports = ports or {}
+        config = {"Image": image,
+                  "Env": [envName + "=" + value for envName, value in (env or [])],
+                  "Labels": labels or {},
+                  "ExposedPorts": dict((port + "/tcp", {}) for port in ports),
+                  "HostConfig": {
+                      "PortBindings": dict((port + "/tcp", [{"HostPort": hostPort}])
+                                           for port, hostPort in ports.items()),
+                      "Binds": binds or []}}
+        if command:
+            config["Cmd"] = command
+        body = json.dumps(config).encode("utf-8")
+        return self.call("POST", "/containers/create", {"name": name}, body)["Id"]
+
+    def startContainer(self, name):
+        """
+        Starts a created container
+        """
+        self.call("POST", "/containers/" + name + "/start", ignore=(304,))
+
+    def stopContainer(self, name, timeout=10):
+        """
+        Stops a running container, ignoring missing or stopped containers
+
+        The daemon sends SIGTERM and kills the container once
+        the timeout has passed
+
+        Parameters:
+
+        str name - The name of the container
+        int timeout - The seconds the container has to exit
+
+        Returns: None
+        """
+        self.call("POST", "/containers/" + name + "/stop", {"t": str(timeout)}, 
+                  ignore=(304, 404))
+
+    def killContainer(self, name):
+        """
+        Kills a running container, ignoring missing or stopped containers
+        """
+        self.call("POST", "/containers/" + name + "/kill", ignore=(404, 409))
+
+    def removeContainer(self, name, force=False, volumes=False):
+        """
+        Removes a container and optionally its anonymous volumes, 
+        ignoring missing containers
+        """
+        query = {}
+        if force:
+            query["force"] = "1"
+        if volumes:
+            query["v"] = "1"
+        self.call("DELETE", "/containers/" + name, query or None, ignore=(404,))
+
+    def removeImage(self, name):
+        """
+        Removes an image, ignoring missing images and images still in use
+        """
+        self.call("DELETE", "/images/" + name, ignore=(404, 409))
+
+    def listVolumes(self, labels):
+        """
+        Lists the volumes carrying labels
+
+        Parameters:
+
+        dict labels - The label values the volumes must have
+
+        Returns:
+
+        list names - The names of the volumes
+        """
+        filters = {"label": [label + "=" + value for label, value in sorted(labels.items())]}
+        volumes = self.call("GET", "/volumes", {"filters": json.dumps(filters)})
+        return sorted(volume["Name"] for volume in volumes.get("Volumes") or [])
+
+    def removeVolume(self, name):
+        """
+        Removes a volume, ignoring missing volumes and volumes still in use
+        """
+        self.call("DELETE", "/volumes/" + name, ignore=(404, 409))
+
+    def createVolume(self, name, labels=None):
+        """
+        Creates a named volume, leaving an existing volume of the name as it is
+
+        Parameters:
+
+        str name - The name of the volume
+        dict labels - The labels of the volume
+
+        Returns: None
+        """
+        body = json.dumps({"Name": name, "Labels": labels or {}}).encode("utf-8")
+        self.call("POST", "/volumes/create", body=body)
+
+    def putArchive(self, name, path, data):
+        """
+        Extracts a tar archive into a container
+
+        Parameters:
+
+        str name - The name of the container
+        str path - The directory inside the container to extract into
+        bytes data - The tar archive
+
+        Returns: None
+        """
+        self.call("PUT", "/containers/" + name + "/archive", {"path": path}, data,
+                  {"Content-Type": "application/x-tar"})
+
+    def copyFiles(self, name, files):
+        """
+        Copies files into a container with a single archive upload
+
+        Parameters:
+
+        str name - The name of the container
+        list files - (absolute path inside the container, bytes) tuples,
+                     or (path, bytes, mode) tuples
+
+        Returns: None
+        """
+        directory, data = fileArchive(files)
+        self.putArchive(name, directory, data)
+
+    def readFile(self, name, path):
+        """
+        Reads a file out of a container, which need not be running
+
+        Parameters:
+
+        str name - The name of the container
+        str path - The absolute path of the file inside the container
+
+        Returns:
+
+        bytes content - The content of the file, or None if it does not exist
+        """
+        status, data = self.request("GET", "/containers/" + name + "/archive", {"path": path})
+        if status == 404:
+            return None
+        if status >= 400:
+            raise engineError(status, errorMessage(data))
+        return extractFile(data)
+
+    def inspectContainer(self, name):
+        """
+        Returns the inspection of a container, or None if it does not exist
+        """
+        return self.call("GET", "/containers/" + name + "/json", ignore=(404,))
+
+    def inspectImage(self, name):
+        """
+        Returns the inspection of an image, or None if it does not exist
+        """
+        return self.call("GET", "/images/" + name + "/json", ignore=(404,))
+
+    def inspectVolume(self, name):
+        """
+        Returns the inspection of a volume, or None if it does not exist
+        """
+        return self.call("GET", "/volumes/" + name, ignore=(404,))
+
+    def info(self):
+        """
+        Returns the system information of the daemon, such as its 
+        CPUs (NCPU) and bytes of memory (MemTotal)
+        """
+        return self.call("GET", "/info")
+
+    def listContainers(self, labels):
+        """
+        Lists the containers, running or stopped, carrying labels
+
+        Parameters:
+
+        dict labels - The label values the containers must have
+
+        Returns:
+
+        list names - The names of the containers
+        """
+        filters = {"label": [label + "=" + value for label, value in sorted(labels.items())]}
+        containers = self.call("GET", "/containers/json", 
+                               {"all": "1", "filters": json.dumps(filters)})
+        return sorted(container["Names"][0].lstrip("/") for container in containers)
+
+    def statsStream(self, name):
+        """
+        Opens the stream of resource usage samples of a container
+
+        The daemon sends one JSON sample per line about every second 
+        until the stream is closed
+
+        Parameters:
+
+        str name - The name of the container
+
+        Returns:
+
+        streamedResponse stream - Iterates over the lines of the samples
+
+        Raises:
+
+        engineError - If the container does not exist
+        """
+        status, response = self.request("GET", "/containers/" + name + "/stats", 
+                                        {"stream": "1"}, stream=True)
+        if status >= 400:
+            with response:
+                raise engineError(status, errorMessage(response.read()))
+        return response
+
+    def logsStream(self, name, follow=True, tail="all", since=None):
+        """
+        Opens the log stream of a container
+
+        Every line of the standard output and error of the container
+        is preceded by its RFC 3339 timestamp
+
+        Parameters:
+
+        str name - The name of the container
+        bool follow - Keep the stream open for new lines
+        str tail - The number of earlier lines to send, or all
+        float since - Only send the lines logged since this UNIX time 
+                      (whole seconds)
+
+        Returns:
+
+        logStream stream - Iterates over the lines of the container
+
+        Raises:
+
+        engineError - If the container does not exist
+        """
+        query = {"stdout": "1", "stderr": "1", "timestamps": "1", "tail": tail,
+                 "follow": "1" if follow else "0"}
+        if since is not None:
+            query["since"] = str(int(since))
+        status, response = self.request("GET", "/containers/" + name + "/logs", query, 
+                                        stream=True)
+        if status >= 400:
+            with response:
+                raise engineError(status, errorMessage(response.read()))
+        return logStream(response)
+
+    def pullImage(self, reference, callback=None):
+        """
+        Pulls an image reference from its registry
+
+        Parameters:
+
+        str reference - The repository, optionally with a :tag or @digest
+        callable callback - Called with each progress message
+
+        Returns: None
+        """
+        repo, separator, tag = reference.partition("@")
+        if not separator:
+            repo, tag = splitTag(reference)
+        self.progress("POST", "/images/create", {"fromImage": repo, "tag": tag},
+                      callback=callback)
+
+    def buildImage(self, tag, contextDir, labels=None, callback=None):
+        """
+        Builds an image from a build context directory
+
+        Parameters:
+
+        str tag - The tag of the image
+        str contextDir - The directory holding the Dockerfile
+        dict labels - The labels of the image
+        callable callback - Called with each progress message
+
+        Returns: None
+        """
+        query = {"t": tag}
+        if labels:
+            query["labels"] = json.dumps(labels)
+        self.progress("POST", "/build", query, contextArchive(contextDir),
+                      {"Content-Type": "application/x-tar"}, callback)
+
+
+class streamedResponse:
+    """
+    An open streaming response that returns its connection when closed
+    """
+
+    def __init__(self, client, conn, response):
+        self.client = client
+        self.conn = conn
+        self.response = response
+
+    def __iter__(self):
+        return iter(self.response.readline, b"")
+
+    def read(self, amount=None):
+        return self.response.read(amount)
+
+    def readline(self):
+        return self.response.readline()
+
+    def close(self):
+        # connections are only reused once the response was consumed
+        if self.response.isclosed() and not self.response.will_close:
+            self.client.release(self.conn)
+            return
+        # wake up a thread still reading the response
+        if self.conn.sock is not None:
+            try:
+                self.conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class logStream:
+    """
+    The lines of a log stream of the daemon
+
+    The output of a container without a terminal is multiplexed:
+    every frame has an 8-byte header with the stream (1 for the
+    standard output, 2 for the standard error) and the payload size.
+    The frames are split into lines, each output keeping its own
+    partial line. A stream without frame headers is read as is
+    """
+
+    def __init__(self, response):
+        self.response = response
+
+    def __iter__(self):
+        header = self.response.read(8)
+        if not (len(header) == 8 and header[0] in (0, 1, 2) and header[1:4] == b"\0\0\0"):
+            # a raw stream of a container with a terminal
+            first = header.split(b"\n")
+            for line in first[:-1]:
+                yield line + b"\n"
+            rest = first[-1] + self.response.readline()
+            while rest:
+                yield rest
+                rest = self.response.readline()
+            return
+
+        partial = {}
+        while len(header) == 8:
+            payload = self.response.read(int.from_bytes(header[4:], "big"))
+            lines = (partial.pop(header[0], b"") + payload).split(b"\n")
+            for line in lines[:-1]:
+                yield line + b"\n"
+            if lines[-1]:
+                partial[header[0]] = lines[-1]
+            header = self.response.read(8)
+        for line in partial.values():
+            yield line
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class cli:
+    """
+    Fallback client running the docker command-line program
+
+    Offers the same operations as the engine client. Every docker
+    invocation is counted as a daemon round-trip.
+    """
+
+    def __init__(self, env=None):
+        """
+        Constructor for the command-line client
+
+        Parameters:
+
+        dict env - The environment of the docker processes (default: inherited)
+
+        Returns: cli
+        """
+        self.env = env
+        self.roundTrips = 0
+        self.lock = threading.Lock()
+
+    def describe(self):
+        """
+        Returns a description of the daemon endpoint
+        """
+        return "docker command-line"
+
+    def close(self):
+        """
+        Nothing to close for the command-line client
+        """
+
+    def run(self, command, stdin=None, ignore=False, output=False):
+        """
+        Runs a docker command
+
+        Parameters:
+
+        list command - The arguments following "docker"
+        bytes stdin - The data to pass on standard input
+        bool ignore - Return None instead of raising on failure
+        bool output - Capture and return standard output
+
+        Returns:
+
+        bytes stdout - The captured output, if requested
+
+        Raises:
+
+        engineError - If the command fails and ignore is not set
+        """
+        with self.lock:
+            self.roundTrips += 1
+        argv = ["docker"] + command
+        with trace.span(" ".join(argv[:2]), "process", argv=argv, 
+                        bytesSent=len(stdin) if stdin else 0) as phase:
+            process = subprocess.Popen(argv, env=self.env,
+                                       stdin=subprocess.PIPE if stdin is not None else None,
+                                       stdout=subprocess.PIPE if output else None,
+                                       stderr=subprocess.PIPE if ignore or output else None)
+            stdout, stderr = process.communicate(stdin)
+            phase.set(exitStatus=process.returncode, 
+                      bytesReceived=len(stdout) if stdout else 0)
+        if process.returncode != 0:
+            if ignore:
+                return None
+            message = stderr.decode("utf-8", "replace").strip() if stderr else " ".join(command)
+            raise engineError(process.returncode, message)
+        return stdout
+
+    def ping(self):
+        """
+        Determines whether the docker program can reach the daemon
+        """
+        try:
+            return self.run(["version", "--format", "{{.Server.Version}}"],
+                            ignore=True, output=True) is not None
+        except OSError:
+            return False
+
+    def createContainer(self, name, image, ports=None, env=None, labels=None, binds=None,
+                        command=None):
+        """
+        Creates a container without starting it (see engine.createContainer)
+        """
+        create = ["create", "--name", name]
+        for port, hostPort in sorted((ports or {}).items()):
+            create += ["-p", hostPort + ":" + port]
+        for envName, value in env or []:
+            create += ["-e", envName + "=" + value]
+        for label, value in sorted((labels or {}).items()):
+            create += ["--label", label + "=" + value]
+        for bind in binds or []:
+            create += ["-v", bind]
+        output = self.run(create + [image] + (command or []), output=True)
+        return output.decode("utf-8").strip()
+
+    def startContainer(self, name):
+        """
+        Starts a created container
+        """
+        self.run(["start", name], output=True)
+
+    def stopContainer(self, name, timeout=10):
+        """
+        Stops a running container (see engine.stopContainer)
+        """
+        self.run(["container", "stop", "-t", str(timeout), name], ignore=True, output=True)
+
+    def killContainer(self, name):
+        """
+        Kills a running container, ignoring missing or stopped containers
+        """
+        self.run(["container", "kill", name], ignore=True, output=True)
+
+    def removeContainer(self, name, force=False, volumes=False):
+        """
+        Removes a container and optionally its anonymous volumes, 
+        ignoring missing containers
+        """
+        remove = (["container", "rm"] + (["-f"] if force else []) + 
+                  (["-v"] if volumes else []) + [name])
+        self.run(remove, ignore=True, output=True)
+
+    def removeImage(self, name):
+        """
+        Removes an image, ignoring missing images and images still in use
+        """
+        self.run(["image", "rm", name], ignore=True, output=True)
+
+    def listVolumes(self, labels):
+        """
+        Lists the volumes carrying labels (see engine.listVolumes)
+        """
+        command = ["volume", "ls", "--quiet"]
+        for label, value in sorted(labels.items()):
+            command += ["--filter", "label=" + label + "=" + value]
+        output = self.run(command, output=True)
+        return sorted(output.decode("utf-8").split())
+
+    def removeVolume(self, name):
+        """
+        Removes a volume, ignoring missing volumes and volumes still in use
+        """
+        self.run(["volume", "rm", name], ignore=True, output=True)
+
+    def createVolume(self, name, labels=None):
+        """
+        Creates a named volume (see engine.createVolume)
+        """
+        command = ["volume", "create"]
+        for label, value in sorted((labels or {}).items()):
+            command += ["--label", label + "=" + value]
+        self.run(command + [name], output=True)
+
+    def putArchive(self, name, path, data):
+        """
+        Extracts a tar archive into a container through docker cp -
+        """
+        self.run(["cp", "-", name + ":" + path], stdin=data)
+
+    def copyFiles(self, name, files):
+        """
+        Copies files into a container with a single docker cp - (see engine.copyFiles)
+        """
+        directory, data = fileArchive(files)
+        self.putArchive(name, directory, data)
+
+    def readFile(self, name, path):
+        """
+        Reads a file out of a container through docker cp (see engine.readFile)
+        """
+        output = self.run(["cp", name + ":" + path, "-"], ignore=True, output=True)
+        if output is None:
+            return None
+        return extractFile(output)
+
+    def inspect(self, kind, name):
+        """
+        Returns the inspection of a container, image or volume, or None if missing
+        """
+        output = self.run([kind, "inspect", name], ignore=True, output=True)
+        if output is None:
+            return None
+        inspection = json.loads(output.decode("utf-8"))
+        return inspection[0] if inspection else None
+
+    def inspectContainer(self, name):
+        """
+        Returns the inspection of a container, or None if it does not exist
+        """
+        return self.inspect("container", name)
+
+    def inspectImage(self, name):
+        """
+        Returns the inspection of an image, or None if it does not exist
+        """
+        return self.inspect("image", name)
+
+    def inspectVolume(self, name):
+        """
+        Returns the inspection of a volume, or None if it does not exist
+        """
+        return self.inspect("volume", name)
+
+    def info(self):
+        """
+        Returns the system information of the daemon (see engine.info)
+        """
+        output = self.run(["info", "--format", "{{json .}}"], output=True)
+        return json.loads(output.decode("utf-8"))
+
+    def listContainers(self, labels):
+        """
+        Lists the containers, running or stopped, carrying labels (see engine.listContainers)
+        """
+        command = ["ps", "--all", "--format", "{{.Names}}"]
+        for label, value in sorted(labels.items()):
+            command += ["--filter", "label=" + label + "=" + value]
+        output = self.run(command, output=True)
+        return sorted(output.decode("utf-8").split())
+
+    def statsStream(self, name):
+        """
+        Opens the stream of resource usage samples of a container (see engine.statsStream)
+
+        docker stats prints one JSON sample per line, preceded by the
+        terminal codes clearing the screen, until it is terminated
+        """
+        with self.lock:
+            self.roundTrips += 1
+        argv = ["docker", "stats", "--no-trunc", "--format", "{{json .}}", name]
+        with trace.span("docker stats", "process", argv=argv):
+            return processStream(argv, self.env)
+
+    def logsStream(self, name, follow=True, tail="all", since=None):
+        """
+        Opens the log stream of a container (see engine.logsStream)
+
+        docker logs writes the standard error of the container to its
+        own, so both are read from one pipe
+        """
+        with self.lock:
+            self.roundTrips += 1
+        argv = ["docker", "logs", "--timestamps", "--tail", tail]
+        if follow:
+            argv.append("--follow")
+        if since is not None:
+            argv += ["--since", str(int(since))]
+        argv.append(name)
+        with trace.span("docker logs", "process", argv=argv):
+            return processStream(argv, self.env, mergeErrors=True)
+
+    def pullImage(self, reference, callback=None):
+        """
+        Pulls an image reference from its registry
+        """
+        self.run(["pull", reference])
+
+    def buildImage(self, tag, contextDir, labels=None, callback=None):
+        """
+        Builds an image from a build context directory
+        """
+        build = ["build", "-t", tag]
+        for label, value in sorted((labels or {}).items()):
+            build += ["--label", label + "=" + value]
+        build.append(contextDir)
+        if callback is None:
+            self.run(build)
+            return
+
+        # stream the output line by line from the classic builder,
+        # which reports each Dockerfile step as "Step N/M"
+        with self.lock:
+            self.roundTrips += 1
+        env = dict(self.env if self.env is not None else os.environ)
+        env["DOCKER_BUILDKIT"] = "0"
+        argv = ["docker"] + build
+        with trace.span("docker build", "process", argv=argv) as phase:
+            process = subprocess.Popen(argv, env=env, stdout=subprocess.PIPE, 
+                                       stderr=subprocess.STDOUT)
+            for line in process.stdout:
+                callback({"stream": line.decode("utf-8", "replace")})
+            process.wait()
+            phase.set(exitStatus=process.returncode)
+        if process.returncode != 0:
+            raise engineError(process.returncode, "docker build of " + tag + " failed")
+
+
+class processStream:
+    """
+    The standard output of a streaming docker program, read line by line
+    """
+
+    def __init__(self, argv, env=None, mergeErrors=False):
+        errors = subprocess.STDOUT if mergeErrors else subprocess.DEVNULL
+        self.process = subprocess.Popen(argv, env=env, stdout=subprocess.PIPE, 
+                                        stderr=errors)
+
+    def __iter__(self):
+        return iter(self.process.stdout.readline, b"")
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def splitTag(reference):
+    """
+    Splits an image reference into its repository and tag
+
+    Parameters:
+
+    str reference - The image reference, e.g. localhost:5000/repo:tag
+
+    Returns:
+
+    tuple parts - (repository, tag), with the tag defaulting to latest
+    """
+    repo, separator, tag = reference.rpartition(":")
+    if not separator or "/" in tag:
+        return reference, "latest"
+    return repo, tag
+
+
+def errorMessage(data):
+    """
+    Extracts the message of a daemon error response
+    """
+    try:
+        return json.loads(data.decode("utf-8"))["message"]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return data.decode("utf-8", "replace").strip() if data else ""
+
+
+def isLocal(dockerHost=None):
+    """
+    Determines whether the daemon runs on this machine
+
+    Parameters:
+
+    str dockerHost - The daemon endpoint (default: $DOCKER_HOST or the local socket)
+
+    Returns:
+
+    bool local - True for unix sockets and the loopback addresses, False
+                 for other hosts and for docker contexts other than default
+    """
+    if dockerHost is None:
+        context = os.environ.get("DOCKER_CONTEXT")
+        if context and not os.environ.get("DOCKER_HOST"):
+            return context == "default"
+        dockerHost = os.environ.get("DOCKER_HOST", "unix://" + DEFAULT_SOCKET)
+
+    parsed = urllib.parse.urlparse(dockerHost)
+    if parsed.scheme in ("unix", "npipe"):
+        return True
+    return parsed.scheme in ("tcp", "http", "https") and \
+        parsed.hostname in ("localhost", "127.0.0.1", "::1")
+
+
+def endpoint():
+    """
+    Identifies the daemon selected by the environment
+
+    Parameters: None
+
+    Returns:
+
+    str endpoint - $DOCKER_HOST, context:<name> for a docker context,
+                   or "" for the local socket
+    """
+    dockerHost = os.environ.get("DOCKER_HOST")
+    if dockerHost:
+        return "" if dockerHost == "unix://" + DEFAULT_SOCKET else dockerHost
+    context = os.environ.get("DOCKER_CONTEXT")
+    if context and context != "default":
+        return "context:" + context
+    return ""
+
+
+def deploymentName(name):
+    """
+    Qualifies the name of a deployment with the daemon it runs on,
+    so the deployments of different hosts are kept apart
+
+    Parameters:
+
+    str name - The name of the deployment (the keycloak container name)
+
+    Returns:
+
+    str deploymentName - The name, followed by @ and the endpoint
+                         unless the daemon is the local socket
+    """
+    daemon = endpoint()
+    return name + "@" + daemon if daemon else name
+
+
+def onEndpoint(deploymentName):
+    """
+    Determines whether a deployment was made to the selected daemon
+
+    Parameters:
+
+    str deploymentName - The name returned by deploymentName
+
+    Returns:
+
+    bool selected - True if the deployment belongs to endpoint()
+    """
+    return deploymentName.partition("@")[2] == endpoint()
+
+
+def connect(dockerHost=None, forceCli=False):
+    """
+    Returns the client to use for the Docker daemon
+
+    The engine client is used when the daemon answers on its
+    unix socket or TCP endpoint with an API version the client 
+    supports; the command-line client otherwise, including when 
+    $DOCKER_CONTEXT selects the daemon. Falling back from an
+    endpoint the engine client could use prints a warning
+
+    Parameters:
+
+    str dockerHost - The daemon endpoint (default: $DOCKER_HOST or the local socket)
+    bool forceCli - Always use the command-line client
+
+    Returns:
+
+    object client - An engine or cli client
+    """
+    # a docker context is only understood by the docker program
+    if dockerHost is None and os.environ.get("DOCKER_CONTEXT") and not os.environ.get("DOCKER_HOST"):
+        forceCli = True
+    if dockerHost is None:
+        dockerHost = os.environ.get("DOCKER_HOST", "unix://" + DEFAULT_SOCKET)
+    if forceCli:
+        return cli()
+
+    parsed = urllib.parse.urlparse(dockerHost)
+    if parsed.scheme == "unix":
+        client = engine(socketPath=parsed.path)
+    elif parsed.scheme in ("tcp", "http"):
+        client = engine(host=parsed.hostname, port=parsed.port or 2375)
+    else:
+        return cli()
+
+    if not client.ping():
+        reason = "the daemon does not answer"
+    else:
+        try:
+            client.negotiate()
+            return client
+        except (engineError, OSError, http.client.HTTPException) as error:
+            reason = str(error)
+    client.close()
+    print("Warning: cannot use the {0} ({1}), using the docker program instead".format(
+        client.describe(), reason), file=sys.stderr)
+    return cli()
@@ -1,27 +1,117 @@
 var http = require ('http');
+var parseURL = require ('url').parse;
 var request = require ('request')
 var config = require ('./config.json')
 
+// one pool of keep-alive connections to funnel shared by every request
+var agent = new http.Agent({
+    keepAlive: config.keepAlive !== false,
+    keepAliveMsecs: config.keepAliveMsecs || 1000,
+    maxSockets: config.maxSockets || 16
+});
+
+// the seconds the worker and job lists are served from the cache
+// and the largest list kept in it
+var listCacheTTL = config.listCacheTTL === undefined ? 2 : config.listCacheTTL;
+var listCacheMaxBytes = config.listCacheMaxBytes || 8388608;
+
+// cached list responses by url, and the requests waiting for a list
+// that is being fetched
+var listCache = {};
+var pending = {};
+
+// the options of a request to funnel through the shared agent
+var requestOptions = function (funnelURL) {
+    var options = parseURL(funnelURL);
+    options.agent = agent;
+    return options;
+}
+
+// answers a client with a status, the headers of funnel and a body
+var reply = function (callback, statusCode, headers, body) {
+    callback.writeHead(statusCode, {'Content-Type': headers['content-type'] || 'application/json'});
+    callback.end(body);
+}
+
 // template for getting job, joblist, worker, workerlist, etc info
+// the response of funnel is piped to the client without buffering it
 var getInfo = function (url, callback) {
-    http.get(url, function (response) {
-        var body = '';
-        response.on('data', function(d) {body += d;});
-        response.on('end', function() {callback.send(body)})
-    })
+    http.get(requestOptions(url), function (response) {
+        callback.writeHead(response.statusCode,
+                           {'Content-Type': response.headers['content-type'] || 'application/json'});
+        response.pipe(callback);
+    }).on('error', function (error) {
+        console.log(error.message);
+        callback.writeHead(502, {'Content-Type': 'text/plain'});
+        callback.end(error.message);
+    });
+}
+
+// template for the worker and job lists, which the client polls
+// one request to funnel answers every client asking for the list
+// within the TTL, lists too large to cache are only piped through
+var getList = function (url, callback) {
+    var cached = listCache[url];
+    if (cached && Date.now() < cached.expires) {
+        reply(callback, cached.statusCode, cached.headers, cached.body);
+        return;
+    }
+    if (pending[url]) {
+        pending[url].push(callback);
+        return;
+    }
+    pending[url] = [callback];
+
+    http.get(requestOptions(url), function (response) {
+        var waiting = pending[url];
+        var chunks = [];
+        var length = 0;
+        delete pending[url];
+        waiting.forEach(function (client) {
+            client.writeHead(response.statusCode,
+                             {'Content-Type': response.headers['content-type'] || 'application/json'});
+        });
+        response.on('data', function (chunk) {
+            waiting.forEach(function (client) {client.write(chunk);});
+            length += chunk.length;
+            if (length <= listCacheMaxBytes) {
+                chunks.push(chunk);
+            }
+        });
+        response.on('end', function () {
+            waiting.forEach(function (client) {client.end();});
+            if (response.statusCode == 200 && length <= listCacheMaxBytes && listCacheTTL > 0) {
+                listCache[url] = {statusCode: response.statusCode, headers: response.headers,
+                                  body: Buffer.concat(chunks, length),
+                                  expires: Date.now() + listCacheTTL * 1000};
+            }
+        });
+    }).on('error', function (error) {
+        var waiting = pending[url] || [];
+        delete pending[url];
+        console.log(error.message);
+        waiting.forEach(function (client) {
+            reply(client, 502, {'content-type': 'text/plain'}, error.message);
+        });
+    });
+}
+
+// the job list changes once a job is submitted or deleted
+var invalidateJobs = function () {
+    delete listCache[config.funnelURL + '/v1/tasks'];
 }
 
 // worker and worker list
 exports.getWorkerList = function (callback) {
     var url = config.funnelURL + '/v1/funnel/workers';
     console.log (url);
-    getInfo (url, callback);
+    getList (url, callback);
 }
 
 // job and job list
 exports.getJobList = function (callback) {    
     var url = config.funnelURL + '/v1/tasks';
-    getInfo (url, callback);
+    getList (url, callback);
 }
 
 exports.getJob = function (job_id, callback) {
@@ -35,9 +125,11 @@ exports.deleteJob = function (job_id) {
     console.log (url);
     var options = {
         url: url,
-        method: 'DELETE'
+        method: 'DELETE',
+        agent: agent
     }    
     request(options, function (error, response, body) {
+        invalidateJobs();
         if (!error && response.statusCode == 200) {
             console.log(body)
         }
@@ -58,9 +150,11 @@ exports.submitJob = function (data) {
         url: funnelURL,
         method: 'POST',
         headers: headers,
-        body: data
+        body: data,
+        agent: agent
     }    
     request(options, function (error, response, body) {
+        invalidateJobs();
         if (!error && response.statusCode == 200) {
             // Print out the response body
             console.log(body)
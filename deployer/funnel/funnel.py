@@ -1,20 +1,72 @@
-import subprocess
-import pkg_resources
 import json
+import sys
+import time
+
+from .. import engine
+from .. import paths
+from .. import readiness
+from .. import reconcile
+from .. import render
+from .. import scheduler
+from .. import trace
 
 class funnel:
     """
     The funnel subdeployer to manage funnel deployment via Docker
     """
-    def __init__(self):
+    def __init__(self, readinessEngine=None, dockerClient=None, configRenderer=None):
         """
         Constructor for the funnel subdeployer
 
         Determines paths to coordinate deployment
+
+        Parameters:
+
+        readiness readinessEngine - The engine polling the started server
+                                    (default: a private engine)
+        object dockerClient - The client of the Docker daemon
+                              (default: engine.connect())
+        render.renderer configRenderer - The rendering layer holding the endpoints
+                                         (default: a private renderer)
         """
-        self.pkgName = __name__
-        funnelPath = '/'.join(('.'))
-        self.funnelDir = pkg_resources.resource_filename(self.pkgName, funnelPath)
+        self.funnelDir = paths.resource(__package__)
+
+        # the hash of the desired container and what was done with it:
+        # "kept", "recreated" or "created"
+        self.specHash = None
+        self.action = None
+
+        # the ID of the container created by the create step
+        self.containerId = None
+
+        # whether the image was "cached" or "built", and 
+        # the build step in progress and the timings of finished steps
+        self.build = None
+        self.buildStep = None
+        self.buildTimes = []
+
+        # the location of the funnel client configuration inside the container
+        # and the rendered (path, bytes) tuples to inject into it
+        self.keycloakPath = "/home/funnel-node/node-client/keycloak.json"
+        self.configFiles = []
+
+        # the rendered keycloak.json in the output directory
+        self.renderedName = None
+
+        # the rendering layer shared with the other subdeployers
+        if configRenderer is None:
+            configRenderer = render.renderer()
+        self.render = configRenderer
+
+        # the client of the docker daemon
+        if dockerClient is None:
+            dockerClient = engine.connect()
+        self.docker = dockerClient
+
+        # the engine polling the server once it has started
+        if readinessEngine is None:
+            readinessEngine = readiness.readiness()
+        self.readiness = readinessEngine
 
     def route(self, args):
         """
@@ -27,15 +79,49 @@ class funnel:
 
         argparse.Namespace args - command-line arguments object
         """
+        # run the funnel steps on their own
+        with trace.span("funnel.route"):
+            funnelScheduler = scheduler.scheduler()
+            funnelScheduler.addSteps(self.steps(args))
+            funnelScheduler.run()
+
+    def steps(self, args):
+        """
+        Lists the deployment steps of funnel for the scheduler
+
+        The image does not hold the funnel keycloak.json, which is 
+        injected into the created container, so the build runs 
+        alongside the configuration
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns:
+
+        list steps - (name, function, dependencies) tuples
+        """
         # deploy funnel if selected
-        if args.funnel:
-            # configure the funnel setup based on args
-            self.config(args)
-            # run the Docker container
-            self.deployDocker(args.funnelImageName, 
-                              args.funnelContainerName, 
-                              args.funnelPort)
+        if not args.funnel:
+            return []
 
+        return [
+            # configure the funnel setup based on args
+            ("funnel.config", lambda: self.config(args), []),
+            # build and run the Docker container
+            ("funnel.build", lambda: self.buildDocker(args.funnelImageName), []),
+            ("funnel.reconcile", lambda: self.reconcileDocker(args), 
+             ["funnel.build", "funnel.config"]),
+            ("funnel.create", lambda: self.createDocker(args.funnelImageName, 
+                                                        args.funnelContainerName, 
+                                                        args.funnelPort), 
+             ["funnel.reconcile"]),
+            ("funnel.copy", lambda: self.copyDocker(args.funnelContainerName), 
+             ["funnel.create"]),
+            ("funnel.start", lambda: self.start(args), 
+             ["funnel.copy"]),
+            ("funnel.ready", self.ready, 
+             ["funnel.start", scheduler.optional("keycloak.ready")])]
 
     def deployDocker(self, funnelImageName, funnelContainerName, funnelPort):
         """
@@ -49,22 +135,226 @@ class funnel:
 
         Returns: None
         """
-        build = ["docker", "build", "-t", funnelImageName, self.funnelDir]
-        subprocess.call(build)
+        self.buildDocker(funnelImageName)
+        self.createDocker(funnelImageName, funnelContainerName, funnelPort)
+        self.copyDocker(funnelContainerName)
+        self.startDocker(funnelContainerName)
+
+    def buildDocker(self, funnelImageName):
+        """
+        Builds the funnel server image unless it is up to date
+
+        The image is labelled with the hash of its build context:
+        the Dockerfile and the files it copies. The build is skipped
+        when the image carries the hash of the current context
+
+        Parameters:
+
+        string funnelImageName
+
+        Returns: None
+        """
+        buildHash = reconcile.contextHash(self.funnelDir)
+        inspection = self.docker.inspectImage(funnelImageName)
+        if inspection is not None:
+            imageLabels = inspection.get("Config", {}).get("Labels") or {}
+            if imageLabels.get(reconcile.BUILD_LABEL) == buildHash:
+                print("Funnel image " + funnelImageName + " is up to date")
+                self.build = "cached"
+                return
+
+        # stream the build output as the daemon produces it
+        self.buildTimes = []
+        self.docker.buildImage(funnelImageName, self.funnelDir, 
+                               {reconcile.BUILD_LABEL: buildHash}, 
+                               callback=self.buildOutput)
+        self.finishStep(time.time())
+        self.build = "built"
+
+        # show the slowest steps of the build
+        print("\nSlowest funnel build steps:")
+        for step, seconds in sorted(self.buildTimes, key=lambda timing: -timing[1])[:5]:
+            print("{0:8.1f}s  {1}".format(seconds, step))
+
+    def buildOutput(self, message):
+        """
+        Writes a progress message of the image build to stdout
+
+        Each "Step N/M" line ends the previous step, 
+        whose duration is printed after its output
+
+        Parameters:
+
+        dict message - A JSON message of the build stream
+
+        Returns: None
+        """
+        text = message.get("stream")
+        if not text:
+            return
+        if text.startswith("Step "):
+            self.finishStep(time.time())
+            self.buildStep = (text.strip(), time.time())
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def finishStep(self, now):
+        """
+        Records the duration of the build step in progress
+
+        Parameters:
+
+        float now - The time the step finished at
+
+        Returns: None
+        """
+        if self.buildStep is None:
+            return
+        step, started = self.buildStep
+        self.buildTimes.append((step, now - started))
+        self.buildStep = None
+        print(" ---> {0:.1f}s".format(now - started))
+
+    def createDocker(self, funnelImageName, funnelContainerName, funnelPort):
+        """
+        Creates the funnel server container without starting it
+
+        Parameters:
+
+        string funnelImageName
+        string funnelContainerName
+        string funnelPort
+
+        Returns: None
+        """
+        # leave an unchanged running container as it is
+        if self.action == "kept":
+            return
 
         # We must allow Funnel to call Docker 
         # from inside one of Docker's container
         # Hence we bind one of docker's sockets into its own container
-        run = ["docker", "run", 
-               "-v", "/var/run/docker.sock:/var/run/docker.sock", 
-               "-p", funnelPort + ":3002", 
-               "--name", funnelContainerName, funnelImageName]
-        subprocess.Popen(run)
+        labels = None
+        if self.specHash is not None:
+            labels = reconcile.labels("funnel", self.specHash)
+        self.containerId = self.docker.createContainer(
+            funnelContainerName, funnelImageName, {"3002": funnelPort}, labels=labels, 
+            binds=["/var/run/docker.sock:/var/run/docker.sock"])
+
+    def spec(self, args):
+        """
+        Returns the desired specification of the funnel container
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns:
+
+        dict spec - The image ID, ports, volumes and the hash of the configuration
+        """
+        return {"image": reconcile.imageId(self.docker, args.funnelImageName), 
+                "ports": {"3002": args.funnelPort}, 
+                "volumes": ["/var/run/docker.sock:/var/run/docker.sock"], 
+                "config": reconcile.contentHash([data for path, data in self.configFiles])}
+
+    def reconcileDocker(self, args):
+        """
+        Decides whether the funnel container must be (re)created
+
+        Without --reconcile the container was already removed by
+        the deployer and is always created
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns: None
+        """
+        self.specHash = reconcile.specHash(self.spec(args))
+        if args.reconcile:
+            self.action = reconcile.reconcile(self.docker, args.funnelContainerName, self.specHash)
+        else:
+            self.action = "created"
+
+    def copyDocker(self, funnelContainerName):
+        """
+        Injects the keycloak.json of the funnel client into the container
+
+        Parameters:
+
+        string funnelContainerName
+
+        Returns: None
+        """
+        # an unchanged running container already holds the configuration
+        if self.action == "kept":
+            return
+
+        self.docker.copyFiles(funnelContainerName, self.configFiles)
+
+    def startDocker(self, funnelContainerName):
+        """
+        Starts the funnel server container
+
+        Parameters:
+
+        string funnelContainerName
+
+        Returns: None
+        """
+        if self.action == "kept":
+            return
+
+        self.docker.startContainer(funnelContainerName)
+
+    def start(self, args):
+        """
+        Starts the funnel server and begins polling it for readiness
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns: None
+        """
+        self.startDocker(args.funnelContainerName)
+        self.readiness.watch(self.probe(args))
+
+    def probe(self, args):
+        """
+        Returns the readiness probe of the funnel node-client server
+
+        The node-client only listens once its npm dependencies
+        are installed and the bundle has been built
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns:
+
+        readiness.probe funnelProbe - The probe of the funnel node port
+        """
+        return readiness.probe("funnel", args.funnelIP, args.funnelPort, 
+                               "/", None, args.readyTimeout)
+
+    def ready(self):
+        """
+        Waits until the funnel node-client answers HTTP requests
+
+        Returns: None
+        """
+        # wait until the node-client answers
+        self.readiness.wait("funnel")
 
 
     def config(self, args):
         """
-        Writes the keycloak.json file for the funnel client
+        Renders the keycloak.json file for the funnel client
+
+        The file is written to the output directory of the deployment
+        and kept in memory to be injected into the container
 
         Parameters:
 
@@ -73,20 +363,57 @@ class funnel:
 
         Returns: None
         """
-        fileName = self.funnelDir + "/funnel-node/node-client/keycloak.json"
+        model = self.render.endpoints(args)
 
-        authUrl = "http://" + args.keycloakIP + ":" + args.keycloakPort + "/auth"
-        redirectList = [ "http://" + args.funnelIP + ":" + args.funnelPort + "/oidc_callback" ]
         secretDict = { "secret" : args.funnelSecret } 
 
         keycloakData = { "realm" : args.realmName, 
-                         "auth-server-url": authUrl, 
+                         "auth-server-url": model.authUrl, 
                          "resource" : args.funnelID, 
-                         "redirect_uris" : redirectList, 
+                         "redirect_uris" : [ model.funnelRedirect ], 
                          "credentials" : secretDict }
 
-        jsonData = json.dumps(keycloakData, indent=1)
+        jsonData = json.dumps(keycloakData, indent=1).encode("utf-8")
 
-        fileHandle = open(fileName, "w")
-        fileHandle.write(jsonData)
-        fileHandle.close()
+        self.renderedName = self.render.write(args, "funnel/keycloak.json", jsonData)
+        self.configFiles = [(self.keycloakPath, jsonData)]
+
+    def deployed(self, args):
+        """
+        Describes the deployed server for the state store
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns:
+
+        list records - One dict for the container (see keycloak.deployed)
+        """
+        return [{"service": "funnel", "name": args.funnelContainerName, "kind": "container", 
+                 "containerId": self.containerId, "image": args.funnelImageName, 
+                 "specHash": self.specHash, "port": args.funnelPort, "action": self.action}]
+
+    def rendered(self):
+        """
+        Returns the rendered configuration recorded by a deployment plan
+
+        Returns:
+
+        dict state - files: the rendered keycloak.json
+        """
+        return {"files": [self.renderedName]}
+
+    def restore(self, state):
+        """
+        Restores the configuration rendered when a plan was compiled
+
+        Parameters:
+
+        dict state - The state returned by rendered
+
+        Returns: None
+        """
+        self.renderedName = state["files"][0]
+        with open(self.renderedName, "rb") as jsonHandle:
+            self.configFiles = [(self.keycloakPath, jsonHandle.read())]
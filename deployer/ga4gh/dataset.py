@@ -0,0 +1,169 @@
+"""
+The ga4gh data source mounted into the ga4gh servers
+
+Instead of the compliance data baked into the image, a host directory
+or a named docker volume holding a registry.db and the files it
+refers to can be mounted read-only at DATA_MOUNT in every ga4gh
+container. The replicas then share one copy of the data (and of its
+pages in the page cache), and the dataset changes without a new image
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+
+# where the data source is mounted inside the ga4gh containers
+DATA_MOUNT = "/srv/ga4gh-data"
+
+# the repository registry of the ga4gh server in the data source
+REGISTRY_NAME = "registry.db"
+
+# the tables every ga4gh repository registry holds
+REGISTRY_TABLES = ("system", "dataset")
+
+
+class dataError(Exception):
+    """
+    Raised when the ga4gh data source is missing or holds no valid registry
+    """
+
+
+def isDirectory(source):
+    """
+    Determines whether a data source is a host directory or a volume name
+
+    Parameters:
+
+    str source - The value of --ga4gh-data
+
+    Returns:
+
+    bool directory - True for paths, False for docker volume names
+    """
+    return os.sep in source or source.startswith(".") or os.path.isdir(source)
+
+
+def bind(source):
+    """
+    Returns the read-only binding of a data source for a container
+
+    Parameters:
+
+    str source - A host directory or a docker volume name
+
+    Returns:
+
+    str bind - source:DATA_MOUNT:ro
+    """
+    if isDirectory(source):
+        source = os.path.abspath(source)
+    return source + ":" + DATA_MOUNT + ":ro"
+
+
+def dataSource():
+    """
+    Returns the DATA_SOURCE of the ga4gh configuration for a mounted data source
+
+    Returns:
+
+    str path - The registry inside the containers
+    """
+    return DATA_MOUNT + "/" + REGISTRY_NAME
+
+
+def checkRegistry(directory):
+    """
+    Checks that a host directory holds a ga4gh repository registry
+
+    The registry is opened read-only, so checking it neither locks
+    it against the running servers nor changes it
+
+    Parameters:
+
+    str directory - The data directory
+
+    Returns:
+
+    str version - The schema version of the registry
+
+    Raises:
+
+    dataError - If the registry is missing, is not an SQLite
+                database or lacks the tables of a ga4gh registry
+    """
+    fileName = os.path.join(directory, REGISTRY_NAME)
+    if not os.path.isfile(fileName):
+        raise dataError("The ga4gh data directory " + directory + " holds no " + REGISTRY_NAME)
+    return checkFile(fileName)
+
+
+def checkCopy(content, source):
+    """
+    Checks a copy of the registry of a data source read through the
+    docker daemon, such as a volume or a directory of a remote host
+
+    Parameters:
+
+    bytes content - The registry read out of a container, or None if missing
+    str source - The value of --ga4gh-data
+
+    Returns:
+
+    str version - The schema version of the registry
+
+    Raises:
+
+    dataError - If the registry is missing or invalid
+    """
+    if content is None:
+        raise dataError("The ga4gh data source " + source + " holds no " + REGISTRY_NAME)
+
+    copyDir = tempfile.mkdtemp()
+    try:
+        fileName = os.path.join(copyDir, REGISTRY_NAME)
+        with open(fileName, "wb") as registryHandle:
+            registryHandle.write(content)
+        return checkFile(fileName, source + ":" + REGISTRY_NAME)
+    finally:
+        shutil.rmtree(copyDir)
+
+
+def checkFile(fileName, label=None):
+    """
+    Checks that an SQLite file is a ga4gh repository registry
+
+    Parameters:
+
+    str fileName - The registry file
+    str label - The name of the registry in errors (default: fileName)
+
+    Returns:
+
+    str version - The schema version of the registry
+
+    Raises:
+
+    dataError - If the file is not an SQLite database or lacks
+                the tables of a ga4gh registry
+    """
+    label = label or fileName
+    try:
+        connection = sqlite3.connect("file:" + fileName + "?mode=ro", uri=True)
+        try:
+            tables = set(row[0].lower() for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"))
+            missing = [table for table in REGISTRY_TABLES if table not in tables]
+            if missing:
+                raise dataError(label + " is not a ga4gh registry (no " +
+                                ", ".join(missing) + " table)")
+            version = connection.execute(
+                "SELECT value FROM system WHERE key = 'schemaVersion'").fetchone()
+        finally:
+            connection.close()
+    except sqlite3.DatabaseError as error:
+        raise dataError(label + " is not a ga4gh registry: " + str(error))
+
+    if version is None:
+        raise dataError(label + " records no schema version")
+    return version[0]
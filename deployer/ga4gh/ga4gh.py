@@ -1,10 +1,22 @@
 import subprocess
 import shutil
 import os
-import pkg_resources
 import json
 import yaml
 
+from .. import artifacts
+from .. import engine
+from .. import images
+from .. import paths
+from .. import ports
+from .. import readiness
+from .. import reconcile
+from .. import render
+from .. import scheduler
+from .. import trace
+from . import dataset
+from . import tuning
+
 
 class ga4gh:
     """
@@ -14,35 +26,99 @@ class ga4gh:
     or singularity container based on the arguments provided
     """
 
-    def __init__(self):
+    def __init__(self, readinessEngine=None, imageCache=None, artifactCache=None, dockerClient=None, 
+                 configRenderer=None):
         """
         Constructor for the GA4GH subdeployer
 
         Sets the paths to coordinate deployment
-        """
-        # establish relative directory names
-        # for inclusion of files
-        pkgName = __name__
 
-        # determine the ga4gh subdeployer directory
-        ga4ghPath = '/'.join(('.'))
-        self.ga4ghDir = pkg_resources.resource_filename(pkgName, ga4ghPath)
+        Parameters:
 
-        # get the location of the local subdeployer client_secrets file
-        secretPath = '/'.join(('.', 'config', 'client_secrets.json'))
-        self.secretName = pkg_resources.resource_filename(pkgName, secretPath)
+        readiness readinessEngine - The engine polling the started server
+                                    (default: a private engine)
+        images imageCache - The digest cache resolving the docker image
+                            (default: a private cache)
+        artifacts artifactCache - The cache holding the singularity image
+                                  (default: a private cache)
+        object dockerClient - The client of the Docker daemon
+                              (default: engine.connect())
+        render.renderer configRenderer - The rendering layer holding the endpoints
+                                         (default: a private renderer)
+        """
+        # determine the ga4gh subdeployer directory
+        self.ga4ghDir = paths.resource(__package__)
 
         # get the ga4gh-server source code directory location
-        ga4ghSource = '/'.join(('.', 'ga4gh-server'))
-        self.sourceName = pkg_resources.resource_filename(pkgName, ga4ghSource)
+        self.sourceName = paths.resource(__package__, 'ga4gh-server')
+
+        # get the location of the oidc_config.yml template
+        self.oidcConfigName = paths.resource(__package__, 'config', 'oidc_config.yml')
+
+        # the templates of the rendered configuration, part of the plan key
+        self.templates = [self.oidcConfigName]
+
+        # the path of the ga4gh singularity image in the artifact cache
+        self.imgName = None
+
+        # the docker image holding the ga4gh server
+        self.imageRepo = "dalos/docker-ga4gh"
+
+        # the location of the directory to which the pip installation is located
+        self.configDir = "/usr/local/lib/python2.7/dist-packages/ga4gh/server/config"
+
+        # the rendered configuration files to inject into the docker container
+        # as (path inside the container, bytes) tuples, and the rendered 
+        # oidc_config.yml read by the singularity container
+        self.configFiles = []
+        self.renderedOidcName = None
+
+        # the rendered files in the output directory, recorded by deployment plans
+        self.renderedFiles = []
+
+        # the singularity process started by the start step
+        self.process = None
+
+        # the hash of the desired container of each replica and what 
+        # was done with it: "kept", "recreated" or "created"
+        self.specHashes = {}
+        self.actions = {}
 
-        # get the location of oidc_config.yml
-        configPath = '/'.join(('.', 'config', 'oidc_config.yml'))
-        self.oidcConfigName = pkg_resources.resource_filename(pkgName, configPath)
+        # the IDs of the containers created by the create steps
+        self.containerIds = {}
 
-        # get the path of the ga4gh singularity image
-        imgPath = '/'.join(('.', 'ga4gh.simg'))
-        self.imgName = pkg_resources.resource_filename(pkgName, imgPath)
+        # the read-only binding of the data source shared by the replicas
+        self.binds = []
+
+        # the container command running the mod_wsgi workers of the
+        # performance profile (None keeps the command of the image)
+        self.command = None
+
+        # the client of the docker daemon
+        if dockerClient is None:
+            dockerClient = engine.connect()
+        self.docker = dockerClient
+
+        # the engine polling the server once it has started
+        if readinessEngine is None:
+            readinessEngine = readiness.readiness()
+        self.readiness = readinessEngine
+
+        # the digest cache and the digest resolved by the pull step
+        if imageCache is None:
+            imageCache = images.images(dockerClient=self.docker)
+        self.images = imageCache
+        self.digest = None
+
+        # the cache holding the singularity image
+        if artifactCache is None:
+            artifactCache = artifacts.artifacts()
+        self.artifacts = artifactCache
+
+        # the rendering layer shared with the other subdeployers
+        if configRenderer is None:
+            configRenderer = render.renderer()
+        self.render = configRenderer
 
 
     def route(self, args):
@@ -55,14 +131,189 @@ class ga4gh:
 
         Returns: None
         """
+        # run the ga4gh steps on their own
+        with trace.span("ga4gh.route"):
+            ga4ghScheduler = scheduler.scheduler()
+            ga4ghScheduler.addSteps(self.steps(args))
+            ga4ghScheduler.run()
+
+    def steps(self, args):
+        """
+        Lists the deployment steps of the ga4gh server for the scheduler
+
+        The server only becomes usable once Keycloak is ready,
+        so its ready step depends on keycloak.ready
+
+        With --ga4gh-replicas, each replica has its own create,
+        copy and start steps so that the replicas start in parallel.
+        Their ports are allocated before any step runs, as the
+        realm rendered by keycloak.config registers all of them,
+        unless args.ga4ghPorts already holds the ports of every
+        replica (e.g. restored from a deployment plan)
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
+
+        Returns:
+
+        list steps - (name, function, dependencies) tuples
+        """
+        # choose the values of the performance profile once, 
+        # so that they are recorded in the plan
+        if args.ga4ghTuning is None:
+            self.resolveTuning(args)
+
         # configure configuration files first
-        self.config(args)
+        steps = [("ga4gh.config", lambda: self.config(args), [])]
+
+        # check the mounted data source before any server starts
+        # a volume or a remote directory is read from a container of the image
+        dataSteps = []
+        if args.ga4ghData:
+            local = args.singularity or (dataset.isDirectory(args.ga4ghData) and engine.isLocal())
+            steps.append(("ga4gh.data", lambda: self.checkData(args), 
+                          [] if local else ["ga4gh.pull"]))
+            dataSteps = ["ga4gh.data"]
 
         # deploy by singularity or docker
         if args.singularity:
-            self.deploySingularity(args)
+            steps += [
+                ("ga4gh.fetch", lambda: self.fetchSingularity(args), []),
+                ("ga4gh.start", lambda: self.start(args), 
+                 ["ga4gh.fetch", "ga4gh.config"] + dataSteps)]
+            startSteps = ["ga4gh.start"]
         else:
-            self.deployDocker(args.ga4ghContainerName, args.ga4ghPort)
+            if len(args.ga4ghPorts) != int(args.ga4ghReplicas):
+                self.allocatePorts(args)
+            self.binds = [dataset.bind(args.ga4ghData)] if args.ga4ghData else []
+            self.command = tuning.command(args.ga4ghTuning)
+            steps += [
+                ("ga4gh.pull", lambda: self.pullDocker(args.ga4ghDigest), []),
+                ("ga4gh.reconcile", lambda: self.reconcileDocker(args), 
+                 ["ga4gh.pull", "ga4gh.config"] + dataSteps)]
+            startSteps = []
+            for index, (containerName, port) in enumerate(self.replicas(args)):
+                steps += self.replicaSteps(args, index, containerName, port)
+                startSteps.append(stepName("start", index))
+
+        # keycloak is not part of the schedule when ga4gh is routed alone
+        steps.append(("ga4gh.ready", lambda: self.ready(args), 
+                      startSteps + [scheduler.optional("keycloak.ready")]))
+        return steps
+
+    def resolveTuning(self, args):
+        """
+        Chooses the values of the ga4gh performance profile
+
+        auto derives them from the CPUs and memory of the docker host 
+        (of this machine with --singularity), shared by the replicas.
+        The values are stored in args.ga4ghTuning
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
+
+        Returns: None
+        """
+        def resources():
+            if args.singularity:
+                return tuning.localResources()
+            info = self.docker.info()
+            return info["NCPU"], info["MemTotal"]
+
+        with trace.span("ga4gh.tuning", profile=args.ga4ghProfile):
+            args.ga4ghTuning = tuning.resolve(args.ga4ghProfile, resources, 
+                                              int(args.ga4ghReplicas))
+
+    def replicaSteps(self, args, index, containerName, port):
+        """
+        Lists the steps creating and starting one ga4gh container
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
+        int index - The position of the replica
+        str containerName - The name of the replica container
+        str port - The host port of the replica
+
+        Returns:
+
+        list steps - (name, function, dependencies) tuples
+        """
+        group = args.ga4ghContainerName
+        return [
+            (stepName("create", index), lambda: self.createDocker(containerName, port, group), 
+             ["ga4gh.reconcile"]),
+            (stepName("copy", index), lambda: self.copyDocker(containerName), 
+             [stepName("create", index)]),
+            (stepName("start", index), lambda: self.startReplica(args, index), 
+             [stepName("copy", index)])]
+
+    def replicaNames(self, args):
+        """
+        Returns the container names of the ga4gh replicas
+
+        The first replica keeps the configured container name,
+        the others append their number to it (e.g. ga4gh_candig_2)
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
+
+        Returns:
+
+        list names - The container names
+        """
+        names = [args.ga4ghContainerName]
+        for number in range(2, int(args.ga4ghReplicas) + 1):
+            names.append(args.ga4ghContainerName + "_" + str(number))
+        return names
+
+    def replicas(self, args):
+        """
+        Returns the container names and ports of the ga4gh replicas
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
+
+        Returns:
+
+        list replicas - (container name, host port) tuples
+        """
+        return list(zip(self.replicaNames(args), args.ga4ghPorts))
+
+    def allocatePorts(self, args):
+        """
+        Allocates the host ports of the ga4gh replicas
+
+        The first replica uses --ga4gh-port. The other replicas keep
+        the ports their existing containers publish, so that unchanged
+        replicas are kept when reconciling and the ports are stable when
+        the containers are replaced; new replicas receive the next free
+        ports of the docker host, skipping the ports other containers 
+        of its daemon publish. The ports are stored in args.ga4ghPorts
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
+
+        Returns: None
+        """
+        names = self.replicaNames(args)
+        if len(names) == 1:
+            args.ga4ghPorts = [args.ga4ghPort]
+            return
+
+        with trace.span("ga4gh.ports", replicas=len(names)):
+            preferred = [ports.hostPort(self.docker.inspectContainer(name), "8000") 
+                         for name in names]
+            # the ports of the replicas' own containers stay available to them
+            taken = ports.published(self.docker) - set(int(port) for port in preferred if port)
+            args.ga4ghPorts = ports.allocate(args.ga4ghPort, len(names), preferred, 
+                                             [args.keycloakPort, args.funnelPort] + sorted(taken),
+                                             engine.isLocal())
 
     def deployDocker(self, ga4ghContainerName, ga4ghPort):
         """
@@ -78,58 +329,308 @@ class ga4gh:
 
         Returns: None
         """
-        # pull the ga4gh server image from the dalos repository
-        imageRepo = "dalos/docker-ga4gh"
-        pull = ["docker", "pull", imageRepo]
-        subprocess.call(pull)
+        self.pullDocker()
+        self.createDocker(ga4ghContainerName, ga4ghPort)
+        self.copyDocker(ga4ghContainerName)
+        self.startDocker(ga4ghContainerName)
 
-        # create the container
-        create = ["docker", "create", "-p", ga4ghPort + ":8000", 
-               "--name", ga4ghContainerName, imageRepo]
-        subprocess.call(create)
+    def pullDocker(self, pinned=None):
+        """
+        Makes the pre-built ga4gh server image available locally
 
-        # the location of the directory to which the pip installation is located
-        configDir = "/usr/local/lib/python2.7/dist-packages/ga4gh/server/config"
+        The image is only pulled when neither the pinned digest
+        nor the cached digest is present
+
+        Parameters:
+
+        str pinned - The digest the image must resolve to
+
+        Returns: None
+        """
+        self.digest = self.images.resolve(self.imageRepo, pinned)
+
+    def imageReference(self):
+        """
+        Returns the image reference to create the container from
+
+        Returns:
+
+        str reference - The repository at the resolved digest
+        """
+        if self.digest:
+            return self.imageRepo + "@" + self.digest
+        return self.imageRepo
+
+    def createDocker(self, ga4ghContainerName, ga4ghPort, group=None):
+        """
+        Creates the ga4gh server container without starting it
+
+        Parameters:
+
+        str ga4ghContainerName - the Docker container name holding the ga4gh server
+        str ga4ghPort - The port number of the ga4gh server
+        str group - The name of the first replica, labelling every replica
+
+        Returns: None
+        """
+        # leave an unchanged running container as it is
+        if self.actions.get(ga4ghContainerName) == "kept":
+            return
+
+        # create the container labelled with the hash of its specification
+        labels = None
+        if ga4ghContainerName in self.specHashes:
+            labels = reconcile.labels("ga4gh", self.specHashes[ga4ghContainerName], group)
+        self.containerIds[ga4ghContainerName] = self.docker.createContainer(
+            ga4ghContainerName, self.imageReference(), {"8000": ga4ghPort}, labels=labels, 
+            binds=self.binds, command=self.command)
+
+    def spec(self, ga4ghPort):
+        """
+        Returns the desired specification of a ga4gh container
+
+        Parameters:
+
+        str ga4ghPort - The host port of the container
+
+        Returns:
+
+        dict spec - The image, ports, configuration hash and the 
+                    binding of the data source and the command, if any
+        """
+        spec = {"image": self.imageReference(), 
+                "ports": {"8000": ga4ghPort}, 
+                "config": reconcile.contentHash([data for path, data in self.configFiles])}
+        if self.binds:
+            spec["binds"] = self.binds
+        if self.command:
+            spec["command"] = self.command
+        return spec
+
+    def reconcileDocker(self, args):
+        """
+        Decides whether each ga4gh container must be (re)created
+
+        Without --reconcile the containers were already removed by
+        the deployer and are always created. With it, containers 
+        of a larger replica set deployed before are removed
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
+
+        Returns: None
+        """
+        replicas = self.replicas(args)
+        for containerName, port in replicas:
+            self.specHashes[containerName] = reconcile.specHash(self.spec(port))
+            if args.reconcile:
+                self.actions[containerName] = reconcile.reconcile(self.docker, containerName, 
+                                                                  self.specHashes[containerName])
+            else:
+                self.actions[containerName] = "created"
+
+        if args.reconcile:
+            names = [containerName for containerName, port in replicas]
+            group = {reconcile.GROUP_LABEL: args.ga4ghContainerName}
+            for containerName in self.docker.listContainers(group):
+                if containerName not in names:
+                    self.docker.removeContainer(containerName, force=True)
+
+    def copyDocker(self, ga4ghContainerName):
+        """
+        Copies the client secrets and oidc config into the container
+
+        Every replica receives the same files
+
+        Parameters:
 
-        # write the location of the client secrets to oidc_config.yml
-        self.configOidc(configDir + "/client_secrets.json")
+        str ga4ghContainerName - the Docker container name holding the ga4gh server
+
+        Returns: None
+        """
+        if self.actions.get(ga4ghContainerName) == "kept":
+            return
 
         # copy the client secrets and oidc config into the container
-        copyConfig = ["docker", "cp", self.oidcConfigName, 
-                      "{0}:{1}/oidc_config.yml".format(ga4ghContainerName, configDir)]
-        subprocess.call(copyConfig)
+        # as one archive upload
+        self.docker.copyFiles(ga4ghContainerName, self.configFiles)
+
+    def startDocker(self, ga4ghContainerName):
+        """
+        Starts the ga4gh server container in the background
+
+        Parameters:
+
+        str ga4ghContainerName - the Docker container name holding the ga4gh server
+
+        Returns: None
+        """
+        if self.actions.get(ga4ghContainerName) == "kept":
+            return
+
+        # start the container
+        self.docker.startContainer(ga4ghContainerName)
+
+    def start(self, args):
+        """
+        Starts the ga4gh server and begins polling it for readiness
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
+
+        Returns: None
+        """
+        if args.singularity:
+            self.startSingularity(args)
+            self.readiness.watch(self.probe(args, 0))
+        else:
+            self.startReplica(args, 0)
+
+    def startReplica(self, args, index):
+        """
+        Starts a ga4gh container and begins polling it for readiness
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
+        int index - The position of the replica
+
+        Returns: None
+        """
+        containerName, port = self.replicas(args)[index]
+        self.startDocker(containerName)
+        self.readiness.watch(self.probe(args, index))
+
+    def probe(self, args, index=0):
+        """
+        Returns the readiness probe of a ga4gh server
+
+        Any HTTP answer from Apache, including the redirect 
+        to the Keycloak login page, means the server is up. 
+        Under singularity the probe fails as soon as the server 
+        process exits
+
+        Parameters:
 
-        copySecrets = ["docker", "cp", self.secretName, 
-                       "{0}:{1}/client_secrets.json".format(ga4ghContainerName, configDir)]
-        subprocess.call(copySecrets)
+        argparse.Namespace args - Object with command-line arguments as attributes
+        int index - The position of the replica
+
+        Returns:
 
-        # start the container as a separate background process
-        start = ["docker", "start", ga4ghContainerName]
-        subprocess.Popen(start)
+        readiness.probe ga4ghProbe - The probe of the ga4gh HTTP port
+        """
+        return readiness.probe(probeName(index), args.ga4ghIP, args.ga4ghPorts[index], 
+                               "/", None, args.readyTimeout, 
+                               self.process if args.singularity else None)
 
-    def configOidc(self, path):
+    def ready(self, args):
         """
-        Sets the location of the GA4GH configuration files
-        for client_secrets.json and oidc_config.yml
-        for singularity deployment
+        Waits until every ga4gh server answers HTTP requests
+
+        Parameters:
 
-        Parameters: None
+        argparse.Namespace args - Object with command-line arguments as attributes
 
         Returns: None
         """
-        # open the oidc_config.yml file
-        fileHandle = open(self.oidcConfigName)
-        # read the YAML data
-        yamlData = yaml.load(fileHandle)   
-        # rewrite oidc_config.yml to point 
-        # to the location of client_secrets.json
+        # wait until the servers answer
+        for index in range(len(args.ga4ghPorts)):
+            self.readiness.wait(probeName(index))
+
+    def configOidc(self, path, dataSource=None, tuningValues=None):
+        """
+        Renders oidc_config.yml pointing to the location 
+        of client_secrets.json
+
+        Parameters:
+
+        str path - The location of client_secrets.json
+        str dataSource - The registry of a mounted data source
+                         (default: the compliance data of the image)
+        dict tuningValues - The values of the performance profile
+                            (default: the packaged values)
+
+        Returns:
+
+        bytes oidcData - The contents of oidc_config.yml
+        """
+        # read the YAML data of the oidc_config.yml file
+        with open(self.oidcConfigName) as fileHandle:
+            yamlData = yaml.safe_load(fileHandle)   
+        # point to the location of client_secrets.json
         yamlData['frontend']['OIDC_CLIENT_SECRETS'] = path
-        fileHandle.close()
+        # point both sections to the mounted registry
+        if dataSource:
+            yamlData['frontend']['DATA_SOURCE'] = dataSource
+            yamlData['server']['DATA_SOURCE'] = dataSource
+        # set the debug mode, caches and limits of the performance profile
+        if tuningValues:
+            tuning.apply(yamlData, tuningValues)
+        return yaml.dump(yamlData).encode("utf-8")
+
+    def checkData(self, args):
+        """
+        Checks the data source mounted into the ga4gh servers
+
+        The registry of a host directory is opened read-only and
+        must be a ga4gh registry. A docker volume or the directory
+        of a remote docker host cannot be read from this machine,
+        so its registry is read through the daemon (see readData)
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
 
-        # write the data to the oidc_config.yml file
-        fileHandle = open(self.oidcConfigName, "w")
-        yaml.dump(yamlData, fileHandle)
-        fileHandle.close()
+        Returns: None
+
+        Raises:
+
+        dataset.dataError - If the data source is missing or invalid
+        """
+        with trace.span("ga4gh.data", source=args.ga4ghData) as phase:
+            if dataset.isDirectory(args.ga4ghData):
+                if args.singularity or engine.isLocal():
+                    phase.set(schemaVersion=dataset.checkRegistry(args.ga4ghData))
+                    return
+            elif self.docker.inspectVolume(args.ga4ghData) is None:
+                raise dataset.dataError("The ga4gh data volume " + args.ga4ghData + 
+                                        " does not exist")
+            phase.set(schemaVersion=dataset.checkCopy(self.readData(args), args.ga4ghData))
+
+    def readData(self, args):
+        """
+        Reads the registry of the data source as the daemon mounts it
+
+        A throwaway container of the ga4gh image is created, but not
+        started, with the data source mounted, and the registry is
+        copied out of it
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
+
+        Returns:
+
+        bytes content - The registry, or None if the data source holds none
+
+        Raises:
+
+        dataset.dataError - If the daemon cannot mount or read the data source
+        """
+        containerName = args.ga4ghContainerName + "_datacheck"
+        try:
+            self.docker.removeContainer(containerName, force=True)
+            try:
+                self.docker.createContainer(containerName, self.imageReference(),
+                                            binds=[dataset.bind(args.ga4ghData)])
+                return self.docker.readFile(containerName, dataset.dataSource())
+            finally:
+                self.docker.removeContainer(containerName, force=True)
+        except (OSError, engine.engineError) as error:
+            raise dataset.dataError("The ga4gh data source " + args.ga4ghData + 
+                                    " cannot be read through the docker daemon: " + str(error))
 
     def deploySingularity(self, args):
         """
@@ -143,20 +644,52 @@ class ga4gh:
 
         Returns: None
         """
+        self.fetchSingularity(args)
+        self.startSingularity(args)
+
+    def fetchSingularity(self, args):
+        """
+        Pulls the ga4gh singularity image from singularity hub
+
+        The image is only pulled when it is not in the artifact
+        cache or when the override argument is set
+
+        Parameters:
 
-        # determine if the ga4gh singularity image already exists
-        duplicateImg = os.path.exists(self.imgName)
-        # remove the image if the override argument is set
-        if args.override and duplicateImg:
-            os.remove(self.imgName)
+        argparse.Namespace args - command-line arguments object
+
+        Returns: None
+        """
+        imageKey = "ga4gh/latest"
+
+        # pull the image again if the override argument is set
+        if args.override:
+            self.artifacts.invalidate(imageKey)
+
+        self.imgName = self.artifacts.lookup(imageKey)
+        if self.imgName is None:
+            # pull the singularity ga4gh image from singularity hub
+            # next to the cache and move it into the cache
+            pullName = os.path.join(self.artifacts.runDir, "ga4gh.simg")
+            if os.path.exists(pullName):
+                os.remove(pullName)
+            pull = ["singularity", "pull", "--name", pullName, 
+                    "shub://DaleDupont/singularity-ga4gh:latest"]
+            with trace.span("singularity pull", "process", argv=pull) as phase:
+                subprocess.check_call(pull)
+                phase.set(exitStatus=0, bytesReceived=os.path.getsize(pullName))
+            self.imgName = self.artifacts.insert(imageKey, pullName)
+
+    def startSingularity(self, args):
+        """
+        Runs the ga4gh singularity image in the background
 
-        # pull the singularity ga4gh image from singularity hub
-        subprocess.call(["singularity", "pull", "--name", self.imgName, 
-                         "shub://DaleDupont/singularity-ga4gh:latest"])
+        Parameters:
 
-        # prepare configuration files for singularity deployment
-        self.configOidc(self.secretName)
+        argparse.Namespace args - command-line arguments object
 
+        Returns: None
+        """
         # set the environment variables to use
         # inside the singularity container
         # GA4GH_PORT - Port number of the ga4gh server
@@ -164,20 +697,33 @@ class ga4gh:
         # GA4GH_CONFIG - Absolute location of the oidc_config.yml file
         envList = [("SINGULARITYENV_GA4GH_PORT", args.ga4ghPort), 
                    ("SINGULARITYENV_GA4GH_IP", args.ga4ghIP), 
-                   ("SINGULARITYENV_GA4GH_CONFIG", self.oidcConfigName)]
-        for envVar in envList:
-            os.environ[envVar[0]] = envVar[1]
+                   ("SINGULARITYENV_GA4GH_CONFIG", self.renderedOidcName)]
+
+        # bind the data directory read-only where the configuration expects it
+        if args.ga4ghData:
+            envList.append(("SINGULARITY_BINDPATH", dataset.bind(args.ga4ghData)))
+
+        # the environment is passed to the process rather than
+        # written to os.environ as other steps run concurrently
+        env = dict(os.environ)
+        env.update(envList)
 
         # run the singularity container
         run = ["singularity", "run", self.imgName]
-        subprocess.Popen(run)
+        with trace.span("singularity run", "process", argv=run) as phase:
+            self.process = subprocess.Popen(run, env=env)
+            phase.set(pid=self.process.pid)
 
     def config(self, args):
         """ 
-        Writes the new client_secrets.json file 
+        Renders the client_secrets.json and oidc_config.yml files 
 
         For registration of ga4gh client with keycloak CanDIG realm
 
+        The files are written to the output directory of the deployment,
+        from which singularity deployments read them. Docker deployments
+        also keep them in memory until they are injected into the container
+
         Parameters:
 
         argparse.Namespace args - An object containing the command-line arguments as attributes
@@ -185,30 +731,123 @@ class ga4gh:
         Returns: None
         """
         # set the data to write to client_secrets.json
-        keycloakRootUrl    = "http://" + args.keycloakIP + ":" + args.keycloakPort + "/auth"
-        issuer             = keycloakRootUrl + "/realms/" + args.realmName
-        openidUri          =  issuer + "/protocol/openid-connect"
-        authUri            = openidUri + "/auth"
-        tokenUri           =  openidUri + "/token"
-        tokenIntrospectUri = tokenUri + "/introspect"
-        userinfoUri        = openidUri + "/userinfo"
-        redirectUri        = "http://" + args.ga4ghIP + ":" + args.ga4ghPort + "/oidc_callback"
+        model = self.render.endpoints(args)
 
         # generate and write the json data
         keycloakSecret = { 
             "web": { 
-                "auth_uri" : authUri, 
-                 "issuer" : issuer, 
+                "auth_uri" : model.authUri, 
+                 "issuer" : model.issuer, 
                  "client_id" : args.ga4ghID, 
                  "client_secret" : args.ga4ghSecret,
-                 "redirect_uris" : [ redirectUri ], 
-                 "token_uri" : tokenUri, 
-                 "token_introspection_uri" : tokenIntrospectUri, 
-                 "userinfo_endpoint" : userinfoUri } }
+                 "redirect_uris" : model.ga4ghRedirects, 
+                 "token_uri" : model.tokenUri, 
+                 "token_introspection_uri" : model.tokenIntrospectUri, 
+                 "userinfo_endpoint" : model.userinfoUri } }
+
+        secretData = json.dumps(keycloakSecret, indent=1).encode("utf-8")
+
+        # the docker oidc_config.yml points to the client secrets 
+        # injected into the container, the singularity one to the
+        # file in the output directory
+        secretName = self.render.write(args, "ga4gh/client_secrets.json", secretData)
+        secretPath = self.configDir + "/client_secrets.json"
+        if args.singularity:
+            secretPath = secretName
+        dataSource = dataset.dataSource() if args.ga4ghData else None
+        oidcData = self.configOidc(secretPath, dataSource, args.ga4ghTuning)
+        self.renderedOidcName = self.render.write(args, "ga4gh/oidc_config.yml", oidcData)
+
+        # keep the files to inject into the docker containers
+        self.renderedFiles = [secretName, self.renderedOidcName]
+        self.configFiles = [(self.configDir + "/oidc_config.yml", oidcData), 
+                            (self.configDir + "/client_secrets.json", secretData)]
+
+    def deployed(self, args):
+        """
+        Describes the deployed servers for the state store
+
+        Parameters:
+
+        argparse.Namespace args - Object with command-line arguments as attributes
 
-        jsonData = json.dumps(keycloakSecret, indent=1)
+        Returns:
 
-        # Rewrite the client_secrets.json file with the new configuration
-        fileHandle = open(self.secretName, "w")
-        fileHandle.write(jsonData)
-        fileHandle.close()
+        list records - One dict per replica (see keycloak.deployed)
+        """
+        if args.singularity:
+            return [{"service": "ga4gh", "name": "ga4gh", "kind": "process", 
+                     "image": self.imgName, "port": args.ga4ghPort, 
+                     "pid": self.process.pid if self.process else None}]
+        return [{"service": "ga4gh", "name": containerName, "kind": "container", 
+                 "containerId": self.containerIds.get(containerName), 
+                 "image": self.imageReference(), "specHash": self.specHashes.get(containerName), 
+                 "port": port, "action": self.actions.get(containerName)}
+                for containerName, port in self.replicas(args)]
+
+    def rendered(self):
+        """
+        Returns the rendered configuration recorded by a deployment plan
+
+        Returns:
+
+        dict state - files: the rendered client_secrets.json and oidc_config.yml
+        """
+        return {"files": list(self.renderedFiles)}
+
+    def restore(self, state):
+        """
+        Restores the configuration rendered when a plan was compiled
+
+        Parameters:
+
+        dict state - The state returned by rendered
+
+        Returns: None
+        """
+        secretName, self.renderedOidcName = state["files"]
+        self.renderedFiles = [secretName, self.renderedOidcName]
+        with open(secretName, "rb") as secretHandle:
+            secretData = secretHandle.read()
+        with open(self.renderedOidcName, "rb") as oidcHandle:
+            oidcData = oidcHandle.read()
+        self.configFiles = [(self.configDir + "/oidc_config.yml", oidcData), 
+                            (self.configDir + "/client_secrets.json", secretData)]
+
+
+def stepName(step, index):
+    """
+    Returns the scheduler step name of a ga4gh replica
+
+    The first replica keeps the plain step names (e.g. ga4gh.start),
+    the others append their number (e.g. ga4gh.start.2)
+
+    Parameters:
+
+    str step - The step, e.g. create
+    int index - The position of the replica
+
+    Returns:
+
+    str name - The name of the step
+    """
+    if index == 0:
+        return "ga4gh." + step
+    return "ga4gh." + step + "." + str(index + 1)
+
+
+def probeName(index):
+    """
+    Returns the readiness probe name of a ga4gh replica
+
+    Parameters:
+
+    int index - The position of the replica
+
+    Returns:
+
+    str name - ga4gh for the first replica, ga4gh.N for the others
+    """
+    if index == 0:
+        return "ga4gh"
+    return "ga4gh." + str(index + 1)
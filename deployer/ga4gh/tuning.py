@@ -0,0 +1,170 @@
+"""
+Performance profiles of the ga4gh servers
+
+A profile sets the throughput settings of oidc_config.yml (debug mode,
+the file handle cache, the default page size and the response size
+limit) and the number of mod_wsgi processes and threads of each ga4gh
+container. dev keeps the packaged values and the workers built into
+the image, small and large are fixed, and auto derives the values
+from the CPUs and memory of the host shared by the replicas
+"""
+
+import os
+
+# the values of the fixed profiles; dev matches the packaged
+# oidc_config.yml and leaves the mod_wsgi workers of the image
+PROFILES = {
+    "dev": {"debug": True, "fileHandleCacheMaxSize": 50, "defaultPageSize": 100,
+            "maxResponseLength": 1 << 20, "processes": None, "threads": None},
+    "small": {"debug": False, "fileHandleCacheMaxSize": 50, "defaultPageSize": 100,
+              "maxResponseLength": 1 << 20, "processes": 2, "threads": 4},
+    "large": {"debug": False, "fileHandleCacheMaxSize": 500, "defaultPageSize": 500,
+              "maxResponseLength": 4 << 20, "processes": 8, "threads": 8}}
+
+# the names accepted by --ga4gh-profile
+NAMES = ("dev", "small", "large", "auto")
+
+# the memory a ga4gh server process needs, in bytes
+PROCESS_MEMORY = 256 << 20
+
+# the most mod_wsgi processes of one container
+MAX_PROCESSES = 16
+
+# the Apache site of the image holding the WSGIDaemonProcess directive
+SITE_CONFIG = "/etc/apache2/sites-available/001-ga4gh.conf"
+
+# the command of the image, run after the workers are set
+SERVER_COMMAND = "exec /usr/sbin/apache2ctl -D FOREGROUND"
+
+
+def localResources():
+    """
+    Returns the CPUs and memory of this machine
+
+    Returns:
+
+    tuple resources - The number of CPUs and the bytes of memory
+    """
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        memory = 0
+    return os.cpu_count() or 1, memory
+
+
+def auto(cpus, memory, replicas=1):
+    """
+    Derives the values of a profile from the resources of the host
+
+    Each replica receives its share of the CPUs and memory. A
+    container runs a process per CPU, as many as its memory holds,
+    with more threads and larger caches and pages on hosts with
+    4 GiB or more per replica
+
+    Parameters:
+
+    int cpus - The CPUs of the host
+    int memory - The bytes of memory of the host
+    int replicas - The ga4gh containers sharing the host
+
+    Returns:
+
+    dict values - The values of the profile (see PROFILES)
+    """
+    cpus = max(1, cpus // replicas)
+    memory = memory // replicas
+    large = memory >= 4 << 30
+    processes = max(1, min(cpus, memory // PROCESS_MEMORY, MAX_PROCESSES))
+    return {"debug": False,
+            "fileHandleCacheMaxSize": max(50, min(1000, (memory >> 30) * 50)),
+            "defaultPageSize": 500 if large else 100,
+            "maxResponseLength": (4 << 20) if large else (1 << 20),
+            "processes": processes,
+            "threads": 8 if large else 4}
+
+
+def resolve(name, resources=None, replicas=1):
+    """
+    Returns the values of a profile
+
+    Parameters:
+
+    str name - dev, small, large or auto
+    callable resources - Returns the (CPUs, bytes of memory) of the
+                         host, only called for auto (default: localResources)
+    int replicas - The ga4gh containers sharing the host
+
+    Returns:
+
+    dict values - The values of PROFILES with the profile name, and
+                  for auto the cpus and memory they were derived from
+    """
+    if name != "auto":
+        return dict(PROFILES[name], profile=name)
+    cpus, memory = (resources or localResources)()
+    return dict(auto(cpus, memory, replicas), profile=name, cpus=cpus, memory=memory)
+
+
+def apply(yamlData, values):
+    """
+    Writes the values of a profile into the ga4gh configuration
+
+    Parameters:
+
+    dict yamlData - The parsed oidc_config.yml, changed in place
+    dict values - The values of the profile
+
+    Returns: None
+    """
+    yamlData["frontend"]["DEBUG"] = values["debug"]
+    yamlData["server"]["DEBUG"] = values["debug"]
+    yamlData["server"]["FILE_HANDLE_CACHE_MAX_SIZE"] = values["fileHandleCacheMaxSize"]
+    yamlData["server"]["DEFAULT_PAGE_SIZE"] = values["defaultPageSize"]
+    yamlData["server"]["MAX_RESPONSE_LENGTH"] = values["maxResponseLength"]
+
+
+def command(values):
+    """
+    Returns the container command running the mod_wsgi workers of a profile
+
+    The image bakes the workers into the WSGIDaemonProcess directive
+    of its Apache site, so the command rewrites them before it starts
+    Apache like the image does
+
+    Parameters:
+
+    dict values - The values of the profile
+
+    Returns:
+
+    list command - The command, or None to keep the workers of the image
+    """
+    if values["processes"] is None:
+        return None
+    script = ("sed -i -e 's/processes=[0-9]*/processes={0}/' "
+              "-e 's/threads=[0-9]*/threads={1}/' {2} && {3}").format(
+                  values["processes"], values["threads"], SITE_CONFIG, SERVER_COMMAND)
+    return ["/bin/sh", "-c", script]
+
+
+def describe(values):
+    """
+    Summarizes the values of a profile for the deployment report
+
+    Parameters:
+
+    dict values - The values of the profile
+
+    Returns:
+
+    str summary - e.g. large: 8 processes x 8 threads, debug off, ...
+    """
+    workers = "workers of the image"
+    if values["processes"] is not None:
+        workers = "{0} processes x {1} threads".format(values["processes"], values["threads"])
+    summary = "{0}: {1}, debug {2}, page size {3}, file handle cache {4}, max response {5}KiB".format(
+        values["profile"], workers, "on" if values["debug"] else "off", values["defaultPageSize"],
+        values["fileHandleCacheMaxSize"], values["maxResponseLength"] >> 10)
+    if values["profile"] == "auto":
+        summary += " (from {0} CPUs, {1:.1f}GiB)".format(values["cpus"], values["memory"] / float(1 << 30))
+    return summary
@@ -0,0 +1,272 @@
+"""
+Digest-aware resolution of the Docker images used by the deployer
+
+Records the digest each image resolved to so that later deploys
+can skip the registry round-trip when the image is already local
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+from . import engine
+from . import paths
+
+
+class imageError(Exception):
+    """
+    Raised when an image cannot be made available locally
+    """
+
+
+class images:
+    """
+    Image resolution layer with a persistent digest cache
+
+    For each repository the cache records the digest it last
+    resolved to. An image is only pulled when neither its pinned
+    digest nor its cached digest is present in the local image
+    store. In offline mode the registry is never contacted.
+
+    The layer is safe to use from the concurrent pull steps of
+    the scheduler, so the pulls that are needed run in parallel.
+    """
+
+    def __init__(self, cacheFile=None, offline=False, dockerClient=None):
+        """
+        Constructor for the image resolution layer
+
+        Parameters:
+
+        str cacheFile - The JSON file holding the digest cache
+                        (default: images.json in the cache directory)
+        bool offline - Never pull from the registry
+        object dockerClient - The client of the Docker daemon
+                              (default: engine.connect())
+
+        Returns: images
+        """
+        if cacheFile is None:
+            cacheFile = os.path.join(paths.cacheDir(), "images.json")
+        self.cacheFile = cacheFile
+        self.offline = offline
+        self.docker = dockerClient
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.cache = self.load()
+
+    def load(self):
+        """
+        Reads the digest cache from disk
+
+        Returns:
+
+        dict cache - Maps repositories to their cache entries
+        """
+        try:
+            with open(self.cacheFile) as cacheHandle:
+                return json.load(cacheHandle)
+        except (IOError, ValueError):
+            return {}
+
+    def locked(self):
+        """
+        Returns a file lock guarding the digest cache across processes
+
+        Returns:
+
+        file lockHandle - An open lock file to use in a with statement
+        """
+        directory = os.path.dirname(os.path.abspath(self.cacheFile))
+        os.makedirs(directory, exist_ok=True)
+        lockHandle = open(self.cacheFile + ".lock", "w")
+        fcntl.flock(lockHandle, fcntl.LOCK_EX)
+        return lockHandle
+
+    def save(self, repo=None, entry=None):
+        """
+        Merges a change into the digest cache on disk atomically
+
+        The cache on disk is read again under the file lock, so the
+        digests recorded by deployers of other hosts sharing the
+        cache directory are kept
+
+        Parameters:
+
+        str repo - The repository that changed (default: all repositories)
+        dict entry - The new cache entry of the repository, None to remove it
+
+        Returns: None
+        """
+        with self.locked():
+            # apply the change to the current cache on disk
+            cache = self.load()
+            if repo is None:
+                cache = {}
+            elif entry is None:
+                cache.pop(repo, None)
+            else:
+                cache[repo] = entry
+
+            directory = os.path.dirname(os.path.abspath(self.cacheFile))
+            tempHandle, tempName = tempfile.mkstemp(dir=directory, suffix=".part")
+            try:
+                with os.fdopen(tempHandle, "w") as cacheHandle:
+                    json.dump(cache, cacheHandle, indent=1, sort_keys=True)
+                os.replace(tempName, self.cacheFile)
+            except BaseException:
+                if os.path.exists(tempName):
+                    os.remove(tempName)
+                raise
+        self.cache = cache
+
+    def invalidate(self, repo=None):
+        """
+        Removes cached digests so the images are resolved again
+
+        Parameters:
+
+        str repo - The repository to forget (default: all repositories)
+
+        Returns: None
+        """
+        with self.lock:
+            self.save(repo)
+
+    def entries(self):
+        """
+        Returns the cache entries sorted by repository
+
+        Returns:
+
+        list entries - (repository, entry) tuples
+        """
+        with self.lock:
+            return sorted(self.cache.items())
+
+    def resolve(self, repo, pinned=None):
+        """
+        Makes an image available locally, pulling only when needed
+
+        Parameters:
+
+        str repo - The image repository, e.g. dalos/docker-keycloak
+        str pinned - A digest the image must resolve to (sha256:...)
+
+        Returns:
+
+        str digest - The digest of the local image, so that the
+                     container can be created from repo@digest
+
+        Raises:
+
+        imageError - If the image is missing and cannot be pulled
+        """
+        with self.lock:
+            cached = self.cache.get(repo, {}).get("digest")
+        wanted = pinned or cached
+
+        # the pinned or cached digest is already in the image store
+        if wanted and self.present(repo + "@" + wanted):
+            self.record(repo, wanted, hit=True)
+            return wanted
+
+        if self.offline:
+            # without a pin any local copy of the image will do
+            local = self.localDigests(repo)
+            if local and not pinned:
+                self.record(repo, local[0], hit=True)
+                return local[0]
+            raise imageError("{0}{1} is not available locally and --offline is set".format(
+                repo, "@" + pinned if pinned else ""))
+
+        # pull by digest when pinned so the tag cannot drift
+        reference = repo + "@" + pinned if pinned else repo
+        self.pull(reference)
+
+        if pinned:
+            digest = pinned
+        else:
+            local = self.localDigests(repo)
+            if not local:
+                raise imageError("No digest found for " + repo + " after pulling it")
+            digest = local[0]
+        self.record(repo, digest, hit=False)
+        return digest
+
+    def record(self, repo, digest, hit):
+        """
+        Stores a resolved digest and counts the cache hit or miss
+
+        Parameters:
+
+        str repo - The image repository
+        str digest - The digest the repository resolved to
+        bool hit - True if no pull was needed
+
+        Returns: None
+        """
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.save(repo, {"digest": digest, "resolved": int(time.time())})
+
+    def client(self):
+        """
+        Returns the docker client, connecting on first use
+        """
+        if self.docker is None:
+            self.docker = engine.connect()
+        return self.docker
+
+    def present(self, reference):
+        """
+        Determines whether an image reference is in the local image store
+
+        Parameters:
+
+        str reference - The image reference, e.g. repo@sha256:...
+
+        Returns:
+
+        bool present - True if the image exists locally
+        """
+        return self.client().inspectImage(reference) is not None
+
+    def localDigests(self, repo):
+        """
+        Lists the registry digests of the local image tagged as repo
+
+        Parameters:
+
+        str repo - The image repository
+
+        Returns:
+
+        list digests - The sha256 digests of the local image
+        """
+        inspection = self.client().inspectImage(repo)
+        if inspection is None:
+            return []
+        repoDigests = inspection.get("RepoDigests") or []
+        return [entry.split("@", 1)[1] for entry in repoDigests
+                if entry.split("@", 1)[0] == repo]
+
+    def pull(self, reference):
+        """
+        Pulls an image reference from the registry
+
+        Parameters:
+
+        str reference - The repository, optionally with an @digest
+
+        Returns: None
+        """
+        print("Pulling " + reference)
+        self.client().pullImage(reference)
@@ -0,0 +1,333 @@
+"""
+Rollout of a deployment to several Docker hosts
+
+An inventory file lists the Docker endpoints to deploy to, each
+with options overriding the ones given on the command line:
+
+    hosts:
+      - name: node1
+        dockerHost: tcp://10.0.0.2:2375
+        options:
+          ip: 10.0.0.2
+      - name: node2
+        dockerContext: node2
+        options:
+          ip: 10.0.0.3
+          ga4gh-replicas: 2
+          funnel: true
+        env:
+          DOCKER_TLS_VERIFY: "1"
+
+Each host is deployed by its own deployer process pointed at the
+endpoint through DOCKER_HOST or DOCKER_CONTEXT, at most a given
+number at a time. A host whose deployment exceeds the timeout is
+stopped. The rollup report lists the phase timings of every host,
+read from the Chrome trace its deployer writes
+"""
+
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import time
+
+import yaml
+
+from . import paths
+
+
+# the phases of the rollup report, in deployment order
+PHASES = ("teardown", "pull", "fetch", "build", "config", "reconcile",
+          "create", "copy", "start", "ready")
+
+# the options of the parent process that are not passed to the hosts
+# as (long form, short form, takes a value) tuples
+PARENT_OPTIONS = (("--inventory", "-inv", True),
+                  ("--inventory-parallel", "-ipar", True),
+                  ("--host-timeout", "-hto", True),
+                  ("--profile", "-prof", True))
+
+
+class inventoryError(Exception):
+    """
+    Raised when an inventory file is malformed
+    """
+
+
+class host:
+    """
+    A Docker endpoint of the inventory and its option overrides
+    """
+
+    def __init__(self, name, dockerHost=None, dockerContext=None, options=None, env=None):
+        """
+        Constructor for an inventory host
+
+        Parameters:
+
+        str name - The name of the host in the report
+        str dockerHost - The DOCKER_HOST URL of the daemon
+        str dockerContext - The docker context of the daemon (instead of dockerHost)
+        dict options - Long option names (without --) mapped to their values,
+                       or a list of command-line arguments
+        dict env - Extra environment variables of the host's deployer
+
+        Returns: host
+        """
+        self.name = name
+        self.dockerHost = dockerHost
+        self.dockerContext = dockerContext
+        self.options = options or {}
+        self.env = env or {}
+
+    def arguments(self):
+        """
+        Returns the command-line arguments overriding the shared ones
+
+        Returns:
+
+        list arguments - The arguments for the host's deployer
+        """
+        if isinstance(self.options, list):
+            return [str(option) for option in self.options]
+
+        arguments = []
+        for option, value in sorted(self.options.items()):
+            if value is True:
+                arguments.append("--" + option)
+            elif value is not False and value is not None:
+                arguments += ["--" + option, str(value)]
+        return arguments
+
+    def environment(self):
+        """
+        Returns the environment of the host's deployer
+
+        Returns:
+
+        dict env - The process environment pointing at the endpoint
+        """
+        env = dict(os.environ)
+        env.pop("DOCKER_HOST", None)
+        env.pop("DOCKER_CONTEXT", None)
+        if self.dockerHost:
+            env["DOCKER_HOST"] = self.dockerHost
+        if self.dockerContext:
+            env["DOCKER_CONTEXT"] = self.dockerContext
+        env.update((key, str(value)) for key, value in self.env.items())
+        return env
+
+
+def load(fileName):
+    """
+    Reads the hosts of an inventory file (YAML or JSON)
+
+    Parameters:
+
+    str fileName - The inventory file
+
+    Returns:
+
+    list hosts - The hosts in file order
+
+    Raises:
+
+    inventoryError - If a host lacks a name or an endpoint
+    """
+    with open(fileName) as inventoryHandle:
+        data = yaml.safe_load(inventoryHandle) or {}
+
+    hosts = []
+    names = set()
+    for entry in data.get("hosts") or []:
+        name = entry.get("name")
+        if not name or name in names:
+            raise inventoryError("Every host needs a unique name: " + repr(entry))
+        if bool(entry.get("dockerHost")) == bool(entry.get("dockerContext")):
+            raise inventoryError("Host " + name + " needs either dockerHost or dockerContext")
+        names.add(name)
+        hosts.append(host(name, entry.get("dockerHost"), entry.get("dockerContext"),
+                          entry.get("options"), entry.get("env")))
+    if not hosts:
+        raise inventoryError("The inventory " + fileName + " lists no hosts")
+    return hosts
+
+
+def sharedArguments(argv):
+    """
+    Removes the options of the rollout itself from the command line
+
+    Parameters:
+
+    list argv - The command-line arguments of the parent process
+
+    Returns:
+
+    list arguments - The arguments shared by every host
+    """
+    arguments = []
+    skip = False
+    for argument in argv:
+        if skip:
+            skip = False
+            continue
+        option = argument.split("=", 1)[0]
+        parent = [entry for entry in PARENT_OPTIONS if option in entry[:2]]
+        if parent:
+            # skip the value unless it was given as --option=value
+            skip = parent[0][2] and "=" not in argument
+            continue
+        arguments.append(argument)
+    return arguments
+
+
+def phases(traceFile):
+    """
+    Reads the phase timings of a deployment from its Chrome trace
+
+    Steps of the same phase run concurrently for the different
+    servers (e.g. keycloak.pull and ga4gh.pull), so a phase takes
+    as long as its slowest step
+
+    Parameters:
+
+    str traceFile - The trace written by the deployer
+
+    Returns:
+
+    dict timings - Maps phase names to seconds
+    """
+    try:
+        with open(traceFile) as traceHandle:
+            events = json.load(traceHandle)["traceEvents"]
+    except (IOError, ValueError, KeyError):
+        return {}
+
+    timings = {}
+    for event in events:
+        if event["cat"] == "step":
+            phase = event["name"].split(".")[1]
+        elif event["name"] == "teardown":
+            phase = "teardown"
+        else:
+            continue
+        timings[phase] = max(timings.get(phase, 0.0), event["dur"] / 1e6)
+    return timings
+
+
+def deploy(target, arguments, timeout, outputDir, command=None):
+    """
+    Deploys one host with its own deployer process
+
+    Parameters:
+
+    host target - The host to deploy to
+    list arguments - The arguments shared by every host
+    float timeout - The seconds after which the deployment is stopped
+    str outputDir - The directory of the logs and traces of the hosts
+    list command - The program running the deployer
+                   (default: this python running deployer.deployer)
+
+    Returns:
+
+    dict result - name, status ("ok", "failed" or "timeout"),
+                  seconds, phases, logFile and traceFile
+    """
+    if command is None:
+        command = [sys.executable, "-m", "deployer.deployer"]
+    logFile = os.path.join(outputDir, target.name + ".log")
+    traceFile = os.path.join(outputDir, target.name + ".trace.json")
+    if os.path.exists(traceFile):
+        os.remove(traceFile)
+
+    # the host options follow the shared ones so that they win
+    argv = command + arguments + target.arguments() + ["--profile", traceFile]
+    if target.dockerContext:
+        argv.append("--docker-cli")
+
+    start = time.perf_counter()
+    with open(logFile, "wb") as logHandle:
+        process = subprocess.Popen(argv, env=target.environment(),
+                                   stdout=logHandle, stderr=subprocess.STDOUT)
+        try:
+            returnCode = process.wait(timeout)
+            status = "ok" if returnCode == 0 else "failed"
+        except subprocess.TimeoutExpired:
+            # give the deployer a chance to stop its own processes
+            process.terminate()
+            try:
+                process.wait(5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            status = "timeout"
+
+    return {"name": target.name,
+            "status": status,
+            "seconds": time.perf_counter() - start,
+            "phases": phases(traceFile),
+            "logFile": logFile,
+            "traceFile": traceFile}
+
+
+def rollout(hosts, arguments, parallel, timeout, outputDir=None, command=None):
+    """
+    Deploys every host of an inventory concurrently
+
+    Parameters:
+
+    list hosts - The hosts to deploy to
+    list arguments - The arguments shared by every host
+    int parallel - The number of hosts deployed at once
+    float timeout - The seconds each host may take
+    str outputDir - The directory of the logs and traces of the hosts
+                    (default: inventory/ in the data directory)
+    list command - The program running the deployer (see deploy)
+
+    Returns:
+
+    list results - The result of every host in inventory order
+    """
+    if outputDir is None:
+        outputDir = paths.dataDir("inventory")
+    os.makedirs(outputDir, exist_ok=True)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+        futures = [pool.submit(deploy, target, arguments, timeout, outputDir, command)
+                   for target in hosts]
+        return [future.result() for future in futures]
+
+
+def report(results):
+    """
+    Returns the rollup table of a rollout
+
+    Parameters:
+
+    list results - The results of the hosts
+
+    Returns:
+
+    str table - One line per host with its status, total and phase seconds
+    """
+    shown = [phase for phase in PHASES
+             if any(phase in result["phases"] for result in results)]
+    width = max([len("HOST")] + [len(result["name"]) for result in results])
+
+    header = "{0:<{1}}  {2:<8} {3:>9}".format("HOST", width, "STATUS", "TOTAL (s)")
+    lines = [header + "".join(" {0:>9}".format(phase) for phase in shown)]
+    for result in results:
+        line = "{0:<{1}}  {2:<8} {3:>9.1f}".format(result["name"], width,
+                                                   result["status"], result["seconds"])
+        for phase in shown:
+            seconds = result["phases"].get(phase)
+            line += " {0:>9}".format("-" if seconds is None else "{0:.1f}".format(seconds))
+        lines.append(line)
+
+    # point to the logs of the hosts that did not deploy
+    for result in results:
+        if result["status"] != "ok":
+            lines.append("\n{0}: {1}, see {2}".format(result["name"], result["status"],
+                                                      result["logFile"]))
+    return "\n".join(lines)
@@ -0,0 +1,328 @@
+"""
+Client of the Keycloak admin REST API
+
+Applies the changes to a running Keycloak server that the realm
+import does not make, such as passwords, additional users and the
+secrets and redirect URIs of clients, without starting kcadm.sh
+(a JVM per change). The changes are queued and applied in one batch
+over a single keep-alive connection with one cached admin token,
+looking every user and client up at most once per batch
+"""
+
+import http.client
+import json
+import select
+import time
+import urllib.parse
+
+from .. import trace
+
+
+# the passwords of the user and admin accounts in the packaged realm
+TEMPLATE_USER_PASSWORD = "user"
+TEMPLATE_ADMIN_PASSWORD = "admin"
+
+# the seconds before its expiry an admin token is renewed
+TOKEN_MARGIN = 5
+
+# the methods resent on a fresh connection when the kept one was closed
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT")
+
+
+class adminError(Exception):
+    """
+    Raised when the admin API rejects a login or a change
+    """
+
+    def __init__(self, status, message):
+        Exception.__init__(self, "Keycloak admin error {0}: {1}".format(status, message))
+        self.status = status
+
+
+def mutations(fileName):
+    """
+    Reads the users and clients to apply from a JSON file
+
+    The file holds users by realm and username, and clients by realm
+    and client ID, e.g.
+
+        {"users": {"CanDIG": {"alice": "secret"}},
+         "clients": {"CanDIG": {"beacon": {"secret": "...",
+                                           "redirectUris": ["http://host:9000/*"]}}}}
+
+    Parameters:
+
+    str fileName - The JSON file
+
+    Returns:
+
+    list changes - (kind, realm, name, value) tuples for admin.queue
+
+    Raises:
+
+    adminError - If the file cannot be read or is malformed
+    """
+    try:
+        with open(fileName) as mutationHandle:
+            content = json.load(mutationHandle)
+    except (IOError, ValueError) as error:
+        raise adminError(None, "Cannot read " + fileName + ": " + str(error))
+
+    changes = []
+    try:
+        for realmName, users in sorted(content.get("users", {}).items()):
+            for username, password in sorted(users.items()):
+                changes.append(("user", realmName, username, password))
+        for realmName, clients in sorted(content.get("clients", {}).items()):
+            for clientId, client in sorted(clients.items()):
+                changes.append(("client", realmName, clientId,
+                                {"secret": client.get("secret"),
+                                 "redirectUris": client.get("redirectUris")}))
+    except AttributeError:
+        raise adminError(None, fileName + " must map users and clients by realm")
+    return changes
+
+
+class admin:
+    """
+    Session with the admin API of a Keycloak server
+    """
+
+    def __init__(self, host, port, username, passwords, timeout=30):
+        """
+        Constructor for the admin session
+
+        Parameters:
+
+        str host - The IP address or host name of the server
+        str port - The port number of the server
+        str username - The admin account of the master realm
+        list passwords - The passwords to log in with, tried in order
+                         (e.g. the new one before the template one)
+        float timeout - The seconds to wait for each response
+
+        Returns: admin
+        """
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.passwords = passwords
+        self.timeout = timeout
+        self.conn = None
+        self.token = None
+        self.expiry = 0
+        self.changes = []
+        self.logins = 0
+        self.requests = 0
+
+    def close(self):
+        """
+        Closes the keep-alive connection
+
+        Returns: None
+        """
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def send(self, method, path, body=None, headers=None):
+        """
+        Sends a request over the keep-alive connection
+
+        A connection the server has closed in the meantime is
+        replaced by a fresh one and the request is sent again,
+        unless it may already have reached the server: a POST
+        is not resent once it was written
+
+        Parameters:
+
+        str method - The HTTP method
+        str path - The path below /auth
+        bytes body - The request body
+        dict headers - The request headers
+
+        Returns:
+
+        tuple result - (status, response headers, body bytes)
+        """
+        with trace.span(method + " " + path.split("?")[0], "keycloak") as phase:
+            while True:
+                # a kept connection is only readable once the server closed it
+                if self.conn is not None and (self.conn.sock is None or
+                                              select.select([self.conn.sock], [], [], 0)[0]):
+                    self.close()
+                reused = self.conn is not None
+                if not reused:
+                    self.conn = http.client.HTTPConnection(self.host, self.port,
+                                                           timeout=self.timeout)
+                sent = False
+                try:
+                    self.conn.request(method, "/auth" + path, body, headers or {})
+                    sent = True
+                    response = self.conn.getresponse()
+                    data = response.read()
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    self.close()
+                    if reused and (not sent or method in IDEMPOTENT_METHODS):
+                        continue
+                    raise
+                except Exception:
+                    self.close()
+                    raise
+                break
+            self.requests += 1
+            phase.set(status=response.status)
+        if response.will_close:
+            self.close()
+        return response.status, response, data
+
+    def login(self):
+        """
+        Returns the admin token, logging in only when it is missing
+        or about to expire
+
+        Returns:
+
+        str token - The access token of the admin account
+
+        Raises:
+
+        adminError - If none of the passwords is accepted
+        """
+        if self.token is not None and time.time() < self.expiry - TOKEN_MARGIN:
+            return self.token
+
+        for password in self.passwords:
+            form = urllib.parse.urlencode({"grant_type": "password", "client_id": "admin-cli",
+                                           "username": self.username, "password": password})
+            requested = time.time()
+            status, response, data = self.send(
+                "POST", "/realms/master/protocol/openid-connect/token", form.encode("utf-8"),
+                {"Content-Type": "application/x-www-form-urlencoded"})
+            self.logins += 1
+            if status == 200:
+                grant = json.loads(data.decode("utf-8"))
+                self.token = grant["access_token"]
+                self.expiry = requested + grant.get("expires_in", 60)
+                return self.token
+            # a refused password answers invalid_grant
+            if status not in (400, 401):
+                raise adminError(status, data.decode("utf-8", "replace"))
+        raise adminError(401, "The admin account " + self.username + " was refused")
+
+    def call(self, method, path, body=None):
+        """
+        Sends an authorized request and decodes its JSON answer
+
+        A token that expired early is renewed once
+
+        Parameters:
+
+        str method - The HTTP method
+        str path - The path below /auth/admin/realms
+        object body - The JSON body
+
+        Returns:
+
+        tuple result - (status, decoded JSON body or None, response headers)
+
+        Raises:
+
+        adminError - If the server answers with an error status
+        """
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        for attempt in range(2):
+            headers = {"Authorization": "Bearer " + self.login(), "Accept": "application/json"}
+            if data is not None:
+                headers["Content-Type"] = "application/json"
+            status, response, answer = self.send(method, "/admin/realms" + path, data, headers)
+            if status != 401:
+                break
+            self.token = None
+        if status >= 400:
+            raise adminError(status, answer.decode("utf-8", "replace") or method + " " + path)
+        decoded = json.loads(answer.decode("utf-8")) if answer else None
+        return status, decoded, response
+
+    def queue(self, kind, realmName, name, value):
+        """
+        Queues a change for the next apply
+
+        Parameters:
+
+        str kind - "password" (of an existing user), "user" (created
+                   when missing, with its password) or "client"
+        str realmName - The realm of the user or client
+        str name - The username or client ID
+        object value - The password, or a dict with the secret and
+                       redirectUris of the client (None keeps a value)
+
+        Returns: None
+        """
+        self.changes.append((kind, realmName, name, value))
+
+    def find(self, realmName, collection, field, name):
+        """
+        Looks up the ID of a user or client
+
+        Parameters:
+
+        str realmName - The realm
+        str collection - users or clients
+        str field - username or clientId
+        str name - The username or client ID
+
+        Returns:
+
+        str id - The ID, or None if there is none of the name
+        """
+        query = urllib.parse.urlencode({field: name})
+        status, found, response = self.call("GET", "/" + realmName + "/" + collection + "?" + query)
+        # users are searched by substring
+        for entry in found or []:
+            if entry.get(field) == name:
+                return entry["id"]
+        return None
+
+    def apply(self):
+        """
+        Applies the queued changes in one batch
+
+        Returns:
+
+        int applied - The number of changes applied
+
+        Raises:
+
+        adminError - If a change is refused or a password belongs to
+                     a user that does not exist
+        """
+        ids = {}
+        changes, self.changes = self.changes, []
+        for kind, realmName, name, value in changes:
+            collection, field = ("clients", "clientId") if kind == "client" else ("users", "username")
+            key = (realmName, collection, name)
+            if key not in ids:
+                ids[key] = self.find(realmName, collection, field, name)
+
+            if kind == "client":
+                client = dict((item, value[item]) for item in ("secret", "redirectUris")
+                              if value.get(item) is not None)
+                if ids[key] is None:
+                    client.update({"clientId": name, "enabled": True, "publicClient": False})
+                    status, created, response = self.call("POST", "/" + realmName + "/clients", client)
+                    ids[key] = response.getheader("Location", "").rstrip("/").split("/")[-1] or None
+                else:
+                    self.call("PUT", "/" + realmName + "/clients/" + ids[key], client)
+                continue
+
+            # users are created without credentials, the password follows
+            if ids[key] is None and kind == "user":
+                status, created, response = self.call("POST", "/" + realmName + "/users",
+                                                      {"username": name, "enabled": True})
+                ids[key] = response.getheader("Location", "").rstrip("/").split("/")[-1]
+            if not ids[key]:
+                raise adminError(404, "The realm " + realmName + " has no user " + name)
+            self.call("PUT", "/" + realmName + "/users/" + ids[key] + "/reset-password",
+                      {"type": "password", "value": value, "temporary": False})
+        return len(changes)
@@ -32,7 +32,38 @@ fi
 
 # /srv/keycloak-3.4.0.Final/bin/standalone.sh -b ${IP_ADDR} -Dkeycloak.migration.action=import -Dkeycloak.migration.provider=singleFile -Dkeycloak.migration.file="${CONFIG_FILE}" -Dkeycloak.migration.strategy=OVERWRITE_EXISTING 
 
-/srv/keycloak/bin/standalone.sh -b ${IP_ADDR} -Dkeycloak.migration.action=import -Dkeycloak.migration.provider=singleFile -Dkeycloak.migration.file="${CONFIG_FILE}" -Dkeycloak.migration.strategy=OVERWRITE_EXISTING
+# the keycloak database lives in the data directory, which the
+# deployer mounts from a persistent volume. The hash of the last
+# realm imported into it is written there once the realm is served
+
+DATA_DIR="/srv/keycloak/standalone/data"
+REALM_HASH_FILE="${DATA_DIR}/realm.sha256"
+
+# import the realm only when it differs from the imported one
+
+REALM_HASH=$(sha256sum "${CONFIG_FILE}" | cut -d ' ' -f 1)
+
+IMPORT_OPTIONS="-Dkeycloak.migration.action=import -Dkeycloak.migration.provider=singleFile -Dkeycloak.migration.file=${CONFIG_FILE} -Dkeycloak.migration.strategy=OVERWRITE_EXISTING"
+
+if [ -f "${REALM_HASH_FILE}" ] && [ "$(cat "${REALM_HASH_FILE}")" == "${REALM_HASH}" ]
+then
+    echo "Realm ${REALM_HASH} already imported, skipping the import"
+    IMPORT_OPTIONS=""
+fi
+
+# the heap and garbage collector of the JVM, keeping the other
+# defaults of standalone.conf
+
+JAVA_OPTS="-Xms${JAVA_HEAP:-64m} -Xmx${JAVA_HEAP:-512m} -XX:MetaspaceSize=96M -XX:MaxMetaspaceSize=256m -Djava.net.preferIPv4Stack=true -Djboss.modules.system.pkgs=org.jboss.byteman -Djava.awt.headless=true"
+
+if [ -n "${JAVA_GC}" ]
+then
+    JAVA_OPTS="${JAVA_OPTS} -XX:+Use${JAVA_GC}GC"
+fi
+
+export JAVA_OPTS
+
+/srv/keycloak/bin/standalone.sh -b ${IP_ADDR} ${IMPORT_OPTIONS}
 
 
 exit 0
@@ -1,8 +1,26 @@
+import hashlib
 import subprocess
-import pkg_resources
 import os
-import json
-import gzip
+
+from .. import artifacts
+from .. import engine
+from .. import images
+from .. import paths
+from .. import readiness
+from .. import reconcile
+from .. import render
+from .. import scheduler
+from .. import trace
+from . import admin
+from . import realm
+
+# the directory of the keycloak database inside the container,
+# mounted from a persistent volume
+DATA_DIR = "/srv/keycloak/standalone/data"
+
+# the hash of the realm imported into the database, written 
+# once the server serves the realm
+REALM_HASH_FILE = DATA_DIR + "/realm.sha256"
 
 class keycloak:
     """
@@ -11,29 +29,98 @@ class keycloak:
     Deploys keycloak either via Docker or Singularity
     based on the command-line arguments
 
-                              +--> deployDocker
-    args                      |
-    --> route --> config --> XOR
-                              |
-                              +--> deploySingularity
+                                     +--> pull --> create --> copy --> start --> ready
+    args                             |
+    --> route --> steps --> config  XOR
+                                     |
+                                     +--> fetch --> start --> ready
     """
-    def __init__(self):
+    def __init__(self, readinessEngine=None, imageCache=None, artifactCache=None, dockerClient=None, 
+                 configRenderer=None):
         """
         Constructor for the keycloak subdeployer
-        """
-        # get the location of the keycloak directory
-        pkgName = __name__
-        keycloakPath = '/'.join(('.'))
-        self.keycloakDir = pkg_resources.resource_filename(pkgName, keycloakPath)
-
-        configPath = '/'.join(('.', 'keycloakConfig.json'))
-        self.configJson = pkg_resources.resource_filename(pkgName, configPath)
 
-        zipPath = '/'.join(('.', "key.img.gz"))
-        self.zipName = pkg_resources.resource_filename(pkgName, zipPath)
+        Parameters:
 
-        imgPath = '/'.join(('.', 'key.img'))
-        self.imgName = pkg_resources.resource_filename(pkgName, imgPath)
+        readiness readinessEngine - The engine polling the started server
+                                    (default: a private engine)
+        images imageCache - The digest cache resolving the docker image
+                            (default: a private cache)
+        artifacts artifactCache - The cache holding the singularity image
+                                  (default: a private cache)
+        object dockerClient - The client of the Docker daemon
+                              (default: engine.connect())
+        render.renderer configRenderer - The rendering layer holding the endpoints
+                                         (default: a private renderer)
+        """
+        # get the location of the keycloak directory
+        self.keycloakDir = paths.resource(__package__)
+        self.configJson = paths.resource(__package__, 'keycloakConfig.json')
+
+        # the renderer of the realm template and the realm file to import
+        # which is the unmodified template when the config step is skipped
+        self.realmTemplate = realm.realm(self.configJson)
+        self.realmFile = self.configJson
+
+        # the start script copied into the container, which imports
+        # the realm only when the database holds another one
+        self.startScript = paths.resource(__package__, 'docker', 'keycloakStart.sh')
+
+        # the templates of the rendered configuration, part of the plan key
+        self.templates = [self.configJson, self.startScript]
+
+        # the hash of the realm to import and whether the start imports
+        # it ("imported") or finds it in the database ("unchanged")
+        self.realmHash = None
+        self.realmAction = None
+
+        # the admin session of the keycloak.admin step and the number
+        # of changes it applied
+        self.admin = None
+        self.adminChanges = 0
+
+        # the writable singularity image of the current run
+        self.imgName = None
+
+        # the docker image holding the keycloak server
+        self.imageRepo = "dalos/docker-keycloak"
+
+        # the singularity process started by the start step
+        self.process = None
+
+        # the hash of the desired container and what was done with it:
+        # "kept", "recreated" or "created"
+        self.specHash = None
+        self.action = None
+
+        # the ID of the container created by the create step
+        self.containerId = None
+
+        # the client of the docker daemon
+        if dockerClient is None:
+            dockerClient = engine.connect()
+        self.docker = dockerClient
+
+        # the engine polling the server once it has started
+        if readinessEngine is None:
+            readinessEngine = readiness.readiness()
+        self.readiness = readinessEngine
+
+        # the digest cache and the digest resolved by the pull step
+        if imageCache is None:
+            imageCache = images.images(dockerClient=self.docker)
+        self.images = imageCache
+        self.digest = None
+
+        # the cache holding the pristine singularity image
+        if artifactCache is None:
+            artifactCache = artifacts.artifacts()
+        self.artifacts = artifactCache
+
+        # the rendering layer shared with the other subdeployers
+        if configRenderer is None:
+            configRenderer = render.renderer()
+        self.render = configRenderer
 
     def route(self, args):
         """
@@ -48,14 +135,62 @@ class keycloak:
 
         Returns: None
         """
+        # run the keycloak steps on their own
+        with trace.span("keycloak.route"):
+            keycloakScheduler = scheduler.scheduler()
+            keycloakScheduler.addSteps(self.steps(args))
+            keycloakScheduler.run()
+
+    def steps(self, args):
+        """
+        Lists the deployment steps of Keycloak for the scheduler
+
+        Configuration and image retrieval are independent of each
+        other, while the container must be created before the
+        configuration is copied into it and started
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns:
+
+        list steps - (name, function, dependencies) tuples
+        """
+        steps = []
+
         # configure the keycloak server
+        configSteps = []
         if not args.noConfig:
-            self.config(args)
+            steps.append(("keycloak.config", lambda: self.config(args), []))
+            configSteps = ["keycloak.config"]
+
         # choose between docker and singularity keycloak deployment
         if args.singularity:
-            self.deploySingularity(args)
+            steps += [
+                ("keycloak.fetch", lambda: self.fetchSingularity(args.keycloakImageUrl, 
+                                                                  args.keycloakChecksum), []),
+                ("keycloak.start", lambda: self.start(args), 
+                 ["keycloak.fetch"] + configSteps)]
         else:
-            self.deployDocker(args)
+            steps += [
+                ("keycloak.pull", lambda: self.pullDocker(args.keycloakDigest), []),
+                ("keycloak.reconcile", lambda: self.reconcileDocker(args), 
+                 ["keycloak.pull"] + configSteps),
+                ("keycloak.create", lambda: self.createDocker(args), 
+                 ["keycloak.reconcile"]),
+                ("keycloak.copy", lambda: self.copyDocker(args), 
+                 ["keycloak.create"] + configSteps),
+                ("keycloak.start", lambda: self.start(args), 
+                 ["keycloak.copy"])]
+
+        steps.append(("keycloak.ready", lambda: self.ready(args), ["keycloak.start"]))
+
+        # change what the realm import does not set through the admin API
+        if self.administered(args):
+            steps.append(("keycloak.admin", lambda: self.administer(args), ["keycloak.ready"]))
+        return steps
 
     def deployDocker(self, args):
         """
@@ -68,39 +203,328 @@ class keycloak:
 
         Returns: None
         """
-        # pull the keycloak docker image from imageRepo
-        imageRepo = "dalos/docker-keycloak"
-        pull = ["docker", "pull", imageRepo]
-        subprocess.call(pull)
+        self.pullDocker(args.keycloakDigest)
+        self.createDocker(args)
+        self.copyDocker(args)
+        self.startDocker(args)
 
-        # Create a docker container 
-        # passing in environment variables
+    def pullDocker(self, pinned=None):
+        """
+        Makes the keycloak docker image available locally
+
+        The image is only pulled from Docker Hub when neither
+        the pinned digest nor the cached digest is present
+
+        Parameters:
+
+        str pinned - The digest the image must resolve to
+
+        Returns: None
+        """
+        self.digest = self.images.resolve(self.imageRepo, pinned)
+
+    def imageReference(self):
+        """
+        Returns the image reference to create the container from
+
+        Returns:
+
+        str reference - The repository at the resolved digest
+        """
+        if self.digest:
+            return self.imageRepo + "@" + self.digest
+        return self.imageRepo
+
+    def environment(self, args):
+        """
+        Returns the environment variables of the keycloak container
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns:
+
+        list envList - (name, value) tuples
+        """
         # tokenTracer - deploy token tracer (boolean)
         # REALM_NAME - realm name to use
         # ADMIN_USERNAME - admin account username
         # ADMIN_PASSWORD - admin account password
         # USER_USERNAME - user account username
         # USER_PASSWORD - user account password 
-        create = ["docker", "create", "-p", args.keycloakPort + ":8080", 
-                  "--name", args.keycloakContainerName, 
-                  "-e", "tokenTracer=''" + str(args.tokenTracer) + "'", 
-                  "-e", "REALM_NAME='" + args.realmName + "'",
-                  "-e", "ADMIN_USERNAME='" + args.adminUsername + "'",
-                  "-e", "ADMIN_PASSWORD='" + args.adminPassword + "'",
-                  "-e", "USER_USERNAME='" + args.userUsername + "'",
-                  "-e", "USER_PASSWORD='" + args.userPassword + "'", 
-                  imageRepo]
-        subprocess.call(create)
-
-        # copy file to the docker container keycloakConfig.json
-        copyConfig = ["docker", "cp", self.configJson, 
-                      "{0}:/srv/keycloakConfig.json".format(args.keycloakContainerName)]
-        subprocess.call(copyConfig)
+        envList = [("tokenTracer", "''" + str(args.tokenTracer) + "'"), 
+                   ("REALM_NAME", "'" + args.realmName + "'"),
+                   ("ADMIN_USERNAME", "'" + args.adminUsername + "'"),
+                   ("ADMIN_PASSWORD", "'" + args.adminPassword + "'"),
+                   ("USER_USERNAME", "'" + args.userUsername + "'"),
+                   ("USER_PASSWORD", "'" + args.userPassword + "'")]
+
+        # JAVA_HEAP - initial and maximum heap of the JVM
+        # JAVA_GC - garbage collector of the JVM
+        if args.keycloakHeap:
+            envList.append(("JAVA_HEAP", args.keycloakHeap))
+        if args.keycloakGc:
+            envList.append(("JAVA_GC", args.keycloakGc))
+        return envList
+
+    def binds(self, args):
+        """
+        Returns the volume binding of the keycloak database
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns:
+
+        list binds - The volume:DATA_DIR binding
+        """
+        return [args.keycloakVolume + ":" + DATA_DIR]
+
+    def spec(self, args):
+        """
+        Returns the desired specification of the keycloak container
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns:
+
+        dict spec - The image, ports, environment, database volume and
+                    configuration hash
+        """
+        return {"image": self.imageReference(), 
+                "ports": {"8080": args.keycloakPort}, 
+                "env": self.environment(args), 
+                "binds": self.binds(args), 
+                "config": reconcile.fileHash([self.realmFile, self.startScript])}
+
+    def reconcileDocker(self, args):
+        """
+        Decides whether the keycloak container must be (re)created
+
+        Without --reconcile the container was already removed by
+        the deployer and is always created
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns: None
+        """
+        self.specHash = reconcile.specHash(self.spec(args))
+        if args.reconcile:
+            self.action = reconcile.reconcile(self.docker, args.keycloakContainerName, self.specHash)
+        else:
+            self.action = "created"
+
+    def createDocker(self, args):
+        """
+        Creates the keycloak docker container without starting it
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns: None
+        """
+        # leave an unchanged running container as it is
+        if self.action == "kept":
+            return
+
+        # keep the database in a managed volume, which outlives the 
+        # container unless down removes the volumes
+        self.docker.createVolume(args.keycloakVolume, {reconcile.MANAGED_LABEL: "true", 
+                                                       reconcile.SERVICE_LABEL: "keycloak"})
+
+        # Create a docker container 
+        # passing in environment variables
+        # labelled with the hash of its specification
+        labels = None
+        if self.specHash is not None:
+            labels = reconcile.labels("keycloak", self.specHash)
+        self.containerId = self.docker.createContainer(args.keycloakContainerName, 
+                                                       self.imageReference(), 
+                                                       {"8080": args.keycloakPort}, 
+                                                       self.environment(args), labels, 
+                                                       self.binds(args))
+
+    def copyDocker(self, args):
+        """
+        Copies keycloakConfig.json and the start script into the keycloak 
+        docker container
+
+        The start script skips the import when the hash of the realm
+        matches the hash stored in the database volume, which is read
+        here to know which of the two starts follows
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns: None
+        """
+        if self.action == "kept":
+            return
+
+        with open(self.realmFile, "rb") as realmHandle:
+            realmData = realmHandle.read()
+        with open(self.startScript, "rb") as scriptHandle:
+            scriptData = scriptHandle.read()
+
+        # compare the realm with the one imported into the database
+        self.realmHash = hashlib.sha256(realmData).hexdigest()
+        imported = self.docker.readFile(args.keycloakContainerName, REALM_HASH_FILE)
+        if imported is not None and imported.decode("utf-8").strip() == self.realmHash:
+            self.realmAction = "unchanged"
+        else:
+            self.realmAction = "imported"
+
+        # copy the realm to the docker container as keycloakConfig.json
+        # with the start script the image runs
+        self.docker.copyFiles(args.keycloakContainerName, 
+                              [("/srv/keycloakConfig.json", realmData), 
+                               ("/srv/keycloakStart.sh", scriptData, 0o755)])
+
+    def startDocker(self, args):
+        """
+        Starts the keycloak docker container in the background
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns: None
+        """
+        if self.action == "kept":
+            return
 
         # start the keycloak server
-        start = ["docker", "start", args.keycloakContainerName]
-        subprocess.Popen(start)
+        self.docker.startContainer(args.keycloakContainerName)
+
+    def start(self, args):
+        """
+        Starts the keycloak server and begins polling it for readiness
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns: None
+        """
+        if args.singularity:
+            self.startSingularity(args)
+        else:
+            self.startDocker(args)
+        self.readiness.watch(self.probe(args))
+
+    def probe(self, args):
+        """
+        Returns the readiness probe of the keycloak server
+
+        Keycloak only serves the OIDC discovery document of the 
+        realm once the realm has been imported, so the server is 
+        ready once the document is returned. Under singularity the
+        probe fails as soon as the server process exits
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns:
+
+        readiness.probe keycloakProbe - The probe of the realm's discovery endpoint
+        """
+        discoveryPath = "/auth/realms/" + args.realmName + "/.well-known/openid-configuration"
+        return readiness.probe("keycloak", args.keycloakIP, args.keycloakPort, 
+                               discoveryPath, [200], args.readyTimeout, 
+                               self.process if args.singularity else None)
+
+    def ready(self, args):
+        """
+        Waits until the keycloak server is ready to serve tokens
+
+        Parameters:
+
+        argpase.Namespace args - The object containing the command-line 
+                                 arguments as attributes
+
+        Returns: None
+        """
+        # wait until the realm is served
+        self.readiness.wait("keycloak")
+
+        # the import has completed, so later starts may skip it
+        if not args.singularity and self.realmAction == "imported":
+            self.docker.copyFiles(args.keycloakContainerName, 
+                                  [(REALM_HASH_FILE, (self.realmHash + "\n").encode("utf-8"))])
+
+
+    def administered(self, args):
+        """
+        Determines whether the server needs changes through the admin API
+
+        The passwords of the packaged realm are only kept when they
+        were not overridden and no changes were listed in a file
+
+        Parameters:
+
+        argparse.Namespace args - The object containing the command-line 
+                                  arguments as attributes
 
+        Returns:
+
+        bool administered - True if the keycloak.admin step must run
+        """
+        return bool(args.keycloakMutations or 
+                    args.userPassword != admin.TEMPLATE_USER_PASSWORD or 
+                    args.adminPassword != admin.TEMPLATE_ADMIN_PASSWORD)
+
+    def administer(self, args):
+        """
+        Applies the passwords, users and clients to the ready server
+
+        Every change is applied in one batch through the admin REST 
+        API, with one admin login over one keep-alive connection. The 
+        admin logs in with its new password, which a persistent 
+        database already holds, before the password of the template
+
+        Parameters:
+
+        argparse.Namespace args - The object containing the command-line 
+                                  arguments as attributes
+
+        Returns: None
+        """
+        passwords = [args.adminPassword]
+        if args.adminPassword != admin.TEMPLATE_ADMIN_PASSWORD:
+            passwords.append(admin.TEMPLATE_ADMIN_PASSWORD)
+        self.admin = admin.admin(args.keycloakIP, args.keycloakPort, args.adminUsername, 
+                                 passwords, float(args.readyTimeout))
+        try:
+            if args.userPassword != admin.TEMPLATE_USER_PASSWORD:
+                self.admin.queue("password", args.realmName, args.userUsername, args.userPassword)
+            if args.keycloakMutations:
+                for change in admin.mutations(args.keycloakMutations):
+                    self.admin.queue(*change)
+
+            # the admin password changes last, once nothing else needs a login
+            if args.adminPassword != admin.TEMPLATE_ADMIN_PASSWORD:
+                self.admin.queue("password", "master", args.adminUsername, args.adminPassword)
+            self.adminChanges = self.admin.apply()
+        finally:
+            self.admin.close()
 
     def deploySingularity(self, args):
         """
@@ -112,23 +536,44 @@ class keycloak:
 
         Returns: None
         """        
-        # remove existing images
-        imgList = [self.imgName, self.zipName]
-        for img in imgList:
-            # check if the compressed/uncompressed image already exists
-            duplicateImg = os.path.exists(img)
-            # remove the existing image
-            # images that have already been executed cannot be re-executed
-            if duplicateImg:
-                os.remove(img)
-
-        # download the compressed singularity image
-        gitUrl = "https://github.com/DaleDupont/singularity-keycloak/releases/download/0.0.1/key.img.gz"
-        subprocess.call(["wget", gitUrl, "-P", self.keycloakDir])
-
-        # decompress the compressed singularity image
-        subprocess.call(["gunzip", self.zipName])
+        self.fetchSingularity(args.keycloakImageUrl, args.keycloakChecksum)
+        self.startSingularity(args)
+
+    def fetchSingularity(self, imageUrl, checksum=None):
+        """
+        Prepares a writable copy of the keycloak singularity image
+
+        The compressed image is only downloaded when it is not in
+        the artifact cache. It is decompressed while it downloads 
+        and every run receives its own writable copy, as images 
+        that have already been executed cannot be re-executed
+
+        Parameters:
+
+        str imageUrl - The URL of the gzipped 0.0.1 release image
+                       (the release on GitHub or a mirror of it)
+        str checksum - The expected sha256 of the decompressed image
+
+        Returns: None
+        """
+        # fetch the pristine image from the cache or the release,
+        # keyed by its URL and checksum
+        imageKey = artifacts.sourceKey("keycloak", imageUrl, checksum)
+        pristine = self.artifacts.fetch(imageKey, imageUrl, checksum)
+
+        # run from a copy so the pristine image is never modified
+        self.imgName = self.artifacts.workingCopy(pristine, "keycloak.img")
+
+    def startSingularity(self, args):
+        """
+        Runs the keycloak singularity image in the background
+
+        Parameters:
 
+        argparse.Namespace args - object with command-line arguments as attributes
+
+        Returns: None
+        """
         # set the environment variables to use
         # inside the container
         # PORT - Port number Keycloak listens to
@@ -140,26 +585,37 @@ class keycloak:
         # USER_PASSWORD - User account password
         envList = [("SINGULARITYENV_PORT", args.keycloakPort), 
                    ("SINGULARITYENV_IPADDR", args.keycloakIP), 
-                   ("SINGULARITYENV_CONFIGFILE", self.configJson), 
+                   ("SINGULARITYENV_CONFIGFILE", self.realmFile), 
                    ("SINGULARITYENV_REALM_NAME", args.realmName), 
                    ("SINGULARITYENV_ADMIN_USERNAME", args.adminUsername), 
                    ("SINGULARITYENV_ADMIN_PASSWORD", args.adminPassword), 
                    ("SINGULARITYENV_USER_USERNAME", args.userUsername), 
                    ("SINGULARITYENV_USER_PASSWORD", args.userPassword)]
 
-        for envVar in envList:
-            os.environ[envVar[0]] = envVar[1]
+        # the environment is passed to the process rather than
+        # written to os.environ as other steps run concurrently
+        env = dict(os.environ)
+        env.update(envList)
+
+        # the image of every run is a fresh copy, which imports the realm
+        self.realmAction = "imported"
 
         # execute the image
-        subprocess.Popen(["singularity", "run", "--writable", self.imgName])
+        run = ["singularity", "run", "--writable", self.imgName]
+        with trace.span("singularity run", "process", argv=run) as phase:
+            self.process = subprocess.Popen(run, env=env)
+            phase.set(pid=self.process.pid)
 
 
     def config(self, args):
         """
-        Writes the keycloak.json configuration file
+        Renders the realm file imported by the keycloak server
 
-        The configuration file determines the realms, clients, 
-        and users that exist on the server and their settings
+        The realm file determines the realms, clients, 
+        and users that exist on the server and their settings.
+        It is rendered from the packaged keycloakConfig.json 
+        and reused as long as the arguments it depends on 
+        are unchanged
 
         Parameters:
 
@@ -167,48 +623,63 @@ class keycloak:
 
         Returns: None
         """        
-        # load the configuration file
-        with open(self.configJson, 'r') as configFile:
-            # load the configuration data from the file
-            configData = json.load(configFile)
-
-            # update IP and ports of authenticated servers
-            ga4ghUrl = "http://" + args.ga4ghIP + ":" + args.ga4ghPort + "/"
-            funnelUrl = "http://" + args.funnelIP + ":" + args.funnelPort + "/"
-
-            # update the realm name
-            configData[0]["realm"] = args.realmName
-            configData[0]["id"] = args.realmName
-
-            configData[0]["roles"]["realm"][0]["containerId"] = args.realmName
-            configData[0]["roles"]["realm"][1]["containerId"] = args.realmName
-
-            # update the realm name for account client
-            configData[0]["clients"][0]["baseUrl"] = "/auth/realms/" + args.realmName + "/account"
-            configData[0]["clients"][0]["redirectUris"] = [ "/auth/realms/" + args.realmName + "/account/*" ]
-
-            # update the realm name for security-admin-console client
-            configData[0]["clients"][6]["baseUrl"] = "/auth/admin/" + args.realmName + "/console/index.html"
-            configData[0]["clients"][6]["redirectUris"]  = ["/auth/admin/" + args.realmName + "/console/*"]
-
-            # configure funnel client
-            configData[0]["clients"][3]["clientId"] = args.funnelID
-            configData[0]["clients"][3]["secret"] = args.funnelSecret
-            configData[0]["clients"][3]["baseUrl"] = funnelUrl
-            configData[0]["clients"][3]["redirectUris"] = [ funnelUrl + "*" ]
-            #configData[0]["clients"][3]["adminUrl"] = funnelUrl
-
-            # configure ga4gh client
-            configData[0]["clients"][4]["clientId"] = args.ga4ghID
-            configData[0]["clients"][4]["secret"] = args.ga4ghSecret
-            configData[0]["clients"][4]["baseUrl"] =  ga4ghUrl
-            configData[0]["clients"][4]["redirectUris"] = [ ga4ghUrl + "*" ]
-            #configData[0]["clients"][4]["adminUrl"] = ga4ghUrl
-
-            # configure the user and admin
-            configData[0]["users"][0]["username"] = args.userUsername
-            configData[1]["users"][0]["username"] = args.adminUsername
-
-        # write the configuration data to the file
-        with open(self.configJson, "w") as configFile:
-            json.dump(configData, configFile, indent=1)
+        # the IP and ports of authenticated servers
+        model = self.render.endpoints(args)
+
+        values = {"realmName": args.realmName, 
+                  "ga4ghID": args.ga4ghID, 
+                  "ga4ghSecret": args.ga4ghSecret, 
+                  "ga4ghUrl": model.ga4ghUrl, 
+                  "ga4ghUrls": model.ga4ghUrls, 
+                  "funnelID": args.funnelID, 
+                  "funnelSecret": args.funnelSecret, 
+                  "funnelUrl": model.funnelUrl, 
+                  "userUsername": args.userUsername, 
+                  "adminUsername": args.adminUsername}
+
+        self.realmFile = self.realmTemplate.render(values)
+
+    def deployed(self, args):
+        """
+        Describes the deployed server for the state store
+
+        Parameters:
+
+        argparse.Namespace args - The object containing the command-line 
+                                  arguments as attributes
+
+        Returns:
+
+        list records - One dict with the service, name, kind ("container" 
+                       or "process"), containerId, image, specHash, port, 
+                       pid and action of the server
+        """
+        if args.singularity:
+            return [{"service": "keycloak", "name": "keycloak", "kind": "process", 
+                     "image": self.imgName, "port": args.keycloakPort, 
+                     "pid": self.process.pid if self.process else None}]
+        return [{"service": "keycloak", "name": args.keycloakContainerName, "kind": "container", 
+                 "containerId": self.containerId, "image": self.imageReference(), 
+                 "specHash": self.specHash, "port": args.keycloakPort, "action": self.action}]
+
+    def rendered(self):
+        """
+        Returns the rendered configuration recorded by a deployment plan
+
+        Returns:
+
+        dict state - files: the rendered realm file
+        """
+        return {"files": [self.realmFile]}
+
+    def restore(self, state):
+        """
+        Restores the configuration rendered when a plan was compiled
+
+        Parameters:
+
+        dict state - The state returned by rendered
+
+        Returns: None
+        """
+        self.realmFile = state["files"][0]
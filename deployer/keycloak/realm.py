@@ -0,0 +1,263 @@
+"""
+Rendering of the Keycloak realm export for a deployment
+
+The packaged keycloakConfig.json is a template: it is never written
+to. Each set of deployment values is rendered into its own minified
+file named after a hash of the template and the values, so a deploy
+whose inputs are unchanged reuses the rendered file without parsing
+any JSON. The rendered files hold passwords and secrets, so they are
+private to the user and only the most recently used ones are kept
+"""
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from .. import paths
+
+# the version of the rendering rules, part of the cache key
+RENDER_VERSION = 1
+
+# the number of rendered realms kept in the cache
+KEEP_RENDERED = 8
+
+
+class realmError(Exception):
+    """
+    Raised when the realm template lacks a realm, client, role or user
+    """
+
+
+def index(realms):
+    """
+    Indexes the realms of an export by name
+
+    Parameters:
+
+    list realms - The realm representations of a Keycloak export
+
+    Returns:
+
+    dict realmIndex - Maps each realm name to a dict holding the
+                      realm itself and its clients (by clientId),
+                      realm roles (by name) and users (by username)
+    """
+    realmIndex = {}
+    for realm in realms:
+        realmIndex[realm["realm"]] = {
+            "realm": realm,
+            "clients": dict((client["clientId"], client)
+                            for client in realm.get("clients", [])),
+            "roles": dict((role["name"], role)
+                          for role in realm.get("roles", {}).get("realm", [])),
+            "users": dict((user["username"], user)
+                          for user in realm.get("users", []))}
+    return realmIndex
+
+
+def lookup(entries, name):
+    """
+    Returns an indexed entry of the template
+
+    Parameters:
+
+    dict entries - Maps IDs to realms, clients, roles or users
+    str name - The ID in the template
+
+    Returns:
+
+    dict entry - The entry with the ID
+
+    Raises:
+
+    realmError - If the template has no entry with the ID
+    """
+    if name not in entries:
+        raise realmError("The realm template has no entry " + name)
+    return entries[name]
+
+
+class realm:
+    """
+    Compiled Keycloak realm template with a cache of rendered realms
+
+    The template is parsed and indexed on the first render that
+    misses the cache. Clients, roles and users are addressed by
+    their ID in the template (e.g. the ga4gh client or the user
+    account) rather than their position, so a regenerated export
+    keeps working as long as those IDs are kept.
+
+    The realms the template provides:
+
+    CanDIG (renamed to the realm name)
+        clients: account, funnel, ga4gh, security-admin-console
+        roles: offline_access, uma_authorization
+        users: user
+    master
+        users: admin
+    """
+
+    def __init__(self, templateFile, outputDir=None, keep=KEEP_RENDERED):
+        """
+        Constructor for the realm renderer
+
+        Parameters:
+
+        str templateFile - The Keycloak realm export to render from
+        str outputDir - The directory of the rendered realms
+                        (default: realms in the cache directory)
+        int keep - The number of rendered realms to keep
+
+        Returns: realm
+        """
+        if outputDir is None:
+            outputDir = paths.cacheDir("realms")
+        self.templateFile = templateFile
+        self.outputDir = outputDir
+        self.keep = keep
+        self.template = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, values):
+        """
+        Hashes the template and the deployment values
+
+        Parameters:
+
+        dict values - The deployment values (see render)
+
+        Returns:
+
+        str digest - The sha256 naming the rendered realm
+        """
+        digest = hashlib.sha256()
+        digest.update(str(RENDER_VERSION).encode("utf-8"))
+        with open(self.templateFile, "rb") as templateHandle:
+            digest.update(templateHandle.read())
+        digest.update(json.dumps(values, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def compile(self):
+        """
+        Parses the template once
+
+        Returns:
+
+        list realms - The pristine realm representations
+        """
+        if self.template is None:
+            with open(self.templateFile) as templateHandle:
+                self.template = json.load(templateHandle)
+        return self.template
+
+    def render(self, values):
+        """
+        Returns the realm file rendered from the deployment values
+
+        Parameters:
+
+        dict values - The deployment values:
+                      realmName, ga4ghID, ga4ghSecret, ga4ghUrl,
+                      funnelID, funnelSecret, funnelUrl,
+                      userUsername and adminUsername, and optionally
+                      ga4ghUrls (the base URLs of every replica)
+
+        Returns:
+
+        str realmFile - The minified rendered realm
+
+        Raises:
+
+        realmError - If the template lacks an entry the values apply to
+        """
+        realmFile = os.path.join(self.outputDir, self.key(values) + ".json")
+        with self.lock:
+            if os.path.exists(realmFile):
+                # mark the realm as recently used
+                os.utime(realmFile)
+                self.hits += 1
+                return realmFile
+
+            realms = copy.deepcopy(self.compile())
+            self.apply(index(realms), values)
+
+            # write atomically so concurrent deploys never read a partial file
+            tempHandle, tempName = tempfile.mkstemp(dir=self.outputDir, suffix=".part")
+            with os.fdopen(tempHandle, "w") as realmHandle:
+                json.dump(realms, realmHandle, separators=(",", ":"))
+            os.chmod(tempName, 0o600)
+            os.rename(tempName, realmFile)
+            self.misses += 1
+            self.evict()
+            return realmFile
+
+    def evict(self):
+        """
+        Removes the least recently used rendered realms beyond the 
+        number to keep
+
+        Returns: None
+        """
+        rendered = []
+        for name in os.listdir(self.outputDir):
+            path = os.path.join(self.outputDir, name)
+            if name.endswith(".json"):
+                try:
+                    rendered.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        for used, path in sorted(rendered, reverse=True)[self.keep:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def apply(self, realmIndex, values):
+        """
+        Applies the deployment values to the indexed realms
+
+        Parameters:
+
+        dict realmIndex - The index of the realms to modify
+        dict values - The deployment values (see render)
+
+        Returns: None
+        """
+        realmName = values["realmName"]
+        candig = lookup(realmIndex, "CanDIG")
+        master = lookup(realmIndex, "master")
+
+        # update the realm name
+        candig["realm"]["realm"] = realmName
+        candig["realm"]["id"] = realmName
+        for roleName in ("offline_access", "uma_authorization"):
+            lookup(candig["roles"], roleName)["containerId"] = realmName
+
+        # update the realm name for the account and admin console clients
+        account = lookup(candig["clients"], "account")
+        account["baseUrl"] = "/auth/realms/" + realmName + "/account"
+        account["redirectUris"] = ["/auth/realms/" + realmName + "/account/*"]
+
+        console = lookup(candig["clients"], "security-admin-console")
+        console["baseUrl"] = "/auth/admin/" + realmName + "/console/index.html"
+        console["redirectUris"] = ["/auth/admin/" + realmName + "/console/*"]
+
+        # configure the funnel and ga4gh clients
+        # with the redirect URIs of every replica
+        for service in ("funnel", "ga4gh"):
+            client = lookup(candig["clients"], service)
+            client["clientId"] = values[service + "ID"]
+            client["secret"] = values[service + "Secret"]
+            client["baseUrl"] = values[service + "Url"]
+            replicaUrls = values.get(service + "Urls") or [values[service + "Url"]]
+            client["redirectUris"] = [url + "*" for url in replicaUrls]
+
+        # configure the user and admin
+        lookup(candig["users"], "user")["username"] = values["userUsername"]
+        lookup(master["users"], "admin")["username"] = values["adminUsername"]
+
@@ -0,0 +1,363 @@
+"""
+Merged log follower of the managed containers
+
+One stream per container follows its timestamped log lines, each
+read by a thread of its own. The lines wait in a bounded buffer per
+stream: a reader blocks while its buffer is full, so a slow consumer
+slows the streams down instead of growing the memory. The follower
+merges the buffers into one stream ordered by timestamp, holding a
+line back until every other stream has a later line or the line is
+older than the merge delay, and marks each service as ready once a
+line matches its readiness pattern
+"""
+
+import calendar
+import collections
+import re
+import threading
+import time
+
+from . import engine
+from . import reconcile
+
+
+# the lines a stream may buffer before its reader blocks
+BUFFER_LINES = 1000
+
+# the seconds a line waits for the lines of slower streams
+MERGE_DELAY = 0.25
+
+# the seconds between the attempts to open the logs of a container
+# that does not exist or is not running yet
+RETRY_DELAY = 0.5
+
+# the log lines of the services once they accept requests
+READY_PATTERNS = {"keycloak": r"WFLYSRV0025|Keycloak .* started in",
+                  "ga4gh": r"resuming normal operations",
+                  "funnel": r"Server listening|Listening on"}
+
+# the timestamp docker puts in front of every line
+TIMESTAMP = re.compile(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(\.\d+)?Z ")
+
+
+def parseLine(line):
+    """
+    Splits a log line into its timestamp and text
+
+    Parameters:
+
+    bytes line - The line, e.g. 2018-03-01T10:00:00.123456789Z text
+
+    Returns:
+
+    tuple entry - The UNIX time of the line (None if it has no
+                  timestamp) and its text without the line break
+    """
+    text = line.decode("utf-8", "replace").rstrip("\r\n")
+    match = TIMESTAMP.match(text)
+    if not match:
+        return None, text
+    seconds = calendar.timegm(time.strptime(match.group(1), "%Y-%m-%dT%H:%M:%S"))
+    return seconds + float(match.group(2) or 0), text[match.end():]
+
+
+def containers(docker, services=None):
+    """
+    Lists the managed containers with their services
+
+    Parameters:
+
+    object docker - The client of the Docker daemon
+    list services - Only list the containers of these services
+
+    Returns:
+
+    list containers - (service, name) tuples
+    """
+    found = []
+    for name in docker.listContainers({reconcile.MANAGED_LABEL: "true"}):
+        inspection = docker.inspectContainer(name) or {}
+        service = ((inspection.get("Config") or {}).get("Labels") or {}).get(
+            reconcile.SERVICE_LABEL, name)
+        if not services or service in services:
+            found.append((service, name))
+    return found
+
+
+class stream:
+    """
+    The buffered lines of the log stream of one container
+    """
+
+    def __init__(self, service, name, readyPattern=None):
+        """
+        Constructor for the stream of a container
+
+        Parameters:
+
+        str service - The service of the container
+        str name - The name of the container
+        str readyPattern - The line of the service once it is ready
+
+        Returns: stream
+        """
+        self.service = service
+        self.name = name
+        self.readyPattern = re.compile(readyPattern) if readyPattern else None
+        self.lines = collections.deque()
+        self.first = None
+        self.last = None
+        self.ready = None
+        self.ended = False
+        self.error = None
+        self.source = None
+
+
+class follower:
+    """
+    Follows the log streams of several containers and merges them
+    """
+
+    def __init__(self, docker, containerList, pattern=None, follow=True, tail="all",
+                 since=None, wait=False, bufferLines=BUFFER_LINES, delay=MERGE_DELAY):
+        """
+        Constructor for the follower
+
+        Parameters:
+
+        object docker - The client of the Docker daemon
+        list containerList - (service, name) tuples of the containers
+        str pattern - Only pass the lines matching this regular expression
+        bool follow - Keep following the streams for new lines
+        str tail - The number of earlier lines of each container, or all
+        float since - Only pass the lines logged after this UNIX time
+        bool wait - Wait for containers that do not exist or run yet,
+                    reopening their streams until the follower is stopped
+        int bufferLines - The lines buffered per stream
+        float delay - The seconds a line waits for slower streams
+
+        Returns: follower
+        """
+        self.docker = docker
+        self.streams = [stream(service, name, READY_PATTERNS.get(service))
+                        for service, name in containerList]
+        for logStream in self.streams:
+            logStream.last = since
+        self.pattern = re.compile(pattern) if pattern else None
+        self.follow = follow
+        self.tail = tail
+        self.wait = wait
+        self.bufferLines = bufferLines
+        self.delay = delay
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+        self.finishing = threading.Event()
+        self.threads = []
+        self.sequence = 0
+
+    def put(self, logStream, entry):
+        """
+        Appends an entry to the buffer of a stream, blocking while it is full
+
+        Parameters:
+
+        stream logStream - The stream of the entry
+        tuple entry - (time, sequence, stream, text, ready)
+
+        Returns: None
+        """
+        with self.condition:
+            while len(logStream.lines) >= self.bufferLines and not self.stopped.is_set():
+                self.condition.wait()
+            logStream.lines.append(entry)
+            self.condition.notify_all()
+
+    def read(self, logStream):
+        """
+        Reads the log stream of one container until it ends or is stopped
+
+        Parameters:
+
+        stream logStream - The stream of the container
+
+        Returns: None
+        """
+        while not self.stopped.is_set():
+            # after finish, the lines logged so far are read once more
+            final = self.finishing.is_set()
+            follow = self.follow and not final
+            since = logStream.last
+            try:
+                source = self.docker.logsStream(logStream.name, follow, self.tail, since)
+                logStream.source = source if follow else None
+                # the follower may have been stopped while the stream opened
+                if self.stopped.is_set() or (follow and self.finishing.is_set()):
+                    source.close()
+                    continue
+                for line in source:
+                    seconds, text = parseLine(line)
+                    # the docker program reports its errors without a timestamp
+                    if seconds is None:
+                        if not self.wait:
+                            logStream.error = text
+                        continue
+                    # a reopened stream repeats the lines of its last second
+                    if since is not None and seconds <= since:
+                        continue
+                    logStream.last = seconds
+                    if logStream.first is None:
+                        logStream.first = seconds
+
+                    matched = self.pattern is None or self.pattern.search(text)
+                    if matched:
+                        self.put(logStream, (seconds, self.next(), logStream, text, False))
+                    if (logStream.ready is None and logStream.readyPattern is not None and
+                            logStream.readyPattern.search(text)):
+                        logStream.ready = seconds - logStream.first
+                        self.put(logStream, (seconds, self.next(), logStream, text, True))
+                source.close()
+            except (OSError, ValueError, engine.engineError) as error:
+                # a stream closed by stop or finish ends with an error as well
+                if not self.stopped.is_set() and not self.finishing.is_set() and not self.wait:
+                    logStream.error = error
+            if final or not self.wait or not self.follow:
+                break
+            self.finishing.wait(RETRY_DELAY)
+
+        with self.condition:
+            logStream.ended = True
+            self.condition.notify_all()
+
+    def next(self):
+        """
+        Returns the next sequence number, which orders lines of the same time
+        """
+        with self.condition:
+            self.sequence += 1
+            return self.sequence
+
+    def start(self):
+        """
+        Opens the stream of every container, each read by its own thread
+
+        Returns: None
+        """
+        for logStream in self.streams:
+            thread = threading.Thread(target=self.read, args=(logStream,),
+                                      name="logs " + logStream.name)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def finish(self, timeout=5):
+        """
+        Reads the lines logged so far and closes the streams
+
+        Each stream is read once more without following it, so the
+        lines of containers that were about to be reopened are not
+        lost, and entries returns once they are merged
+
+        Parameters:
+
+        float timeout - The seconds to wait for each thread
+
+        Returns: None
+        """
+        self.finishing.set()
+        for logStream in self.streams:
+            if logStream.source is not None:
+                logStream.source.close()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.stop(timeout)
+
+    def stop(self, timeout=5):
+        """
+        Closes the streams and waits for their threads
+
+        The lines already buffered are still returned by entries
+
+        Parameters:
+
+        float timeout - The seconds to wait for each thread
+
+        Returns: None
+        """
+        self.stopped.set()
+        with self.condition:
+            self.condition.notify_all()
+        for logStream in self.streams:
+            if logStream.source is not None:
+                logStream.source.close()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def entries(self):
+        """
+        Returns the merged entries of the streams in timestamp order
+
+        An entry is returned once every stream still open has a later
+        entry buffered, or once it has waited for the merge delay
+
+        Returns:
+
+        generator entries - (time, sequence, stream, text, ready) tuples,
+                            ready being True for the marker of a service
+                            that became ready, until every stream ended
+        """
+        waiting = {}
+        while True:
+            with self.condition:
+                while True:
+                    heads = [logStream for logStream in self.streams if logStream.lines]
+                    now = time.time()
+                    for logStream in heads:
+                        waiting.setdefault(logStream.lines[0][1], now)
+                    if not heads:
+                        if all(logStream.ended for logStream in self.streams):
+                            return
+                        self.condition.wait()
+                        continue
+                    oldest = min(heads, key=lambda logStream: logStream.lines[0][:2])
+                    complete = all(logStream.lines or logStream.ended
+                                   for logStream in self.streams)
+                    held = now - waiting[oldest.lines[0][1]]
+                    if complete or held >= self.delay:
+                        entry = oldest.lines.popleft()
+                        waiting.pop(entry[1], None)
+                        self.condition.notify_all()
+                        break
+                    self.condition.wait(self.delay - held)
+            yield entry
+
+    def errors(self):
+        """
+        Returns the containers whose stream failed
+
+        Returns:
+
+        dict errors - Maps container names to their errors
+        """
+        return dict((logStream.name, logStream.error) for logStream in self.streams
+                    if logStream.error is not None)
+
+
+def formatEntry(entry, width=0):
+    """
+    Formats a merged entry as a line prefixed with its time and container
+
+    Parameters:
+
+    tuple entry - (time, sequence, stream, text, ready) from follower.entries
+    int width - The width of the container column
+
+    Returns:
+
+    str line - e.g. 10:00:00.123 keycloak_candig | text
+    """
+    seconds, sequence, logStream, text, ready = entry
+    stamp = time.strftime("%H:%M:%S", time.localtime(seconds)) + "{0:.3f}".format(seconds % 1)[1:]
+    if ready:
+        text = "*** {0} ready after {1:.1f} seconds of logs".format(logStream.service,
+                                                                   logStream.ready)
+    return "{0} {1:<{2}} | {3}".format(stamp, logStream.name, width, text)
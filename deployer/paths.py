@@ -0,0 +1,94 @@
+"""
+Locations of the files the deployer keeps between runs
+
+Caches and state live in the user's XDG directories rather
+than in the installed package directory
+"""
+
+import importlib
+import os
+
+
+def resource(package, *names):
+    """
+    Returns the path of a file shipped inside a package
+
+    The package is imported if needed but, unlike pkg_resources,
+    no installed distribution is scanned
+
+    Parameters:
+
+    str package - The dotted name of the package, e.g. deployer.keycloak
+    str names - The path components below the package directory
+
+    Returns:
+
+    str path - The absolute path of the file or directory
+    """
+    try:
+        from importlib.resources import files
+        base = str(files(package))
+    except ImportError:
+        # importlib.resources.files needs python 3.9
+        base = os.path.dirname(importlib.import_module(package).__file__)
+    return os.path.join(base, *names)
+
+
+def cacheDir(*names):
+    """
+    Returns a directory inside the deployer's cache directory
+
+    The directory is created if it does not exist
+
+    Parameters:
+
+    str names - The path components below the cache directory
+
+    Returns:
+
+    str path - The absolute path of the directory
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "candigDeploy", *names)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def dataDir(*names):
+    """
+    Returns a directory inside the deployer's data directory
+
+    The directory is created if it does not exist
+
+    Parameters:
+
+    str names - The path components below the data directory
+
+    Returns:
+
+    str path - The absolute path of the directory
+    """
+    base = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    path = os.path.join(base, "candigDeploy", *names)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def stateDir(*names):
+    """
+    Returns a directory inside the deployer's state directory
+
+    The directory is created if it does not exist
+
+    Parameters:
+
+    str names - The path components below the state directory
+
+    Returns:
+
+    str path - The absolute path of the directory
+    """
+    base = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    path = os.path.join(base, "candigDeploy", *names)
+    os.makedirs(path, exist_ok=True)
+    return path
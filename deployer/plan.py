@@ -0,0 +1,445 @@
+"""
+Serializable deployment plans
+
+A plan is compiled from the command-line arguments before anything
+is deployed. The *.config steps render the configuration files at
+compile time, and the plan records the inputs, the sha256 of every
+rendered file and the remaining operations with their dependencies:
+
+    {"version": 2,
+     "key": "<sha256 of the inputs, the secrets and the templates>",
+     "inputs": {"keycloakPort": "8080", "ga4ghPorts": ["8000"], ...},
+     "secrets": "<sha256 of the passwords and client secrets>",
+     "teardown": true,
+     "services": {"keycloak": {"files": [{"path": "...", "sha256": "..."}]}, ...},
+     "operations": [{"name": "keycloak.pull", "after": []}, ...]}
+
+Applying a plan checks the hashes of the rendered files and hands
+them back to the subdeployers (their restore methods) instead of
+rendering them again, then runs the operations. Plans are cached by
+key, so a deploy with the same inputs reuses the previous plan.
+
+The passwords and client secrets are left out of the inputs, so that
+plans can be shared: only their hash is recorded, and apply takes them
+from the command line or the environment again
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from . import engine
+from . import paths
+from . import reconcile
+from . import scheduler
+from . import trace
+
+
+# the version of the plan format, part of the plan key
+PLAN_VERSION = 2
+
+# the options that change how a plan is executed or reported
+# but not what it deploys, left out of the inputs
+RUNTIME_OPTIONS = ("command", "planFile", "dryRun", "savePlan", "profile", "workers",
+                   "readyTimeout", "offline", "dockerCli", "showImageCache", "clearImageCache",
+                   "artifactCacheSize", "inventory", "inventoryParallel", "hostTimeout",
+                   "stopTimeout", "removeImages", "removeVolumes", "statsInterval",
+                   "statsCount", "statsFormat", "followLogs", "logsService", "logsGrep",
+                   "logsTail", "logsNoFollow")
+
+# the passwords and client secrets, hashed rather than recorded
+SECRET_OPTIONS = ("adminPassword", "userPassword", "ga4ghSecret", "funnelSecret")
+
+
+class planError(Exception):
+    """
+    Raised when a plan cannot be read or no longer matches the deployer
+    or its rendered files
+    """
+
+
+def inputs(args):
+    """
+    Returns the arguments that determine what is deployed, 
+    without the secrets (see secretHash)
+
+    Parameters:
+
+    argparse.Namespace args - command-line arguments object
+
+    Returns:
+
+    dict inputs - The argument values by attribute name
+    """
+    return dict((name, value) for name, value in sorted(vars(args).items())
+                if name not in RUNTIME_OPTIONS and name not in SECRET_OPTIONS)
+
+
+def secretHash(args):
+    """
+    Hashes the passwords and client secrets of a deployment
+
+    Parameters:
+
+    argparse.Namespace args - command-line arguments object
+
+    Returns:
+
+    str digest - The sha256 of the secret argument values
+    """
+    secrets = [getattr(args, name, None) for name in SECRET_OPTIONS]
+    return hashlib.sha256(json.dumps(secrets).encode("utf-8")).hexdigest()
+
+
+def key(args, services):
+    """
+    Computes the cache key of the plan of a deployment
+
+    Parameters:
+
+    argparse.Namespace args - command-line arguments object
+    list services - (name, subdeployer) tuples of the deployment
+
+    Returns:
+
+    str key - The sha256 of the plan version, the inputs, the secrets,
+              the docker endpoint and the templates of the subdeployers
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([PLAN_VERSION, inputs(args), secretHash(args), engine.endpoint()], 
+                             sort_keys=True).encode("utf-8"))
+    for name, subdeployer in services:
+        templates = getattr(subdeployer, "templates", [])
+        digest.update((name + ":" + reconcile.fileHash(templates)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def fileStates(fileNames):
+    """
+    Records the hashes of rendered files
+
+    Parameters:
+
+    list fileNames - The rendered files
+
+    Returns:
+
+    list files - path and sha256 dicts
+    """
+    return [{"path": fileName, "sha256": reconcile.fileHash([fileName])}
+            for fileName in fileNames]
+
+
+def compilePlan(args, services, planKey=None):
+    """
+    Renders the configuration of a deployment and records its plan
+
+    Parameters:
+
+    argparse.Namespace args - command-line arguments object
+    list services - (name, subdeployer) tuples of the deployment
+    str planKey - The key of the plan (default: computed from args)
+
+    Returns:
+
+    tuple compiled - the plan dict and the steps left to run
+    """
+    if planKey is None:
+        planKey = key(args, services)
+
+    with trace.span("plan.compile"):
+        # listing the steps allocates the ga4gh replica ports
+        steps = []
+        for name, subdeployer in services:
+            steps += subdeployer.steps(args)
+
+        # render the configuration files concurrently
+        configScheduler = scheduler.scheduler(args.workers)
+        configScheduler.addSteps([step for step in steps if isConfig(step[0])])
+        configScheduler.run()
+
+        # record the rendered files of the services that rendered them
+        states = {}
+        rendered = set(step[0].split(".")[0] for step in steps if isConfig(step[0]))
+        for name, subdeployer in services:
+            if name in rendered and hasattr(subdeployer, "rendered"):
+                state = subdeployer.rendered()
+                state["files"] = fileStates(state["files"])
+                states[name] = state
+
+    steps = [step for step in steps if not isConfig(step[0])]
+    compiled = {"version": PLAN_VERSION,
+                "key": planKey,
+                "inputs": inputs(args),
+                "secrets": secretHash(args),
+                "teardown": not args.reconcile,
+                "services": states,
+                "operations": operations(steps)}
+    return compiled, remaining(steps)
+
+
+def restore(compiled, args, services):
+    """
+    Restores a deployment from its plan
+
+    The inputs of the plan replace the arguments, the subdeployers
+    are handed the rendered files after their hashes are checked,
+    and their steps are checked against the operations of the plan
+
+    Parameters:
+
+    dict compiled - The plan
+    argparse.Namespace args - command-line arguments object, updated
+                              with the inputs of the plan
+    list services - (name, subdeployer) tuples of the deployment
+
+    Returns:
+
+    list steps - The steps to run
+
+    Raises:
+
+    planError - If a rendered file changed, the secrets differ from the 
+                ones the plan was compiled with or the steps differ 
+                from the plan
+    """
+    if compiled.get("version") != PLAN_VERSION:
+        raise planError("The plan has version {0}, expected {1}".format(
+            compiled.get("version"), PLAN_VERSION))
+    if secretHash(args) != compiled.get("secrets"):
+        raise planError("The passwords and client secrets differ from the ones the plan "
+                        "was compiled with; pass them as options or CANDIG_* variables")
+
+    with trace.span("plan.restore"):
+        arguments(compiled, args)
+
+        # the rendered files must still hold what the plan recorded
+        subdeployers = dict(services)
+        for name, state in sorted(compiled["services"].items()):
+            for entry in state["files"]:
+                try:
+                    digest = reconcile.fileHash([entry["path"]])
+                except (IOError, OSError):
+                    digest = None
+                if digest != entry["sha256"]:
+                    raise planError("The rendered file " + entry["path"] +
+                                    " is missing or changed since the plan was compiled")
+            if name not in subdeployers:
+                raise planError("The plan deploys " + name + ", which is not selected")
+            state = dict(state, files=[entry["path"] for entry in state["files"]])
+            subdeployers[name].restore(state)
+
+        steps = []
+        for name, subdeployer in services:
+            steps += subdeployer.steps(args)
+        steps = [step for step in steps if not isConfig(step[0])]
+
+    if operations(steps) != compiled["operations"]:
+        raise planError("The operations of the plan differ from the steps of the deployer")
+    return remaining(steps)
+
+
+def arguments(compiled, args):
+    """
+    Replaces the arguments with the inputs of a plan
+
+    The runtime options (see RUNTIME_OPTIONS) and the secrets 
+    (see SECRET_OPTIONS) keep their values
+
+    Parameters:
+
+    dict compiled - The plan
+    argparse.Namespace args - command-line arguments object
+
+    Returns: None
+    """
+    for name, value in compiled["inputs"].items():
+        setattr(args, name, value)
+
+
+def isConfig(stepName):
+    """
+    Determines whether a step renders configuration at compile time
+
+    Parameters:
+
+    str stepName - The name of the step, e.g. ga4gh.config
+
+    Returns:
+
+    bool config - True for the *.config steps
+    """
+    return stepName.endswith(".config")
+
+
+def remaining(steps):
+    """
+    Drops the dependencies on the *.config steps, which ran when
+    the plan was compiled, from the steps left to run
+
+    Parameters:
+
+    list steps - (name, function, dependencies) tuples without the *.config steps
+
+    Returns:
+
+    list steps - The steps with their dependencies on *.config steps removed
+    """
+    return [(name, function, [dep for dep in dependencies if not isConfig(dep)])
+            for name, function, dependencies in steps]
+
+
+def unfinished(steps, done):
+    """
+    Drops the steps a resumed deployment already completed, which
+    count as satisfied dependencies of the steps left to run
+
+    A completed step still runs when a step of the same service
+    runs after it, as a subdeployer hands the results of its steps
+    (the image digest, the spec hash, the reconcile action) to its
+    next steps in memory
+
+    Parameters:
+
+    list steps - (name, function, dependencies) tuples
+    list done - The names of the steps completed by the deployment resumed
+
+    Returns:
+
+    list steps - The steps left to run, without the dependencies on skipped steps
+    """
+    def service(name):
+        return name.split(".")[0]
+
+    # keep the completed steps a step of their service still needs
+    skipped = set(done)
+    changed = True
+    while changed:
+        changed = False
+        for name, function, dependencies in steps:
+            if name in skipped:
+                continue
+            for dep in dependencies:
+                dep = dep.lstrip(scheduler.OPTIONAL)
+                if dep in skipped and service(dep) == service(name):
+                    skipped.discard(dep)
+                    changed = True
+
+    return [(name, function, [dep for dep in dependencies
+                              if dep.lstrip(scheduler.OPTIONAL) not in skipped])
+            for name, function, dependencies in steps if name not in skipped]
+
+
+def operations(steps):
+    """
+    Records the operations of steps
+
+    Parameters:
+
+    list steps - (name, function, dependencies) tuples
+
+    Returns:
+
+    list operations - name and after (the dependencies) dicts in step order
+    """
+    return [{"name": name, "after": list(dependencies)}
+            for name, function, dependencies in steps]
+
+
+def save(compiled, fileName):
+    """
+    Writes a plan atomically as JSON
+
+    Parameters:
+
+    dict compiled - The plan
+    str fileName - The file to write
+
+    Returns: None
+    """
+    directory = os.path.dirname(os.path.abspath(fileName))
+    os.makedirs(directory, exist_ok=True)
+    tempHandle, tempName = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(tempHandle, "w") as planHandle:
+            json.dump(compiled, planHandle, indent=1, sort_keys=True)
+        os.rename(tempName, fileName)
+    except BaseException:
+        if os.path.exists(tempName):
+            os.remove(tempName)
+        raise
+
+
+def load(fileName):
+    """
+    Reads a plan written by save
+
+    Parameters:
+
+    str fileName - The plan file
+
+    Returns:
+
+    dict compiled - The plan
+
+    Raises:
+
+    planError - If the file is not a plan
+    """
+    try:
+        with open(fileName) as planHandle:
+            compiled = json.load(planHandle)
+    except (IOError, OSError, ValueError) as error:
+        raise planError("Cannot read the plan " + fileName + ": " + str(error))
+    if not isinstance(compiled, dict) or not all(
+            field in compiled for field in ("version", "inputs", "services", "operations")):
+        raise planError(fileName + " is not a deployment plan")
+    return compiled
+
+
+def cacheFile(planKey):
+    """
+    Returns the file caching the plan with a key
+
+    Parameters:
+
+    str planKey - The key of the plan
+
+    Returns:
+
+    str fileName - plans/<key>.json in the cache directory
+    """
+    return os.path.join(paths.cacheDir("plans"), planKey + ".json")
+
+
+def describe(compiled):
+    """
+    Returns a listing of a plan
+
+    Parameters:
+
+    dict compiled - The plan
+
+    Returns:
+
+    str listing - The rendered files of each *.config step, 
+                  then the operations in order
+    """
+    lines = ["Plan " + compiled["key"][:12], "\nRendered configuration:"]
+    for name, state in sorted(compiled["services"].items()):
+        for entry in state["files"]:
+            lines.append("  {0:<16} {1} {2}".format(name + ".config", entry["sha256"][:12], 
+                                                   entry["path"]))
+
+    lines.append("\nOperations:")
+    if compiled["teardown"]:
+        lines.append("  teardown")
+    width = max([len(operation["name"]) for operation in compiled["operations"]] + [0])
+    for operation in compiled["operations"]:
+        line = "  {0:<{1}}".format(operation["name"], width)
+        if operation["after"]:
+            line += "  after " + ", ".join(dep.lstrip(scheduler.OPTIONAL) 
+                                           for dep in operation["after"])
+        lines.append(line.rstrip())
+    return "\n".join(lines)
@@ -0,0 +1,136 @@
+"""
+Allocation of host ports for replicated servers
+
+Docker publishes container ports on every interface of the host,
+so a port is available when nothing on the host listens on it and
+no container of the daemon publishes it. The listening sockets can
+only be checked when the daemon runs on this machine
+"""
+
+import socket
+
+
+# the highest port number that can be allocated
+MAX_PORT = 65535
+
+
+def available(port):
+    """
+    Determines whether a host port is free to publish
+
+    Parameters:
+
+    int port - The port number
+
+    Returns:
+
+    bool free - True if a socket can bind the port on every interface
+    """
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        # ignore connections of earlier deployments in TIME_WAIT
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        probe.bind(("", port))
+    except OSError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def published(docker):
+    """
+    Lists the host ports published by the containers of a daemon
+
+    Stopped containers are included, as they take their ports 
+    back when they are started
+
+    Parameters:
+
+    object docker - The engine or cli client of the daemon
+
+    Returns:
+
+    set ports - The published host port numbers
+    """
+    publishedPorts = set()
+    for name in docker.listContainers({}):
+        inspection = docker.inspectContainer(name) or {}
+        bindings = (inspection.get("HostConfig") or {}).get("PortBindings") or {}
+        for entries in bindings.values():
+            publishedPorts.update(int(entry["HostPort"]) for entry in entries or [] 
+                                  if entry.get("HostPort"))
+    return publishedPorts
+
+
+def allocate(first, count, preferred=None, exclude=(), local=True):
+    """
+    Allocates the ports of a set of replicas
+
+    The first replica keeps the configured port. Each other replica
+    keeps its preferred port (the port already published by its own
+    container) or receives the next available port above the ones
+    allocated so far
+
+    Parameters:
+
+    str first - The port of the first replica
+    int count - The number of replicas
+    list preferred - The port each replica already holds, or None
+    iterable exclude - Ports reserved for other servers or published
+                       by other containers
+    bool local - True if the replicas run on this machine, whose
+                 listening sockets are then checked as well
+
+    Returns:
+
+    list ports - The port of each replica as strings
+
+    Raises:
+
+    ValueError - If the ports run out
+    """
+    preferred = preferred or [None] * count
+    exclude = set(int(port) for port in exclude)
+    held = set(int(port) for port in preferred if port)
+    allocated = [int(first)]
+
+    for index in range(1, count):
+        # a replica keeps the port its container already publishes
+        port = preferred[index]
+        if port and int(port) not in allocated and int(port) not in exclude:
+            allocated.append(int(port))
+            continue
+
+        # otherwise take the next free port
+        candidate = max(allocated) + 1
+        while (candidate in exclude or candidate in held or
+               candidate in allocated or (local and not available(candidate))):
+            candidate += 1
+            if candidate > MAX_PORT:
+                raise ValueError("No free port for replica {0} above {1}".format(index + 1, first))
+        allocated.append(candidate)
+
+    return [str(port) for port in allocated]
+
+
+def hostPort(inspection, containerPort):
+    """
+    Returns the host port publishing a container port
+
+    Parameters:
+
+    dict inspection - The inspection of the container, or None
+    str containerPort - The port inside the container
+
+    Returns:
+
+    str port - The host port, or None if the port is not published
+    """
+    if inspection is None:
+        return None
+    bindings = (inspection.get("HostConfig") or {}).get("PortBindings") or {}
+    published = bindings.get(containerPort + "/tcp") or []
+    if not published:
+        return None
+    return published[0].get("HostPort")
@@ -0,0 +1,266 @@
+"""
+Readiness probes for the deployed application servers
+
+Polls the HTTP endpoints of every started service concurrently
+on a single asyncio event loop until they answer or time out
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+
+class readinessError(Exception):
+    """
+    Raised when a service does not become ready before its timeout
+    """
+
+
+class probe:
+    """
+    Describes how to check that one service is ready
+
+    A service is ready once an HTTP GET on its path returns
+    a status code accepted by the probe. A service run as a 
+    local process fails as soon as the process exits
+    """
+
+    def __init__(self, name, host, port, path="/", statuses=None, timeout=300, 
+                 process=None):
+        """
+        Constructor for a readiness probe
+
+        Parameters:
+
+        str name - The name of the service
+        str host - The IP address or host name the service listens on
+        str port - The port number the service listens on
+        str path - The path to request
+        list statuses - The accepted status codes (default: any status below 500)
+        float timeout - The number of seconds to wait for the service
+        subprocess.Popen process - The process serving the service, if it
+                                   runs locally (e.g. under singularity)
+
+        Returns: probe
+        """
+        self.name = name
+        self.host = host
+        self.port = int(port)
+        self.path = path
+        self.statuses = statuses
+        self.timeout = float(timeout)
+        self.process = process
+
+    def accepts(self, status):
+        """
+        Determines whether an HTTP status code means the service is ready
+
+        Parameters:
+
+        int status - The status code of the response
+
+        Returns:
+
+        bool accepted - True if the service is ready
+        """
+        if self.statuses is None:
+            return status < 500
+        return status in self.statuses
+
+    def url(self):
+        """
+        Returns the URL polled by the probe
+        """
+        return "http://{0}:{1}{2}".format(self.host, self.port, self.path)
+
+
+class readiness:
+    """
+    Engine that polls readiness probes concurrently
+
+    The probes run as coroutines on one event loop in a background
+    thread. A probe is watched as soon as its service is started
+    so that the time-to-ready is measured from the start, and the
+    deployment steps block on the result with wait.
+
+    Failed attempts are retried with exponential backoff and
+    jitter so that slow services are not hammered with requests
+    while fast services are detected quickly.
+    """
+
+    def __init__(self, initialDelay=0.25, maxDelay=5.0, attemptTimeout=5.0):
+        """
+        Constructor for the readiness engine
+
+        Parameters:
+
+        float initialDelay - The delay in seconds after the first failed attempt
+        float maxDelay - The upper bound of the delay between attempts
+        float attemptTimeout - The timeout of a single HTTP attempt
+
+        Returns: readiness
+        """
+        self.initialDelay = initialDelay
+        self.maxDelay = maxDelay
+        self.attemptTimeout = attemptTimeout
+        self.futures = {}
+        self.results = {}
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the event loop thread if it is not already running
+
+        Returns: None
+        """
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self.loop.run_forever,
+                                          name="readiness")
+                thread.daemon = True
+                thread.start()
+
+    def watch(self, serviceProbe):
+        """
+        Begins polling a service in the background
+
+        Parameters:
+
+        probe serviceProbe - The probe of the started service
+
+        Returns: None
+        """
+        self.start()
+        coroutine = self.poll(serviceProbe)
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        self.futures[serviceProbe.name] = future
+
+    def wait(self, name):
+        """
+        Blocks until a watched service is ready or has timed out
+
+        Parameters:
+
+        str name - The name of the service
+
+        Returns:
+
+        float seconds - The time-to-ready of the service
+
+        Raises:
+
+        readinessError - If the service did not become ready in time
+        """
+        return self.futures[name].result()
+
+    def cancel(self, name):
+        """
+        Stops polling a service whose start has failed
+
+        Parameters:
+
+        str name - The name of the service
+
+        Returns: None
+        """
+        future = self.futures.get(name)
+        if future is not None:
+            future.cancel()
+
+    def waitAll(self, probes):
+        """
+        Polls several services concurrently until each is ready or timed out
+
+        Parameters:
+
+        list probes - The probes of the services
+
+        Returns:
+
+        dict results - Maps each service name to its time-to-ready
+                       or None if it timed out
+        """
+        for serviceProbe in probes:
+            self.watch(serviceProbe)
+        for serviceProbe in probes:
+            try:
+                self.wait(serviceProbe.name)
+            except readinessError:
+                pass
+        return dict((p.name, self.results[p.name]) for p in probes)
+
+    async def poll(self, serviceProbe):
+        """
+        Polls a probe with exponential backoff until it succeeds or times out
+
+        Parameters:
+
+        probe serviceProbe - The probe to poll
+
+        Returns:
+
+        float seconds - The time-to-ready of the service
+        """
+        begin = time.time()
+        deadline = begin + serviceProbe.timeout
+        delay = self.initialDelay
+        self.results[serviceProbe.name] = None
+
+        while True:
+            if await self.check(serviceProbe):
+                seconds = time.time() - begin
+                self.results[serviceProbe.name] = seconds
+                return seconds
+
+            # a server process that has exited will never answer
+            if serviceProbe.process is not None and serviceProbe.process.poll() is not None:
+                raise readinessError("{0} exited with code {1} before it was ready".format(
+                    serviceProbe.name, serviceProbe.process.returncode))
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise readinessError("{0} was not ready at {1} after {2:.0f} seconds".format(
+                    serviceProbe.name, serviceProbe.url(), serviceProbe.timeout))
+
+            # sleep for half the delay plus a random jitter of up to
+            # the other half, then double the delay up to its bound
+            jitter = random.uniform(0, delay / 2)
+            await asyncio.sleep(min(remaining, delay / 2 + jitter))
+            delay = min(self.maxDelay, delay * 2)
+
+    async def check(self, serviceProbe):
+        """
+        Makes a single HTTP attempt against a probe
+
+        Parameters:
+
+        probe serviceProbe - The probe to check
+
+        Returns:
+
+        bool ready - True if the service answered with an accepted status
+        """
+        request = ("GET {0} HTTP/1.1\r\n"
+                   "Host: {1}:{2}\r\n"
+                   "Connection: close\r\n\r\n").format(serviceProbe.path,
+                                                      serviceProbe.host,
+                                                      serviceProbe.port)
+        writer = None
+        try:
+            connect = asyncio.open_connection(serviceProbe.host, serviceProbe.port)
+            reader, writer = await asyncio.wait_for(connect, self.attemptTimeout)
+            writer.write(request.encode("ascii"))
+            await writer.drain()
+            statusLine = await asyncio.wait_for(reader.readline(), self.attemptTimeout)
+            status = int(statusLine.split()[1])
+        except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+            # refused connections, resets and garbled responses
+            # all mean the service is not ready yet
+            return False
+        finally:
+            if writer is not None:
+                writer.close()
+        return serviceProbe.accepts(status)
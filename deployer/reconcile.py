@@ -0,0 +1,277 @@
+"""
+Reconciliation of the desired containers with the running ones
+
+Every container created by the deployer is labelled with a hash
+of its specification, so that a later deploy can tell whether the
+running container already matches what it would create
+"""
+
+import glob
+import hashlib
+import json
+import os
+
+# the labels attached to every managed container
+MANAGED_LABEL = "candig.managed"
+SERVICE_LABEL = "candig.service"
+SPEC_LABEL = "candig.spec"
+
+# the label of replicated containers holding the name of their first replica
+GROUP_LABEL = "candig.group"
+
+# the label of built images holding the hash of their build context
+BUILD_LABEL = "candig.build"
+
+
+def fileHash(fileNames):
+    """
+    Hashes the contents of configuration files
+
+    Parameters:
+
+    list fileNames - The files to hash, in order
+
+    Returns:
+
+    str digest - The sha256 of the concatenated contents
+    """
+    contents = []
+    for fileName in fileNames:
+        with open(fileName, "rb") as fileHandle:
+            contents.append(fileHandle.read())
+    return contentHash(contents)
+
+
+def contentHash(contents):
+    """
+    Hashes rendered configuration files
+
+    Parameters:
+
+    list contents - The bytes of the files, in order
+
+    Returns:
+
+    str digest - The sha256 of the concatenated contents
+    """
+    digest = hashlib.sha256()
+    for content in contents:
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def specHash(spec):
+    """
+    Hashes a container specification
+
+    Parameters:
+
+    dict spec - The image, ports, environment and configuration hash
+
+    Returns:
+
+    str digest - The sha256 of the canonical JSON of the specification
+    """
+    canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def contextFiles(contextDir, dockerfile="Dockerfile"):
+    """
+    Lists the files of a build context that affect the image
+
+    These are the Dockerfile and the local sources of its COPY
+    and ADD instructions (directories are listed recursively and
+    wildcards are expanded within the context)
+
+    Parameters:
+
+    str contextDir - The build context directory
+    str dockerfile - The Dockerfile inside the context
+
+    Returns:
+
+    list fileNames - The paths relative to the context, sorted
+    """
+    fileNames = set([dockerfile])
+    for source in copySources(os.path.join(contextDir, dockerfile)):
+        if "://" in source:
+            continue
+        sourcePattern = os.path.normpath(os.path.join(contextDir, source))
+        if glob.has_magic(source):
+            sourcePaths = glob.glob(sourcePattern)
+        else:
+            sourcePaths = [sourcePattern]
+        for sourcePath in sourcePaths:
+            if os.path.isdir(sourcePath):
+                for directory, subdirs, files in os.walk(sourcePath):
+                    fileNames.update(os.path.relpath(os.path.join(directory, name), contextDir)
+                                     for name in files)
+            else:
+                fileNames.add(os.path.relpath(sourcePath, contextDir))
+    return sorted(fileNames)
+
+
+def copySources(dockerfilePath):
+    """
+    Lists the sources of the COPY and ADD instructions of a Dockerfile
+
+    Instructions continued on the next line with a backslash are
+    joined first, and both the shell form (COPY a b dest) and the 
+    JSON form (COPY ["a", "b", "dest"]) are read
+
+    Parameters:
+
+    str dockerfilePath - The path of the Dockerfile
+
+    Returns:
+
+    list sources - The sources as written, in order
+    """
+    with open(dockerfilePath) as dockerHandle:
+        content = dockerHandle.read()
+
+    # join the continuation lines, leaving out comment lines between them
+    instructions = []
+    current = ""
+    for line in content.splitlines():
+        if current and line.lstrip().startswith("#"):
+            continue
+        if line.rstrip().endswith("\\"):
+            current += line.rstrip()[:-1] + " "
+            continue
+        instructions.append(current + line)
+        current = ""
+    if current:
+        instructions.append(current)
+
+    sources = []
+    for instruction in instructions:
+        words = instruction.split()
+        if not words or words[0].upper() not in ("COPY", "ADD"):
+            continue
+        # options such as --chown= start with --
+        arguments = instruction.split(None, 1)[1].lstrip()
+        while arguments.startswith("--"):
+            arguments = (arguments.split(None, 1) + [""])[1].lstrip()
+        if arguments.startswith("["):
+            try:
+                words = json.loads(arguments)
+            except ValueError:
+                continue
+        else:
+            words = arguments.split()
+        # the last word is the destination
+        sources += words[:-1]
+    return sources
+
+
+def contextHash(contextDir, dockerfile="Dockerfile"):
+    """
+    Hashes the files of a build context that affect the image
+
+    Parameters:
+
+    str contextDir - The build context directory
+    str dockerfile - The Dockerfile inside the context
+
+    Returns:
+
+    str digest - The sha256 of the names and contents of the files
+    """
+    digest = hashlib.sha256()
+    for fileName in contextFiles(contextDir, dockerfile):
+        digest.update(fileName.encode("utf-8") + b"\0")
+        with open(os.path.join(contextDir, fileName), "rb") as fileHandle:
+            digest.update(fileHandle.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def labels(service, digest, group=None):
+    """
+    Returns the labels of a managed container
+
+    Parameters:
+
+    str service - The name of the service, e.g. keycloak
+    str digest - The hash of the container specification
+    str group - The replica set of the container, if replicated
+
+    Returns:
+
+    dict labels - Maps the label names to their values
+    """
+    containerLabels = {MANAGED_LABEL: "true",
+                       SERVICE_LABEL: service,
+                       SPEC_LABEL: digest}
+    if group is not None:
+        containerLabels[GROUP_LABEL] = group
+    return containerLabels
+
+
+def imageId(docker, imageName):
+    """
+    Returns the ID of a local image
+
+    Parameters:
+
+    object docker - The client of the Docker daemon
+    str imageName - The name or reference of the image
+
+    Returns:
+
+    str imageId - The sha256 ID of the image, or None if it is missing
+    """
+    inspection = docker.inspectImage(imageName)
+    if inspection is None:
+        return None
+    return inspection["Id"]
+
+
+def inspect(docker, containerName):
+    """
+    Returns the specification hash and state of an existing container
+
+    Parameters:
+
+    object docker - The client of the Docker daemon
+    str containerName - The name of the container
+
+    Returns:
+
+    tuple current - (spec hash, running) or None if there is no container
+    """
+    inspection = docker.inspectContainer(containerName)
+    if inspection is None:
+        return None
+    # containers created without labels have no spec hash
+    containerLabels = inspection["Config"].get("Labels") or {}
+    return (containerLabels.get(SPEC_LABEL), inspection["State"]["Running"])
+
+
+def reconcile(docker, containerName, digest):
+    """
+    Compares the desired container with the existing one
+
+    A running container with the same specification hash is kept.
+    Any other container with the name is removed so it can be
+    recreated.
+
+    Parameters:
+
+    object docker - The client of the Docker daemon
+    str containerName - The name of the container
+    str digest - The hash of the desired specification
+
+    Returns:
+
+    str action - "kept", "recreated" or "created"
+    """
+    current = inspect(docker, containerName)
+    if current is None:
+        return "created"
+    if current == (digest, True):
+        return "kept"
+    docker.removeContainer(containerName, force=True)
+    return "recreated"
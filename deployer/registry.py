@@ -0,0 +1,172 @@
+"""
+Registry of the subdeployers
+
+The subdeployers are listed in a static table and imported only when
+a deployment selects them, so that --help and other commands that do
+not deploy never import them. Further services can be installed as
+entry points of the candigDeploy.services group and are deployed when
+--services selects them: the entry point names a subdeployer class, constructed with the shared objects as keyword
+arguments (readinessEngine, imageCache, artifactCache, dockerClient,
+configRenderer), whose steps(args) method lists its deployment steps.
+Subdeployers with *.config steps provide rendered() and restore(state)
+so that deployment plans can record and replay their configuration
+(see plan.py).
+"""
+
+import importlib
+
+
+# the entry point group of subdeployers installed by other packages
+ENTRY_POINT_GROUP = "candigDeploy.services"
+
+# name -> (module, class, shared objects passed to the constructor,
+#          the argument selecting the service or None if always deployed)
+SERVICES = {"keycloak": ("deployer.keycloak.keycloak", "keycloak",
+                         ("readinessEngine", "imageCache", "artifactCache",
+                          "dockerClient", "configRenderer"), None),
+            "ga4gh": ("deployer.ga4gh.ga4gh", "ga4gh",
+                      ("readinessEngine", "imageCache", "artifactCache",
+                       "dockerClient", "configRenderer"), None),
+            "funnel": ("deployer.funnel.funnel", "funnel",
+                       ("readinessEngine", "dockerClient", "configRenderer"), "funnel")}
+
+
+def entryPoints():
+    """
+    Lists the subdeployers installed as entry points
+
+    Returns:
+
+    list entryPoints - The entry points of the candigDeploy.services group
+    """
+    try:
+        from importlib import metadata
+    except ImportError:
+        # importlib.metadata needs python 3.8
+        return []
+    found = metadata.entry_points()
+    if hasattr(found, "select"):
+        return list(found.select(group=ENTRY_POINT_GROUP))
+    return list(found.get(ENTRY_POINT_GROUP, []))
+
+
+class registryError(Exception):
+    """
+    Raised when --services selects a service that is not installed
+    """
+
+
+class registry:
+    """
+    Creates the subdeployers on first use
+    """
+
+    def __init__(self, shared):
+        """
+        Constructor for the registry
+
+        Parameters:
+
+        dict shared - The objects shared by the subdeployers, by keyword
+
+        Returns: registry
+        """
+        self.shared = shared
+        self.services = {}
+        self.plugins = None
+
+    def module(self, name):
+        """
+        Imports the module of a built-in subdeployer
+
+        Parameters:
+
+        str name - The name of the service, e.g. ga4gh
+
+        Returns:
+
+        module subdeployerModule - The module holding the subdeployer
+        """
+        return importlib.import_module(SERVICES[name][0])
+
+    def get(self, name):
+        """
+        Returns a subdeployer, importing and creating it if needed
+
+        Parameters:
+
+        str name - The name of the service
+
+        Returns:
+
+        object subdeployer - The subdeployer of the service
+        """
+        if name not in self.services:
+            if name in SERVICES:
+                moduleName, className, keywords, selector = SERVICES[name]
+                subdeployerClass = getattr(self.module(name), className)
+                self.services[name] = subdeployerClass(
+                    **dict((keyword, self.shared[keyword]) for keyword in keywords))
+            else:
+                self.services[name] = self.installed()[name].load()(**self.shared)
+        return self.services[name]
+
+    def installed(self):
+        """
+        Returns the subdeployers installed as entry points
+
+        Returns:
+
+        dict plugins - Maps service names to their entry points
+        """
+        if self.plugins is None:
+            self.plugins = dict((entryPoint.name, entryPoint) for entryPoint in entryPoints()
+                                if entryPoint.name not in SERVICES)
+        return self.plugins
+
+    def names(self, args):
+        """
+        Returns the names of the services deployed with the arguments
+
+        Built-in services come first in the order of SERVICES, 
+        followed by the installed ones selected with --services, 
+        sorted by name
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns:
+
+        list names - The names of the services
+
+        Raises:
+
+        registryError - If --services names a service that is not installed
+        """
+        names = [name for name, (moduleName, className, keywords, selector) in SERVICES.items()
+                 if selector is None or getattr(args, selector)]
+        if not args.services:
+            return names
+
+        plugins = set(name.strip() for name in args.services.split(",") if name.strip())
+        unknown = plugins - set(self.installed())
+        if unknown:
+            raise registryError("Unknown services: {0} (installed: {1})".format(
+                ", ".join(sorted(unknown)), ", ".join(sorted(self.installed())) or "none"))
+        return names + sorted(plugins)
+
+    def selected(self, args):
+        """
+        Returns the subdeployers deployed with the arguments
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns:
+
+        list subdeployers - The subdeployers to collect the steps of,
+                            in the order of names
+        """
+        return [self.get(name) for name in self.names(args)]
@@ -0,0 +1,187 @@
+"""
+Shared rendering of the configuration files of a deployment
+
+The URLs the servers use to find each other are computed once per
+deployment in a single endpoint model. Rendered files are written
+to a per-deployment output directory outside the installed package,
+atomically and only when their bytes change, so unchanged files keep
+their modification time
+"""
+
+import os
+import re
+import tempfile
+import threading
+
+from . import engine
+from . import paths
+
+
+class endpoints:
+    """
+    The URLs of the Keycloak, ga4gh and funnel servers of a deployment
+
+    Attributes:
+
+    str keycloakUrl - http://keycloakIP:keycloakPort
+    str authUrl - The Keycloak auth root (keycloakUrl/auth)
+    str issuer - The OIDC issuer of the realm
+    str authUri, tokenUri, tokenIntrospectUri, userinfoUri - The OIDC endpoints of the realm
+    str ga4ghUrl, funnelUrl - The base URLs of the clients (ending in /)
+    str ga4ghRedirect, funnelRedirect - The OIDC callbacks of the clients
+    list ga4ghUrls, ga4ghRedirects - The base URLs and callbacks of every ga4gh replica
+    """
+
+    def __init__(self, args):
+        """
+        Computes the endpoints from the command-line arguments
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns: endpoints
+        """
+        self.keycloakUrl = "http://" + args.keycloakIP + ":" + args.keycloakPort
+        self.authUrl = self.keycloakUrl + "/auth"
+        self.issuer = self.authUrl + "/realms/" + args.realmName
+
+        openidUri = self.issuer + "/protocol/openid-connect"
+        self.authUri = openidUri + "/auth"
+        self.tokenUri = openidUri + "/token"
+        self.tokenIntrospectUri = self.tokenUri + "/introspect"
+        self.userinfoUri = openidUri + "/userinfo"
+
+        self.ga4ghUrls = ["http://" + args.ga4ghIP + ":" + port + "/" for port in args.ga4ghPorts]
+        self.ga4ghRedirects = [url + "oidc_callback" for url in self.ga4ghUrls]
+        self.ga4ghUrl = self.ga4ghUrls[0]
+        self.ga4ghRedirect = self.ga4ghRedirects[0]
+        self.funnelUrl = "http://" + args.funnelIP + ":" + args.funnelPort + "/"
+        self.funnelRedirect = self.funnelUrl + "oidc_callback"
+
+
+def writeIfChanged(fileName, data):
+    """
+    Writes a file atomically unless it already holds the same bytes
+
+    Parameters:
+
+    str fileName - The file to write
+    bytes data - The contents of the file
+
+    Returns:
+
+    bool written - False if the file was left untouched
+    """
+    try:
+        with open(fileName, "rb") as fileHandle:
+            if fileHandle.read() == data:
+                return False
+    except (IOError, OSError):
+        pass
+
+    directory = os.path.dirname(fileName)
+    os.makedirs(directory, exist_ok=True)
+    tempHandle, tempName = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(tempHandle, "wb") as fileHandle:
+            fileHandle.write(data)
+        os.chmod(tempName, 0o644)
+        os.rename(tempName, fileName)
+    except BaseException:
+        if os.path.exists(tempName):
+            os.remove(tempName)
+        raise
+    return True
+
+
+class renderer:
+    """
+    Rendering layer shared by the subdeployers
+
+    The endpoint model and the output directory are computed on the
+    first call for a deployment and shared by every subdeployer
+
+    deployments/<keycloak container name>/
+        ga4gh/client_secrets.json
+        ga4gh/oidc_config.yml
+        funnel/keycloak.json
+    """
+
+    def __init__(self, outputDir=None):
+        """
+        Constructor for the rendering layer
+
+        Parameters:
+
+        str outputDir - The directory of the rendered files
+                        (default: deployments/<keycloak container name>
+                        in the data directory)
+
+        Returns: renderer
+        """
+        self.outputDir = outputDir
+        self.args = None
+        self.model = None
+        self.written = 0
+        self.unchanged = 0
+        self.lock = threading.Lock()
+
+    def endpoints(self, args):
+        """
+        Returns the endpoint model of the deployment
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns:
+
+        endpoints model - The URLs of the servers
+        """
+        with self.lock:
+            if self.model is None or self.args is not args:
+                self.model = endpoints(args)
+                self.args = args
+            return self.model
+
+    def directory(self, args):
+        """
+        Returns the output directory of the deployment
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+
+        Returns:
+
+        str outputDir - The directory of the rendered files
+        """
+        if self.outputDir is None:
+            # the deployments of different docker hosts get their own directory
+            name = re.sub(r"[^A-Za-z0-9_.@-]", "_", engine.deploymentName(args.keycloakContainerName))
+            self.outputDir = paths.dataDir("deployments", name)
+        return self.outputDir
+
+    def write(self, args, name, data):
+        """
+        Writes a rendered file to the output directory if it changed
+
+        Parameters:
+
+        argparse.Namespace args - command-line arguments object
+        str name - The path of the file inside the output directory
+        bytes data - The rendered contents
+
+        Returns:
+
+        str fileName - The absolute path of the file
+        """
+        fileName = os.path.join(self.directory(args), name)
+        written = writeIfChanged(fileName, data)
+        with self.lock:
+            if written:
+                self.written += 1
+            else:
+                self.unchanged += 1
+        return fileName
@@ -0,0 +1,264 @@
+"""
+Dependency-graph scheduler for the deployment steps
+
+Runs the steps of the subdeployers concurrently in a
+bounded pool of worker threads while respecting the
+dependencies between the steps
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from . import trace
+
+
+# marks a dependency on a step that may not be registered, e.g. on
+# keycloak.ready when ga4gh is deployed on its own
+OPTIONAL = "?"
+
+
+def optional(name):
+    """
+    Marks a dependency as optional
+
+    Parameters:
+
+    str name - The name of the step depended on
+
+    Returns:
+
+    str dependency - The name, satisfied if the step is never registered
+    """
+    return OPTIONAL + name
+
+
+class scheduleError(Exception):
+    """
+    Raised when one or more steps of a schedule have failed
+
+    Attributes:
+
+    dict failures - Maps the names of the failed steps to their exceptions
+    list cancelled - The names of the steps skipped because a dependency failed
+    """
+
+    def __init__(self, failures, cancelled):
+        self.failures = failures
+        self.cancelled = cancelled
+        names = ", ".join(sorted(failures))
+        message = "Deployment steps failed: " + names
+        if cancelled:
+            message += " (cancelled: " + ", ".join(sorted(cancelled)) + ")"
+        Exception.__init__(self, message)
+
+
+class scheduler:
+    """
+    Schedules deployment steps as a dependency graph
+
+    Each step is a named callable with a list of the step names
+    it depends on. A step is submitted to the worker pool once all
+    of its dependencies have completed. Steps that do not depend
+    on each other therefore run concurrently, so the wall time of
+    a deployment approaches the longest chain of dependent steps.
+
+    If a step raises, every step depending on it (directly or
+    transitively) is cancelled, while independent branches run
+    to completion.
+
+      config ---------+
+                      v
+      pull --> create --> copy --> start --> ready
+    """
+
+    def __init__(self, workers=4, listener=None):
+        """
+        Constructor for the scheduler
+
+        Parameters:
+
+        int workers - The maximum number of steps to run at once
+        callable listener - Called with the name, status ("done", "failed"
+                            or "cancelled") and seconds of each finished
+                            step, from the thread calling run
+
+        Returns: scheduler
+        """
+        self.workers = max(1, int(workers))
+        self.listener = listener
+        self.steps = {}
+        self.order = []
+        self.status = {}
+        self.seconds = {}
+
+    def add(self, name, function, dependencies=()):
+        """
+        Registers a step in the dependency graph
+
+        A dependency marked with optional is satisfied if its step is
+        never registered, any other dependency must name a registered
+        step once the schedule runs
+
+        Parameters:
+
+        str name - The unique name of the step
+        callable function - The function to call without arguments
+        list dependencies - The names of the steps that must complete first
+
+        Returns: None
+        """
+        if name in self.steps:
+            raise ValueError("Duplicate step: " + name)
+        self.steps[name] = (function, list(dependencies))
+        self.order.append(name)
+
+    def addSteps(self, steps):
+        """
+        Registers a list of (name, function, dependencies) tuples
+
+        Parameters:
+
+        list steps - The steps returned by a subdeployer
+
+        Returns: None
+        """
+        for name, function, dependencies in steps:
+            self.add(name, function, dependencies)
+
+    def dependencies(self, name):
+        """
+        Returns the registered dependencies of a step
+
+        Parameters:
+
+        str name - The name of the step
+
+        Returns:
+
+        list dependencies - The dependencies that are part of the graph
+        """
+        return [dep.lstrip(OPTIONAL) for dep in self.steps[name][1] 
+                if not dep.startswith(OPTIONAL) or dep.lstrip(OPTIONAL) in self.steps]
+
+    def checkDependencies(self):
+        """
+        Raises a ValueError if a step depends on a step that is not 
+        registered and the dependency is not marked optional
+
+        Returns: None
+        """
+        for name in self.order:
+            for dep in self.dependencies(name):
+                if dep not in self.steps:
+                    raise ValueError("Unknown dependency of " + name + ": " + dep)
+
+    def checkCycles(self):
+        """
+        Raises a ValueError if the dependency graph contains a cycle
+
+        Returns: None
+        """
+        visiting = set()
+        visited = set()
+
+        def visit(name, path):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError("Dependency cycle: " + " -> ".join(path + [name]))
+            visiting.add(name)
+            for dep in self.dependencies(name):
+                visit(dep, path + [name])
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.order:
+            visit(name, [])
+
+    def execute(self, name):
+        """
+        Calls the function of a step inside a trace span
+        and records the seconds it took
+
+        Parameters:
+
+        str name - The name of the step
+
+        Returns: None
+        """
+        start = time.perf_counter()
+        try:
+            with trace.span(name, "step"):
+                self.steps[name][0]()
+        finally:
+            self.seconds[name] = time.perf_counter() - start
+
+    def run(self):
+        """
+        Executes every registered step in dependency order
+
+        Returns:
+
+        dict status - Maps each step name to "done", "failed" or "cancelled"
+
+        Raises:
+
+        scheduleError - If at least one step failed
+        """
+        self.checkDependencies()
+        self.checkCycles()
+
+        # build the reverse edges and the count of outstanding dependencies
+        dependents = dict((name, []) for name in self.order)
+        waiting = {}
+        for name in self.order:
+            deps = self.dependencies(name)
+            waiting[name] = len(deps)
+            for dep in deps:
+                dependents[dep].append(name)
+
+        failures = {}
+        self.status = {}
+        running = {}
+
+        def cancel(name):
+            # cancel every step reachable from a failed step
+            for child in dependents[name]:
+                if child not in self.status:
+                    self.status[child] = "cancelled"
+                    notify(child)
+                    cancel(child)
+
+        def notify(name):
+            if self.listener is not None:
+                self.listener(name, self.status[name], self.seconds.get(name))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            ready = [name for name in self.order if waiting[name] == 0]
+            while ready or running:
+                # submit every step whose dependencies are satisfied
+                for name in ready:
+                    running[pool.submit(self.execute, name)] = name
+                ready = []
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        self.status[name] = "failed"
+                        failures[name] = error
+                        notify(name)
+                        cancel(name)
+                        continue
+                    self.status[name] = "done"
+                    notify(name)
+                    for child in dependents[name]:
+                        waiting[child] -= 1
+                        if waiting[child] == 0 and child not in self.status:
+                            ready.append(child)
+
+        if failures:
+            cancelled = [name for name in self.order if self.status.get(name) == "cancelled"]
+            raise scheduleError(failures, cancelled)
+        return self.status
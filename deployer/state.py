@@ -0,0 +1,466 @@
+"""
+Local store of the deployments made by the deployer
+
+Every deployment is recorded in an SQLite database in the user's
+state directory ($XDG_STATE_HOME/candigDeploy/state.db) as it
+progresses: the deployment itself when it starts, each step as it
+finishes, and the containers (IDs, image, spec hash, port) or
+singularity processes (PIDs) once it completes, each write in its
+own transaction:
+
+    deployments  id, name, command, planKey, plan, pid, status, started, finished
+    steps        deployment, name, status, seconds, finished
+    records      deployment, service, name, kind, containerId, image,
+                 specHash, port, pid, action
+
+A deployment is named after its keycloak container. Its status is
+"running", "complete", "failed" or "removed"; a running deployment
+whose deployer process is gone was interrupted
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import engine
+from . import paths
+
+
+# the version of the schema, kept in the user_version pragma
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deployments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    command TEXT NOT NULL,
+    planKey TEXT,
+    plan TEXT,
+    pid INTEGER,
+    status TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL);
+CREATE INDEX IF NOT EXISTS deploymentsByName ON deployments (name, id);
+CREATE TABLE IF NOT EXISTS steps (
+    deployment INTEGER NOT NULL REFERENCES deployments (id),
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    seconds REAL,
+    finished REAL NOT NULL,
+    PRIMARY KEY (deployment, name));
+CREATE TABLE IF NOT EXISTS records (
+    deployment INTEGER NOT NULL REFERENCES deployments (id),
+    service TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    containerId TEXT,
+    image TEXT,
+    specHash TEXT,
+    port TEXT,
+    pid INTEGER,
+    action TEXT,
+    PRIMARY KEY (deployment, name));
+"""
+
+# the columns of a record, in table order
+RECORD_FIELDS = ("service", "name", "kind", "containerId", "image", "specHash",
+                 "port", "pid", "action")
+
+
+def alive(pid):
+    """
+    Determines whether a process is running
+
+    Parameters:
+
+    int pid - The process ID
+
+    Returns:
+
+    bool running - True if the process exists
+    """
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # the process exists but belongs to another user
+        return True
+    return True
+
+
+def phases(steps):
+    """
+    Returns the phase timings of the steps of a deployment
+
+    Steps of the same phase run concurrently for the different
+    servers, so a phase takes as long as its slowest step
+
+    Parameters:
+
+    list steps - The steps of a deployment (see store.steps)
+
+    Returns:
+
+    dict timings - Maps phase names (e.g. pull) to seconds
+    """
+    timings = {}
+    for step in steps:
+        if step["seconds"] is None:
+            continue
+        parts = step["name"].split(".")
+        phase = parts[1] if len(parts) > 1 else parts[0]
+        timings[phase] = max(timings.get(phase, 0.0), step["seconds"])
+    return timings
+
+
+class store:
+    """
+    The SQLite database recording the deployments
+    """
+
+    def __init__(self, fileName=None):
+        """
+        Constructor for the state store
+
+        Opens the database, creating its tables if needed. The
+        database is readable by the user only
+
+        Parameters:
+
+        str fileName - The database file
+                       (default: state.db in the state directory)
+
+        Returns: store
+        """
+        if fileName is None:
+            fileName = os.path.join(paths.stateDir(), "state.db")
+        self.fileName = fileName
+        self.lock = threading.Lock()
+
+        # create the file before sqlite does, which would use the umask;
+        # the journal files take the permissions of the database
+        os.close(os.open(fileName, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(fileName, 0o600)
+        self.connection = sqlite3.connect(fileName, timeout=30, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            # readers (status) do not block a deployment writing
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            if self.connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                self.connection.executescript(SCHEMA)
+                self.connection.execute("PRAGMA user_version = {0}".format(SCHEMA_VERSION))
+
+    def close(self):
+        """
+        Closes the database
+
+        Returns: None
+        """
+        self.connection.close()
+
+    def execute(self, statement, parameters=()):
+        """
+        Runs a statement in a transaction of its own
+
+        Parameters:
+
+        str statement - The SQL statement
+        tuple parameters - The values of its placeholders
+
+        Returns:
+
+        sqlite3.Cursor cursor - The cursor of the statement
+        """
+        with self.lock, self.connection:
+            return self.connection.execute(statement, parameters)
+
+    def query(self, statement, parameters=()):
+        """
+        Returns the rows selected by a statement
+
+        Parameters:
+
+        str statement - The SQL statement
+        tuple parameters - The values of its placeholders
+
+        Returns:
+
+        list rows - The rows as dicts
+        """
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(statement, parameters)]
+
+    def begin(self, name, command, compiled=None):
+        """
+        Records the start of a deployment
+
+        The plan holds no passwords or client secrets, only their 
+        hash (see plan.inputs)
+
+        Parameters:
+
+        str name - The name of the deployment (the keycloak container name)
+        str command - The lifecycle command, e.g. up
+        dict compiled - The plan of the deployment, or None
+
+        Returns:
+
+        int deploymentId - The ID of the deployment
+        """
+        planKey = compiled["key"] if compiled else None
+        planData = json.dumps(compiled, sort_keys=True) if compiled else None
+        cursor = self.execute("INSERT INTO deployments (name, command, planKey, plan, pid, "
+                              "status, started) VALUES (?, ?, ?, ?, ?, 'running', ?)",
+                              (name, command, planKey, planData, os.getpid(), time.time()))
+        return cursor.lastrowid
+
+    def step(self, deploymentId, name, status, seconds=None):
+        """
+        Records a finished step of a deployment
+
+        Parameters:
+
+        int deploymentId - The ID of the deployment
+        str name - The name of the step, e.g. keycloak.pull
+        str status - done, failed or cancelled
+        float seconds - The seconds the step took
+
+        Returns: None
+        """
+        self.execute("INSERT OR REPLACE INTO steps (deployment, name, status, seconds, finished) "
+                     "VALUES (?, ?, ?, ?, ?)", (deploymentId, name, status, seconds, time.time()))
+
+    def finish(self, deploymentId, status, records=()):
+        """
+        Records the end of a deployment and what it deployed
+
+        Containers kept unchanged were not created by this deployment,
+        so they keep the container ID recorded by an earlier one
+
+        Parameters:
+
+        int deploymentId - The ID of the deployment
+        str status - complete or failed
+        list records - The dicts returned by the deployed methods
+                       of the subdeployers (see RECORD_FIELDS)
+
+        Returns: None
+        """
+        with self.lock, self.connection:
+            for record in records:
+                values = [record.get(field) for field in RECORD_FIELDS]
+                if record.get("kind") == "container" and not record.get("containerId"):
+                    earlier = self.connection.execute(
+                        "SELECT containerId FROM records WHERE name = ? AND kind = 'container' "
+                        "AND containerId IS NOT NULL AND deployment < ? "
+                        "ORDER BY deployment DESC LIMIT 1", (record["name"], deploymentId)).fetchone()
+                    if earlier is not None:
+                        values[RECORD_FIELDS.index("containerId")] = earlier[0]
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO records (deployment, " + ", ".join(RECORD_FIELDS) +
+                    ") VALUES (?" + ", ?" * len(RECORD_FIELDS) + ")", [deploymentId] + values)
+            self.connection.execute("UPDATE deployments SET status = ?, finished = ? WHERE id = ?",
+                                    (status, time.time(), deploymentId))
+
+    def removed(self, name):
+        """
+        Records that the containers of a deployment were removed
+
+        Parameters:
+
+        str name - The name of the deployment
+
+        Returns: None
+        """
+        self.execute("UPDATE deployments SET status = 'removed' WHERE id = "
+                     "(SELECT MAX(id) FROM deployments WHERE name = ?)", (name,))
+
+    def latest(self, name=None):
+        """
+        Returns the latest deployment of each name
+
+        Parameters:
+
+        str name - Only return the deployment with this name
+
+        Returns:
+
+        list deployments - The deployments as dicts, newest first
+        """
+        statement = ("SELECT * FROM deployments WHERE id IN "
+                     "(SELECT MAX(id) FROM deployments GROUP BY name)")
+        parameters = ()
+        if name is not None:
+            statement += " AND name = ?"
+            parameters = (name,)
+        return self.query(statement + " ORDER BY id DESC", parameters)
+
+    def steps(self, deploymentId):
+        """
+        Returns the finished steps of a deployment
+
+        Parameters:
+
+        int deploymentId - The ID of the deployment
+
+        Returns:
+
+        list steps - name, status, seconds and finished dicts in finishing order
+        """
+        return self.query("SELECT name, status, seconds, finished FROM steps "
+                          "WHERE deployment = ? ORDER BY finished", (deploymentId,))
+
+    def records(self, deploymentId):
+        """
+        Returns the containers and processes of a deployment
+
+        Parameters:
+
+        int deploymentId - The ID of the deployment
+
+        Returns:
+
+        list records - The records as dicts (see RECORD_FIELDS)
+        """
+        return self.query("SELECT " + ", ".join(RECORD_FIELDS) + " FROM records "
+                          "WHERE deployment = ? ORDER BY rowid", (deploymentId,))
+
+    def interrupted(self, name, planKey):
+        """
+        Returns the deployment to resume, if any
+
+        The latest deployment with the name is resumed when it has
+        the same plan and failed or was interrupted (it is still
+        marked as running but its deployer process is gone)
+
+        Parameters:
+
+        str name - The name of the deployment
+        str planKey - The key of the plan about to be deployed
+
+        Returns:
+
+        dict deployment - The deployment with the names of its
+                          completed steps as done, or None
+        """
+        latest = self.latest(name)
+        if not latest or latest[0]["planKey"] != planKey:
+            return None
+        deployment = latest[0]
+        if deployment["status"] == "failed" or (deployment["status"] == "running" and
+                                                not alive(deployment["pid"])):
+            deployment["done"] = [step["name"] for step in self.steps(deployment["id"])
+                                  if step["status"] == "done"]
+            return deployment
+        return None
+
+
+def shortId(containerId):
+    """
+    Strips the algorithm from a container ID
+
+    Parameters:
+
+    str containerId - The ID, with or without a sha256: prefix
+
+    Returns:
+
+    str hexadecimal - The ID without the prefix
+    """
+    return containerId.split(":")[-1]
+
+
+def status(docker, records):
+    """
+    Checks the recorded containers and processes
+
+    Each container is inspected by name, so the daemon is asked
+    about the deployed containers only rather than listing them all
+
+    Parameters:
+
+    object docker - The client of the Docker daemon
+    list records - The records of a deployment (see store.records)
+
+    Returns:
+
+    list records - The records with their state: running, exited,
+                   missing, replaced (another container holds the name)
+                   or unknown (the daemon cannot be reached)
+    """
+    checked = []
+    for record in records:
+        record = dict(record)
+        if record["kind"] == "process":
+            record["state"] = "running" if alive(record["pid"]) else "missing"
+        else:
+            try:
+                inspection = docker.inspectContainer(record["name"])
+            except (OSError, engine.engineError):
+                inspection = {}
+            if inspection == {}:
+                record["state"] = "unknown"
+            elif inspection is None:
+                record["state"] = "missing"
+            elif record["containerId"] and not shortId(inspection["Id"]).startswith(
+                    shortId(record["containerId"])):
+                record["state"] = "replaced"
+            elif inspection["State"]["Running"]:
+                record["state"] = "running"
+            else:
+                record["state"] = "exited"
+        checked.append(record)
+    return checked
+
+
+def report(deployment, records, steps):
+    """
+    Returns the status table of a deployment
+
+    Parameters:
+
+    dict deployment - The deployment (see store.latest)
+    list records - The checked records (see status)
+    list steps - The steps of the deployment (see store.steps)
+
+    Returns:
+
+    str table - The deployment, one line per container or process
+                and the phase timings
+    """
+    # a running deployment whose deployer is gone was interrupted
+    deploymentStatus = deployment["status"]
+    if deploymentStatus == "running" and not alive(deployment["pid"]):
+        deploymentStatus = "interrupted"
+
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(deployment["started"]))
+    header = "Deployment {0} #{1}: {2} ({3}, started {4}".format(
+        deployment["name"], deployment["id"], deploymentStatus, deployment["command"], started)
+    if deployment["finished"]:
+        header += ", took {0:.1f} seconds".format(deployment["finished"] - deployment["started"])
+    if deployment["planKey"]:
+        header += ", plan " + deployment["planKey"][:12]
+    lines = [header + ")"]
+
+    if records:
+        lines.append("{0:<10} {1:<20} {2:<7} {3:<14} {4:<9} {5}".format(
+            "SERVICE", "NAME", "PORT", "ID", "STATE", "IMAGE"))
+    for record in records:
+        identifier = record["containerId"] or ""
+        if record["kind"] == "process":
+            identifier = "pid " + str(record["pid"])
+        lines.append("{0:<10} {1:<20} {2:<7} {3:<14} {4:<9} {5}".format(
+            record["service"], record["name"], record["port"] or "-",
+            shortId(identifier)[:12], record["state"], record["image"] or "-"))
+
+    timings = phases(steps)
+    if timings:
+        lines.append("Phases: " + ", ".join("{0} {1:.1f} s".format(phase, seconds)
+                                            for phase, seconds in sorted(timings.items(),
+                                                                         key=lambda item: -item[1])))
+    return "\n".join(lines)
@@ -0,0 +1,381 @@
+"""
+Streaming resource monitor of the managed containers
+
+One feed per container streams its resource usage samples from the
+Docker daemon, each read by a thread of its own that blocks on the
+stream, so the monitor costs no polling. Every sample is normalized
+to CPU %, memory (RSS without the page cache), network and block I/O
+bytes, and kept in a fixed-size ring buffer per container from which
+the rolling p50 and p95 are computed. The samples of the engine API
+and of the docker stats program are both understood
+"""
+
+import collections
+import json
+import math
+import re
+import threading
+import time
+
+from . import engine
+
+
+# the samples kept per container for the rolling percentiles
+WINDOW = 120
+
+# the columns of a JSON-lines row, in order
+FIELDS = ("time", "container", "cpu", "cpuP50", "cpuP95", "memory", "memoryP50",
+          "memoryP95", "netRx", "netTx", "blockRead", "blockWrite", "samples")
+
+# the multipliers of the size units printed by docker stats
+UNITS = {"b": 1, "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3, "tb": 1000 ** 4,
+         "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3, "tib": 1024 ** 4}
+
+
+def parseSize(text):
+    """
+    Converts a size printed by docker stats to bytes
+
+    Parameters:
+
+    str text - The size, e.g. 12.5MiB or 3.1kB
+
+    Returns:
+
+    float size - The size in bytes (0 if it cannot be read)
+    """
+    match = re.match(r"\s*([0-9.]+)\s*([a-zA-Z]*)", text)
+    if not match:
+        return 0.0
+    return float(match.group(1)) * UNITS.get(match.group(2).lower() or "b", 1)
+
+
+def parsePair(text):
+    """
+    Converts a pair of sizes printed by docker stats to bytes
+
+    Parameters:
+
+    str text - The sizes, e.g. 1.2kB / 3.4MB
+
+    Returns:
+
+    tuple sizes - The two sizes in bytes
+    """
+    first, separator, second = text.partition("/")
+    return parseSize(first), parseSize(second)
+
+
+def sample(raw):
+    """
+    Normalizes a resource usage sample
+
+    Parameters:
+
+    dict raw - A sample of the engine API (cpu_stats, memory_stats, ...)
+               or of docker stats --format "{{json .}}" (CPUPerc, MemUsage, ...)
+
+    Returns:
+
+    dict sample - cpu (%), memory, netRx, netTx, blockRead and blockWrite (bytes)
+    """
+    if "CPUPerc" in raw:
+        netRx, netTx = parsePair(raw.get("NetIO", ""))
+        blockRead, blockWrite = parsePair(raw.get("BlockIO", ""))
+        return {"cpu": float(raw["CPUPerc"].rstrip("%") or 0),
+                "memory": parsePair(raw.get("MemUsage", ""))[0],
+                "netRx": netRx, "netTx": netTx,
+                "blockRead": blockRead, "blockWrite": blockWrite}
+
+    # the CPU share since the previous sample, over all online CPUs
+    cpuStats = raw.get("cpu_stats") or {}
+    previous = raw.get("precpu_stats") or {}
+    cpuDelta = ((cpuStats.get("cpu_usage") or {}).get("total_usage", 0) -
+                (previous.get("cpu_usage") or {}).get("total_usage", 0))
+    systemDelta = cpuStats.get("system_cpu_usage", 0) - previous.get("system_cpu_usage", 0)
+    onlineCpus = (cpuStats.get("online_cpus") or
+                  len((cpuStats.get("cpu_usage") or {}).get("percpu_usage") or []) or 1)
+    cpu = 0.0
+    if cpuDelta > 0 and systemDelta > 0:
+        cpu = cpuDelta / systemDelta * onlineCpus * 100.0
+
+    # the page cache is not part of the resident memory
+    memoryStats = raw.get("memory_stats") or {}
+    details = memoryStats.get("stats") or {}
+    memory = memoryStats.get("usage", 0) - details.get("inactive_file", details.get("cache", 0))
+
+    networks = (raw.get("networks") or {}).values()
+    blocks = (raw.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+    return {"cpu": cpu, "memory": float(max(memory, 0)),
+            "netRx": float(sum(network.get("rx_bytes", 0) for network in networks)),
+            "netTx": float(sum(network.get("tx_bytes", 0) for network in networks)),
+            "blockRead": float(sum(entry.get("value", 0) for entry in blocks
+                                   if entry.get("op", "").lower() == "read")),
+            "blockWrite": float(sum(entry.get("value", 0) for entry in blocks
+                                    if entry.get("op", "").lower() == "write"))}
+
+
+def percentile(values, fraction):
+    """
+    Returns a percentile of values by the nearest-rank method
+
+    Parameters:
+
+    iterable values - The values
+    float fraction - The percentile as a fraction, e.g. 0.95
+
+    Returns:
+
+    float value - The percentile, or None without values
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, int(math.ceil(fraction * len(ordered))))
+    return ordered[rank - 1]
+
+
+def decode(line):
+    """
+    Decodes a line of a stats stream
+
+    Parameters:
+
+    bytes line - The line, possibly preceded by terminal codes
+
+    Returns:
+
+    dict raw - The decoded sample, or None if the line holds none
+    """
+    text = line.decode("utf-8", "replace")
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        return json.loads(text[start:])
+    except ValueError:
+        return None
+
+
+class feed:
+    """
+    The samples of one container and their ring buffers
+    """
+
+    def __init__(self, name, window=WINDOW):
+        """
+        Constructor for the feed of a container
+
+        Parameters:
+
+        str name - The name of the container
+        int window - The number of samples kept for the percentiles
+
+        Returns: feed
+        """
+        self.name = name
+        self.cpu = collections.deque(maxlen=window)
+        self.memory = collections.deque(maxlen=window)
+        self.latest = None
+        self.samples = 0
+        self.error = None
+        self.stream = None
+
+    def add(self, normalized):
+        """
+        Records a normalized sample
+
+        Parameters:
+
+        dict normalized - The sample returned by sample
+
+        Returns: None
+        """
+        self.cpu.append(normalized["cpu"])
+        self.memory.append(normalized["memory"])
+        self.latest = normalized
+        self.samples += 1
+
+    def row(self):
+        """
+        Returns the current values of the feed
+
+        Returns:
+
+        dict row - The fields of FIELDS, or None before the first sample
+        """
+        if self.latest is None:
+            return None
+        row = dict(self.latest)
+        row.update({"time": round(time.time(), 3),
+                    "container": self.name,
+                    "cpuP50": percentile(self.cpu, 0.5),
+                    "cpuP95": percentile(self.cpu, 0.95),
+                    "memoryP50": percentile(self.memory, 0.5),
+                    "memoryP95": percentile(self.memory, 0.95),
+                    "samples": self.samples})
+        return row
+
+
+class monitor:
+    """
+    Streams the samples of several containers concurrently
+    """
+
+    def __init__(self, docker, containerNames, window=WINDOW):
+        """
+        Constructor for the monitor
+
+        Parameters:
+
+        object docker - The client of the Docker daemon
+        list containerNames - The containers to monitor
+        int window - The number of samples kept per container
+
+        Returns: monitor
+        """
+        self.docker = docker
+        self.feeds = [feed(name, window) for name in containerNames]
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def read(self, containerFeed):
+        """
+        Reads the stream of one container until it ends or is stopped
+
+        Parameters:
+
+        feed containerFeed - The feed of the container
+
+        Returns: None
+        """
+        try:
+            containerFeed.stream = self.docker.statsStream(containerFeed.name)
+            # the monitor may have been stopped while the stream opened
+            if self.stopped.is_set():
+                containerFeed.stream.close()
+                return
+            for line in containerFeed.stream:
+                raw = decode(line)
+                if raw is None:
+                    continue
+                normalized = sample(raw)
+                with self.lock:
+                    containerFeed.add(normalized)
+        except (OSError, ValueError, engine.engineError) as error:
+            # a stream closed by stop ends with an error as well
+            if not self.stopped.is_set():
+                containerFeed.error = error
+
+    def start(self):
+        """
+        Opens the feed of every container, each read by its own thread
+
+        Returns: None
+        """
+        for containerFeed in self.feeds:
+            thread = threading.Thread(target=self.read, args=(containerFeed,),
+                                      name="stats " + containerFeed.name)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=5):
+        """
+        Closes the feeds and waits for their threads
+
+        Parameters:
+
+        float timeout - The seconds to wait for each thread
+
+        Returns: None
+        """
+        self.stopped.set()
+        for containerFeed in self.feeds:
+            if containerFeed.stream is not None:
+                containerFeed.stream.close()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def rows(self):
+        """
+        Returns the current values of every container with samples
+
+        Returns:
+
+        list rows - The rows of the feeds (see feed.row)
+        """
+        with self.lock:
+            return [row for row in (containerFeed.row() for containerFeed in self.feeds)
+                    if row is not None]
+
+    def errors(self):
+        """
+        Returns the containers whose feed failed
+
+        Returns:
+
+        dict errors - Maps container names to their errors
+        """
+        return dict((containerFeed.name, containerFeed.error) for containerFeed in self.feeds
+                    if containerFeed.error is not None)
+
+
+def humanSize(size):
+    """
+    Formats bytes with a binary unit
+
+    Parameters:
+
+    float size - The bytes
+
+    Returns:
+
+    str text - e.g. 12.5MiB
+    """
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return "{0:.1f}{1}".format(size, unit)
+        size /= 1024.0
+
+
+def table(rows):
+    """
+    Returns the table of the current values
+
+    Parameters:
+
+    list rows - The rows of the containers (see monitor.rows)
+
+    Returns:
+
+    str table - One line per container
+    """
+    lines = ["{0:<20} {1:>20} {2:>30} {3:>20} {4:>20}".format(
+        "CONTAINER", "CPU % (P50/P95)", "MEMORY (P50/P95)", "NET RX/TX", "BLOCK R/W")]
+    for row in rows:
+        lines.append("{0:<20} {1:>20} {2:>30} {3:>20} {4:>20}".format(
+            row["container"],
+            "{0:.1f} ({1:.1f}/{2:.1f})".format(row["cpu"], row["cpuP50"], row["cpuP95"]),
+            "{0} ({1}/{2})".format(humanSize(row["memory"]), humanSize(row["memoryP50"]),
+                                   humanSize(row["memoryP95"])),
+            humanSize(row["netRx"]) + "/" + humanSize(row["netTx"]),
+            humanSize(row["blockRead"]) + "/" + humanSize(row["blockWrite"])))
+    return "\n".join(lines)
+
+
+def jsonLines(rows):
+    """
+    Returns the current values as JSON lines
+
+    Parameters:
+
+    list rows - The rows of the containers (see monitor.rows)
+
+    Returns:
+
+    str lines - One JSON object per container with the fields of FIELDS
+    """
+    return "\n".join(json.dumps(collections.OrderedDict((field, row[field]) for field in FIELDS))
+                     for row in rows)
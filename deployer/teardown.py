@@ -0,0 +1,163 @@
+"""
+Parallel teardown of the containers managed by the deployer
+
+Every container is stopped with a grace period, killed if it cannot
+be stopped, and removed, concurrently with the other containers.
+The images the containers ran and the volumes of the deployment
+can be removed afterwards
+"""
+
+import concurrent.futures
+import time
+
+from . import engine
+from . import reconcile
+from . import trace
+
+
+def managed(docker):
+    """
+    Lists the containers labelled as managed by the deployer
+
+    Parameters:
+
+    object docker - The client of the Docker daemon
+
+    Returns:
+
+    list names - The names of the containers
+    """
+    return docker.listContainers({reconcile.MANAGED_LABEL: "true"})
+
+
+def removeContainer(docker, containerName, stopTimeout, volumes=False):
+    """
+    Stops and removes one container
+
+    Parameters:
+
+    object docker - The client of the Docker daemon
+    str containerName - The name of the container
+    int stopTimeout - The seconds the container has to exit before it
+                      is killed (0 kills it at once)
+    bool volumes - Also remove the anonymous volumes of the container
+
+    Returns:
+
+    dict result - name, action ("stopped", "killed" or "missing"),
+                  image (the image ID, or None) and seconds
+    """
+    start = time.perf_counter()
+    with trace.span("down." + containerName, stopTimeout=stopTimeout) as phase:
+        inspection = docker.inspectContainer(containerName)
+        if inspection is None:
+            action = "missing"
+        elif stopTimeout > 0:
+            action = "stopped"
+            try:
+                docker.stopContainer(containerName, stopTimeout)
+            except (OSError, engine.engineError):
+                # fall back to killing a container that does not stop
+                action = "killed"
+                docker.killContainer(containerName)
+        else:
+            action = "killed"
+            docker.killContainer(containerName)
+
+        if inspection is not None:
+            docker.removeContainer(containerName, force=True, volumes=volumes)
+        phase.set(action=action)
+
+    return {"name": containerName,
+            "action": action,
+            "image": inspection.get("Image") if inspection else None,
+            "seconds": time.perf_counter() - start}
+
+
+def removeContainers(docker, containerNames, stopTimeout, volumes=False, workers=8):
+    """
+    Stops and removes containers concurrently
+
+    Parameters:
+
+    object docker - The client of the Docker daemon
+    list containerNames - The names of the containers
+    int stopTimeout - The seconds each container has to exit
+    bool volumes - Also remove the anonymous volumes of the containers
+    int workers - The number of containers handled at once
+
+    Returns:
+
+    list results - The result of every container (see removeContainer)
+    """
+    if not containerNames:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(containerNames))) as pool:
+        futures = [pool.submit(removeContainer, docker, containerName, stopTimeout, volumes)
+                   for containerName in containerNames]
+        return [future.result() for future in futures]
+
+
+def down(docker, stopTimeout, images=False, volumes=False, workers=8):
+    """
+    Stops and removes every managed container
+
+    Parameters:
+
+    object docker - The client of the Docker daemon
+    int stopTimeout - The seconds each container has to exit
+    bool images - Also remove the images the containers ran
+    bool volumes - Also remove the anonymous volumes of the containers
+                   and the volumes labelled as managed
+    int workers - The number of containers handled at once
+
+    Returns:
+
+    dict report - containers (see removeContainers), the removed images
+                  and volumes, and the total seconds
+    """
+    start = time.perf_counter()
+    with trace.span("down"):
+        results = removeContainers(docker, managed(docker), stopTimeout, volumes, workers)
+
+        # images are only removed once no container uses them
+        removedImages = []
+        if images:
+            for image in sorted(set(result["image"] for result in results if result["image"])):
+                docker.removeImage(image)
+                removedImages.append(image)
+
+        removedVolumes = []
+        if volumes:
+            for volume in docker.listVolumes({reconcile.MANAGED_LABEL: "true"}):
+                docker.removeVolume(volume)
+                removedVolumes.append(volume)
+
+    return {"containers": results,
+            "images": removedImages,
+            "volumes": removedVolumes,
+            "seconds": time.perf_counter() - start}
+
+
+def report(teardown):
+    """
+    Returns a table of a teardown
+
+    Parameters:
+
+    dict teardown - The report returned by down
+
+    Returns:
+
+    str table - One line per container, then the removed images and volumes
+    """
+    lines = ["{0:<30} {1:<8} {2:>8}".format("CONTAINER", "ACTION", "SECONDS")]
+    for result in sorted(teardown["containers"], key=lambda result: -result["seconds"]):
+        lines.append("{0:<30} {1:<8} {2:>8.1f}".format(result["name"], result["action"],
+                                                       result["seconds"]))
+    for image in teardown["images"]:
+        lines.append("IMAGE REMOVED:  " + image)
+    for volume in teardown["volumes"]:
+        lines.append("VOLUME REMOVED: " + volume)
+    lines.append("TOTAL:          {0:.1f} seconds".format(teardown["seconds"]))
+    return "\n".join(lines)
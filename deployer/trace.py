@@ -0,0 +1,189 @@
+"""
+Tracing of the deployment phases
+
+Spans record the wall time of the scheduler steps, the requests to
+the Docker daemon, the subprocesses and the downloads of a deploy.
+With --profile the spans are written as Chrome trace-event JSON
+(viewable in chrome://tracing or Perfetto) and summarized in a table.
+
+Tracing is off by default, in which case span() returns a shared
+no-op span and nothing is recorded.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class nullSpan:
+    """
+    The span returned while tracing is off
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = nullSpan()
+
+
+class traceSpan:
+    """
+    A timed phase of the deployment
+
+    Attributes set while the span is open (such as the exit status
+    or the bytes transferred) are recorded with it. A span left
+    by an exception records the exception as its error.
+    """
+
+    def __init__(self, owner, name, category, args):
+        self.owner = owner
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        end = time.perf_counter()
+        if excValue is not None:
+            self.args["error"] = repr(excValue)
+        self.owner.record(self, end)
+        return False
+
+    def set(self, **args):
+        """
+        Adds attributes to the span
+        """
+        self.args.update(args)
+
+
+class tracer:
+    """
+    Collects the spans of a deployment
+
+    +---------+  span()  +--------+  record()  +--------+
+    | caller  | -------> | span   | ---------> | tracer | --> chromeTrace(), summary()
+    +---------+          +--------+            +--------+
+    """
+
+    def __init__(self):
+        """
+        Constructor for the tracer, disabled until enable() is called
+
+        Returns: tracer
+        """
+        self.enabled = False
+        self.events = []
+        self.threads = {}
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def enable(self):
+        """
+        Starts recording spans, discarding any recorded before
+
+        Returns: None
+        """
+        with self.lock:
+            self.events = []
+            self.threads = {}
+            self.origin = time.perf_counter()
+            self.enabled = True
+
+    def span(self, name, category="deploy", **args):
+        """
+        Returns a span to use in a with statement
+
+        Parameters:
+
+        str name - The name of the phase, e.g. keycloak.pull
+        str category - The kind of phase: deploy, step, docker, process, download 
+                       or keycloak
+        args - Attributes of the phase, such as the argv of a subprocess
+
+        Returns:
+
+        traceSpan phase - The span, or a no-op span while tracing is off
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return traceSpan(self, name, category, args)
+
+    def record(self, phase, end):
+        """
+        Stores a finished span as a complete trace event
+
+        Parameters:
+
+        traceSpan phase - The finished span
+        float end - The perf_counter time the span ended at
+
+        Returns: None
+        """
+        with self.lock:
+            # number the threads in the order they first record a span
+            thread = self.threads.setdefault(threading.get_ident(), len(self.threads) + 1)
+            self.events.append({"name": phase.name,
+                                "cat": phase.category,
+                                "ph": "X",
+                                "ts": round((phase.start - self.origin) * 1e6, 1),
+                                "dur": round((end - phase.start) * 1e6, 1),
+                                "pid": os.getpid(),
+                                "tid": thread,
+                                "args": phase.args})
+
+    def chromeTrace(self, fileName):
+        """
+        Writes the recorded spans as Chrome trace-event JSON
+
+        Parameters:
+
+        str fileName - The file to write
+
+        Returns: None
+        """
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event["ts"])
+        with open(fileName, "w") as traceHandle:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, traceHandle,
+                      default=str)
+
+    def summary(self):
+        """
+        Returns a table of the recorded spans sorted by duration
+
+        Returns:
+
+        str table - One line per span with its duration and attributes
+        """
+        with self.lock:
+            events = sorted(self.events, key=lambda event: -event["dur"])
+        lines = ["{0:<40} {1:<9} {2:>9}  {3}".format("SPAN", "CATEGORY", "SECONDS", "DETAIL")]
+        for event in events:
+            detail = " ".join("{0}={1}".format(key, value)
+                              for key, value in sorted(event["args"].items()))
+            lines.append("{0:<40} {1:<9} {2:>9.3f}  {3}".format(
+                event["name"], event["cat"], event["dur"] / 1e6, detail))
+        return "\n".join(lines)
+
+
+# the tracer shared by the deployer and its subdeployers
+active = tracer()
+
+
+def span(name, category="deploy", **args):
+    """
+    Returns a span of the shared tracer (see tracer.span)
+    """
+    return active.span(name, category, **args)
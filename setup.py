@@ -14,16 +14,16 @@ setup(name="candigDeploy",
                   "Intended Audience :: Developers",
                   "Intended Audience :: System Administrators",
                   "LICENSE :: OSI Approved :: Apache Software License",
-                  "Programming Language :: Python :: 2",
-                  "Programming Language :: Python 2.7",
+                  "Programming Language :: Python :: 3",
+                  "Programming Language :: Python :: 3.7",
                   "Natural Language :: English",
                   "Topic :: Scientific/Engineering :: Bio-Informatics",
                   "Topic :: System :: Installation/Setup",
                   "Topic :: Utilities"],
       keywords="utility command-line candig deploy deployment deployer ga4gh keycloak funnel authentication server setup",
-      packages=find_packages(exclude=['docs', 'tests']),
+      packages=find_packages(exclude=['docs', 'tests', 'benchmarks']),
       install_requires=["PyYAML"],
-      python_requires=">=2.7",
+      python_requires=">=3.7",
       include_package_data=True,
       entry_points = {
           "console_scripts": ["candigDeploy = deployer.deployer:main"]
@@ -0,0 +1,259 @@
+import http.client
+import http.server
+import json
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import unittest
+import urllib.parse
+
+from deployer.cmdparse import cmdparse
+from deployer.keycloak import admin
+from deployer.keycloak.keycloak import keycloak
+
+
+class stubHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers the token endpoint and a part of the admin API of Keycloak
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=None, headers=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def authorized(self):
+        stub = self.server
+        if self.headers.get("Authorization") != "Bearer token-" + str(stub.logins):
+            self.reply(401, {"error": "unauthorized"})
+            return False
+        if stub.expireNext:
+            stub.expireNext = False
+            self.reply(401, {"error": "token expired"})
+            return False
+        return True
+
+    def do_GET(self):
+        stub = self.server
+        path, query = self.path.split("?")
+        parts = path.split("/")
+        query = dict(urllib.parse.parse_qsl(query))
+        if not self.authorized():
+            return
+        realm, collection = parts[4], parts[5]
+        field = "username" if collection == "users" else "clientId"
+        found = [dict(entry, id=entryId) for entryId, entry in sorted(stub.realms[realm][collection].items())
+                 if query[field] in entry[field]]
+        return self.reply(200, found)
+
+    def do_POST(self):
+        stub = self.server
+        body = self.body()
+        if self.path == "/auth/realms/master/protocol/openid-connect/token":
+            form = dict(urllib.parse.parse_qsl(body.decode("utf-8")))
+            stub.logins += 1
+            if form["password"] != stub.adminPassword:
+                return self.reply(401, {"error": "invalid_grant"})
+            return self.reply(200, {"access_token": "token-" + str(stub.logins),
+                                    "expires_in": 60})
+        if not self.authorized():
+            return
+        parts = self.path.split("/")
+        realm, collection = parts[4], parts[5]
+        if realm == "dropped":
+            # the server goes away without answering
+            stub.dropped += 1
+            self.close_connection = True
+            return
+        entry = json.loads(body.decode("utf-8"))
+        if collection == "clients" and any(client["clientId"] == entry["clientId"]
+                                           for client in stub.realms[realm][collection].values()):
+            return self.reply(409, {"errorMessage": "Client already exists"})
+        entryId = collection + "-" + str(len(stub.realms[realm][collection]) + 1)
+        stub.realms[realm][collection][entryId] = entry
+        return self.reply(201, headers={"Location": "http://stub" + self.path + "/" + entryId})
+
+    def do_PUT(self):
+        stub = self.server
+        body = json.loads(self.body().decode("utf-8"))
+        if not self.authorized():
+            return
+        parts = self.path.split("/")
+        realm, collection, entryId = parts[4], parts[5], parts[6]
+        if entryId not in stub.realms[realm][collection]:
+            return self.reply(404, {"error": "not found"})
+        if parts[-1] == "reset-password":
+            stub.realms[realm][collection][entryId]["password"] = body["value"]
+        else:
+            stub.realms[realm][collection][entryId].update(body)
+        return self.reply(204)
+
+
+class stubServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    A Keycloak stub counting its connections and logins
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        http.server.HTTPServer.__init__(self, ("127.0.0.1", 0), stubHandler)
+        self.adminPassword = "admin"
+        self.logins = 0
+        self.connections = 0
+        self.expireNext = False
+        self.dropped = 0
+        self.realms = {
+            "master": {"users": {"u-admin": {"username": "admin"}}, "clients": {}},
+            "CanDIG": {"users": {"u-user": {"username": "user"},
+                                 "u-user2": {"username": "user2"}},
+                       "clients": {"c-ga4gh": {"clientId": "cq_candig", "secret": "old",
+                                               "redirectUris": ["http://a/*"]}}}}
+
+    def get_request(self):
+        self.connections += 1
+        return http.server.HTTPServer.get_request(self)
+
+
+class adminTest(unittest.TestCase):
+    """
+    Tests for the admin client against a stub Keycloak server
+    """
+
+    def setUp(self):
+        self.stub = stubServer()
+        self.thread = threading.Thread(target=self.stub.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.port = str(self.stub.server_address[1])
+
+    def tearDown(self):
+        self.stub.shutdown()
+        self.stub.server_close()
+
+    def session(self, passwords=("admin",)):
+        return admin.admin("127.0.0.1", self.port, "admin", list(passwords))
+
+    def testBatch(self):
+        session = self.session()
+        session.queue("password", "CanDIG", "user", "p1")
+        session.queue("user", "CanDIG", "alice", "p2")
+        session.queue("user", "CanDIG", "user2", "p3")
+        session.queue("client", "CanDIG", "cq_candig", {"secret": "new", "redirectUris": None})
+        session.queue("client", "CanDIG", "beacon", {"secret": "s", "redirectUris": ["http://b/*"]})
+        self.assertEqual(session.apply(), 5)
+        session.close()
+
+        candig = self.stub.realms["CanDIG"]
+        self.assertEqual(candig["users"]["u-user"]["password"], "p1")
+        self.assertEqual(candig["users"]["u-user2"]["password"], "p3")
+        self.assertEqual(candig["users"]["users-3"], {"username": "alice", "enabled": True,
+                                                      "password": "p2"})
+        self.assertEqual(candig["clients"]["c-ga4gh"]["secret"], "new")
+        self.assertEqual(candig["clients"]["c-ga4gh"]["redirectUris"], ["http://a/*"])
+        self.assertEqual(candig["clients"]["clients-2"]["redirectUris"], ["http://b/*"])
+        # one login over one connection for the whole batch
+        self.assertEqual((self.stub.logins, self.stub.connections), (1, 1))
+        self.assertEqual(session.requests, 12)
+
+    def testCreatedClientChangedAgain(self):
+        session = self.session(["admin"])
+        session.queue("client", "CanDIG", "beacon", {"secret": "s", "redirectUris": None})
+        session.queue("client", "CanDIG", "beacon", {"secret": None, "redirectUris": ["http://b/*"]})
+        self.assertEqual(session.apply(), 2)
+        session.close()
+
+        # the second change updates the client the first one created
+        self.assertEqual(self.stub.realms["CanDIG"]["clients"]["clients-2"],
+                         {"clientId": "beacon", "enabled": True, "publicClient": False,
+                          "secret": "s", "redirectUris": ["http://b/*"]})
+
+    def testFallbackPassword(self):
+        session = self.session(["new", "admin"])
+        session.queue("password", "master", "admin", "new")
+        session.apply()
+        self.assertEqual(session.logins, 2)
+        self.assertEqual(self.stub.realms["master"]["users"]["u-admin"]["password"], "new")
+
+        self.stub.adminPassword = "new"
+        session = self.session(["new", "admin"])
+        session.login()
+        self.assertEqual(session.logins, 1)
+
+    def testRefused(self):
+        with self.assertRaises(admin.adminError) as raised:
+            self.session(["wrong"]).login()
+        self.assertEqual(raised.exception.status, 401)
+
+    def testExpiredTokenRenewed(self):
+        session = self.session()
+        session.queue("password", "CanDIG", "user", "p1")
+        self.stub.expireNext = True
+        session.apply()
+        self.assertEqual(self.stub.logins, 2)
+        self.assertEqual(self.stub.realms["CanDIG"]["users"]["u-user"]["password"], "p1")
+
+    def testMissingUser(self):
+        session = self.session()
+        session.queue("password", "CanDIG", "nobody", "p1")
+        with self.assertRaises(admin.adminError) as raised:
+            session.apply()
+        self.assertEqual(raised.exception.status, 404)
+
+    def testPostNotResent(self):
+        session = self.session()
+        session.login()
+        with self.assertRaises(http.client.RemoteDisconnected):
+            session.call("POST", "/dropped/users", {"username": "alice"})
+        self.assertEqual(self.stub.dropped, 1)
+
+    def testMutationsFile(self):
+        tempDir = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(tempDir, "mutations.json")
+            with open(fileName, "w") as mutationHandle:
+                json.dump({"users": {"CanDIG": {"bob": "b", "alice": "a"}},
+                           "clients": {"CanDIG": {"beacon": {"secret": "s"}}}}, mutationHandle)
+            self.assertEqual(admin.mutations(fileName),
+                             [("user", "CanDIG", "alice", "a"), ("user", "CanDIG", "bob", "b"),
+                              ("client", "CanDIG", "beacon", {"secret": "s", "redirectUris": None})])
+            with open(fileName, "w") as mutationHandle:
+                json.dump({"users": ["bob"]}, mutationHandle)
+            with self.assertRaises(admin.adminError):
+                admin.mutations(fileName)
+        finally:
+            shutil.rmtree(tempDir)
+
+    def testAdminStep(self):
+        server = keycloak(object(), object(), object(), object(), object())
+        args = cmdparse().commandParser([])
+        self.assertNotIn("keycloak.admin", [step[0] for step in server.steps(args)])
+
+        args = cmdparse().commandParser(["--keycloak-ip", "127.0.0.1", "--keycloak-port", self.port,
+                                         "--user-password", "p1", "--admin-password", "p2"])
+        step = dict((name, (function, dependencies))
+                    for name, function, dependencies in server.steps(args))["keycloak.admin"]
+        self.assertEqual(step[1], ["keycloak.ready"])
+        step[0]()
+        self.assertEqual(server.adminChanges, 2)
+        self.assertEqual(self.stub.realms["CanDIG"]["users"]["u-user"]["password"], "p1")
+        self.assertEqual(self.stub.realms["master"]["users"]["u-admin"]["password"], "p2")
+        # the new admin password is refused before the template one
+        self.assertEqual(self.stub.logins, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from deployer.artifacts import artifacts, artifactError, sourceKey
+
+
+class artifactsTest(unittest.TestCase):
+    """
+    Tests for the singularity artifact cache
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.cache = artifacts(os.path.join(self.tempDir, "cache"), maxBytes=1 << 20)
+        self.content = b"singularity image " * 1000
+        self.checksum = hashlib.sha256(self.content).hexdigest()
+        self.url = self.compress("key.img.gz", self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def compress(self, name, content):
+        path = os.path.join(self.tempDir, name)
+        with gzip.open(path, "wb") as gzipHandle:
+            gzipHandle.write(content)
+        return "file://" + path
+
+    def testFetchDecompresses(self):
+        path = self.cache.fetch("keycloak/0.0.1", self.url, self.checksum)
+        self.assertEqual(os.path.basename(path), self.checksum)
+        with open(path, "rb") as blobHandle:
+            self.assertEqual(blobHandle.read(), self.content)
+        self.assertTrue(self.cache.verify("keycloak/0.0.1"))
+
+    def testWarmFetchSkipsDownload(self):
+        self.cache.fetch("keycloak/0.0.1", self.url)
+        os.remove(self.url[len("file://"):])
+        self.cache.fetch("keycloak/0.0.1", self.url)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def testChangedChecksumIsMiss(self):
+        self.cache.fetch("keycloak/0.0.1", self.url)
+        other = b"other image " * 1000
+        url = self.compress("other.img.gz", other)
+        self.cache.fetch("keycloak/0.0.1", url, hashlib.sha256(other).hexdigest())
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def testChecksumMismatch(self):
+        self.assertRaises(artifactError, self.cache.fetch,
+                          "keycloak/0.0.1", self.url, "0" * 64)
+        self.assertIsNone(self.cache.lookup("keycloak/0.0.1"))
+        self.assertEqual(os.listdir(self.cache.blobDir), [])
+
+    def testWorkingCopy(self):
+        pristine = self.cache.fetch("keycloak/0.0.1", self.url)
+        copy = self.cache.workingCopy(pristine, "keycloak.img")
+        with open(copy, "ab") as copyHandle:
+            copyHandle.write(b"database")
+        self.assertTrue(self.cache.verify("keycloak/0.0.1"))
+
+    def testSourceKey(self):
+        key = sourceKey("keycloak", self.url, self.checksum)
+        self.assertTrue(key.startswith("keycloak/"))
+        self.assertEqual(key, sourceKey("keycloak", self.url, self.checksum))
+        self.assertNotEqual(key, sourceKey("keycloak", self.url))
+        mirror = self.compress("mirror.img.gz", self.content)
+        self.assertNotEqual(key, sourceKey("keycloak", mirror, self.checksum))
+        self.cache.fetch(key, self.url, self.checksum)
+        self.assertIsNone(self.cache.lookup(sourceKey("keycloak", mirror, self.checksum)))
+
+    def testInsert(self):
+        pulled = os.path.join(self.tempDir, "ga4gh.simg")
+        with open(pulled, "wb") as pulledHandle:
+            pulledHandle.write(self.content)
+        path = self.cache.insert("ga4gh/latest", pulled)
+        self.assertFalse(os.path.exists(pulled))
+        self.assertEqual(self.cache.lookup("ga4gh/latest"), path)
+        self.cache.invalidate("ga4gh/latest")
+        self.assertIsNone(self.cache.lookup("ga4gh/latest"))
+
+    def testLeastRecentlyUsedEviction(self):
+        self.cache.maxBytes = 2 * 400000
+        urls = [self.compress(str(i), os.urandom(400000)) for i in range(3)]
+        self.cache.fetch("a/1", urls[0])
+        self.cache.fetch("b/1", urls[1])
+        self.cache.lookup("a/1")
+        self.cache.fetch("c/1", urls[2])
+        self.assertIsNotNone(self.cache.lookup("a/1"))
+        self.assertIsNone(self.cache.lookup("b/1"))
+        self.assertIsNotNone(self.cache.lookup("c/1"))
+        self.assertEqual(len(os.listdir(self.cache.blobDir)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
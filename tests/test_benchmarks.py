@@ -0,0 +1,30 @@
+import unittest
+
+from benchmarks import bench
+
+
+class benchTest(unittest.TestCase):
+    """
+    Tests for the benchmark runner and its fake container tools
+    """
+
+    def testDockerDeploy(self):
+        result = bench.runScenario("docker-cold", 1, {"default": 0.0})
+        self.assertIn("docker pull", result["calls"])
+        self.assertIn("docker cp", result["calls"])
+        self.assertEqual(result["subprocesses"], len(result["calls"]))
+        self.assertGreater(result["peakRss"], 0)
+
+    def testCompare(self):
+        baseline = {"docker-warm": {"wallTime": 1.0, "peakRss": 1000, "subprocesses": 10}}
+        results = {"docker-warm": {"wallTime": 1.1, "peakRss": 1000, "subprocesses": 10}}
+        self.assertEqual(bench.compare(results, baseline, 0.25), [])
+
+        results["docker-warm"].update(wallTime=1.5, subprocesses=11)
+        regressions = bench.compare(results, baseline, 0.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("wallTime 1.500 > 1.000 (+50%)", regressions[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,90 +3,112 @@ import unittest
 from deployer.cmdparse import cmdparse
 
 class noArgsTest(unittest.TestCase):
-"""
-Tests for the command-line arguments
-"""
-
+    """
+    Tests for the command-line arguments
+    """
 
     def setUp(self):
         """
         Test a bare-bones deployment with no arguments
         """
         self.cmdparse = cmdparse()
-        self.args = cmdparse.commandArgs([""])
+        self.args = self.cmdparse.commandParser([])
 
-    def testDeploy(self):         
-        assertTrue(self.args.deploy)
+    def testSingularity(self):
+        self.assertFalse(self.args.singularity)
 
-    def testVagrant(self):
-        assertFalse(self.args.vagrant)
+    def testFunnel(self):
+        self.assertFalse(self.args.funnel)
 
     def testIP(self):
-        assertFalse(self.args.ip)
+        self.assertFalse(self.args.ip)
 
-    def testNoData(self):
-        assertFalse(self.args.noData)
+    def testNoConfig(self):
+        self.assertFalse(self.args.noConfig)
 
-    def testExtraData(self):
-        assertFalse(self.args.extraData)
+    def testOverride(self):
+        self.assertFalse(self.args.override)
 
     def testKeycloakIP(self):
         keycloakIP = "127.0.0.1"
-        assertEqual(self.args.keycloakIP, keycloakIP)
+        self.assertEqual(self.args.keycloakIP, keycloakIP)
 
     def testGa4ghIP(self):
         ga4ghIP = "127.0.0.1"
-        assertEqual(self.args.ga4ghIP, ga4ghIP)
+        self.assertEqual(self.args.ga4ghIP, ga4ghIP)
 
     def testGa4ghPort(self):
         ga4ghPort = "8000"
-        assertEqual(self.args.ga4ghPort, ga4ghPort)
+        self.assertEqual(self.args.ga4ghPort, ga4ghPort)
 
     def testKeycloakPort(self):
         keycloakPort = "8080"
-        assertEqual(self.args.keycloakPort, keycloakPort)
+        self.assertEqual(self.args.keycloakPort, keycloakPort)
 
     def testRealmName(self):
         realmName = "CanDIG"
-        assertEqual(self.args.realmName, realmName)
+        self.assertEqual(self.args.realmName, realmName)
 
     def testGa4ghID(self):
         ga4ghID = "ga4gh"
-        assertEqual(self.args.ga4ghID, ga4ghID)
+        self.assertEqual(self.args.ga4ghID, ga4ghID)
 
     def testKeycloakContainerName(self):
-        keycloakContainerName = "keycloak_candig_server"
-        assertEqual(self.args.keycloakContainerName, keycloakContainerName)
+        keycloakContainerName = "keycloak_candig"
+        self.assertEqual(self.args.keycloakContainerName, keycloakContainerName)
 
     def testGa4ghContainerName(self):
-        ga4ghContainerName = "ga4gh_candig_server"
-        assertEqual(self.args.ga4ghContainerName, ga4ghContainerName)
+        ga4ghContainerName = "ga4gh_candig"
+        self.assertEqual(self.args.ga4ghContainerName, ga4ghContainerName)
 
     def testKeycloakImageName(self):
-        keycloakImageName = "keycloak_candig_server"
-        assertEqual(self.args.keycloakImageName, keycloakImageName)
+        keycloakImageName = "keycloak_candig"
+        self.assertEqual(self.args.keycloakImageName, keycloakImageName)
 
     def testGa4ghImageName(self):
-        ga4ghImageName = "ga4gh_candig_server"
-        assertEqual(self.args.ga4ghImageName, ga4ghImageName)
+        ga4ghImageName = "ga4gh_candig"
+        self.assertEqual(self.args.ga4ghImageName, ga4ghImageName)
+
+    def testGa4ghProfile(self):
+        self.assertEqual(self.args.ga4ghProfile, "dev")
+        self.assertIsNone(self.args.ga4ghTuning)
+
+    def testCommand(self):
+        self.assertEqual(self.args.command, "up")
 
 
 
 
 class ipTest(noArgsTest):
-"""
-Tests for setting the ip
-"""
+    """
+    Tests for setting the ip
+    """
     def setUp(self):
         """
         Test a bare-bones deployment with no arguments
         """
         self.ip = "192.168.11.100"
         self.cmdparse = cmdparse()
-        self.args = cmdparse.commandArgs(["-i " + self.ip])
+        self.args = self.cmdparse.commandParser(["-i", self.ip])
+
+    def testIP(self):
+        self.assertEqual(self.args.ip, self.ip)
 
     def testKeycloakIP(self):
-        assertEqual(self.args.keycloakIP, self.ip)
+        self.assertEqual(self.args.keycloakIP, self.ip)
 
     def testGa4ghIP(self):
-        assertEqual(self.args.ga4ghIP, self.ip)
+        self.assertEqual(self.args.ga4ghIP, self.ip)
+
+
+class downTest(unittest.TestCase):
+    """
+    Tests for the down subcommand
+    """
+
+    def testDown(self):
+        args = cmdparse().commandParser(["down", "--stop-timeout", "3", "--remove-images"])
+        self.assertEqual(args.command, "down")
+        self.assertEqual(args.stopTimeout, "3")
+        self.assertTrue(args.removeImages)
+        self.assertFalse(args.removeVolumes)
@@ -0,0 +1,254 @@
+import contextlib
+import http.client
+import http.server
+import io
+import json
+import os
+import shutil
+import socketserver
+import tarfile
+import tempfile
+import threading
+import unittest
+import urllib.parse
+
+from deployer import engine as engineModule
+from deployer.engine import engine, engineError
+
+
+class fakeDaemonHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers a small part of the Docker Engine API from memory
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=b""):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        daemon = self.server.daemon
+        path = self.path.split("?")[0]
+        daemon["paths"].append(path)
+        if path == "/version":
+            return self.reply(200, daemon["version"])
+        if path.endswith("/_ping"):
+            return self.reply(200, b"OK")
+        if path.endswith("/containers/json"):
+            query = urllib.parse.parse_qs(self.path.split("?")[1])
+            wanted = json.loads(query["filters"][0])["label"]
+            found = []
+            for name, container in sorted(daemon["containers"].items()):
+                containerLabels = ["=".join(item) for item in container["Config"]["Labels"].items()]
+                if all(label in containerLabels for label in wanted):
+                    found.append({"Names": ["/" + name]})
+            return self.reply(200, found)
+        if path.endswith("/logs"):
+            # multiplexed frames, the first line split over two of them
+            frames = [(1, b"2018-03-01T10:00:01Z star"), (1, b"ted\n"),
+                      (2, b"2018-03-01T10:00:02Z warning\n"), (1, b"2018-03-01T10:00:03Z tail")]
+            return self.reply(200, b"".join(bytes([output, 0, 0, 0]) + len(payload).to_bytes(4, "big") +
+                                            payload for output, payload in frames))
+        if path.endswith("/archive"):
+            query = urllib.parse.parse_qs(self.path.split("?")[1])
+            if query["path"][0] not in daemon["files"]:
+                return self.reply(404, {"message": "Could not find the file"})
+            content = daemon["files"][query["path"][0]]
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode="w") as tar:
+                info = tarfile.TarInfo(os.path.basename(query["path"][0]))
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+            return self.reply(200, buffer.getvalue())
+        if path.endswith("/json") and "/containers/" in path:
+            name = path.split("/")[-2]
+            if name not in daemon["containers"]:
+                return self.reply(404, {"message": "No such container: " + name})
+            return self.reply(200, daemon["containers"][name])
+        return self.reply(404, {"message": "not found"})
+
+    def do_POST(self):
+        daemon = self.server.daemon
+        path = self.path.split("?")[0]
+        body = self.body()
+        daemon["paths"].append(path)
+        if path.endswith("/containers/dropped/start"):
+            # the daemon goes away without answering
+            self.close_connection = True
+            return
+        if path.endswith("/containers/create"):
+            name = self.path.split("name=")[1]
+            config = json.loads(body.decode("utf-8"))
+            daemon["containers"][name] = {"Id": "c-" + name, "Config": config,
+                                          "State": {"Running": False}}
+            return self.reply(201, {"Id": "c-" + name})
+        if path.endswith("/start"):
+            name = path.split("/")[-2]
+            daemon["containers"][name]["State"]["Running"] = True
+            return self.reply(204)
+        if path.endswith("/volumes/create"):
+            volume = json.loads(body.decode("utf-8"))
+            daemon["volumes"][volume["Name"]] = volume
+            return self.reply(201, volume)
+        if path.endswith("/images/create"):
+            stream = b'{"status":"Pulling"}\n{"error":"manifest unknown"}\n'
+            return self.reply(200, stream)
+        return self.reply(404, {"message": "not found"})
+
+    def do_PUT(self):
+        daemon = self.server.daemon
+        daemon["archives"].append((self.path, self.body()))
+        return self.reply(200)
+
+
+class fakeDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    A unix socket server counting the connections it accepts
+    """
+    daemon_threads = True
+
+    def __init__(self, socketPath):
+        socketserver.UnixStreamServer.__init__(self, socketPath, fakeDaemonHandler)
+        self.daemon = {"containers": {}, "archives": [], "volumes": {}, "files": {}, 
+                       "paths": [], "version": {"ApiVersion": "1.51", "MinAPIVersion": "1.44"}}
+        self.connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        request, address = socketserver.UnixStreamServer.get_request(self)
+        # unix sockets have no client address
+        return request, ("local", 0)
+
+
+class engineTest(unittest.TestCase):
+    """
+    Tests for the Docker Engine API client
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.socketPath = os.path.join(self.tempDir, "docker.sock")
+        self.server = fakeDaemon(self.socketPath)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.docker = engine(self.socketPath)
+
+    def tearDown(self):
+        self.docker.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tempDir)
+
+    def testConnectionReuse(self):
+        for attempt in range(5):
+            self.assertTrue(self.docker.ping())
+        self.assertEqual(self.docker.roundTrips, 5)
+        self.assertEqual(self.server.connections, 1)
+
+    def testCreateStartInspect(self):
+        self.docker.createContainer("keycloak_candig", "dalos/docker-keycloak@sha256:aaa",
+                                    {"8080": "8081"}, [("KEYCLOAK_USER", "admin")],
+                                    {"candig.managed": "true"})
+        self.docker.startContainer("keycloak_candig")
+        inspection = self.docker.inspectContainer("keycloak_candig")
+        config = inspection["Config"]
+        self.assertTrue(inspection["State"]["Running"])
+        self.assertEqual(config["Image"], "dalos/docker-keycloak@sha256:aaa")
+        self.assertEqual(config["Env"], ["KEYCLOAK_USER=admin"])
+        self.assertEqual(config["Labels"], {"candig.managed": "true"})
+        self.assertEqual(config["HostConfig"]["PortBindings"],
+                         {"8080/tcp": [{"HostPort": "8081"}]})
+        self.assertEqual(self.docker.roundTrips, 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def testListContainers(self):
+        for name in ("ga4gh_candig", "ga4gh_candig_2", "keycloak_candig"):
+            group = "ga4gh_candig" if name.startswith("ga4gh") else name
+            self.docker.createContainer(name, "image", labels={"candig.group": group})
+        self.assertEqual(self.docker.listContainers({"candig.group": "ga4gh_candig"}),
+                         ["ga4gh_candig", "ga4gh_candig_2"])
+
+    def testMissingContainer(self):
+        self.assertIsNone(self.docker.inspectContainer("missing"))
+
+    def testCopyFiles(self):
+        configDir = "/usr/local/ga4gh/config"
+        self.docker.copyFiles("ga4gh_candig",
+                              [(configDir + "/oidc_config.yml", b"frontend: {}"),
+                               (configDir + "/client_secrets.json", b"{}")])
+        self.assertEqual(len(self.server.daemon["archives"]), 1)
+        self.assertEqual(self.docker.roundTrips, 1)
+
+        path, data = self.server.daemon["archives"][0]
+        self.assertIn("/containers/ga4gh_candig/archive", path)
+        self.assertIn("path=%2Fusr%2Flocal%2Fga4gh%2Fconfig", path)
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            self.assertEqual(tar.getnames(), ["oidc_config.yml", "client_secrets.json"])
+            self.assertEqual(tar.extractfile("client_secrets.json").read(), b"{}")
+
+    def testReadFile(self):
+        self.server.daemon["files"]["/srv/keycloak/standalone/data/realm.sha256"] = b"abc\n"
+        self.assertEqual(self.docker.readFile("keycloak_candig",
+                                              "/srv/keycloak/standalone/data/realm.sha256"), b"abc\n")
+        self.assertIsNone(self.docker.readFile("keycloak_candig", "/srv/missing"))
+
+    def testCreateVolume(self):
+        self.docker.createVolume("keycloak_candig_data", {"candig.managed": "true"})
+        self.assertEqual(self.server.daemon["volumes"]["keycloak_candig_data"]["Labels"],
+                         {"candig.managed": "true"})
+
+    def testLogsDemultiplexed(self):
+        with self.docker.logsStream("keycloak_candig", follow=False) as stream:
+            self.assertEqual(list(stream), [b"2018-03-01T10:00:01Z started\n",
+                                            b"2018-03-01T10:00:02Z warning\n",
+                                            b"2018-03-01T10:00:03Z tail"])
+
+    def testNegotiatedVersion(self):
+        self.assertEqual(self.docker.negotiate(), "1.45")
+        self.docker.inspectContainer("keycloak_candig")
+        self.assertEqual(self.server.daemon["paths"],
+                         ["/version", "/v1.45/containers/keycloak_candig/json"])
+
+        self.server.daemon["version"] = {"ApiVersion": "1.30", "MinAPIVersion": "1.12"}
+        self.assertEqual(self.docker.negotiate(), "1.30")
+        self.server.daemon["version"] = {"ApiVersion": "1.20", "MinAPIVersion": "1.12"}
+        self.assertRaises(engineError, self.docker.negotiate)
+
+    def testConnectFallback(self):
+        client = engineModule.connect("unix://" + self.socketPath)
+        self.assertEqual(client.apiVersion, "1.45")
+        client.close()
+
+        warnings = io.StringIO()
+        with contextlib.redirect_stderr(warnings):
+            client = engineModule.connect("unix://" + os.path.join(self.tempDir, "missing.sock"))
+        self.assertIsInstance(client, engineModule.cli)
+        self.assertIn("Warning: cannot use the engine API", warnings.getvalue())
+
+    def testPostNotResent(self):
+        self.assertTrue(self.docker.ping())
+        self.assertRaises(http.client.RemoteDisconnected, self.docker.startContainer, "dropped")
+        self.assertEqual(self.server.daemon["paths"].count("/containers/dropped/start"), 1)
+
+    def testPullError(self):
+        messages = []
+        with self.assertRaises(engineError):
+            self.docker.pullImage("dalos/docker-keycloak", messages.append)
+        self.assertEqual(messages, [{"status": "Pulling"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from deployer import reconcile
+from deployer.funnel.funnel import funnel
+
+
+class fakeDocker:
+    """
+    Docker client holding a single image inspection
+    """
+
+    def __init__(self, inspection=None):
+        self.inspection = inspection
+        self.builds = []
+
+    def inspectImage(self, name):
+        return self.inspection
+
+    def buildImage(self, tag, contextDir, labels=None, callback=None):
+        self.builds.append((tag, labels))
+        for step in ("Step 1/2 : FROM debian\n", " ---> 123\n", "Step 2/2 : RUN true\n"):
+            callback({"stream": step})
+
+
+class funnelBuildTest(unittest.TestCase):
+    """
+    Tests for the content-hash build cache of the funnel image
+    """
+
+    def setUp(self):
+        self.docker = fakeDocker()
+        self.funnel = funnel(object(), self.docker)
+        self.buildHash = reconcile.contextHash(self.funnel.funnelDir)
+
+    def testBuildLabelsImage(self):
+        self.funnel.buildDocker("funnel_candig")
+        self.assertEqual(self.docker.builds,
+                         [("funnel_candig", {"candig.build": self.buildHash})])
+        self.assertEqual(self.funnel.build, "built")
+        self.assertEqual([step for step, seconds in self.funnel.buildTimes],
+                         ["Step 1/2 : FROM debian", "Step 2/2 : RUN true"])
+
+    def testMatchingLabelSkipsBuild(self):
+        self.docker.inspection = {"Config": {"Labels": {"candig.build": self.buildHash}}}
+        self.funnel.buildDocker("funnel_candig")
+        self.assertEqual(self.docker.builds, [])
+        self.assertEqual(self.funnel.build, "cached")
+
+    def testStaleLabelRebuilds(self):
+        self.docker.inspection = {"Config": {"Labels": {"candig.build": "0" * 64}}}
+        self.funnel.buildDocker("funnel_candig")
+        self.assertEqual(len(self.docker.builds), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
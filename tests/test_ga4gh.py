@@ -0,0 +1,344 @@
+import contextlib
+import io
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import unittest
+
+import yaml
+
+from deployer import engine
+from deployer import render
+from deployer.cmdparse import cmdparse
+from deployer.ga4gh import dataset
+from deployer.ga4gh import tuning
+from deployer.ga4gh.ga4gh import ga4gh
+
+
+def registryContent(directory, tables=("system", "dataset")):
+    """
+    Returns the bytes of a ga4gh registry with tables
+    """
+    fileName = os.path.join(directory, "content.db")
+    connection = sqlite3.connect(fileName)
+    for table in tables:
+        connection.execute("CREATE TABLE " + table + " (key TEXT, value TEXT)")
+    if "system" in tables:
+        connection.execute("INSERT INTO system VALUES ('schemaVersion', '2.0.0')")
+    connection.commit()
+    connection.close()
+    with open(fileName, "rb") as registryHandle:
+        content = registryHandle.read()
+    os.remove(fileName)
+    return content
+
+
+class fakeDocker:
+    """
+    Docker client recording the containers created and started
+    """
+
+    def __init__(self):
+        self.created = []
+        self.started = []
+        self.binds = {}
+        self.commands = {}
+        self.published = {}
+        self.registries = {}
+        self.removed = []
+
+    def listContainers(self, labels):
+        return sorted(self.published)
+
+    def inspectContainer(self, name):
+        if name not in self.published:
+            return None
+        return {"HostConfig": {"PortBindings": {"8000/tcp": [{"HostPort": self.published[name]}]}}}
+
+    def inspectVolume(self, name):
+        return {"Name": name} if name == "ga4gh-data" else None
+
+    def info(self):
+        return {"NCPU": 8, "MemTotal": 16 << 30}
+
+    def createContainer(self, name, image, ports=None, env=None, labels=None, binds=None,
+                        command=None):
+        self.created.append((name, ports, labels))
+        self.binds[name] = binds
+        self.commands[name] = command
+
+    def copyFiles(self, name, files):
+        pass
+
+    def readFile(self, name, path):
+        source = self.binds[name][0].split(":")[0]
+        return self.registries.get(source) if path == "/srv/ga4gh-data/registry.db" else None
+
+    def removeContainer(self, name, force=False, volumes=False):
+        if self.binds.pop(name, None) is not None:
+            self.removed.append(name)
+
+    def startContainer(self, name):
+        self.started.append(name)
+
+
+class ga4ghReplicaTest(unittest.TestCase):
+    """
+    Tests for the ga4gh replica set
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.docker = fakeDocker()
+        self.ga4gh = ga4gh(object(), object(), object(), self.docker,
+                           render.renderer(self.tempDir))
+        self.args = cmdparse().commandParser(["--ga4gh-replicas", "3"])
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testSteps(self):
+        names = [name for name, function, dependencies in self.ga4gh.steps(self.args)]
+        self.assertIn("ga4gh.start", names)
+        self.assertIn("ga4gh.start.3", names)
+        ready = self.ga4gh.steps(self.args)[-1]
+        self.assertEqual(ready[2], ["ga4gh.start", "ga4gh.start.2", "ga4gh.start.3",
+                                    "?keycloak.ready"])
+
+    def testReplicasShareConfiguration(self):
+        self.ga4gh.allocatePorts(self.args)
+        self.ga4gh.config(self.args)
+        self.ga4gh.reconcileDocker(self.args)
+        for containerName, port in self.ga4gh.replicas(self.args):
+            self.ga4gh.createDocker(containerName, port, self.args.ga4ghContainerName)
+
+        self.assertEqual([name for name, ports, labels in self.docker.created],
+                         ["ga4gh_candig", "ga4gh_candig_2", "ga4gh_candig_3"])
+        self.assertEqual(len(set(self.args.ga4ghPorts)), 3)
+        self.assertEqual(set(labels["candig.group"] for name, ports, labels in self.docker.created),
+                         set(["ga4gh_candig"]))
+        # the client secrets register the callback of every replica
+        secrets = dict(self.ga4gh.configFiles)[self.ga4gh.configDir + "/client_secrets.json"]
+        for port in self.args.ga4ghPorts:
+            self.assertIn((":" + port + "/oidc_callback").encode("utf-8"), secrets)
+
+    def testNumericOptions(self):
+        for argv, message in ((["--ga4gh-replicas", "two"], "--ga4gh-replicas must be an integer"),
+                              (["--ready-timeout", "5m"], "--ready-timeout must be a number"),
+                              (["--logs-tail", "ten"], "--logs-tail must be an integer or all")):
+            errors = io.StringIO()
+            with contextlib.redirect_stderr(errors), self.assertRaises(SystemExit):
+                cmdparse().commandParser(argv)
+            self.assertIn(message, errors.getvalue())
+        self.assertEqual(cmdparse().commandParser(["--logs-tail", "all"]).logsTail, "all")
+
+
+class ga4ghRemoteHostTest(unittest.TestCase):
+    """
+    Tests for a ga4gh deployment on a remote docker host
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.environment = dict((name, os.environ.pop(name, None)) 
+                                for name in ("DOCKER_HOST", "DOCKER_CONTEXT"))
+        os.environ["DOCKER_HOST"] = "tcp://10.0.0.2:2375"
+        self.docker = fakeDocker()
+        self.ga4gh = ga4gh(object(), object(), object(), self.docker,
+                           render.renderer(self.tempDir))
+        # a port only this machine listens on
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("", 0))
+        self.listener.listen(1)
+        self.busy = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+        for name, value in self.environment.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+        shutil.rmtree(self.tempDir)
+
+    def testPortsOfTheRemoteDaemon(self):
+        self.assertFalse(engine.isLocal())
+        self.docker.published["other_service"] = str(self.busy + 1)
+        args = cmdparse().commandParser(["--ga4gh-replicas", "3", 
+                                         "--ga4gh-port", str(self.busy - 1)])
+        self.ga4gh.allocatePorts(args)
+        self.assertEqual(args.ga4ghPorts, [str(self.busy - 1), str(self.busy), str(self.busy + 2)])
+
+    def testDataDirectoryOfTheRemoteHost(self):
+        args = cmdparse().commandParser(["--ga4gh-data", "/srv/remote-data"])
+        steps = dict((name, dependencies) for name, function, dependencies 
+                     in self.ga4gh.steps(args))
+        self.assertEqual(steps["ga4gh.data"], ["ga4gh.pull"])
+        self.assertEqual(self.ga4gh.binds, ["/srv/remote-data:/srv/ga4gh-data:ro"])
+
+        # the registry is read through the daemon
+        with self.assertRaises(dataset.dataError):
+            self.ga4gh.checkData(args)
+        self.docker.registries["/srv/remote-data"] = registryContent(self.tempDir)
+        self.ga4gh.checkData(args)
+        self.assertEqual(self.docker.removed, ["ga4gh_candig_datacheck"] * 2)
+
+        os.environ["DOCKER_HOST"] = "unix:///var/run/docker.sock"
+        with self.assertRaises(dataset.dataError):
+            self.ga4gh.checkData(args)
+
+
+class ga4ghDataTest(unittest.TestCase):
+    """
+    Tests for the data source mounted into the ga4gh servers
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.dataDir = os.path.join(self.tempDir, "data")
+        os.mkdir(self.dataDir)
+        self.registry(["system", "dataset"])
+        self.docker = fakeDocker()
+        self.ga4gh = ga4gh(object(), object(), object(), self.docker,
+                           render.renderer(self.tempDir))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def registry(self, tables):
+        fileName = os.path.join(self.dataDir, "registry.db")
+        if os.path.exists(fileName):
+            os.remove(fileName)
+        connection = sqlite3.connect(fileName)
+        for table in tables:
+            connection.execute("CREATE TABLE " + table + " (key TEXT, value TEXT)")
+        if "system" in tables:
+            connection.execute("INSERT INTO system VALUES ('schemaVersion', '2.0.0')")
+        connection.commit()
+        connection.close()
+
+    def testCheckRegistry(self):
+        self.assertEqual(dataset.checkRegistry(self.dataDir), "2.0.0")
+        self.registry(["system"])
+        with self.assertRaises(dataset.dataError):
+            dataset.checkRegistry(self.dataDir)
+        with open(os.path.join(self.dataDir, "registry.db"), "wb") as registryHandle:
+            registryHandle.write(b"not a database" * 100)
+        with self.assertRaises(dataset.dataError):
+            dataset.checkRegistry(self.dataDir)
+        with self.assertRaises(dataset.dataError):
+            dataset.checkRegistry(self.tempDir)
+
+    def testReplicasShareData(self):
+        args = cmdparse().commandParser(["--ga4gh-replicas", "2", "--ga4gh-data",
+                                         os.path.relpath(self.dataDir)])
+        self.assertEqual(args.ga4ghData, self.dataDir)
+        steps = dict((name, dependencies) for name, function, dependencies 
+                     in self.ga4gh.steps(args))
+        self.assertIn("ga4gh.data", steps["ga4gh.reconcile"])
+
+        self.ga4gh.checkData(args)
+        self.ga4gh.config(args)
+        self.ga4gh.reconcileDocker(args)
+        for containerName, port in self.ga4gh.replicas(args):
+            self.ga4gh.createDocker(containerName, port, args.ga4ghContainerName)
+        self.assertEqual(list(self.docker.binds.values()),
+                         [[self.dataDir + ":/srv/ga4gh-data:ro"]] * 2)
+
+        oidc = yaml.safe_load(dict(self.ga4gh.configFiles)[self.ga4gh.configDir + "/oidc_config.yml"])
+        self.assertEqual(oidc["frontend"]["DATA_SOURCE"], "/srv/ga4gh-data/registry.db")
+        self.assertEqual(oidc["server"]["DATA_SOURCE"], "/srv/ga4gh-data/registry.db")
+
+    def testVolume(self):
+        args = cmdparse().commandParser(["--ga4gh-data", "ga4gh-data"])
+        self.ga4gh.steps(args)
+        self.docker.registries["ga4gh-data"] = registryContent(self.tempDir)
+        self.ga4gh.checkData(args)
+        self.assertEqual(self.ga4gh.binds, ["ga4gh-data:/srv/ga4gh-data:ro"])
+        self.assertEqual(self.docker.binds, {})
+
+        self.docker.registries["ga4gh-data"] = registryContent(self.tempDir, ["system"])
+        with self.assertRaises(dataset.dataError):
+            self.ga4gh.checkData(args)
+
+        args.ga4ghData = "missing-data"
+        with self.assertRaises(dataset.dataError):
+            self.ga4gh.checkData(args)
+
+    def testWithoutData(self):
+        args = cmdparse().commandParser([])
+        self.ga4gh.steps(args)
+        self.ga4gh.config(args)
+        self.assertEqual(self.ga4gh.binds, [])
+        self.assertNotIn("binds", self.ga4gh.spec("8000"))
+        oidc = yaml.safe_load(dict(self.ga4gh.configFiles)[self.ga4gh.configDir + "/oidc_config.yml"])
+        self.assertEqual(oidc["server"]["DATA_SOURCE"], "/srv/ga4gh-compliance-data/registry.db")
+
+
+class ga4ghTuningTest(unittest.TestCase):
+    """
+    Tests for the ga4gh performance profiles
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.docker = fakeDocker()
+        self.ga4gh = ga4gh(object(), object(), object(), self.docker,
+                           render.renderer(self.tempDir))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def deploy(self, arguments):
+        args = cmdparse().commandParser(arguments)
+        self.ga4gh.steps(args)
+        self.ga4gh.config(args)
+        self.ga4gh.reconcileDocker(args)
+        for containerName, port in self.ga4gh.replicas(args):
+            self.ga4gh.createDocker(containerName, port, args.ga4ghContainerName)
+        oidcName = self.ga4gh.configDir + "/oidc_config.yml"
+        return args, yaml.safe_load(dict(self.ga4gh.configFiles)[oidcName])
+
+    def testDevKeepsPackagedValues(self):
+        args, oidc = self.deploy([])
+        with open(self.ga4gh.oidcConfigName) as templateHandle:
+            template = yaml.safe_load(templateHandle)
+        for section in ("frontend", "server"):
+            for name in ("DEBUG", "DATA_SOURCE"):
+                self.assertEqual(oidc[section][name], template[section][name])
+        self.assertEqual(oidc["server"]["FILE_HANDLE_CACHE_MAX_SIZE"], 
+                         template["server"]["FILE_HANDLE_CACHE_MAX_SIZE"])
+        self.assertIsNone(self.docker.commands["ga4gh_candig"])
+        self.assertNotIn("command", self.ga4gh.spec("8000"))
+
+    def testLarge(self):
+        args, oidc = self.deploy(["--ga4gh-profile", "large"])
+        self.assertFalse(oidc["frontend"]["DEBUG"])
+        self.assertFalse(oidc["server"]["DEBUG"])
+        self.assertEqual(oidc["server"]["DEFAULT_PAGE_SIZE"], 500)
+        script = self.docker.commands["ga4gh_candig"][-1]
+        self.assertIn("processes=8", script)
+        self.assertIn("threads=8", script)
+        self.assertTrue(script.endswith("apache2ctl -D FOREGROUND"))
+
+    def testAutoSharesTheHost(self):
+        args, oidc = self.deploy(["--ga4gh-profile", "auto", "--ga4gh-replicas", "2"])
+        # 8 CPUs and 16 GiB shared by 2 replicas
+        self.assertEqual(args.ga4ghTuning["processes"], 4)
+        self.assertEqual(args.ga4ghTuning["threads"], 8)
+        self.assertEqual(oidc["server"]["FILE_HANDLE_CACHE_MAX_SIZE"], 400)
+        self.assertEqual(len(set(map(tuple, self.docker.commands.values()))), 1)
+        self.assertIn("auto: 4 processes x 8 threads, debug off", 
+                      tuning.describe(args.ga4ghTuning))
+        self.assertIn("(from 8 CPUs, 16.0GiB)", tuning.describe(args.ga4ghTuning))
+
+    def testAutoSmallHost(self):
+        values = tuning.auto(2, 1 << 30)
+        self.assertEqual((values["processes"], values["threads"]), (2, 4))
+        self.assertEqual(values["fileHandleCacheMaxSize"], 50)
+        self.assertEqual(tuning.auto(1, 128 << 20)["processes"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
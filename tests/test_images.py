@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from deployer.images import images, imageError
+
+
+class fakeImages(images):
+    """
+    Image layer backed by an in-memory image store instead of docker
+    """
+
+    def __init__(self, cacheFile, remote, offline=False):
+        self.store = {}
+        self.remote = remote
+        self.pulls = []
+        images.__init__(self, cacheFile, offline)
+
+    def present(self, reference):
+        repo, digest = reference.split("@")
+        return digest in self.store.get(repo, [])
+
+    def localDigests(self, repo):
+        return list(self.store.get(repo, []))
+
+    def pull(self, reference):
+        self.pulls.append(reference)
+        repo = reference.split("@")[0]
+        self.store.setdefault(repo, []).insert(0, self.remote[repo])
+
+
+class imagesTest(unittest.TestCase):
+    """
+    Tests for the digest-aware image cache
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.cacheFile = os.path.join(self.tempDir, "images.json")
+        self.remote = {"dalos/docker-keycloak": "sha256:aaa"}
+        self.images = fakeImages(self.cacheFile, self.remote)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testColdPull(self):
+        digest = self.images.resolve("dalos/docker-keycloak")
+        self.assertEqual(digest, "sha256:aaa")
+        self.assertEqual(self.images.pulls, ["dalos/docker-keycloak"])
+        self.assertEqual((self.images.hits, self.images.misses), (0, 1))
+
+    def testWarmSkipsPull(self):
+        self.images.resolve("dalos/docker-keycloak")
+        warm = fakeImages(self.cacheFile, self.remote)
+        warm.store = self.images.store
+        self.assertEqual(warm.resolve("dalos/docker-keycloak"), "sha256:aaa")
+        self.assertEqual(warm.pulls, [])
+        self.assertEqual((warm.hits, warm.misses), (1, 0))
+
+    def testPinnedPullsByDigest(self):
+        self.remote["dalos/docker-keycloak"] = "sha256:bbb"
+        self.images.resolve("dalos/docker-keycloak", "sha256:bbb")
+        self.assertEqual(self.images.pulls, ["dalos/docker-keycloak@sha256:bbb"])
+        self.images.resolve("dalos/docker-keycloak", "sha256:bbb")
+        self.assertEqual(len(self.images.pulls), 1)
+
+    def testOffline(self):
+        offline = fakeImages(self.cacheFile, self.remote, offline=True)
+        self.assertRaises(imageError, offline.resolve, "dalos/docker-keycloak")
+        offline.store["dalos/docker-keycloak"] = ["sha256:ccc"]
+        self.assertEqual(offline.resolve("dalos/docker-keycloak"), "sha256:ccc")
+        self.assertEqual(offline.pulls, [])
+
+    def testInvalidate(self):
+        self.images.resolve("dalos/docker-keycloak")
+        self.assertEqual([repo for repo, entry in self.images.entries()],
+                         ["dalos/docker-keycloak"])
+        self.images.invalidate()
+        self.assertEqual(fakeImages(self.cacheFile, self.remote).entries(), [])
+
+    def testSharedCacheKeepsBothHosts(self):
+        self.remote["candig/ga4gh"] = "sha256:ddd"
+        other = fakeImages(self.cacheFile, self.remote)
+        self.images.resolve("dalos/docker-keycloak")
+        other.resolve("candig/ga4gh")
+        self.assertEqual([repo for repo, entry in fakeImages(self.cacheFile, self.remote).entries()],
+                         ["candig/ga4gh", "dalos/docker-keycloak"])
+        self.assertEqual([name for name in os.listdir(self.tempDir) if name.endswith(".part")], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
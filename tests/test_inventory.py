@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+from benchmarks import bench
+from deployer import inventory
+
+# a stand-in deployer recording when it ran and writing a trace
+FAKE_DEPLOYER = """
+import json, os, sys, time
+traceFile = sys.argv[sys.argv.index("--profile") + 1]
+start = time.time()
+time.sleep(float(os.environ["FAKE_SECONDS"]))
+with open(os.environ["FAKE_RUNS"], "a") as runHandle:
+    runHandle.write(json.dumps([start, time.time()]) + "\\n")
+events = [{"name": "keycloak.pull", "cat": "step", "dur": 2e6},
+          {"name": "ga4gh.pull", "cat": "step", "dur": 3e6},
+          {"name": "teardown", "cat": "deploy", "dur": 1e5}]
+with open(traceFile, "w") as traceHandle:
+    json.dump({"traceEvents": events}, traceHandle)
+"""
+
+
+class inventoryTest(unittest.TestCase):
+    """
+    Tests for the inventory rollout
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.script = os.path.join(self.tempDir, "fakeDeployer.py")
+        with open(self.script, "w") as scriptHandle:
+            scriptHandle.write(FAKE_DEPLOYER)
+        self.runs = os.path.join(self.tempDir, "runs.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def hosts(self, count, seconds):
+        env = {"FAKE_SECONDS": seconds, "FAKE_RUNS": self.runs}
+        return [inventory.host("node" + str(number), "unix:///tmp/node.sock", env=env)
+                for number in range(count)]
+
+    def testLoad(self):
+        fileName = os.path.join(self.tempDir, "hosts.yml")
+        with open(fileName, "w") as inventoryHandle:
+            inventoryHandle.write("hosts:\n"
+                                  "  - name: node1\n"
+                                  "    dockerHost: tcp://10.0.0.2:2375\n"
+                                  "    options: {ip: 10.0.0.2, funnel: true, ga4gh-replicas: 2}\n"
+                                  "  - name: node2\n"
+                                  "    dockerContext: node2\n")
+        node1, node2 = inventory.load(fileName)
+        self.assertEqual(node1.arguments(), ["--funnel", "--ga4gh-replicas", "2",
+                                             "--ip", "10.0.0.2"])
+        self.assertEqual(node1.environment()["DOCKER_HOST"], "tcp://10.0.0.2:2375")
+        self.assertEqual(node2.environment()["DOCKER_CONTEXT"], "node2")
+        self.assertNotIn("DOCKER_HOST", node2.environment())
+
+        with open(fileName, "w") as inventoryHandle:
+            inventoryHandle.write("hosts:\n  - name: node1\n")
+        with self.assertRaises(inventory.inventoryError):
+            inventory.load(fileName)
+
+    def testSharedArguments(self):
+        argv = ["--inventory", "hosts.yml", "-f", "--inventory-parallel=2",
+                "-hto", "60", "--profile", "trace.json", "-i", "10.0.0.1"]
+        self.assertEqual(inventory.sharedArguments(argv), ["-f", "-i", "10.0.0.1"])
+
+    def testBoundedConcurrency(self):
+        results = inventory.rollout(self.hosts(4, 0.3), [], 2, 30, self.tempDir,
+                                    [sys.executable, self.script])
+        self.assertEqual([result["status"] for result in results], ["ok"] * 4)
+        self.assertEqual(results[0]["phases"], {"pull": 3.0, "teardown": 0.1})
+
+        with open(self.runs) as runHandle:
+            runs = [json.loads(line) for line in runHandle]
+        # no more than two deployers overlap at any start time
+        for start, end in runs:
+            overlapping = [run for run in runs if run[0] <= start < run[1]]
+            self.assertLessEqual(len(overlapping), 2)
+
+    def testTimeout(self):
+        results = inventory.rollout(self.hosts(1, 10), [], 1, 0.5, self.tempDir,
+                                    [sys.executable, self.script])
+        self.assertEqual(results[0]["status"], "timeout")
+        self.assertLess(results[0]["seconds"], 5)
+        self.assertIn("node0: timeout", inventory.report(results))
+
+    def testLocalRollout(self):
+        # two hosts deployed by the real deployer against fake docker programs
+        server = bench.readyServer(("127.0.0.1", 0), bench.readyHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        port = str(server.server_address[1])
+        boxes = [bench.sandbox({"default": 0.0}) for number in range(2)]
+        try:
+            hosts = [inventory.host("node" + str(number), "unix://" + box.root + "/missing.sock",
+                                    options={"keycloak-port": port, "ga4gh-port": port,
+                                             "ready-timeout": 30},
+                                    env=box.environment())
+                     for number, box in enumerate(boxes)]
+            results = inventory.rollout(hosts, ["--docker-cli"], 2, 60, self.tempDir)
+            self.assertEqual([result["status"] for result in results], ["ok", "ok"])
+            self.assertIn("ready", results[0]["phases"])
+            for box in boxes:
+                self.assertIn(["docker", "pull"], [call["argv"][:2] for call in box.calls()])
+        finally:
+            server.shutdown()
+            server.server_close()
+            for box in boxes:
+                box.remove()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from benchmarks import bench
+from deployer import render
+from deployer.cmdparse import cmdparse
+from deployer.keycloak import keycloak as keycloakModule
+from deployer.keycloak.keycloak import keycloak
+
+
+class fakeDocker:
+    """
+    Docker client keeping the files copied into the keycloak database volume
+    """
+
+    def __init__(self):
+        self.volumes = {}
+        self.created = {}
+        self.copied = []
+
+    def createVolume(self, name, labels=None):
+        self.volumes.setdefault(name, {})
+
+    def createContainer(self, name, image, ports=None, env=None, labels=None, binds=None,
+                        command=None):
+        self.created[name] = {"env": dict(env or []), "binds": binds}
+
+    def volumeFiles(self, name):
+        return self.volumes[self.created[name]["binds"][0].split(":")[0]]
+
+    def readFile(self, name, path):
+        return self.volumeFiles(name).get(path)
+
+    def copyFiles(self, name, files):
+        for entry in files:
+            self.copied.append(entry)
+            if entry[0].startswith(keycloakModule.DATA_DIR + "/"):
+                self.volumeFiles(name)[entry[0]] = entry[1]
+
+    def startContainer(self, name):
+        pass
+
+
+class fakeReadiness:
+    """
+    Readiness engine whose servers are ready at once
+    """
+
+    def watch(self, probe):
+        pass
+
+    def wait(self, name):
+        pass
+
+    def cancel(self, name):
+        pass
+
+
+class keycloakDatabaseTest(unittest.TestCase):
+    """
+    Tests for the persistent database and the realm import
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.docker = fakeDocker()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def deploy(self, arguments=()):
+        server = keycloak(fakeReadiness(), object(), object(), self.docker,
+                          render.renderer(self.tempDir))
+        args = cmdparse().commandParser(list(arguments))
+        server.config(args)
+        server.reconcileDocker(args)
+        server.createDocker(args)
+        server.copyDocker(args)
+        server.start(args)
+        server.ready(args)
+        return server
+
+    def testFirstStartImports(self):
+        server = self.deploy()
+        self.assertEqual(server.realmAction, "imported")
+        self.assertEqual(self.docker.created["keycloak_candig"]["binds"],
+                         ["keycloak_candig_data:/srv/keycloak/standalone/data"])
+        # the start script stays executable, and the hash follows readiness
+        paths = [entry[0] for entry in self.docker.copied]
+        self.assertEqual(paths, ["/srv/keycloakConfig.json", "/srv/keycloakStart.sh",
+                                 keycloakModule.REALM_HASH_FILE])
+        self.assertEqual(self.docker.copied[1][2], 0o755)
+        self.assertEqual(self.docker.volumes["keycloak_candig_data"][keycloakModule.REALM_HASH_FILE],
+                         (server.realmHash + "\n").encode("utf-8"))
+
+    def testWarmStartSkipsImport(self):
+        self.deploy()
+        self.docker.copied = []
+        server = self.deploy()
+        self.assertEqual(server.realmAction, "unchanged")
+        self.assertNotIn(keycloakModule.REALM_HASH_FILE,
+                         [entry[0] for entry in self.docker.copied])
+
+    def testChangedRealmImports(self):
+        self.deploy()
+        server = self.deploy(["--realm-name", "OtherRealm"])
+        self.assertEqual(server.realmAction, "imported")
+
+    def testJvmOptions(self):
+        self.deploy(["--keycloak-heap", "2g", "--keycloak-gc", "G1"])
+        env = self.docker.created["keycloak_candig"]["env"]
+        self.assertEqual((env["JAVA_HEAP"], env["JAVA_GC"]), ("2g", "G1"))
+        self.deploy()
+        self.assertNotIn("JAVA_HEAP", self.docker.created["keycloak_candig"]["env"])
+        with self.assertRaises(SystemExit):
+            cmdparse().commandParser(["--keycloak-heap", "2 GB"])
+
+
+class keycloakRestartTest(unittest.TestCase):
+    """
+    Tests for warm restarts with the real deployer against fake docker programs
+    """
+
+    def setUp(self):
+        self.server = bench.readyServer(("127.0.0.1", 0), bench.readyHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.box = bench.sandbox({"default": 0.0})
+        port = str(self.server.server_address[1])
+        self.arguments = ["--docker-cli", "--keycloak-port", port, "--ga4gh-port", port,
+                          "--ready-timeout", "30"]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.box.remove()
+
+    def deploy(self, arguments):
+        env = self.box.environment()
+        env["DOCKER_HOST"] = "unix://" + self.box.root + "/missing.sock"
+        result = subprocess.run([sys.executable, "-m", "deployer.deployer"] + arguments,
+                                env=env, cwd=self.box.root, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, universal_newlines=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stdout)
+        return result.stdout
+
+    def testRestartKeepsDatabase(self):
+        self.assertIn("REALM:     imported", self.deploy(self.arguments))
+        output = self.deploy(self.arguments + ["restart"])
+        self.assertIn("REALM:     unchanged, import skipped", output)
+        self.assertIn("READY IN:", output)
+
+        # removing the volumes drops the database and its realm
+        self.deploy(["--docker-cli", "down", "--remove-volumes"])
+        self.assertIn("REALM:     imported", self.deploy(self.arguments))
+
+
+if __name__ == "__main__":
+    unittest.main()
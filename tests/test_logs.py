@@ -0,0 +1,187 @@
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from benchmarks import bench
+from deployer import engine
+from deployer import logs
+
+
+def line(seconds, text):
+    """
+    Returns a log line of docker logs --timestamps at a time of day
+    """
+    return "2018-03-01T10:00:{0:012.9f}Z {1}\n".format(seconds, text).encode("utf-8")
+
+
+class fakeSource:
+    """
+    Log stream counting the lines read from it
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for logLine in self.lines:
+            self.read += 1
+            yield logLine
+
+    def close(self):
+        self.closed = True
+
+
+class fakeDocker:
+    """
+    Docker client returning fixed log lines by container name
+    """
+
+    def __init__(self, lines, missing=0):
+        self.lines = lines
+        self.missing = missing
+        self.sources = []
+        self.calls = []
+
+    def logsStream(self, name, follow=True, tail="all", since=None):
+        self.calls.append((name, follow, since))
+        # the first attempts find no container
+        if len(self.calls) <= self.missing:
+            raise engine.engineError(404, "No such container: " + name)
+        source = fakeSource(self.lines[name])
+        self.sources.append(source)
+        return source
+
+
+class parseTest(unittest.TestCase):
+    """
+    Tests for the timestamps of log lines
+    """
+
+    def testParseLine(self):
+        seconds, text = logs.parseLine(b"2018-03-01T10:00:01.5Z started\r\n")
+        self.assertEqual(seconds, 1519898401.5)
+        self.assertEqual(text, "started")
+        self.assertEqual(logs.parseLine(b"2018-03-01T10:00:01Z x")[0], 1519898401)
+        # the errors of the docker program have no timestamp
+        self.assertEqual(logs.parseLine(b"Error: No such container: x\n"),
+                         (None, "Error: No such container: x"))
+
+
+class followerTest(unittest.TestCase):
+    """
+    Tests for merging, filtering and the bounded buffers of the follower
+    """
+
+    def setUp(self):
+        self.docker = fakeDocker({
+            "keycloak_candig": [line(1, "starting"), line(4, "WFLYSRV0025: Keycloak started"),
+                                line(5, "imported realm")],
+            "ga4gh_candig": [line(2, "starting"), line(3, "warning"),
+                             line(6, "resuming normal operations")]})
+        self.containers = [("keycloak", "keycloak_candig"), ("ga4gh", "ga4gh_candig")]
+
+    def follow(self, logFollower):
+        logFollower.start()
+        entries = list(logFollower.entries())
+        logFollower.stop()
+        return entries
+
+    def testMergedInTimestampOrder(self):
+        logFollower = logs.follower(self.docker, self.containers, follow=False, delay=5)
+        entries = self.follow(logFollower)
+        self.assertEqual([round(entry[0] % 60) for entry in entries], [1, 2, 3, 4, 4, 5, 6, 6])
+        # the ready marker follows the line matching the readiness pattern
+        markers = [(entry[2].service, entry[0] % 60) for entry in entries if entry[4]]
+        self.assertEqual(markers, [("keycloak", 4), ("ga4gh", 6)])
+        self.assertEqual(logFollower.streams[0].ready, 3)
+        self.assertIn("*** keycloak ready after 3.0 seconds", logs.formatEntry(entries[4]))
+
+    def testPattern(self):
+        logFollower = logs.follower(self.docker, self.containers, "starting|realm", follow=False)
+        texts = [entry[3] for entry in self.follow(logFollower) if not entry[4]]
+        self.assertEqual(texts, ["starting", "starting", "imported realm"])
+
+    def testBackpressure(self):
+        self.docker.lines["keycloak_candig"] = [line(seconds / 10.0, "line")
+                                                for seconds in range(50)]
+        logFollower = logs.follower(self.docker, self.containers[:1], follow=False,
+                                    bufferLines=4)
+        logFollower.start()
+        time.sleep(0.2)
+        # the reader waits for the consumer once its buffer is full
+        self.assertEqual(len(logFollower.streams[0].lines), 4)
+        self.assertEqual(self.docker.sources[0].read, 5)
+        self.assertEqual(len(list(logFollower.entries())), 50)
+        logFollower.stop()
+
+    def testWaitForContainer(self):
+        docker = fakeDocker(self.docker.lines, missing=2)
+        logFollower = logs.follower(docker, self.containers[:1], wait=True, since=1519898401.5)
+        logFollower.start()
+        deadline = time.time() + 10
+        while len(docker.sources) < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        logFollower.finish()
+        texts = [entry[3] for entry in logFollower.entries() if not entry[4]]
+        # the lines before since are left out, and the final read repeats none
+        self.assertEqual(texts, ["WFLYSRV0025: Keycloak started", "imported realm"])
+        self.assertEqual(docker.calls[-1][1], False)
+        self.assertEqual(logFollower.errors(), {})
+
+
+class logsCommandTest(unittest.TestCase):
+    """
+    Tests for the logs subcommand and --follow-logs with the real
+    deployer against fake docker programs
+    """
+
+    def setUp(self):
+        self.server = bench.readyServer(("127.0.0.1", 0), bench.readyHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.box = bench.sandbox({"default": 0.0})
+        port = str(self.server.server_address[1])
+        self.arguments = ["--docker-cli", "--keycloak-port", port, "--ga4gh-port", port,
+                          "--ready-timeout", "30"]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.box.remove()
+
+    def deploy(self, arguments):
+        env = self.box.environment()
+        env["DOCKER_HOST"] = "unix://" + self.box.root + "/missing.sock"
+        return subprocess.run([sys.executable, "-m", "deployer.deployer"] + arguments,
+                              env=env, cwd=self.box.root, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, universal_newlines=True, timeout=120)
+
+    def testFollowThenLogs(self):
+        result = self.deploy(self.arguments + ["--follow-logs"])
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertIn("keycloak_candig | starting keycloak_candig", result.stdout)
+        self.assertIn("*** ga4gh ready after", result.stdout)
+        self.assertLess(result.stdout.index("*** keycloak ready"),
+                        result.stdout.index("Deployment Complete."))
+
+        result = self.deploy(["--docker-cli", "logs", "--logs-no-follow", "--logs-service",
+                              "ga4gh", "--logs-grep", "warning"])
+        self.assertEqual(result.returncode, 0, result.stdout)
+        lines = result.stdout.splitlines()
+        self.assertEqual(len(lines), 2, result.stdout)
+        self.assertTrue(lines[0].endswith("ga4gh_candig | warning: fake configuration"))
+        self.assertIn("*** ga4gh ready", lines[1])
+
+    def testFollowLogsRequiresDeploy(self):
+        result = self.deploy(["logs", "--follow-logs"])
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("--follow-logs follows the logs while deploying", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
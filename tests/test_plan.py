@@ -0,0 +1,233 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from benchmarks import bench
+from deployer import engine
+from deployer import plan
+from deployer import render
+from deployer.cmdparse import cmdparse
+from deployer.funnel.funnel import funnel
+from deployer.ga4gh.ga4gh import ga4gh
+from deployer.keycloak.keycloak import keycloak
+
+
+class fakeDocker:
+    """
+    Docker client without containers
+    """
+
+    def listContainers(self, labels):
+        return []
+
+    def inspectContainer(self, name):
+        return None
+
+
+class planTest(unittest.TestCase):
+    """
+    Tests for compiling, saving and restoring deployment plans
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.cacheHome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.tempDir, "cache")
+        self.args = cmdparse().commandParser(["--funnel", "--ga4gh-replicas", "2"])
+
+    def tearDown(self):
+        if self.cacheHome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cacheHome
+        shutil.rmtree(self.tempDir)
+
+    def services(self):
+        renderer = render.renderer(os.path.join(self.tempDir, "deployment"))
+        docker = fakeDocker()
+        return [("keycloak", keycloak(object(), object(), object(), docker, renderer)),
+                ("ga4gh", ga4gh(object(), object(), object(), docker, renderer)),
+                ("funnel", funnel(object(), docker, renderer))]
+
+    def testCompile(self):
+        compiled, steps = plan.compilePlan(self.args, self.services())
+        names = [operation["name"] for operation in compiled["operations"]]
+        self.assertEqual(names, [name for name, function, dependencies in steps])
+        self.assertNotIn("keycloak.config", names)
+        self.assertIn("ga4gh.start.2", names)
+        self.assertEqual(sorted(compiled["services"]), ["funnel", "ga4gh", "keycloak"])
+        self.assertEqual(len(compiled["inputs"]["ga4ghPorts"]), 2)
+        self.assertNotIn("workers", compiled["inputs"])
+        self.assertIn("Rendered configuration:", plan.describe(compiled))
+
+    def testRestoreWithoutRendering(self):
+        compiledServices = self.services()
+        compiled, steps = plan.compilePlan(self.args, compiledServices)
+        planFile = os.path.join(self.tempDir, "plan.json")
+        plan.save(compiled, planFile)
+
+        services = self.services()
+        renderer = services[0][1].render
+        args = cmdparse().commandParser(["apply", planFile])
+        restored = plan.restore(plan.load(planFile), args, services)
+
+        self.assertEqual(plan.operations(restored), plan.operations(steps))
+        # the configuration rendered at compile time is no longer depended on
+        self.assertNotIn("keycloak.config", sum([dependencies for name, function, dependencies
+                                                 in restored], []))
+        self.assertEqual(args.ga4ghPorts, self.args.ga4ghPorts)
+        self.assertEqual((renderer.written, renderer.unchanged), (0, 0))
+        for (name, subdeployer), (compiledName, compiledSubdeployer) in zip(services[1:], 
+                                                                            compiledServices[1:]):
+            self.assertEqual(subdeployer.configFiles, compiledSubdeployer.configFiles)
+        self.assertEqual(services[0][1].realmFile, compiledServices[0][1].realmFile)
+
+    def testChangedFile(self):
+        compiled, steps = plan.compilePlan(self.args, self.services())
+        with open(compiled["services"]["funnel"]["files"][0]["path"], "ab") as fileHandle:
+            fileHandle.write(b" ")
+        with self.assertRaises(plan.planError):
+            plan.restore(compiled, self.args, self.services())
+
+    def testChangedSteps(self):
+        compiled, steps = plan.compilePlan(self.args, self.services())
+        compiled["operations"] = compiled["operations"][1:]
+        with self.assertRaises(plan.planError):
+            plan.restore(compiled, self.args, self.services())
+
+    def testKey(self):
+        services = self.services()
+        planKey = plan.key(self.args, services)
+        self.args.workers = "8"
+        self.assertEqual(plan.key(self.args, services), planKey)
+        self.args.realmName = "Other"
+        self.assertNotEqual(plan.key(self.args, services), planKey)
+
+    def testUnfinished(self):
+        steps = [("keycloak.pull", None, []), ("keycloak.start", None, ["keycloak.pull"]),
+                 ("keycloak.ready", None, ["keycloak.start"]),
+                 ("ga4gh.pull", None, []), ("ga4gh.start", None, ["ga4gh.pull"]),
+                 ("ga4gh.ready", None, ["ga4gh.start", "?keycloak.ready"])]
+        done = ["keycloak.pull", "keycloak.start", "keycloak.ready", "ga4gh.pull", "ga4gh.start"]
+        # ga4gh.ready still needs the results of the ga4gh steps before it
+        self.assertEqual(plan.unfinished(steps, done),
+                         [("ga4gh.pull", None, []), ("ga4gh.start", None, ["ga4gh.pull"]),
+                          ("ga4gh.ready", None, ["ga4gh.start"])])
+
+    def testKeyOfEndpoint(self):
+        services = self.services()
+        saved = dict((name, os.environ.pop(name, None))
+                     for name in ("DOCKER_HOST", "DOCKER_CONTEXT", "XDG_DATA_HOME"))
+        os.environ["XDG_DATA_HOME"] = os.path.join(self.tempDir, "data")
+        try:
+            planKey = plan.key(self.args, services)
+            localDir = render.renderer().directory(self.args)
+            self.assertEqual(engine.deploymentName("keycloak_candig"), "keycloak_candig")
+
+            # an inventory host differs from the local deployment only by its endpoint
+            os.environ["DOCKER_HOST"] = "tcp://10.0.0.2:2376"
+            self.assertNotEqual(plan.key(self.args, services), planKey)
+            self.assertNotEqual(render.renderer().directory(self.args), localDir)
+            name = engine.deploymentName("keycloak_candig")
+            self.assertEqual(name, "keycloak_candig@tcp://10.0.0.2:2376")
+            self.assertTrue(engine.onEndpoint(name))
+            self.assertFalse(engine.onEndpoint("keycloak_candig"))
+
+            del os.environ["DOCKER_HOST"]
+            os.environ["DOCKER_CONTEXT"] = "remote"
+            self.assertEqual(engine.deploymentName("keycloak_candig"), "keycloak_candig@context:remote")
+            self.assertFalse(engine.onEndpoint(name))
+        finally:
+            for name, value in saved.items():
+                os.environ.pop(name, None)
+                if value is not None:
+                    os.environ[name] = value
+
+    def testSecretsNotRecorded(self):
+        self.args = cmdparse().commandParser(["--admin-password", "s3cret-admin", 
+                                              "--ga4gh-secret", "s3cret-client"])
+        services = self.services()
+        planKey = plan.key(self.args, services)
+        compiled, steps = plan.compilePlan(self.args, services)
+        planFile = os.path.join(self.tempDir, "plan.json")
+        plan.save(compiled, planFile)
+        with open(planFile) as planHandle:
+            self.assertNotIn("s3cret", planHandle.read())
+
+        self.args.adminPassword = "other"
+        self.assertNotEqual(plan.key(self.args, services), planKey)
+
+        # apply takes the secrets from the options or the environment
+        args = cmdparse().commandParser(["apply", planFile])
+        plan.arguments(plan.load(planFile), args)
+        with self.assertRaises(plan.planError):
+            plan.restore(plan.load(planFile), args, self.services())
+        os.environ["CANDIG_ADMIN_PASSWORD"] = "s3cret-admin"
+        try:
+            args = cmdparse().commandParser(["apply", planFile, "--ga4gh-secret", "s3cret-client"])
+        finally:
+            del os.environ["CANDIG_ADMIN_PASSWORD"]
+        plan.arguments(plan.load(planFile), args)
+        plan.restore(plan.load(planFile), args, self.services())
+
+    def testLoadInvalid(self):
+        planFile = os.path.join(self.tempDir, "plan.json")
+        with open(planFile, "w") as planHandle:
+            planHandle.write("[]")
+        with self.assertRaises(plan.planError):
+            plan.load(planFile)
+
+
+class applyTest(unittest.TestCase):
+    """
+    Tests for --dry-run, --save-plan and apply with the real deployer
+    against fake docker programs
+    """
+
+    def setUp(self):
+        self.server = bench.readyServer(("127.0.0.1", 0), bench.readyHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.box = bench.sandbox({"default": 0.0})
+        self.planFile = os.path.join(self.box.root, "plan.json")
+        port = str(self.server.server_address[1])
+        self.arguments = ["--docker-cli", "--keycloak-port", port, "--ga4gh-port", port,
+                          "--ready-timeout", "30"]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.box.remove()
+
+    def deploy(self, arguments):
+        env = self.box.environment()
+        env["DOCKER_HOST"] = "unix://" + self.box.root + "/missing.sock"
+        return subprocess.run([sys.executable, "-m", "deployer.deployer"] + arguments,
+                              env=env, cwd=self.box.root, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, universal_newlines=True, timeout=120)
+
+    def testDryRunThenApply(self):
+        result = self.deploy(self.arguments + ["--dry-run", "--save-plan", self.planFile])
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertIn("after keycloak.pull, keycloak.config", result.stdout)
+        self.assertNotIn(["docker", "create"], [call["argv"][:2] for call in self.box.calls()])
+
+        result = self.deploy(self.arguments + ["apply", self.planFile])
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertIn("(applied from " + self.planFile + ")", result.stdout)
+        self.assertNotIn("Configuration:", result.stdout)
+        self.assertIn(["docker", "create"], [call["argv"][:2] for call in self.box.calls()])
+
+        # a deploy with the same inputs reuses the cached plan
+        result = self.deploy(self.arguments)
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertIn("(reused)", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import socket
+import unittest
+
+from deployer import ports
+
+
+class portsTest(unittest.TestCase):
+    """
+    Tests for the allocation of replica ports
+    """
+
+    def setUp(self):
+        # hold a port so that it is unavailable
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("", 0))
+        self.listener.listen(1)
+        self.busy = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def testAvailable(self):
+        self.assertFalse(ports.available(self.busy))
+
+    def testAllocateSkipsBusyPorts(self):
+        first = self.busy - 1
+        allocated = ports.allocate(str(first), 3, exclude=[str(self.busy + 1)])
+        self.assertEqual(allocated[0], str(first))
+        self.assertNotIn(str(self.busy), allocated)
+        self.assertNotIn(str(self.busy + 1), allocated)
+        self.assertEqual(len(set(allocated)), 3)
+
+    def testPreferredPortsAreKept(self):
+        # the port held by the replica's own container is kept
+        allocated = ports.allocate("8000", 2, [None, str(self.busy)])
+        self.assertEqual(allocated, ["8000", str(self.busy)])
+
+    def testHostPort(self):
+        inspection = {"HostConfig": {"PortBindings": {"8000/tcp": [{"HostPort": "8002"}]}}}
+        self.assertEqual(ports.hostPort(inspection, "8000"), "8002")
+        self.assertIsNone(ports.hostPort(None, "8000"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import socket
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from deployer.readiness import probe, readiness, readinessError
+
+
+def freePort():
+    """
+    Returns a local port number that is currently unused
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class stubServer:
+    """
+    Local HTTP server answering every GET with a fixed status
+    """
+
+    def __init__(self, port, status=200, path=None):
+        class handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                code = status if path is None or self.path == path else 404
+                self.send_response(code)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class readinessTest(unittest.TestCase):
+    """
+    Tests for the readiness probe engine
+    """
+
+    def setUp(self):
+        self.engine = readiness(initialDelay=0.05, maxDelay=0.2, attemptTimeout=1)
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+
+    def serve(self, port, status=200, path=None):
+        self.servers.append(stubServer(port, status, path))
+
+    def testReady(self):
+        port = freePort()
+        self.serve(port)
+        self.engine.watch(probe("ga4gh", "127.0.0.1", str(port), timeout=5))
+        seconds = self.engine.wait("ga4gh")
+        self.assertLess(seconds, 1)
+        self.assertEqual(self.engine.results["ga4gh"], seconds)
+
+    def testDiscoveryPath(self):
+        port = freePort()
+        path = "/auth/realms/CanDIG/.well-known/openid-configuration"
+        self.serve(port, 200, path)
+        self.engine.watch(probe("keycloak", "127.0.0.1", port, path, [200], 5))
+        self.engine.wait("keycloak")
+
+    def testDelayedStart(self):
+        port = freePort()
+        self.engine.watch(probe("funnel", "127.0.0.1", port, timeout=5))
+        time.sleep(0.3)
+        self.serve(port, 302)
+        seconds = self.engine.wait("funnel")
+        self.assertGreaterEqual(seconds, 0.3)
+
+    def testTimeout(self):
+        port = freePort()
+        self.serve(port, 404)
+        self.engine.watch(probe("keycloak", "127.0.0.1", port, "/", [200], 0.3))
+        self.assertRaises(readinessError, self.engine.wait, "keycloak")
+        self.assertIsNone(self.engine.results["keycloak"])
+
+    def testExitedProcess(self):
+        process = subprocess.Popen([sys.executable, "-c", "import sys; sys.exit(3)"])
+        process.wait()
+        self.engine.watch(probe("keycloak", "127.0.0.1", freePort(), timeout=30, 
+                                process=process))
+        begin = time.time()
+        with self.assertRaises(readinessError) as raised:
+            self.engine.wait("keycloak")
+        self.assertLess(time.time() - begin, 1)
+        self.assertIn("exited with code 3", str(raised.exception))
+
+    def testConcurrentPolling(self):
+        ports = [freePort() for i in range(3)]
+        probes = [probe("service" + str(i), "127.0.0.1", port, timeout=5)
+                  for i, port in enumerate(ports)]
+
+        def serveLater():
+            time.sleep(0.4)
+            for port in ports:
+                self.serve(port)
+
+        thread = threading.Thread(target=serveLater)
+        thread.start()
+        begin = time.time()
+        results = self.engine.waitAll(probes)
+        thread.join()
+        self.assertLess(time.time() - begin, 1.5)
+        self.assertTrue(all(seconds is not None for seconds in results.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from deployer import paths
+from deployer.keycloak.realm import realm, realmError
+
+
+class realmTest(unittest.TestCase):
+    """
+    Tests for the cached Keycloak realm renderer
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.templateFile = paths.resource("deployer.keycloak", "keycloakConfig.json")
+        self.values = {"realmName": "Test",
+                       "ga4ghID": "ga4ghTest",
+                       "ga4ghSecret": "ga4ghSecret",
+                       "ga4ghUrl": "http://10.0.0.1:8001/",
+                       "funnelID": "funnelTest",
+                       "funnelSecret": "funnelSecret",
+                       "funnelUrl": "http://10.0.0.1:3003/",
+                       "userUsername": "alice",
+                       "adminUsername": "root"}
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def clients(self, realmData):
+        return dict((client["clientId"], client) for client in realmData["clients"])
+
+    def testRender(self):
+        renderer = realm(self.templateFile, self.tempDir)
+        with open(renderer.render(self.values)) as realmHandle:
+            text = realmHandle.read()
+        self.assertNotIn("\n", text)
+
+        candig, master = json.loads(text)
+        clients = self.clients(candig)
+        self.assertEqual(candig["realm"], "Test")
+        self.assertEqual(clients["ga4ghTest"]["redirectUris"], ["http://10.0.0.1:8001/*"])
+        self.assertEqual(clients["funnelTest"]["secret"], "funnelSecret")
+        self.assertEqual(clients["account"]["baseUrl"], "/auth/realms/Test/account")
+        self.assertEqual([role["containerId"] for role in candig["roles"]["realm"]],
+                         ["Test", "Test"])
+        self.assertEqual(candig["users"][0]["username"], "alice")
+        self.assertEqual(master["users"][0]["username"], "root")
+
+    def testReplicaRedirects(self):
+        self.values["ga4ghUrls"] = ["http://10.0.0.1:8001/", "http://10.0.0.1:8002/"]
+        renderer = realm(self.templateFile, self.tempDir)
+        with open(renderer.render(self.values)) as realmHandle:
+            candig, master = json.load(realmHandle)
+        clients = self.clients(candig)
+        self.assertEqual(clients["ga4ghTest"]["redirectUris"],
+                         ["http://10.0.0.1:8001/*", "http://10.0.0.1:8002/*"])
+        self.assertEqual(clients["ga4ghTest"]["baseUrl"], "http://10.0.0.1:8001/")
+
+    def testWarmRenderSkipsParsing(self):
+        realmFile = realm(self.templateFile, self.tempDir).render(self.values)
+        warm = realm(self.templateFile, self.tempDir)
+        self.assertEqual(warm.render(self.values), realmFile)
+        self.assertIsNone(warm.template)
+        self.assertEqual((warm.hits, warm.misses), (1, 0))
+
+    def testChangedValues(self):
+        renderer = realm(self.templateFile, self.tempDir)
+        first = renderer.render(self.values)
+        self.values["ga4ghUrl"] = "http://10.0.0.2:8001/"
+        self.assertNotEqual(renderer.render(self.values), first)
+        self.assertEqual(renderer.misses, 2)
+
+    def testLeastRecentlyUsedEviction(self):
+        renderer = realm(self.templateFile, os.path.join(self.tempDir, "realms"), keep=2)
+        os.makedirs(renderer.outputDir)
+        rendered = []
+        for port in ("8001", "8002", "8003"):
+            self.values["ga4ghUrl"] = "http://10.0.0.1:" + port + "/"
+            rendered.append(renderer.render(self.values))
+            os.utime(rendered[-1], (len(rendered), len(rendered)))
+            if port == "8002":
+                # the first realm is used again
+                self.values["ga4ghUrl"] = "http://10.0.0.1:8001/"
+                renderer.render(self.values)
+        self.assertEqual(sorted(os.listdir(renderer.outputDir)),
+                         sorted(os.path.basename(path) for path in (rendered[0], rendered[2])))
+        self.assertEqual(os.stat(rendered[0]).st_mode & 0o777, 0o600)
+
+    def testClientsIndexedById(self):
+        # reorder the clients as a regenerated export might
+        with open(self.templateFile) as templateHandle:
+            realms = json.load(templateHandle)
+        realms[0]["clients"].reverse()
+        templateFile = os.path.join(self.tempDir, "template.json")
+        with open(templateFile, "w") as templateHandle:
+            json.dump(realms, templateHandle)
+
+        with open(realm(templateFile, self.tempDir).render(self.values)) as realmHandle:
+            clients = self.clients(json.load(realmHandle)[0])
+        self.assertEqual(clients["ga4ghTest"]["baseUrl"], "http://10.0.0.1:8001/")
+        self.assertEqual(clients["funnelTest"]["baseUrl"], "http://10.0.0.1:3003/")
+
+    def testMissingClient(self):
+        with open(self.templateFile) as templateHandle:
+            realms = json.load(templateHandle)
+        realms[0]["clients"] = [client for client in realms[0]["clients"]
+                                if client["clientId"] != "ga4gh"]
+        templateFile = os.path.join(self.tempDir, "template.json")
+        with open(templateFile, "w") as templateHandle:
+            json.dump(realms, templateHandle)
+        self.assertRaises(realmError, realm(templateFile, self.tempDir).render, self.values)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from deployer import reconcile
+
+
+class reconcileTest(unittest.TestCase):
+    """
+    Tests for the container specification hashes
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.spec = {"image": "dalos/docker-ga4gh@sha256:aaa",
+                     "ports": {"8000": "8000"},
+                     "config": "0" * 64}
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testSpecHashIsCanonical(self):
+        reordered = dict(reversed(list(self.spec.items())))
+        self.assertEqual(reconcile.specHash(self.spec), reconcile.specHash(reordered))
+
+    def testSpecHashChangesWithPorts(self):
+        changed = dict(self.spec, ports={"8000": "9000"})
+        self.assertNotEqual(reconcile.specHash(self.spec), reconcile.specHash(changed))
+
+    def testFileHash(self):
+        configName = os.path.join(self.tempDir, "oidc_config.yml")
+        with open(configName, "w") as configHandle:
+            configHandle.write("frontend: {}\n")
+        before = reconcile.fileHash([configName])
+        self.assertEqual(before, reconcile.fileHash([configName]))
+        with open(configName, "w") as configHandle:
+            configHandle.write("frontend: {DEBUG: False}\n")
+        self.assertNotEqual(before, reconcile.fileHash([configName]))
+
+    def testContextHash(self):
+        os.makedirs(os.path.join(self.tempDir, "node", "public"))
+        files = {"Dockerfile": "FROM debian\nCOPY node/public /home/public\nCOPY start.sh /home/\n",
+                 "node/public/app.js": "app",
+                 "start.sh": "start",
+                 "notes.txt": "not copied"}
+        for fileName, content in files.items():
+            with open(os.path.join(self.tempDir, fileName), "w") as fileHandle:
+                fileHandle.write(content)
+
+        self.assertEqual(reconcile.contextFiles(self.tempDir),
+                         ["Dockerfile", "node/public/app.js", "start.sh"])
+        before = reconcile.contextHash(self.tempDir)
+
+        # files outside the COPY sources do not change the hash
+        with open(os.path.join(self.tempDir, "notes.txt"), "w") as fileHandle:
+            fileHandle.write("changed")
+        self.assertEqual(before, reconcile.contextHash(self.tempDir))
+
+        with open(os.path.join(self.tempDir, "node/public/app.js"), "w") as fileHandle:
+            fileHandle.write("changed")
+        self.assertNotEqual(before, reconcile.contextHash(self.tempDir))
+
+    def testContextForms(self):
+        os.makedirs(os.path.join(self.tempDir, "node"))
+        files = {"Dockerfile": ("FROM debian\n"
+                                "COPY --chown=node:node \\\n"
+                                "    start.sh \\\n"
+                                "    /home/\n"
+                                "COPY [\"config.json\", \"/srv/\"]\n"
+                                "ADD node/*.js /home/node/\n"),
+                 "start.sh": "start",
+                 "config.json": "{}",
+                 "node/app.js": "app",
+                 "node/api.js": "api",
+                 "node/notes.txt": "not copied"}
+        for fileName, content in files.items():
+            with open(os.path.join(self.tempDir, fileName), "w") as fileHandle:
+                fileHandle.write(content)
+
+        self.assertEqual(reconcile.contextFiles(self.tempDir),
+                         ["Dockerfile", "config.json", "node/api.js", "node/app.js", "start.sh"])
+
+    def testLabels(self):
+        labels = reconcile.labels("ga4gh", "abc")
+        self.assertEqual(labels, {"candig.managed": "true",
+                                  "candig.service": "ga4gh",
+                                  "candig.spec": "abc"})
+        labels = reconcile.labels("ga4gh", "abc", "ga4gh_candig")
+        self.assertEqual(labels["candig.group"], "ga4gh_candig")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from deployer import render
+from deployer.cmdparse import cmdparse
+
+
+class writeIfChangedTest(unittest.TestCase):
+    """
+    Tests for the atomic write-only-if-changed helper
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "ga4gh", "client_secrets.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testIdenticalBytesKeepFile(self):
+        self.assertTrue(render.writeIfChanged(self.fileName, b"{}"))
+        os.utime(self.fileName, (1, 1))
+        self.assertFalse(render.writeIfChanged(self.fileName, b"{}"))
+        self.assertEqual(os.stat(self.fileName).st_mtime, 1)
+
+    def testChangedBytesReplaceFile(self):
+        render.writeIfChanged(self.fileName, b"{}")
+        self.assertTrue(render.writeIfChanged(self.fileName, b"[]"))
+        with open(self.fileName, "rb") as fileHandle:
+            self.assertEqual(fileHandle.read(), b"[]")
+        # no temporary files are left behind
+        self.assertEqual(os.listdir(os.path.dirname(self.fileName)), ["client_secrets.json"])
+
+
+class rendererTest(unittest.TestCase):
+    """
+    Tests for the endpoint model and the rendering layer
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.args = cmdparse().commandParser(["-i", "10.0.0.5"])
+        self.renderer = render.renderer(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testEndpoints(self):
+        model = self.renderer.endpoints(self.args)
+        self.assertIs(model, self.renderer.endpoints(self.args))
+        self.assertEqual(model.issuer, "http://10.0.0.5:8080/auth/realms/CanDIG")
+        self.assertEqual(model.tokenIntrospectUri,
+                         model.issuer + "/protocol/openid-connect/token/introspect")
+        self.assertEqual(model.ga4ghRedirect, "http://10.0.0.5:8000/oidc_callback")
+
+    def testWriteCounts(self):
+        fileName = self.renderer.write(self.args, "funnel/keycloak.json", b"{}")
+        self.renderer.write(self.args, "funnel/keycloak.json", b"{}")
+        self.assertEqual(fileName, os.path.join(self.directory, "funnel", "keycloak.json"))
+        self.assertEqual((self.renderer.written, self.renderer.unchanged), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+
+from deployer.scheduler import optional, scheduler, scheduleError
+
+
+class schedulerTest(unittest.TestCase):
+    """
+    Tests for the dependency-graph scheduler
+    """
+
+    def setUp(self):
+        self.scheduler = scheduler(workers=4)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def record(self, name, delay=0):
+        def step():
+            time.sleep(delay)
+            with self.lock:
+                self.calls.append(name)
+        return step
+
+    def fail(self):
+        raise RuntimeError("boom")
+
+    def testDependencyOrder(self):
+        self.scheduler.add("start", self.record("start"), ["copy"])
+        self.scheduler.add("copy", self.record("copy"), ["create", "config"])
+        self.scheduler.add("create", self.record("create"), ["pull"])
+        self.scheduler.add("pull", self.record("pull", 0.05))
+        self.scheduler.add("config", self.record("config"))
+        status = self.scheduler.run()
+        self.assertEqual(set(status.values()), set(["done"]))
+        self.assertLess(self.calls.index("pull"), self.calls.index("create"))
+        self.assertLess(self.calls.index("config"), self.calls.index("copy"))
+        self.assertEqual(self.calls[-1], "start")
+
+    def testIndependentStepsRunConcurrently(self):
+        for name in ["keycloak.pull", "ga4gh.pull", "funnel.build"]:
+            self.scheduler.add(name, self.record(name, 0.2))
+        begin = time.time()
+        self.scheduler.run()
+        self.assertLess(time.time() - begin, 0.5)
+
+    def testWorkerBound(self):
+        bounded = scheduler(workers=1)
+        for name in ["a", "b"]:
+            bounded.add(name, self.record(name, 0.1))
+        begin = time.time()
+        bounded.run()
+        self.assertGreaterEqual(time.time() - begin, 0.2)
+
+    def testUnknownDependency(self):
+        self.scheduler.add("keycloak.ready", self.record("ready"), ["keycloak.redy"])
+        self.assertRaises(ValueError, self.scheduler.run)
+        self.assertEqual(self.calls, [])
+
+    def testOptionalDependency(self):
+        self.scheduler.add("ga4gh.ready", self.record("ga4gh.ready"), 
+                           [optional("keycloak.ready")])
+        self.assertEqual(self.scheduler.run(), {"ga4gh.ready": "done"})
+
+        both = scheduler()
+        both.add("ga4gh.ready", self.record("ga4gh.ready"), [optional("keycloak.ready")])
+        both.add("keycloak.ready", self.record("keycloak.ready", 0.05))
+        both.run()
+        self.assertEqual(self.calls[-2:], ["keycloak.ready", "ga4gh.ready"])
+
+    def testFailureCancelsDependents(self):
+        self.scheduler.add("keycloak.pull", self.fail)
+        self.scheduler.add("keycloak.create", self.record("keycloak.create"), ["keycloak.pull"])
+        self.scheduler.add("keycloak.ready", self.record("keycloak.ready"), ["keycloak.create"])
+        self.scheduler.add("ga4gh.ready", self.record("ga4gh.ready"), ["keycloak.ready"])
+        self.scheduler.add("funnel.build", self.record("funnel.build", 0.05))
+        with self.assertRaises(scheduleError) as context:
+            self.scheduler.run()
+        self.assertEqual(list(context.exception.failures), ["keycloak.pull"])
+        self.assertEqual(context.exception.cancelled,
+                         ["keycloak.create", "keycloak.ready", "ga4gh.ready"])
+        self.assertEqual(self.calls, ["funnel.build"])
+
+    def testCycle(self):
+        self.scheduler.add("a", self.record("a"), ["b"])
+        self.scheduler.add("b", self.record("b"), ["a"])
+        self.assertRaises(ValueError, self.scheduler.run)
+
+    def testDuplicate(self):
+        self.scheduler.add("a", self.record("a"))
+        self.assertRaises(ValueError, self.scheduler.add, "a", self.record("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
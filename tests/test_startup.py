@@ -0,0 +1,122 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from benchmarks import bench
+
+# the root of the repository holding the deployer package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the wall time --help may take, interpreter start-up included
+STARTUP_BUDGET = 0.5
+
+# the wall time a plan-only run (--dry-run) may take
+PLAN_BUDGET = 1.0
+
+# an installed service whose steps do nothing
+STUB_SERVICE = """
+class stub:
+    def __init__(self, **shared):
+        pass
+
+    def steps(self, args):
+        return [("stub.config", lambda: None, []), 
+                ("stub.start", lambda: None, ["stub.config"])]
+
+    def rendered(self):
+        return {"files": []}
+
+    def restore(self, state):
+        pass
+"""
+
+# modules that only a deployment may import
+DEPLOY_MODULES = ("pkg_resources", "yaml", "asyncio", "http.client",
+                  "deployer.engine", "deployer.keycloak.keycloak",
+                  "deployer.ga4gh.ga4gh", "deployer.funnel.funnel")
+
+
+class startupTest(unittest.TestCase):
+    """
+    Tests for the start-up cost of the command-line program
+    """
+
+    def helpImports(self):
+        """
+        Runs --help and returns the modules imported by then
+        """
+        script = ("import sys\n"
+                  "sys.argv = ['candigDeploy', '--help']\n"
+                  "from deployer import deployer\n"
+                  "try:\n"
+                  "    deployer.main()\n"
+                  "except SystemExit:\n"
+                  "    pass\n"
+                  "sys.stderr.write(' '.join(sys.modules))\n")
+        process = subprocess.run([sys.executable, "-c", script], cwd=ROOT,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return process.stderr.decode("utf-8").split()
+
+    def testHelpImports(self):
+        modules = self.helpImports()
+        for module in DEPLOY_MODULES:
+            self.assertNotIn(module, modules)
+
+    def testHelpBudget(self):
+        # the fastest of a few runs, to leave out a busy machine
+        timings = []
+        for attempt in range(3):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-m", "deployer.deployer", "--help"], cwd=ROOT,
+                           stdout=subprocess.DEVNULL, check=True)
+            timings.append(time.perf_counter() - start)
+        self.assertLess(min(timings), STARTUP_BUDGET)
+
+    def testDryRunBudget(self):
+        box = bench.sandbox({"default": 0.0})
+        try:
+            # install the stub service as an entry point
+            pluginDir = os.path.join(box.root, "plugins")
+            distInfo = os.path.join(pluginDir, "stubservice-0.1.dist-info")
+            os.makedirs(distInfo)
+            with open(os.path.join(pluginDir, "stubservice.py"), "w") as moduleHandle:
+                moduleHandle.write(STUB_SERVICE)
+            with open(os.path.join(distInfo, "METADATA"), "w") as metadataHandle:
+                metadataHandle.write("Metadata-Version: 2.1\nName: stubservice\nVersion: 0.1\n")
+            with open(os.path.join(distInfo, "entry_points.txt"), "w") as entryHandle:
+                entryHandle.write("[candigDeploy.services]\nstub = stubservice:stub\n")
+
+            env = box.environment()
+            env["PYTHONPATH"] += os.pathsep + pluginDir
+            env["DOCKER_HOST"] = "unix://" + box.root + "/missing.sock"
+            timings = []
+            for attempt in range(3):
+                start = time.perf_counter()
+                result = subprocess.run([sys.executable, "-m", "deployer.deployer", "--docker-cli",
+                                         "--services", "stub", "--dry-run"], 
+                                        env=env, cwd=box.root, stdout=subprocess.PIPE, 
+                                        stderr=subprocess.STDOUT, universal_newlines=True)
+                timings.append(time.perf_counter() - start)
+                self.assertEqual(result.returncode, 0, result.stdout)
+                self.assertRegex(result.stdout, r"stub.start +after stub.config")
+
+            # installed services are only deployed when selected
+            result = subprocess.run([sys.executable, "-m", "deployer.deployer", "--docker-cli",
+                                     "--dry-run"], env=env, cwd=box.root, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, universal_newlines=True)
+            self.assertNotIn("stub.start", result.stdout)
+            result = subprocess.run([sys.executable, "-m", "deployer.deployer", "--docker-cli",
+                                     "--services", "stbu", "--dry-run"], env=env, cwd=box.root, 
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
+                                    universal_newlines=True)
+            self.assertEqual(result.returncode, 1)
+            self.assertIn("Unknown services: stbu (installed: stub)", result.stdout)
+        finally:
+            box.remove()
+        self.assertLess(min(timings), PLAN_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from benchmarks import bench
+from deployer import state
+
+
+class fakeDocker:
+    """
+    Docker client holding inspections by container name
+    """
+
+    def __init__(self, containers):
+        self.containers = containers
+        self.inspected = []
+
+    def inspectContainer(self, name):
+        self.inspected.append(name)
+        return self.containers.get(name)
+
+
+class storeTest(unittest.TestCase):
+    """
+    Tests for the SQLite state store
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.store = state.store(os.path.join(self.tempDir, "state.db"))
+        self.plan = {"key": "a" * 64}
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tempDir)
+
+    def record(self, name, containerId=None, action="created"):
+        return {"service": "ga4gh", "name": name, "kind": "container", "containerId": containerId,
+                "image": "dalos/docker-ga4gh", "specHash": "b" * 64, "port": "8000",
+                "action": action}
+
+    def testDeployment(self):
+        deploymentId = self.store.begin("keycloak_candig", "up", self.plan)
+        self.store.step(deploymentId, "ga4gh.pull", "done", 2.0)
+        self.store.step(deploymentId, "keycloak.pull", "done", 3.0)
+        self.store.finish(deploymentId, "complete", [self.record("ga4gh_candig", "1234")])
+
+        latest = self.store.latest()
+        self.assertEqual([deployment["id"] for deployment in latest], [deploymentId])
+        self.assertEqual(latest[0]["status"], "complete")
+        self.assertEqual(state.phases(self.store.steps(deploymentId)), {"pull": 3.0})
+        self.assertEqual(self.store.records(deploymentId)[0]["containerId"], "1234")
+
+    def testPrivateDatabase(self):
+        self.assertEqual(os.stat(self.store.fileName).st_mode & 0o777, 0o600)
+
+    def testKeptContainerKeepsId(self):
+        first = self.store.begin("keycloak_candig", "up", self.plan)
+        self.store.finish(first, "complete", [self.record("ga4gh_candig", "1234")])
+        second = self.store.begin("keycloak_candig", "up", self.plan)
+        self.store.finish(second, "complete", [self.record("ga4gh_candig", action="kept")])
+        self.assertEqual(self.store.records(second)[0]["containerId"], "1234")
+
+    def testInterrupted(self):
+        deploymentId = self.store.begin("keycloak_candig", "up", self.plan)
+        self.store.step(deploymentId, "keycloak.pull", "done", 1.0)
+        # the deployer of a running deployment is still alive
+        self.assertIsNone(self.store.interrupted("keycloak_candig", self.plan["key"]))
+
+        self.store.execute("UPDATE deployments SET pid = ? WHERE id = ?", (2 ** 22 + 1, deploymentId))
+        resumed = self.store.interrupted("keycloak_candig", self.plan["key"])
+        self.assertEqual(resumed["done"], ["keycloak.pull"])
+        # another plan starts over
+        self.assertIsNone(self.store.interrupted("keycloak_candig", "c" * 64))
+
+        self.store.removed("keycloak_candig")
+        self.assertIsNone(self.store.interrupted("keycloak_candig", self.plan["key"]))
+
+    def testStatus(self):
+        docker = fakeDocker({"ga4gh_candig": {"Id": "sha256:1234ab", "State": {"Running": True}},
+                             "ga4gh_candig_2": {"Id": "9999", "State": {"Running": True}}})
+        records = [self.record("ga4gh_candig", "1234"), self.record("ga4gh_candig_2", "1234"),
+                   self.record("ga4gh_candig_3", "5678")]
+        checked = state.status(docker, records)
+        self.assertEqual([record["state"] for record in checked], ["running", "replaced", "missing"])
+        # only the recorded containers are inspected
+        self.assertEqual(docker.inspected, ["ga4gh_candig", "ga4gh_candig_2", "ga4gh_candig_3"])
+
+
+class statusTest(unittest.TestCase):
+    """
+    Tests for the status subcommand and resumed deployments with the
+    real deployer against fake docker programs
+    """
+
+    def setUp(self):
+        self.server = bench.readyServer(("127.0.0.1", 0), bench.readyHandler)
+        self.port = str(self.server.server_address[1])
+        self.box = bench.sandbox({"default": 0.0})
+        self.arguments = ["--docker-cli", "--keycloak-port", self.port, "--ga4gh-port", self.port]
+
+    def tearDown(self):
+        self.server.server_close()
+        self.box.remove()
+
+    def deploy(self, arguments):
+        env = self.box.environment()
+        env["DOCKER_HOST"] = "unix://" + self.box.root + "/missing.sock"
+        return subprocess.run([sys.executable, "-m", "deployer.deployer"] + arguments,
+                              env=env, cwd=self.box.root, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, universal_newlines=True, timeout=120)
+
+    def testResumeAndStatus(self):
+        # nothing answers the readiness probes, so the first deploy fails
+        result = self.deploy(self.arguments + ["--ready-timeout", "1"])
+        self.assertEqual(result.returncode, 1, result.stdout)
+        result = self.deploy(self.arguments + ["status"])
+        self.assertIn("failed", result.stdout)
+
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            result = self.deploy(self.arguments + ["--ready-timeout", "30"])
+        finally:
+            self.server.shutdown()
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertIn("Resuming deployment #1", result.stdout)
+        # the containers started by the failed deploy were kept
+        self.assertIn("ACTION:    kept", result.stdout)
+
+        result = self.deploy(self.arguments + ["status"])
+        self.assertIn("#2: complete", result.stdout)
+        self.assertEqual(result.stdout.count(" running "), 2, result.stdout)
+
+    def testResumeSkipsCompletedSteps(self):
+        ga4ghServer = bench.readyServer(("127.0.0.1", 0), bench.readyHandler)
+        arguments = ["--docker-cli", "--keycloak-port", self.port, 
+                     "--ga4gh-port", str(ga4ghServer.server_address[1])]
+        keycloakThread = threading.Thread(target=self.server.serve_forever)
+        keycloakThread.daemon = True
+        keycloakThread.start()
+        try:
+            # only keycloak answers, so the first deploy fails at ga4gh.ready
+            result = self.deploy(arguments + ["--ready-timeout", "1"])
+            self.assertEqual(result.returncode, 1, result.stdout)
+            self.box.calls()
+
+            ga4ghThread = threading.Thread(target=ga4ghServer.serve_forever)
+            ga4ghThread.daemon = True
+            ga4ghThread.start()
+            try:
+                result = self.deploy(arguments + ["--ready-timeout", "30"])
+            finally:
+                ga4ghServer.shutdown()
+        finally:
+            self.server.shutdown()
+            ga4ghServer.server_close()
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertIn("Resuming deployment #1", result.stdout)
+
+        # the completed keycloak steps were not run again
+        calls = self.box.calls()
+        self.assertTrue(any("ga4gh_candig" in call["argv"] for call in calls), calls)
+        self.assertFalse(any("keycloak_candig" in call["argv"] for call in calls), calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
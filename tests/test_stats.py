@@ -0,0 +1,187 @@
+import json
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from benchmarks import bench
+from deployer import stats
+
+
+# a sample of the engine API: 50% of one of two CPUs, 100MiB without
+# 20MiB of page cache
+API_SAMPLE = {"cpu_stats": {"cpu_usage": {"total_usage": 2000}, "system_cpu_usage": 8000,
+                            "online_cpus": 2},
+              "precpu_stats": {"cpu_usage": {"total_usage": 1000}, "system_cpu_usage": 4000},
+              "memory_stats": {"usage": 120 * 1024 ** 2, "stats": {"inactive_file": 20 * 1024 ** 2}},
+              "networks": {"eth0": {"rx_bytes": 100, "tx_bytes": 200},
+                           "eth1": {"rx_bytes": 1, "tx_bytes": 2}},
+              "blkio_stats": {"io_service_bytes_recursive": [{"op": "Read", "value": 4096},
+                                                             {"op": "Write", "value": 512}]}}
+
+CLI_SAMPLE = {"Name": "ga4gh_candig", "CPUPerc": "12.50%", "MemUsage": "100MiB / 1.944GiB",
+              "NetIO": "1.5kB / 2kB", "BlockIO": "4MB / 0B", "PIDs": "4"}
+
+
+class fakeStream:
+    """
+    Stats stream that yields lines and then blocks until closed
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        for line in self.lines:
+            yield line
+        self.closed.wait()
+        raise OSError("closed")
+
+    def close(self):
+        self.closed.set()
+
+
+class fakeDocker:
+    """
+    Docker client streaming fixed stats lines by container name
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.streams = []
+
+    def statsStream(self, name):
+        if name not in self.lines:
+            raise OSError("No such container: " + name)
+        stream = fakeStream(self.lines[name])
+        self.streams.append(stream)
+        return stream
+
+
+class sampleTest(unittest.TestCase):
+    """
+    Tests for the normalization of stats samples
+    """
+
+    def testApiSample(self):
+        normalized = stats.sample(API_SAMPLE)
+        self.assertAlmostEqual(normalized["cpu"], 50.0)
+        self.assertEqual(normalized["memory"], 100 * 1024 ** 2)
+        self.assertEqual((normalized["netRx"], normalized["netTx"]), (101, 202))
+        self.assertEqual((normalized["blockRead"], normalized["blockWrite"]), (4096, 512))
+
+    def testCliSample(self):
+        normalized = stats.sample(CLI_SAMPLE)
+        self.assertEqual(normalized["cpu"], 12.5)
+        self.assertEqual(normalized["memory"], 100 * 1024 ** 2)
+        self.assertEqual((normalized["netRx"], normalized["netTx"]), (1500, 2000))
+        self.assertEqual(normalized["blockRead"], 4000000)
+
+    def testParseSize(self):
+        self.assertEqual(stats.parseSize("1.5GiB"), 1.5 * 1024 ** 3)
+        self.assertEqual(stats.parseSize("12B"), 12)
+        self.assertEqual(stats.parseSize("--"), 0)
+
+    def testPercentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(stats.percentile(values, 0.5), 50)
+        self.assertEqual(stats.percentile(values, 0.95), 95)
+        self.assertIsNone(stats.percentile([], 0.5))
+
+    def testDecodeTerminalCodes(self):
+        line = b"\x1b[2J\x1b[H" + json.dumps(CLI_SAMPLE).encode("utf-8") + b"\n"
+        self.assertEqual(stats.decode(line)["Name"], "ga4gh_candig")
+        self.assertIsNone(stats.decode(b"\x1b[2J\x1b[H\n"))
+
+
+class monitorTest(unittest.TestCase):
+    """
+    Tests for the ring buffers and the concurrent feeds
+    """
+
+    def testRingBuffer(self):
+        containerFeed = stats.feed("ga4gh_candig", window=3)
+        for cpu in (90.0, 1.0, 2.0, 3.0):
+            containerFeed.add(dict(stats.sample(CLI_SAMPLE), cpu=cpu))
+        self.assertEqual(list(containerFeed.cpu), [1.0, 2.0, 3.0])
+        row = containerFeed.row()
+        self.assertEqual((row["cpuP95"], row["samples"]), (3.0, 4))
+
+    def testMonitor(self):
+        apiLine = json.dumps(API_SAMPLE).encode("utf-8")
+        cliLine = json.dumps(CLI_SAMPLE).encode("utf-8")
+        docker = fakeDocker({"keycloak_candig": [apiLine, b"\n", apiLine],
+                             "ga4gh_candig": [cliLine]})
+        resourceMonitor = stats.monitor(docker, ["keycloak_candig", "ga4gh_candig", "gone"])
+        resourceMonitor.start()
+        deadline = time.time() + 10
+        while len(resourceMonitor.rows()) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        resourceMonitor.stop()
+
+        rows = dict((row["container"], row) for row in resourceMonitor.rows())
+        self.assertEqual(rows["keycloak_candig"]["samples"], 2)
+        self.assertEqual(rows["ga4gh_candig"]["cpu"], 12.5)
+        # the streams closed by stop are not errors
+        self.assertEqual(list(resourceMonitor.errors()), ["gone"])
+        self.assertTrue(all(stream.closed.is_set() for stream in docker.streams))
+        self.assertFalse(any(thread.is_alive() for thread in resourceMonitor.threads))
+
+        lines = stats.jsonLines(resourceMonitor.rows()).splitlines()
+        self.assertEqual(list(json.loads(lines[0])), list(stats.FIELDS))
+        self.assertIn("ga4gh_candig", stats.table(resourceMonitor.rows()))
+
+
+class statsCommandTest(unittest.TestCase):
+    """
+    Tests for the stats subcommand with the real deployer against fake
+    docker programs
+    """
+
+    def setUp(self):
+        self.server = bench.readyServer(("127.0.0.1", 0), bench.readyHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.box = bench.sandbox({"default": 0.0})
+        port = str(self.server.server_address[1])
+        self.arguments = ["--docker-cli", "--keycloak-port", port, "--ga4gh-port", port,
+                          "--ready-timeout", "30"]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.box.remove()
+
+    def deploy(self, arguments):
+        env = self.box.environment()
+        env["DOCKER_HOST"] = "unix://" + self.box.root + "/missing.sock"
+        return subprocess.run([sys.executable, "-m", "deployer.deployer"] + arguments,
+                              env=env, cwd=self.box.root, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, universal_newlines=True, timeout=120)
+
+    def testStatsJson(self):
+        result = self.deploy(self.arguments)
+        self.assertEqual(result.returncode, 0, result.stdout)
+
+        result = self.deploy(["--docker-cli", "stats", "--stats-interval", "0.5",
+                              "--stats-count", "2", "--stats-format", "json"])
+        self.assertEqual(result.returncode, 0, result.stdout)
+        rows = [json.loads(line) for line in result.stdout.splitlines()]
+        self.assertEqual(sorted(set(row["container"] for row in rows)),
+                         ["ga4gh_candig", "keycloak_candig"])
+        self.assertTrue(all(row["memory"] >= 100 * 1024 ** 2 for row in rows))
+        # one stream per container
+        streams = [call["argv"] for call in self.box.calls() if call["argv"][1:2] == ["stats"]]
+        self.assertEqual(len(streams), 2)
+
+    def testStatsRejectsDryRun(self):
+        result = self.deploy(["stats", "--dry-run"])
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("stats has no deployment plan", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
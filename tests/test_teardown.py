@@ -0,0 +1,96 @@
+import threading
+import time
+import unittest
+
+from deployer import teardown
+from deployer.engine import engineError
+
+
+class fakeDocker:
+    """
+    Docker client holding managed containers that take time to stop
+    """
+
+    def __init__(self, containers, stopSeconds=0.0):
+        self.containers = dict(containers)
+        self.stopSeconds = stopSeconds
+        self.stuck = set()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def record(self, *call):
+        with self.lock:
+            self.calls.append(call)
+
+    def listContainers(self, labels):
+        return sorted(self.containers)
+
+    def inspectContainer(self, name):
+        if name not in self.containers:
+            return None
+        return {"Image": self.containers[name]}
+
+    def stopContainer(self, name, timeout):
+        self.record("stop", name, timeout)
+        time.sleep(self.stopSeconds)
+        if name in self.stuck:
+            raise engineError(500, "cannot stop container " + name)
+
+    def killContainer(self, name):
+        self.record("kill", name)
+
+    def removeContainer(self, name, force=False, volumes=False):
+        self.record("rm", name, volumes)
+        self.containers.pop(name, None)
+
+    def removeImage(self, name):
+        self.record("rmi", name)
+
+    def listVolumes(self, labels):
+        return ["keycloak_candig_db"]
+
+    def removeVolume(self, name):
+        self.record("volume rm", name)
+
+
+class teardownTest(unittest.TestCase):
+    """
+    Tests for the parallel teardown of managed containers
+    """
+
+    def setUp(self):
+        self.docker = fakeDocker({"keycloak_candig": "sha256:k",
+                                  "ga4gh_candig": "sha256:g",
+                                  "ga4gh_candig_2": "sha256:g"}, stopSeconds=0.3)
+
+    def testParallelStop(self):
+        result = teardown.down(self.docker, 5)
+        self.assertEqual(sorted(container["action"] for container in result["containers"]),
+                         ["stopped"] * 3)
+        # the containers stop concurrently
+        self.assertLess(result["seconds"], 0.8)
+        self.assertEqual(self.docker.containers, {})
+        self.assertEqual((result["images"], result["volumes"]), ([], []))
+
+    def testKillFallback(self):
+        self.docker.stuck.add("ga4gh_candig")
+        result = teardown.down(self.docker, 5)
+        actions = dict((container["name"], container["action"]) for container in result["containers"])
+        self.assertEqual(actions["ga4gh_candig"], "killed")
+        self.assertIn(("kill", "ga4gh_candig"), self.docker.calls)
+
+    def testImagesAndVolumes(self):
+        result = teardown.down(self.docker, 5, images=True, volumes=True)
+        self.assertEqual(result["images"], ["sha256:g", "sha256:k"])
+        self.assertEqual(result["volumes"], ["keycloak_candig_db"])
+        self.assertIn(("rm", "keycloak_candig", True), self.docker.calls)
+        self.assertIn("IMAGE REMOVED:  sha256:g", teardown.report(result))
+
+    def testMissingContainer(self):
+        results = teardown.removeContainers(self.docker, ["missing"], 0)
+        self.assertEqual(results[0]["action"], "missing")
+        self.assertEqual(self.docker.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
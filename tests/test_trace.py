@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from deployer import trace
+from deployer.scheduler import scheduler
+
+
+class traceTest(unittest.TestCase):
+    """
+    Tests for the deployment tracer
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.tracer = trace.tracer()
+
+    def tearDown(self):
+        trace.active.enabled = False
+        shutil.rmtree(self.tempDir)
+
+    def testDisabled(self):
+        with self.tracer.span("keycloak.pull") as phase:
+            phase.set(status=200)
+        self.assertIs(phase, trace.NULL_SPAN)
+        self.assertEqual(self.tracer.events, [])
+
+    def testSpans(self):
+        self.tracer.enable()
+        with self.tracer.span("docker cp", "process", argv=["docker", "cp"]) as phase:
+            time.sleep(0.01)
+            phase.set(exitStatus=0)
+        with self.assertRaises(ValueError):
+            with self.tracer.span("ga4gh.config"):
+                raise ValueError("bad config")
+
+        slow, failed = self.tracer.events
+        self.assertEqual(slow["cat"], "process")
+        self.assertEqual(slow["args"], {"argv": ["docker", "cp"], "exitStatus": 0})
+        self.assertGreaterEqual(slow["dur"], 10000)
+        self.assertIn("bad config", failed["args"]["error"])
+
+        lines = self.tracer.summary().splitlines()
+        self.assertTrue(lines[0].startswith("SPAN"))
+        self.assertTrue(lines[1].startswith("docker cp"))
+
+    def testChromeTrace(self):
+        self.tracer.enable()
+        with self.tracer.span("deploy"):
+            pass
+        traceFile = os.path.join(self.tempDir, "trace.json")
+        self.tracer.chromeTrace(traceFile)
+        with open(traceFile) as traceHandle:
+            events = json.load(traceHandle)["traceEvents"]
+        self.assertEqual([(event["name"], event["ph"]) for event in events], [("deploy", "X")])
+
+    def testSchedulerSteps(self):
+        trace.active.enable()
+        steps = scheduler()
+        steps.add("keycloak.config", lambda: None)
+        steps.add("keycloak.start", lambda: None, ["keycloak.config"])
+        steps.run()
+        self.assertEqual(sorted(event["name"] for event in trace.active.events),
+                         ["keycloak.config", "keycloak.start"])
+
+
+if __name__ == "__main__":
+    unittest.main()